@@ -39,13 +39,15 @@ def FileFinderOSFromClient(
 
   opts = args.action.stat
 
+  content_conditions = list(conditions.ContentCondition.Parse(args.conditions))
+  content_scanner = conditions.ContentScanner(content_conditions)
+
   for path in GetExpandedPaths(args):
     try:
-      content_conditions = conditions.ContentCondition.Parse(args.conditions)
-      for content_condition in content_conditions:
+      if content_conditions:
         with io.open(path, "rb") as fd:
-          result = list(content_condition.Search(fd))
-        if not result:
+          results = content_scanner.Scan(fd)
+        if not all(results):
           raise _SkipFileException()
       stat = stat_cache.Get(path, follow_symlink=opts.resolve_links)
       stat_entry = client_utils.StatEntryFromStatPathSpec(
@@ -74,6 +76,7 @@ class FileFinderOS(actions.ActionPlugin):
         conditions.MetadataCondition.Parse(args.conditions))
     self._content_conditions = list(
         conditions.ContentCondition.Parse(args.conditions))
+    self._content_scanner = conditions.ContentScanner(self._content_conditions)
 
     for path in GetExpandedPaths(args, heartbeat_cb=self.Progress):
       self.Progress()
@@ -126,12 +129,16 @@ class FileFinderOS(actions.ActionPlugin):
         raise _SkipFileException()
 
   def _ValidateContent(self, stat, filepath, matches):
-    if self._content_conditions and not stat.IsRegular():
+    if not self._content_conditions:
+      return
+
+    if not stat.IsRegular():
       raise _SkipFileException()
 
-    for content_condition in self._content_conditions:
-      with io.open(filepath, "rb") as fd:
-        result = list(content_condition.Search(fd))
+    with io.open(filepath, "rb") as fd:
+      results = self._content_scanner.Scan(fd)
+
+    for result in results:
       if not result:
         raise _SkipFileException()
       matches.extend(result)
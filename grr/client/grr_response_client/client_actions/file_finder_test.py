@@ -9,7 +9,6 @@ import os
 import shutil
 import stat
 from unittest import mock
-import zlib
 
 from absl import app
 
@@ -19,6 +18,7 @@ from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.util import compression
 from grr_response_core.lib.util import temp
 from grr.test_lib import client_test_lib
 from grr.test_lib import filesystem_test_lib
@@ -987,12 +987,7 @@ class MockTransferStore(object):
       raise ValueError("message is not authenticated")
 
     data_blob = message.payload
-    if data_blob.compression == "UNCOMPRESSED":
-      data = data_blob.data
-    elif data_blob.compression == "ZCOMPRESSION":
-      data = zlib.decompress(data_blob.data)
-    else:
-      raise ValueError("unknown blob compression: %s" % data_blob.compression)
+    data = compression.Decompress(data_blob.data, data_blob.compression)
 
     digest = hashlib.sha256(data).digest()
     self.blobs[digest] = data
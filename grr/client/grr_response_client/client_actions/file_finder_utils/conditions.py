@@ -2,11 +2,21 @@
 """Implementation of condition mechanism for client-side file-finder."""
 
 import abc
+import collections
+import heapq
+import io
+import mmap
+import os
 import re
+from typing import Dict
+from typing import FrozenSet
 from typing import Iterator
+from typing import List
 from typing import NamedTuple
 from typing import Optional
 from typing import Pattern
+from typing import Sequence
+from typing import Tuple
 
 from grr_response_client import streaming
 from grr_response_core.lib.rdfvalues import client as rdf_client
@@ -139,18 +149,6 @@ class ExtFlagsCondition(MetadataCondition):
 class ContentCondition(metaclass=abc.ABCMeta):
   """An abstract class representing conditions on the file contents."""
 
-  @abc.abstractmethod
-  def Search(self, fd):
-    """Searches specified file for particular content.
-
-    Args:
-      fd: A file descriptor of the file that needs to be searched.
-
-    Yields:
-      `BufferReference` objects pointing to file parts with matching content.
-    """
-    pass
-
   @staticmethod
   def Parse(conditions):
     """Parses the file finder condition types into the condition objects.
@@ -173,38 +171,18 @@ class ContentCondition(metaclass=abc.ABCMeta):
       except KeyError:
         pass
 
-  OVERLAP_SIZE = 1024 * 1024
-  CHUNK_SIZE = 10 * 1024 * 1024
-
-  def Scan(self, fd,
-           matcher: "Matcher") -> Iterator[rdf_client.BufferReference]:
-    """Scans given file searching for occurrences of given pattern.
+  def Search(self, fd) -> Iterator[rdf_client.BufferReference]:
+    """Searches specified file for particular content.
 
     Args:
       fd: A file descriptor of the file that needs to be searched.
-      matcher: A matcher object specifying a pattern to search for.
 
     Yields:
       `BufferReference` objects pointing to file parts with matching content.
     """
-    streamer = streaming.Streamer(
-        chunk_size=self.CHUNK_SIZE, overlap_size=self.OVERLAP_SIZE)
-
-    offset = self.params.start_offset
-    amount = self.params.length
-    for chunk in streamer.StreamFile(fd, offset=offset, amount=amount):
-      for span in chunk.Scan(matcher):
-        ctx_begin = max(span.begin - self.params.bytes_before, 0)
-        ctx_end = min(span.end + self.params.bytes_after, len(chunk.data))
-        ctx_data = chunk.data[ctx_begin:ctx_end]
-
-        yield rdf_client.BufferReference(
-            offset=chunk.offset + ctx_begin,
-            length=len(ctx_data),
-            data=ctx_data)
-
-        if self.params.mode == self.params.Mode.FIRST_HIT:
-          return
+    results, = ContentScanner([self]).Scan(fd)
+    for result in results:
+      yield result
 
 
 class LiteralMatchCondition(ContentCondition):
@@ -213,11 +191,7 @@ class LiteralMatchCondition(ContentCondition):
   def __init__(self, params):
     super().__init__()
     self.params = params.contents_literal_match
-
-  def Search(self, fd):
-    matcher = LiteralMatcher(self.params.literal.AsBytes())
-    for match in self.Scan(fd, matcher):
-      yield match
+    self.literal = self.params.literal.AsBytes()
 
 
 class RegexMatchCondition(ContentCondition):
@@ -226,13 +200,222 @@ class RegexMatchCondition(ContentCondition):
   def __init__(self, params):
     super().__init__()
     self.params = params.contents_regex_match
+    self.regex = re.compile(
+        self.params.regex.AsBytes(), flags=re.I | re.S | re.M)
 
-  def Search(self, fd) -> Iterator[rdf_client.BufferReference]:
-    regex = re.compile(self.params.regex.AsBytes(), flags=re.I | re.S | re.M)
 
-    matcher = RegexMatcher(regex)
-    for match in self.Scan(fd, matcher):
-      yield match
+class ContentScanner(object):
+  """Searches a file for multiple content conditions in a single pass.
+
+  Files are read in large overlapping chunks. Optionally, regular files are
+  memory-mapped instead and each condition is matched against the whole
+  searched range at once. Either way, the file is read only once no matter how
+  many conditions are given: literals are looked up together by a
+  `MultiLiteralMatcher` and regular expressions by a `MultiRegexMatcher`.
+
+  Args:
+    content_conditions: `ContentCondition` objects to search for.
+    memory_map: Whether to memory-map regular files. Accessing a mapping past
+      the end of a file that was truncated while being searched kills the
+      process with SIGBUS, so this is only safe for files that are known not
+      to change.
+  """
+
+  OVERLAP_SIZE = 1024 * 1024
+  CHUNK_SIZE = 10 * 1024 * 1024
+
+  def __init__(self,
+               content_conditions: Sequence[ContentCondition],
+               memory_map: bool = False):
+    super().__init__()
+    self._conditions = list(content_conditions)
+    self._memory_map = memory_map
+
+    # Conditions can search different ranges of the file, so the conditions
+    # are grouped by range and each group gets its own matchers.
+    ranges = collections.defaultdict(list)
+    for index, condition in enumerate(self._conditions):
+      key = (condition.params.start_offset, condition.params.length)
+      ranges[key].append(index)
+
+    self._ranges = []
+    for (start_offset, length), indices in ranges.items():
+      literals = []
+      regexes = []
+      for index in indices:
+        condition = self._conditions[index]
+        if isinstance(condition, LiteralMatchCondition):
+          literals.append((index, condition.literal))
+        elif isinstance(condition, RegexMatchCondition):
+          regexes.append((index, condition.regex))
+        else:
+          raise TypeError("Unexpected content condition: {}".format(condition))
+
+      self._ranges.append(
+          _ScanRange(
+              start_offset=start_offset,
+              length=length,
+              literal_indices=[index for index, _ in literals],
+              literal_matcher=MultiLiteralMatcher(
+                  [literal for _, literal in literals]),
+              regex_indices=[index for index, _ in regexes],
+              regex_matcher=MultiRegexMatcher([regex for _, regex in regexes])))
+
+  def Scan(self, fd) -> List[List[rdf_client.BufferReference]]:
+    """Searches given file for all the conditions of the scanner.
+
+    Args:
+      fd: A file descriptor of the file that needs to be searched.
+
+    Returns:
+      A list with a list of `BufferReference` objects for each condition (in
+      the order the conditions were given) pointing to file parts with
+      matching content.
+    """
+    results = [[] for _ in self._conditions]
+    if not self._conditions:
+      return results
+
+    begin = min(scan_range.start_offset for scan_range in self._ranges)
+    end = max(scan_range.end_offset for scan_range in self._ranges)
+
+    mapping = None
+    if self._memory_map:
+      mapping = _MapFile(fd, begin, end)
+
+    if mapping is None:
+      streamer = streaming.Streamer(
+          chunk_size=self.CHUNK_SIZE, overlap_size=self.OVERLAP_SIZE)
+      for chunk in streamer.StreamFile(fd, offset=begin, amount=end - begin):
+        if not self._ScanBuffer(chunk.data, chunk.offset, chunk.overlap,
+                                results):
+          break
+      return results
+
+    offset, data = mapping
+    try:
+      self._ScanBuffer(data, offset, 0, results)
+    finally:
+      data.close()
+
+    return results
+
+  def _ScanBuffer(self, data, offset: int, overlap: int,
+                  results: List[List[rdf_client.BufferReference]]) -> bool:
+    """Searches a buffer holding a part of the file for all the conditions.
+
+    Args:
+      data: A bytes-like object with the file contents.
+      offset: An offset within the file at which the buffer starts.
+      overlap: A number of leading buffer bytes that were already searched.
+      results: Lists of references found so far to extend with new ones.
+
+    Returns:
+      False if all the conditions are already satisfied and there is no point
+      in searching the rest of the file, True otherwise.
+    """
+    for scan_range in self._ranges:
+      begin = max(scan_range.start_offset - offset, 0)
+      end = min(scan_range.end_offset - offset, len(data))
+      if begin >= end:
+        continue
+
+      hits = heapq.merge(
+          scan_range.LiteralHits(data, begin, end),
+          scan_range.RegexHits(data, begin, end),
+          key=lambda hit: hit[1].begin)
+
+      for index, span in hits:
+        # Hits within overlap-only zone were found in the previous buffer.
+        if overlap and span.end <= overlap:
+          continue
+
+        params = self._conditions[index].params
+        first_hit = params.mode == params.Mode.FIRST_HIT
+        if first_hit and results[index]:
+          continue
+
+        ctx_begin = max(span.begin - params.bytes_before, begin)
+        ctx_end = min(span.end + params.bytes_after, end)
+        ctx_data = bytes(data[ctx_begin:ctx_end])
+
+        results[index].append(
+            rdf_client.BufferReference(
+                offset=offset + ctx_begin,
+                length=len(ctx_data),
+                data=ctx_data))
+
+        if first_hit and self._Satisfied(results):
+          return False
+
+    return True
+
+  def _Satisfied(self, results: List[List[rdf_client.BufferReference]]) -> bool:
+    for condition, result in zip(self._conditions, results):
+      if condition.params.mode != condition.params.Mode.FIRST_HIT or not result:
+        return False
+    return True
+
+
+class _ScanRange(object):
+  """A range of the file searched for a group of conditions."""
+
+  def __init__(self, start_offset: int, length: int,
+               literal_indices: List[int],
+               literal_matcher: "MultiLiteralMatcher", regex_indices: List[int],
+               regex_matcher: "MultiRegexMatcher"):
+    self.start_offset = start_offset
+    self.end_offset = start_offset + length
+    self._literal_indices = literal_indices
+    self._literal_matcher = literal_matcher
+    self._regex_indices = regex_indices
+    self._regex_matcher = regex_matcher
+
+  def LiteralHits(self, data, begin: int,
+                  end: int) -> Iterator[Tuple[int, "Matcher.Span"]]:
+    for index, span in self._literal_matcher.Match(data, begin, end):
+      yield self._literal_indices[index], span
+
+  def RegexHits(self, data, begin: int,
+                end: int) -> Iterator[Tuple[int, "Matcher.Span"]]:
+    for index, span in self._regex_matcher.Match(data, begin, end):
+      yield self._regex_indices[index], span
+
+
+def _MapFile(fd, begin: int, end: int) -> Optional[Tuple[int, mmap.mmap]]:
+  """Memory-maps given range of a file if possible.
+
+  Args:
+    fd: A file descriptor of the file to map.
+    begin: An offset at which the range to map starts.
+    end: An offset at which the range to map ends.
+
+  Returns:
+    A tuple with the file offset at which the mapping starts (which can be
+    lower than `begin` because of alignment) and the mapping itself or `None`
+    if the file cannot be mapped (e.g. it is not a regular file).
+  """
+  try:
+    fileno = fd.fileno()
+    size = os.fstat(fileno).st_size
+  except (AttributeError, io.UnsupportedOperation, OSError):
+    return None
+
+  offset = begin - begin % mmap.ALLOCATIONGRANULARITY
+  end = min(end, size)
+  if offset >= end:
+    return None
+
+  try:
+    data = mmap.mmap(
+        fileno, end - offset, access=mmap.ACCESS_READ, offset=offset)
+  except (OSError, ValueError, OverflowError):
+    return None
+
+  if hasattr(mmap, "MADV_SEQUENTIAL"):
+    data.madvise(mmap.MADV_SEQUENTIAL)
+
+  return offset, data
 
 
 class Matcher(metaclass=abc.ABCMeta):
@@ -301,3 +484,231 @@ class LiteralMatcher(Matcher):
       return None
 
     return Matcher.Span(begin=offset, end=offset + len(self._literal))
+
+
+class MultiLiteralMatcher(object):
+  """An exact string matcher looking up multiple literals at once.
+
+  Candidate positions are found with a single alternation of all the literals
+  (so the data is traversed once regardless of the number of literals) and
+  verified against the literals starting with the byte at the candidate
+  position, similarly to how an Aho-Corasick automaton reports all patterns
+  ending at a given state.
+
+  Args:
+    literals: Byte string patterns that the matcher matches.
+  """
+
+  def __init__(self, literals: Sequence[bytes]):
+    super().__init__()
+
+    self._literals: List[bytes] = []
+    self._indices: List[List[int]] = []
+
+    positions: Dict[bytes, int] = {}
+    for index, literal in enumerate(literals):
+      precondition.AssertType(literal, bytes)
+      # Empty literal has nothing to look for.
+      if not literal:
+        continue
+
+      if literal not in positions:
+        positions[literal] = len(self._literals)
+        self._literals.append(literal)
+        self._indices.append([])
+      self._indices[positions[literal]].append(index)
+
+    # Literals are grouped by their first byte to verify only the ones that
+    # can possibly match at a candidate position.
+    self._candidates: Dict[int, List[int]] = {}
+    for position, literal in enumerate(self._literals):
+      self._candidates.setdefault(literal[0], []).append(position)
+
+    if self._literals:
+      # Longer literals go first so that a literal does not shadow the ones it
+      # is a prefix of (this does not affect correctness, as all candidates at
+      # a position are verified, but lets the regex engine skip less).
+      alternation = b"|".join(
+          re.escape(literal)
+          for literal in sorted(self._literals, key=len, reverse=True))
+      self._regex = re.compile(alternation)
+    else:
+      self._regex = None
+
+  def Match(self, data, begin: int,
+            end: int) -> Iterator[Tuple[int, Matcher.Span]]:
+    """Finds all literals within given range of the data.
+
+    For each literal, only non-overlapping occurrences are reported (like
+    repeatedly calling `LiteralMatcher.Match` would).
+
+    Args:
+      data: A bytes-like object to pattern match on.
+      begin: First position at which the search is started on.
+      end: Position at which the search ends.
+
+    Yields:
+      Tuples with an index of the matched literal (in the order the literals
+      were given) and a `Span` object, ordered by the beginning of the span.
+    """
+    if self._regex is None:
+      return
+
+    resume = [begin] * len(self._literals)
+
+    position = begin
+    while True:
+      match = self._regex.search(data, position, end)
+      if match is None:
+        return
+
+      position = match.start()
+      for candidate in self._candidates[data[position]]:
+        if position < resume[candidate]:
+          continue
+
+        literal = self._literals[candidate]
+        literal_end = position + len(literal)
+        if literal_end > end or data[position:literal_end] != literal:
+          continue
+
+        resume[candidate] = literal_end
+        span = Matcher.Span(begin=position, end=literal_end)
+        for index in self._indices[candidate]:
+          yield index, span
+
+      position += 1
+
+
+class MultiRegexMatcher(object):
+  """A matcher looking up multiple regular expressions at once.
+
+  Regular expressions that still have to be searched from the same position
+  are combined into a single alternation, so that the data is traversed once
+  for all of them rather than once per regular expression. The alternation only
+  tells where the leftmost match of any of them begins, each expression is then
+  matched individually at that position. Regular expressions with groups are
+  always searched individually.
+
+  Args:
+    regexes: Regular expressions that the matcher matches.
+  """
+
+  def __init__(self, regexes: Sequence[Pattern[bytes]]):
+    super().__init__()
+
+    for regex in regexes:
+      precondition.AssertType(regex, Pattern)
+
+    self._regexes = list(regexes)
+    self._searchers: Dict[FrozenSet[int], List[Pattern[bytes]]] = {}
+
+  def Match(self, data, begin: int,
+            end: int) -> Iterator[Tuple[int, Matcher.Span]]:
+    """Finds all regular expressions within given range of the data.
+
+    For each regular expression, only non-overlapping matches are reported.
+
+    The range is searched as if it was all of the data (like `RegexMatcher`
+    searches the data following the position it's given): `^`, word boundaries
+    and lookbehind assertions treat `begin` as the beginning of the data, and
+    `$` and lookahead assertions treat `end` as its end. Unlike with
+    `RegexMatcher`, further matches are searched for in the context of the
+    whole range, so e.g. `^` only matches at `begin` and after newlines rather
+    than wherever the previous match ended.
+
+    Args:
+      data: A bytes-like object to pattern match on.
+      begin: First position at which the search is started on.
+      end: Position at which the search ends.
+
+    Yields:
+      Tuples with an index of the matched regular expression (in the order the
+      regular expressions were given) and a `Span` object, ordered by the
+      beginning of the span.
+    """
+    # Searching a slice of the data (rather than passing positions to the
+    # regexes) makes assertions treat the range boundaries as data boundaries.
+    # A memoryview slice doesn't copy the data.
+    with memoryview(data) as view, view[begin:end] as range_view:
+      for index, span in self._MatchRange(range_view):
+        yield index, Matcher.Span(begin=begin + span.begin, end=begin + span.end)
+
+  def _MatchRange(self, data) -> Iterator[Tuple[int, Matcher.Span]]:
+    """Finds all regular expressions within all of the data."""
+    end = len(data)
+
+    # Each regular expression is known not to have any more matches before its
+    # resume position. Exhausted regular expressions are removed altogether.
+    resume = {index: 0 for index in range(len(self._regexes))}
+
+    while resume:
+      position = min(resume.values())
+      group = frozenset(
+          index for index, value in resume.items() if value == position)
+      limit = min((value for value in resume.values() if value != position),
+                  default=end)
+
+      match_begin = self._Search(group, data, position, end)
+      if match_begin is None:
+        for index in group:
+          del resume[index]
+        continue
+
+      # Regular expressions that resume further will be searched together with
+      # this group from there on.
+      if match_begin >= limit:
+        for index in group:
+          resume[index] = limit
+        continue
+
+      for index in sorted(group):
+        match = self._regexes[index].match(data, match_begin, end)
+        if match is None:
+          resume[index] = match_begin + 1
+          continue
+
+        resume[index] = max(match.end(), match_begin + 1)
+        yield index, Matcher.Span(begin=match_begin, end=match.end())
+
+  def _Search(self, group: FrozenSet[int], data, position: int,
+              end: int) -> Optional[int]:
+    """Finds the leftmost position at which any of the given regexes matches."""
+    match_begins = []
+    for searcher in self._Searchers(group):
+      match = searcher.search(data, position, end)
+      if match is not None:
+        match_begins.append(match.start())
+
+    return min(match_begins, default=None)
+
+  def _Searchers(self, group: FrozenSet[int]) -> List[Pattern[bytes]]:
+    """Returns regexes matching wherever any of the given regexes matches."""
+    try:
+      return self._searchers[group]
+    except KeyError:
+      pass
+
+    searchers = []
+    combined = []
+    for index in sorted(group):
+      regex = self._regexes[index]
+      # Groups are renumbered in an alternation, which breaks references to
+      # them (e.g. `\1` or `(?(1)...)`).
+      if regex.groups:
+        searchers.append(regex)
+      else:
+        combined.append(regex)
+
+    flags = {regex.flags for regex in combined}
+    if len(combined) > 1 and len(flags) == 1:
+      pattern = b"|".join(b"(?:" + regex.pattern + b")" for regex in combined)
+      try:
+        combined = [re.compile(pattern, flags=flags.pop())]
+      except re.error:
+        # E.g. inline global flags are allowed only at the start of a pattern.
+        pass
+
+    searchers.extend(combined)
+    self._searchers[group] = searchers
+    return searchers
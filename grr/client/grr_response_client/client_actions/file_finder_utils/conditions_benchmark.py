@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+"""Benchmark of content conditions on a synthetic file tree.
+
+Compares searching every file once per condition (which is what the file
+finder used to do) with searching all the conditions in a single pass, both
+for memory-mapped files and for files read in chunks.
+
+The default setup is a 10 GiB tree searched for 50 literals. Note that the
+files are read through the page cache, so the first run of the first mode is
+usually slower than the others unless the tree does not fit in memory.
+"""
+
+import os
+import random
+import time
+from typing import List
+
+from absl import app
+from absl import flags
+
+from grr_response_client.client_actions.file_finder_utils import conditions
+from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
+from grr_response_core.lib.util import temp
+
+_ROOT = flags.DEFINE_string(
+    "root",
+    default=None,
+    help="Search an existing folder instead of a synthetic tree.",
+)
+
+_TOTAL_SIZE = flags.DEFINE_integer(
+    "total_size",
+    default=10 * 1024 * 1024 * 1024,
+    help="Total size (in bytes) of the synthetic tree.",
+)
+
+_FILE_SIZE = flags.DEFINE_integer(
+    "file_size",
+    default=64 * 1024 * 1024,
+    help="Size (in bytes) of each file of the synthetic tree.",
+)
+
+_FILES_PER_DIR = flags.DEFINE_integer(
+    "files_per_dir",
+    default=16,
+    help="Number of files in each folder of the synthetic tree.",
+)
+
+_LITERALS = flags.DEFINE_integer(
+    "literals",
+    default=50,
+    help="Number of literal conditions to search for.",
+)
+
+_RUNS = flags.DEFINE_integer(
+    "runs",
+    default=1,
+    help="Number of searches per mode.",
+)
+
+_BLOCK_SIZE = 1024 * 1024
+
+
+def _Literals() -> List[bytes]:
+  literals = []
+  for idx in range(_LITERALS.value):
+    literal = "needle{:03d}-{:08x}".format(idx, idx * 2654435761 % 2**32)
+    literals.append(literal.encode("ascii"))
+  return literals
+
+
+def _CreateTree(path: str, literals: List[bytes]) -> None:
+  """Creates a synthetic tree of text-like files with some literals planted."""
+  rand = random.Random(0)
+  alphabet = b"abcdefghijklmnopqrstuvwxyz0123456789 \n"
+  block = bytes(rand.choice(alphabet) for _ in range(_BLOCK_SIZE))
+
+  file_count = max(_TOTAL_SIZE.value // _FILE_SIZE.value, 1)
+  for idx in range(file_count):
+    dirpath = os.path.join(path, "dir{}".format(idx // _FILES_PER_DIR.value))
+    os.makedirs(dirpath, exist_ok=True)
+
+    filepath = os.path.join(dirpath, "file{}".format(idx))
+    with open(filepath, "wb") as filedesc:
+      written = 0
+      while written < _FILE_SIZE.value:
+        # Every block gets a different prefix, so that files are not identical.
+        data = block[rand.randrange(_BLOCK_SIZE):] + block
+        if rand.random() < 0.05:
+          data = rand.choice(literals) + data
+        data = data[:min(_BLOCK_SIZE, _FILE_SIZE.value - written)]
+        filedesc.write(data)
+        written += len(data)
+
+
+def _Conditions(literals: List[bytes]) -> List[conditions.ContentCondition]:
+  """Creates literal conditions searching whole files for all hits."""
+  result = []
+  for literal in literals:
+    params = rdf_file_finder.FileFinderCondition()
+    params.contents_literal_match.literal = literal
+    params.contents_literal_match.mode = "ALL_HITS"
+    params.contents_literal_match.length = 2**63 - 1
+    result.append(conditions.LiteralMatchCondition(params))
+  return result
+
+
+def _Paths(root: str) -> List[str]:
+  paths = []
+  for dirpath, _, filenames in os.walk(root):
+    for filename in filenames:
+      paths.append(os.path.join(dirpath, filename))
+  return paths
+
+
+def _SearchPerCondition(paths: List[str],
+                        content_conditions: List[conditions.ContentCondition],
+                        mapped: bool) -> int:
+  scanners = [
+      conditions.ContentScanner([_], memory_map=mapped)
+      for _ in content_conditions
+  ]
+  return sum(_Search(paths, scanner) for scanner in scanners)
+
+
+def _SearchSinglePass(paths: List[str],
+                      content_conditions: List[conditions.ContentCondition],
+                      mapped: bool) -> int:
+  scanner = conditions.ContentScanner(content_conditions, memory_map=mapped)
+  return _Search(paths, scanner)
+
+
+def _Search(paths: List[str], scanner: conditions.ContentScanner) -> int:
+  hits = 0
+  for path in paths:
+    with open(path, "rb") as filedesc:
+      results = scanner.Scan(filedesc)
+    hits += sum(len(result) for result in results)
+  return hits
+
+
+def _Benchmark(root: str, literals: List[bytes]) -> None:
+  """Prints search durations for all modes."""
+  paths = _Paths(root)
+  total_size = sum(os.path.getsize(path) for path in paths)
+  content_conditions = _Conditions(literals)
+
+  print("{} files, {:.2f} GiB, {} literals".format(
+      len(paths), total_size / 1024**3, len(literals)))
+  print("mode\t\tmapped\ttotal\tMiB/sec\thits")
+
+  for mode, fn in [("per-condition", _SearchPerCondition),
+                   ("single-pass", _SearchSinglePass)]:
+    for mapped in [True, False]:
+      for _ in range(_RUNS.value):
+        start = time.time()
+        hits = fn(paths, content_conditions, mapped)
+        duration = time.time() - start
+        print("{mode: <13}\t{mapped}\t{total:.2f}s\t{mibps:.0f}\t{hits}".format(
+            mode=mode,
+            mapped=mapped,
+            total=duration,
+            mibps=total_size / 1024**2 / duration,
+            hits=hits))
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  literals = _Literals()
+
+  if _ROOT.value:
+    _Benchmark(os.path.abspath(_ROOT.value), literals)
+    return
+
+  with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+    _CreateTree(dirpath, literals)
+    _Benchmark(dirpath, literals)
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -6,6 +6,7 @@ import platform
 import re
 import subprocess
 import unittest
+from unittest import mock
 
 from absl import app
 from absl.testing import absltest
@@ -108,6 +109,136 @@ class LiteralMatcherTest(absltest.TestCase):
     self.assertFalse(span)
 
 
+class MultiLiteralMatcherTest(absltest.TestCase):
+
+  def testMatchOverlappingLiterals(self):
+    matcher = conditions.MultiLiteralMatcher([b"foo", b"oob", b"bar"])
+
+    hits = list(matcher.Match(b"xfoobarx", 0, 8))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=1, end=4)),
+        (1, conditions.Matcher.Span(begin=2, end=5)),
+        (2, conditions.Matcher.Span(begin=4, end=7)),
+    ])
+
+  def testMatchNonOverlappingOccurrences(self):
+    matcher = conditions.MultiLiteralMatcher([b"oo", b"o"])
+
+    hits = list(matcher.Match(b"ooo", 0, 3))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=0, end=2)),
+        (1, conditions.Matcher.Span(begin=0, end=1)),
+        (1, conditions.Matcher.Span(begin=1, end=2)),
+        (1, conditions.Matcher.Span(begin=2, end=3)),
+    ])
+
+  def testMatchDuplicateLiterals(self):
+    matcher = conditions.MultiLiteralMatcher([b"foo", b"bar", b"foo"])
+
+    hits = list(matcher.Match(b"foo", 0, 3))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=0, end=3)),
+        (2, conditions.Matcher.Span(begin=0, end=3)),
+    ])
+
+  def testMatchRange(self):
+    matcher = conditions.MultiLiteralMatcher([b"foo"])
+
+    hits = list(matcher.Match(b"foofoofoo", 1, 8))
+    self.assertEqual(hits, [(0, conditions.Matcher.Span(begin=3, end=6))])
+
+  def testNoLiterals(self):
+    matcher = conditions.MultiLiteralMatcher([])
+    self.assertEqual(list(matcher.Match(b"foo", 0, 3)), [])
+
+
+class MultiRegexMatcherTest(absltest.TestCase):
+
+  @staticmethod
+  def _MultiRegexMatcher(*regexes: bytes):
+    return conditions.MultiRegexMatcher([re.compile(_) for _ in regexes])
+
+  def testMatchSameBegin(self):
+    matcher = self._MultiRegexMatcher(b"fo+", b"f[a-z]+")
+
+    hits = list(matcher.Match(b"xfoobar", 0, 7))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=1, end=4)),
+        (1, conditions.Matcher.Span(begin=1, end=7)),
+    ])
+
+  def testMatchOverlapping(self):
+    matcher = self._MultiRegexMatcher(b"\\d+", b"[a-z]\\d")
+
+    hits = list(matcher.Match(b"12a3 b45", 0, 8))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=0, end=2)),
+        (1, conditions.Matcher.Span(begin=2, end=4)),
+        (0, conditions.Matcher.Span(begin=3, end=4)),
+        (1, conditions.Matcher.Span(begin=5, end=7)),
+        (0, conditions.Matcher.Span(begin=6, end=8)),
+    ])
+
+  def testMatchBackreference(self):
+    matcher = self._MultiRegexMatcher(b"(a)\\1", b"(b)\\1")
+
+    hits = list(matcher.Match(b"abbaa", 0, 5))
+    self.assertEqual(hits, [
+        (1, conditions.Matcher.Span(begin=1, end=3)),
+        (0, conditions.Matcher.Span(begin=3, end=5)),
+    ])
+
+  def testMatchConditionalGroup(self):
+    matcher = self._MultiRegexMatcher(b"(x)", b"(a)?(?(1)b|c)")
+
+    hits = list(matcher.Match(b"ab", 0, 2))
+    self.assertEqual(hits, [(1, conditions.Matcher.Span(begin=0, end=2))])
+
+  def testMatchInlineFlags(self):
+    matcher = self._MultiRegexMatcher(b"(?i)foo", b"bar")
+
+    hits = list(matcher.Match(b"FOObar", 0, 6))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=0, end=3)),
+        (1, conditions.Matcher.Span(begin=3, end=6)),
+    ])
+
+  def testMatchRange(self):
+    matcher = self._MultiRegexMatcher(b"o+")
+
+    hits = list(matcher.Match(b"ooooo", 1, 4))
+    self.assertEqual(hits, [(0, conditions.Matcher.Span(begin=1, end=4))])
+
+  def testMatchRangeBoundariesAreDataBoundaries(self):
+    matcher = conditions.MultiRegexMatcher([
+        re.compile(b"^foo", flags=re.M),
+        re.compile(b"\\bbar"),
+        re.compile(b"(?<=x)baz"),
+    ])
+
+    hits = list(matcher.Match(b"xxfoo\nfooxbar xbazfoo", 2, 19))
+    self.assertEqual(hits, [
+        (0, conditions.Matcher.Span(begin=2, end=5)),
+        (0, conditions.Matcher.Span(begin=6, end=9)),
+        (2, conditions.Matcher.Span(begin=15, end=18)),
+    ])
+
+    hits = list(matcher.Match(b"xxfoo\nfooxbar xbazfoo", 10, 21))
+    self.assertEqual(hits, [
+        (1, conditions.Matcher.Span(begin=10, end=13)),
+        (2, conditions.Matcher.Span(begin=15, end=18)),
+    ])
+
+    hits = list(matcher.Match(b"xxfoo\nfooxbar xbazfoo", 15, 21))
+    self.assertEmpty(hits)
+
+  def testMatchAnchorOnlyAtRangeBeginAndNewlines(self):
+    matcher = self._MultiRegexMatcher(b"^a")
+
+    hits = list(matcher.Match(b"aaa", 0, 3))
+    self.assertEqual(hits, [(0, conditions.Matcher.Span(begin=0, end=1))])
+
+
 class ConditionTestMixin(object):
 
   def setUp(self):
@@ -560,6 +691,104 @@ class RegexMatchCondition(ConditionTestMixin, absltest.TestCase):
     self.assertEqual(results[0].length, 4)
 
 
+class ContentScannerTest(ConditionTestMixin, absltest.TestCase):
+
+  @staticmethod
+  def _LiteralCondition(literal: bytes, **kwargs):
+    params = rdf_file_finder.FileFinderCondition()
+    params.contents_literal_match.literal = literal
+    for key, value in kwargs.items():
+      setattr(params.contents_literal_match, key, value)
+    return conditions.LiteralMatchCondition(params)
+
+  @staticmethod
+  def _RegexCondition(regex: bytes, **kwargs):
+    params = rdf_file_finder.FileFinderCondition()
+    params.contents_regex_match.regex = regex
+    for key, value in kwargs.items():
+      setattr(params.contents_regex_match, key, value)
+    return conditions.RegexMatchCondition(params)
+
+  def _Scan(self, content_conditions, data: bytes):
+    with io.open(self.temp_filepath, "wb") as fd:
+      fd.write(data)
+
+    scanner = conditions.ContentScanner(content_conditions)
+    with io.open(self.temp_filepath, "rb") as fd:
+      results = self._Hits(scanner.Scan(fd))
+
+    # Memory-mapped files have to yield the same results.
+    scanner = conditions.ContentScanner(content_conditions, memory_map=True)
+    with io.open(self.temp_filepath, "rb") as fd:
+      self.assertEqual(results, self._Hits(scanner.Scan(fd)))
+
+    return results
+
+  @staticmethod
+  def _Hits(results):
+    return [[(ref.offset, ref.data) for ref in result] for result in results]
+
+  def testNoConditions(self):
+    self.assertEqual(self._Scan([], b"foo"), [])
+
+  def testEmptyFile(self):
+    content_conditions = [
+        self._LiteralCondition(b"foo"),
+        self._RegexCondition(b"foo"),
+    ]
+    self.assertEqual(self._Scan(content_conditions, b""), [[], []])
+
+  def testMultipleConditions(self):
+    content_conditions = [
+        self._LiteralCondition(b"foo", mode="ALL_HITS"),
+        self._LiteralCondition(b"oob", mode="ALL_HITS"),
+        self._LiteralCondition(b"quux", mode="ALL_HITS"),
+        self._RegexCondition(b"ba+r", mode="ALL_HITS"),
+        self._RegexCondition(b"\\d+", mode="FIRST_HIT"),
+    ]
+
+    results = self._Scan(content_conditions, b"foobar 42 foobaar 108")
+    self.assertEqual(results, [
+        [(0, b"foo"), (10, b"foo")],
+        [(1, b"oob"), (11, b"oob")],
+        [],
+        [(3, b"bar"), (13, b"baar")],
+        [(7, b"42")],
+    ])
+
+  def testDifferentRanges(self):
+    content_conditions = [
+        self._LiteralCondition(b"foo", mode="ALL_HITS", start_offset=2),
+        self._LiteralCondition(b"foo", mode="ALL_HITS", length=5),
+        self._RegexCondition(
+            b"fo+", mode="ALL_HITS", start_offset=4, bytes_before=2),
+    ]
+
+    results = self._Scan(content_conditions, b"foo foo foo")
+    self.assertEqual(results, [
+        [(4, b"foo"), (8, b"foo")],
+        [(0, b"foo")],
+        [(4, b"foo"), (6, b"o foo")],
+    ])
+
+  def testSearchAcrossChunks(self):
+    content_conditions = [
+        self._LiteralCondition(b"foo", mode="ALL_HITS"),
+        self._RegexCondition(b"bar\\d", mode="ALL_HITS"),
+    ]
+    data = b"x" * 14 + b"foo" + b"x" * 14 + b"bar1" + b"x" * 5 + b"foo"
+
+    scanner = conditions.ContentScanner(content_conditions)
+    with mock.patch.object(scanner, "CHUNK_SIZE", 16):
+      with mock.patch.object(scanner, "OVERLAP_SIZE", 4):
+        results = self._Hits(scanner.Scan(io.BytesIO(data)))
+
+    self.assertEqual(results, [
+        [(14, b"foo"), (40, b"foo")],
+        [(31, b"bar1")],
+    ])
+
+
 def main(argv):
   test_lib.main(argv)
 
@@ -2,19 +2,19 @@
 """Utility classes for uploading files to the server."""
 
 import hashlib
-import zlib
 
+from grr_response_client import client_utils_common
 from grr_response_client import streaming
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
-from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 
 
 class TransferStoreUploader(object):
   """An utility class for uploading chunked files to the server.
 
-  Input is divided into chunks, then these chunks are compressed (using zlib)
-  and then they are uploaded to the transfer store (a well-known flow).
+  Input is divided into chunks, then these chunks are compressed (unless they
+  look incompressible) and then they are uploaded to the transfer store (a
+  well-known flow).
   """
 
   DEFAULT_CHUNK_SIZE = 512 * 1024
@@ -81,7 +81,7 @@ class TransferStoreUploader(object):
     Returns:
       A `BlobImageChunkDescriptor` object.
     """
-    blob = _CompressedDataBlob(chunk)
+    blob = client_utils_common.CompressedDataBlob(chunk.data)
 
     self._action.ChargeBytesToSession(len(chunk.data))
     self._action.SendReply(blob, session_id=self._TRANSFER_STORE_SESSION_ID)
@@ -90,9 +90,3 @@ class TransferStoreUploader(object):
         digest=hashlib.sha256(chunk.data).digest(),
         offset=chunk.offset,
         length=len(chunk.data))
-
-
-def _CompressedDataBlob(chunk):
-  return rdf_protodict.DataBlob(
-      data=zlib.compress(chunk.data),
-      compression=rdf_protodict.DataBlob.CompressionType.ZCOMPRESSION)
@@ -3,12 +3,13 @@
 import collections
 import hashlib
 import io
+import os
 from unittest import mock
-import zlib
 
 from absl.testing import absltest
 
 from grr_response_client.client_actions.file_finder_utils import uploading
+from grr_response_core.lib.util import compression
 from grr_response_core.lib.util import temp
 
 
@@ -39,7 +40,7 @@ class UploaderTest(absltest.TestCase):
 
       self.assertEqual(action.charged_bytes, 6)
       self.assertLen(action.messages, 1)
-      self.assertEqual(action.messages[0].item.data, zlib.compress(b"foobar"))
+      self.assertEqual(Data(action.messages[0].item), b"foobar")
 
       self.assertLen(blobdesc.chunks, 1)
       self.assertEqual(blobdesc.chunk_size, 6)
@@ -59,10 +60,10 @@ class UploaderTest(absltest.TestCase):
 
       self.assertEqual(action.charged_bytes, 10)
       self.assertLen(action.messages, 4)
-      self.assertEqual(action.messages[0].item.data, zlib.compress(b"123"))
-      self.assertEqual(action.messages[1].item.data, zlib.compress(b"456"))
-      self.assertEqual(action.messages[2].item.data, zlib.compress(b"789"))
-      self.assertEqual(action.messages[3].item.data, zlib.compress(b"0"))
+      self.assertEqual(Data(action.messages[0].item), b"123")
+      self.assertEqual(Data(action.messages[1].item), b"456")
+      self.assertEqual(Data(action.messages[2].item), b"789")
+      self.assertEqual(Data(action.messages[3].item), b"0")
 
       self.assertLen(blobdesc.chunks, 4)
       self.assertEqual(blobdesc.chunk_size, 3)
@@ -91,8 +92,8 @@ class UploaderTest(absltest.TestCase):
 
       self.assertEqual(action.charged_bytes, 5)
       self.assertLen(action.messages, 2)
-      self.assertEqual(action.messages[0].item.data, zlib.compress(b"123"))
-      self.assertEqual(action.messages[1].item.data, zlib.compress(b"45"))
+      self.assertEqual(Data(action.messages[0].item), b"123")
+      self.assertEqual(Data(action.messages[1].item), b"45")
 
       self.assertLen(blobdesc.chunks, 2)
       self.assertEqual(blobdesc.chunk_size, 3)
@@ -115,9 +116,9 @@ class UploaderTest(absltest.TestCase):
 
       self.assertEqual(action.charged_bytes, 5)
       self.assertLen(action.messages, 3)
-      self.assertEqual(action.messages[0].item.data, zlib.compress(b"23"))
-      self.assertEqual(action.messages[1].item.data, zlib.compress(b"45"))
-      self.assertEqual(action.messages[2].item.data, zlib.compress(b"6"))
+      self.assertEqual(Data(action.messages[0].item), b"23")
+      self.assertEqual(Data(action.messages[1].item), b"45")
+      self.assertEqual(Data(action.messages[2].item), b"6")
 
       self.assertLen(blobdesc.chunks, 3)
       self.assertEqual(blobdesc.chunk_size, 2)
@@ -131,6 +132,37 @@ class UploaderTest(absltest.TestCase):
       self.assertEqual(blobdesc.chunks[2].length, 1)
       self.assertEqual(blobdesc.chunks[2].digest, Sha256(b"6"))
 
+  def testCompressibleChunk(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(action, chunk_size=1024)
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(b"foobar" * 1024)
+
+      uploader.UploadFilePath(temp_filepath)
+
+      self.assertLen(action.messages, 6)
+      for message in action.messages:
+        self.assertEqual(message.item.compression, compression.ZCOMPRESSION)
+        self.assertLess(len(message.item.data), 1024)
+
+  def testIncompressibleChunk(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(action, chunk_size=64 * 1024)
+    data = os.urandom(64 * 1024)
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(data)
+
+      uploader.UploadFilePath(temp_filepath)
+
+      self.assertLen(action.messages, 1)
+      self.assertEqual(action.messages[0].item.compression,
+                       compression.UNCOMPRESSED)
+      self.assertEqual(action.messages[0].item.data, data)
+
   def testIncorrectFile(self):
     action = FakeAction()
     uploader = uploading.TransferStoreUploader(action, chunk_size=10)
@@ -143,6 +175,10 @@ def Sha256(data):
   return hashlib.sha256(data).digest()
 
 
+def Data(blob):
+  return compression.Decompress(blob.data, blob.compression)
+
+
 class FakeAction(mock.MagicMock):
 
   Message = collections.namedtuple("Message", ("item", "session_id"))  # pylint: disable=invalid-name
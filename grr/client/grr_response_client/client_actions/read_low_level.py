@@ -4,13 +4,12 @@
 import hashlib
 import io
 from typing import AnyStr, Optional
-import zlib
 
 from grr_response_client import actions
+from grr_response_client import client_utils_common
 from grr_response_client import comms
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
-from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import read_low_level as rdf_read_low_level
 
 # We'll read at most 10 GiB in this flow. If the requested length is greater
@@ -103,9 +102,7 @@ class ReadLowLevel(actions.ActionPlugin):
       offset: Offset where the data was read from.
     """
 
-    data_blob = rdf_protodict.DataBlob(
-        data=zlib.compress(data),
-        compression=rdf_protodict.DataBlob.CompressionType.ZCOMPRESSION)
+    data_blob = client_utils_common.CompressedDataBlob(data)
 
     # Ensure that the buffer is counted against this response. Check network
     # send limit.
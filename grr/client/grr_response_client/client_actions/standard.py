@@ -11,7 +11,6 @@ import socket
 import sys
 from typing import Text
 from unittest import mock
-import zlib
 
 from absl import flags
 import psutil
@@ -30,7 +29,6 @@ from grr_response_core.lib.rdfvalues import client_network as rdf_client_network
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
-from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.util import precondition
 
 
@@ -79,9 +77,7 @@ class TransferBuffer(actions.ActionPlugin):
         args.offset,
         args.length,
         progress_callback=self.Progress)
-    result = rdf_protodict.DataBlob(
-        data=zlib.compress(data),
-        compression=rdf_protodict.DataBlob.CompressionType.ZCOMPRESSION)
+    result = client_utils_common.CompressedDataBlob(data)
 
     digest = hashlib.sha256(data).digest()
 
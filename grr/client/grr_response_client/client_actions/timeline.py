@@ -1,12 +1,18 @@
 #!/usr/bin/env python
 """A module with a client action for timeline collection."""
 
+import contextlib
+from concurrent import futures
 import hashlib
+import itertools
 import os
 import stat as stat_mode
 
+from typing import Callable
 from typing import Iterator
+from typing import List
 from typing import Optional
+from typing import Tuple
 
 import psutil
 
@@ -14,13 +20,20 @@ from grr_response_client import actions
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
+from grr_response_core.lib.util import collection
+from grr_response_core.lib.util import gzchunked
 from grr_response_core.lib.util import iterator
 from grr_response_core.lib.util import statx
+from grr_response_proto import timeline_pb2
 
 
 # Indicates whether the timeline action will also collect file birth time.
 BTIME_SUPPORT: bool = statx.BTIME_SUPPORT
 
+# A number of directory children stat-ed concurrently when a thread pool is
+# used. Bounds memory used for pending stat results of huge directories.
+_STAT_BATCH_SIZE = 1024
+
 
 class Timeline(actions.ActionPlugin):
   """A client action for timeline collection."""
@@ -33,8 +46,12 @@ class Timeline(actions.ActionPlugin):
   def Run(self, args: rdf_timeline.TimelineArgs) -> None:
     """Executes the client action."""
     fstype = GetFilesystemType(args.root)
-    entries = iterator.Counted(Walk(args.root))
-    for entry_batch in rdf_timeline.TimelineEntry.SerializeStream(entries):
+    # Entries are serialized straight from stat results, without creating
+    # intermediate RDF values.
+    entries = iterator.Counted(
+        _SerializeEntry(path, stat)
+        for path, stat in WalkStats(args.root, stat_threads=args.stat_threads))
+    for entry_batch in gzchunked.Serialize(entries):
       entry_batch_blob = rdf_protodict.DataBlob(data=entry_batch)
       self.SendReply(entry_batch_blob, session_id=self._TRANSFER_STORE_ID)
 
@@ -52,7 +69,10 @@ class Timeline(actions.ActionPlugin):
       entries.Reset()
 
 
-def Walk(root: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
+def Walk(
+    root: bytes,
+    stat_threads: int = 0,
+) -> Iterator[rdf_timeline.TimelineEntry]:
   """Walks the filesystem collecting stat information.
 
   This method will recursively descend to all sub-folders and sub-sub-folders
@@ -62,10 +82,38 @@ def Walk(root: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
 
   Args:
     root: A path to the root folder at which the recursion should start.
+    stat_threads: A number of threads to collect stat information with. If 0,
+      files are stat-ed sequentially in the calling thread.
 
   Returns:
     An iterator over timeline entries with stat information about each file.
 
+  Raises:
+    OSError: If it is not possible to collect information about the root folder.
+    ValueError: If the specified root path is not absolute.
+  """
+  stats = WalkStats(root, stat_threads=stat_threads)
+  return (rdf_timeline.TimelineEntry.FromStatx(path, stat)
+          for path, stat in stats)
+
+
+def WalkStats(
+    root: bytes,
+    stat_threads: int = 0,
+) -> Iterator[Tuple[bytes, statx.Result]]:
+  """Walks the filesystem yielding paths along with their stat information.
+
+  The walk is performed iteratively in pre-order (a folder comes before its
+  children), with the same semantics as `Walk`.
+
+  Args:
+    root: A path to the root folder at which the recursion should start.
+    stat_threads: A number of threads to collect stat information with. If 0,
+      files are stat-ed sequentially in the calling thread.
+
+  Returns:
+    An iterator over pairs of paths and their stat information.
+
   Raises:
     OSError: If it is not possible to collect information about the root folder.
     ValueError: If the specified root path is not absolute.
@@ -85,31 +133,96 @@ def Walk(root: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
   # flow should fail, giving the user a meaningful error message.
   dev = os.lstat(root).st_dev
 
-  def Recurse(path: bytes) -> Iterator[rdf_timeline.TimelineEntry]:
-    """Performs the recursive walk over the file hierarchy."""
-    try:
-      stat = statx.Get(path)
-    except OSError:
-      return
-
-    yield rdf_timeline.TimelineEntry.FromStatx(path, stat)
-
-    # We want to recurse only to folders on the same device.
-    if not stat_mode.S_ISDIR(stat.mode) or stat.dev != dev:
-      return
-
-    try:
-      childnames = os.listdir(path)
-    except OSError:
-      childnames = []
-
-    # TODO(hanuszczak): Implement more efficient auto-batcher instead of having
-    # multi-level iterators.
-    for childname in childnames:
-      for entry in Recurse(os.path.join(path, childname)):
-        yield entry
-
-  return Recurse(root)
+  return _WalkStats(root, dev, stat_threads)
+
+
+def _WalkStats(
+    root: bytes,
+    dev: int,
+    stat_threads: int,
+) -> Iterator[Tuple[bytes, statx.Result]]:
+  """Performs the iterative walk over the file hierarchy."""
+  with contextlib.ExitStack() as stack:
+    if stat_threads > 0:
+      executor = stack.enter_context(
+          futures.ThreadPoolExecutor(
+              max_workers=stat_threads, thread_name_prefix="TimelineStat"))
+      stat_many = _ConcurrentStatter(executor)
+    else:
+      stat_many = _SequentialStatter
+
+    # A stack of iterators over (path, stat) pairs of folders being walked.
+    # The walk is iterative to avoid overhead of deeply nested generators.
+    pending = [iter([(root, _StatOrNone(root))])]
+    while pending:
+      try:
+        path, stat = next(pending[-1])
+      except StopIteration:
+        pending.pop()
+        continue
+
+      if stat is None:
+        continue
+
+      yield path, stat
+
+      # We want to recurse only to folders on the same device.
+      if not stat_mode.S_ISDIR(stat.mode) or stat.dev != dev:
+        continue
+
+      try:
+        with os.scandir(path) as children:
+          childpaths = [child.path for child in children]
+      except OSError:
+        continue
+
+      pending.append(stat_many(childpaths))
+
+
+def _StatOrNone(path: bytes) -> Optional[statx.Result]:
+  try:
+    return statx.Get(path)
+  except OSError:
+    return None
+
+
+def _SequentialStatter(
+    paths: List[bytes]) -> Iterator[Tuple[bytes, Optional[statx.Result]]]:
+  return ((path, _StatOrNone(path)) for path in paths)
+
+
+def _ConcurrentStatter(
+    executor: futures.Executor,
+) -> Callable[[List[bytes]], Iterator[Tuple[bytes, Optional[statx.Result]]]]:
+  """Returns a function collecting stat information using the executor."""
+
+  def StatMany(
+      paths: List[bytes]) -> Iterator[Tuple[bytes, Optional[statx.Result]]]:
+    # Batches are submitted lazily, so that pending results of huge folders
+    # don't have to be kept in memory all at once.
+    return itertools.chain.from_iterable(
+        zip(batch, executor.map(_StatOrNone, batch))
+        for batch in collection.Batch(paths, _STAT_BATCH_SIZE))
+
+  return StatMany
+
+
+def _SerializeEntry(path: bytes, stat: statx.Result) -> bytes:
+  """Serializes a timeline entry equivalent to `TimelineEntry.FromStatx`."""
+  return timeline_pb2.TimelineEntry(
+      path=path,
+      mode=stat.mode,
+      size=stat.size,
+      dev=stat.dev,
+      ino=stat.ino,
+      uid=stat.uid,
+      gid=stat.gid,
+      attributes=stat.attributes,
+      atime_ns=stat.atime_ns,
+      btime_ns=stat.btime_ns,
+      mtime_ns=stat.mtime_ns,
+      ctime_ns=stat.ctime_ns,
+  ).SerializeToString()
 
 
 def GetFilesystemType(root: bytes) -> Optional[str]:
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Benchmark of the timeline walker on a synthetic file hierarchy.
+
+Compares producing serialized timeline batches through RDF timeline entries
+with serializing stat results directly (which is what the `Timeline` action
+does), for different numbers of stat threads.
+"""
+
+import os
+import time
+
+from absl import app
+from absl import flags
+
+from grr_response_client.client_actions import timeline
+from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
+from grr_response_core.lib.util import gzchunked
+from grr_response_core.lib.util import temp
+
+_ROOT = flags.DEFINE_string(
+    "root",
+    default=None,
+    help="Walk an existing folder instead of a synthetic hierarchy.",
+)
+
+_DEPTH = flags.DEFINE_integer(
+    "depth",
+    default=3,
+    help="Depth of the synthetic folder hierarchy.",
+)
+
+_FANOUT = flags.DEFINE_integer(
+    "fanout",
+    default=8,
+    help="Number of subfolders of each non-leaf synthetic folder.",
+)
+
+_FILES_PER_DIR = flags.DEFINE_integer(
+    "files_per_dir",
+    default=100,
+    help="Number of files in each synthetic folder.",
+)
+
+_STAT_THREADS = flags.DEFINE_list(
+    "stat_threads",
+    default=["0", "4", "16"],
+    help="Numbers of stat threads to benchmark the walker with.",
+)
+
+_RUNS = flags.DEFINE_integer(
+    "runs",
+    default=3,
+    help="Number of walks per configuration.",
+)
+
+
+def _CreateTree(path: str, depth: int) -> None:
+  for idx in range(_FILES_PER_DIR.value):
+    with open(os.path.join(path, "file{}".format(idx)), "wb") as filedesc:
+      filedesc.write(b"x" * idx)
+
+  if depth == 0:
+    return
+
+  for idx in range(_FANOUT.value):
+    subpath = os.path.join(path, "dir{}".format(idx))
+    os.mkdir(subpath)
+    _CreateTree(subpath, depth - 1)
+
+
+def _WalkRdfEntries(root: bytes, stat_threads: int) -> int:
+  entries = timeline.Walk(root, stat_threads=stat_threads)
+  return sum(1 for _ in rdf_timeline.TimelineEntry.SerializeStream(entries))
+
+
+def _WalkSerializedEntries(root: bytes, stat_threads: int) -> int:
+  entries = (
+      timeline._SerializeEntry(path, stat)  # pylint: disable=protected-access
+      for path, stat in timeline.WalkStats(root, stat_threads=stat_threads))
+  return sum(1 for _ in gzchunked.Serialize(entries))
+
+
+def _Benchmark(root: bytes) -> None:
+  """Prints walk durations for all configurations."""
+  entry_count = sum(1 for _ in timeline.WalkStats(root))
+  print("{} entries".format(entry_count))
+  print("mode\t\tthreads\ttotal\tentries/sec")
+
+  for mode, fn in [("rdf", _WalkRdfEntries),
+                   ("serialized", _WalkSerializedEntries)]:
+    for stat_threads in map(int, _STAT_THREADS.value):
+      for _ in range(_RUNS.value):
+        start = time.time()
+        fn(root, stat_threads)
+        duration = time.time() - start
+        print("{mode: <10}\t{threads}\t{total:.2f}s\t{eps:.0f}".format(
+            mode=mode,
+            threads=stat_threads,
+            total=duration,
+            eps=entry_count / duration))
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  if _ROOT.value:
+    _Benchmark(os.path.abspath(_ROOT.value).encode("utf-8"))
+    return
+
+  with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+    _CreateTree(dirpath, _DEPTH.value)
+    _Benchmark(dirpath.encode("utf-8"))
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -9,6 +9,7 @@ import stat as stat_mode
 import time
 from typing import List
 from typing import Text
+from unittest import mock
 
 from absl.testing import absltest
 
@@ -29,6 +30,23 @@ class TimelineTest(client_test_lib.EmptyActionTest):
     super(TimelineTest, cls).setUpClass()
     testing_startup.TestInit()
 
+  def testRunWithStatThreads(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as temp_dirpath:
+      for idx in range(8):
+        _Touch(os.path.join(temp_dirpath, "foo{}".format(idx)))
+
+      args = rdf_timeline.TimelineArgs()
+      args.root = temp_dirpath.encode("utf-8")
+      args.stat_threads = 4
+
+      responses = self.RunAction(timeline.Timeline, args)
+
+      results = [
+          response for response in responses
+          if isinstance(response, rdf_timeline.TimelineResult)
+      ]
+      self.assertEqual(sum(result.entry_count for result in results), 9)
+
   def testRun(self):
     file_count = 64
 
@@ -71,6 +89,12 @@ class TimelineTest(client_test_lib.EmptyActionTest):
       total_entry_count = sum(result.entry_count for result in results)
       self.assertEqual(total_entry_count, file_count + 1)
 
+      entries = list(
+          rdf_timeline.TimelineEntry.DeserializeStream(
+              blob.data for blob in blobs))
+      self.assertLen(entries, file_count + 1)
+      self.assertEqual(entries[0].path, args.root)
+
       for result in results:
         # The filesystem type should be the same for every result.
         self.assertEqual(result.filesystem_type, results[0].filesystem_type)
@@ -251,6 +275,42 @@ class WalkTest(absltest.TestCase):
       self.assertEqual(paths[1], os.path.join(dirpath, "foo", "bar"))
 
 
+class WalkStatThreadsTest(absltest.TestCase):
+
+  def testSameEntriesAsSequentialWalk(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as root_dirpath:
+      for dirname in ["foo", "bar", os.path.join("bar", "baz")]:
+        dirpath = os.path.join(root_dirpath, dirname)
+        os.makedirs(dirpath)
+        for idx in range(16):
+          _Touch(os.path.join(dirpath, f"file{idx}"), content=b"x" * idx)
+
+      root = root_dirpath.encode("utf-8")
+      with mock.patch.object(timeline, "_STAT_BATCH_SIZE", 5):
+        entries = list(timeline.Walk(root, stat_threads=4))
+
+      # Access times of folders change while walking, so they are not compared.
+      def Key(entry):
+        return entry.path, entry.mode, entry.size, entry.ino
+
+      self.assertEqual(
+          list(map(Key, entries)), list(map(Key, timeline.Walk(root))))
+      self.assertLen(entries, 1 + 3 + 3 * 16)
+
+  def testSerializedEntriesMatchTimelineEntries(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as root_dirpath:
+      _Touch(os.path.join(root_dirpath, "foo"), content=b"foobar")
+
+      stats = list(timeline.WalkStats(root_dirpath.encode("utf-8")))
+      self.assertLen(stats, 2)
+
+      for path, stat in stats:
+        entry = rdf_timeline.TimelineEntry.FromStatx(path, stat)
+        self.assertEqual(
+            rdf_timeline.TimelineEntry.FromSerializedBytes(
+                timeline._SerializeEntry(path, stat)), entry)
+
+
 class GetFilesystemType(absltest.TestCase):
 
   def testReturnsForExistingPath(self):
@@ -28,6 +28,7 @@ class VfsFileFinder(actions.ActionPlugin):
     action = self._ParseAction(args)
     content_conditions = list(
         conditions.ContentCondition.Parse(args.conditions))
+    content_scanner = conditions.ContentScanner(content_conditions)
     metadata_conditions = list(
         conditions.MetadataCondition.Parse(args.conditions))
 
@@ -47,9 +48,11 @@ class VfsFileFinder(actions.ActionPlugin):
         if not all(cond.Check(fs_stat) for cond in metadata_conditions):
           continue
 
-        matches = _CheckConditionsShortCircuit(content_conditions, pathspec)
-        if content_conditions and not matches:
-          continue  # Skip if any condition yielded no matches.
+        matches = []
+        if content_conditions:
+          matches = _CheckConditionsShortCircuit(content_scanner, pathspec)
+          if not matches:
+            continue  # Skip if any condition yielded no matches.
 
         result = action(stat_entry=stat_entry, fd=vfs_file)
         result.matches = matches
@@ -66,20 +69,27 @@ class VfsFileFinder(actions.ActionPlugin):
       return vfs_subactions.StatAction(self, args.action.stat)
 
 
-def _CheckConditionsShortCircuit(content_conditions, pathspec):
-  """Checks all `content_conditions` until one yields no matches."""
+def _CheckConditionsShortCircuit(content_scanner, pathspec):
+  """Checks all conditions of `content_scanner` in a single pass over the file.
+
+  Args:
+    content_scanner: A `ContentScanner` with the conditions to check.
+    pathspec: A `PathSpec` of the file to check.
+
+  Returns:
+    Matches of all the conditions or no matches if any condition yields none.
+  """
+  with vfs.VFSOpen(pathspec) as vfs_file:
+    if vfs_file.size == 0 or vfs_file.size is None:
+      # Skip directories.
+      return []
+    results = content_scanner.Scan(vfs_file)
+
   matches = []
-  for cond in content_conditions:
-    with vfs.VFSOpen(pathspec) as vfs_file:
-      if vfs_file.size == 0 or vfs_file.size is None:
-        # Skip directories.
-        cur_matches = []
-      else:
-        cur_matches = list(cond.Search(vfs_file))
-    if cur_matches:
-      matches.extend(cur_matches)
-    else:  # As soon as one condition does not match, we skip the file.
+  for result in results:
+    if not result:  # As soon as one condition does not match, skip the file.
       return []  # Return no matches to indicate skipping this file.
+    matches.extend(result)
   return matches
 
 
@@ -9,12 +9,16 @@ import shlex
 import subprocess
 import threading
 import time
+from typing import Tuple
+import zlib
 
 
 from grr_response_client.local import binary_whitelist
 from grr_response_core import config
 from grr_response_core.lib import constants
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr_response_core.lib.util import compression
 
 
 def HandleAlarm(process):
@@ -210,6 +214,33 @@ def IsExecutionAllowed(cmd, args):
   return False
 
 
+def Compress(data: bytes) -> Tuple[bytes, int]:
+  """Compresses data sent to the server with the configured codecs.
+
+  Args:
+    data: Data to compress.
+
+  Returns:
+    A tuple of the (possibly) compressed data and the codec (a value of
+    `DataBlob.CompressionType`) it is compressed with.
+  """
+  codecs = compression.ParseCodecs(config.CONFIG["Client.compression_codecs"])
+  return compression.Compress(data, codecs)
+
+
+def CompressedDataBlob(data: bytes) -> rdf_protodict.DataBlob:
+  """Creates a blob with (possibly) compressed data to send to the server."""
+  # The server ignores blobs without any data, so empty data is compressed to
+  # be stored as an empty blob.
+  if not data:
+    return rdf_protodict.DataBlob(
+        data=zlib.compress(data),
+        compression=rdf_protodict.DataBlob.CompressionType.ZCOMPRESSION)
+
+  data, codec = Compress(data)
+  return rdf_protodict.DataBlob(data=data, compression=codec)
+
+
 class MultiHasher(object):
   """An utility class that is able to applies multiple hash algorithms.
 
@@ -23,6 +23,32 @@ from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_proto import jobs_pb2
+
+# Encoded tag of the (repeated) `job` field of `MessageList`.
+_MESSAGE_LIST_JOB_TAG = rdf_structs.VarintEncode(
+    jobs_pb2.MessageList.DESCRIPTOR.fields_by_name["job"].number << 3
+    | rdf_structs.WIRETYPE_LENGTH_DELIMITED)
+
+
+def EncodeMessageListEntry(message):
+  """Serializes a GrrMessage as an entry of a serialized MessageList.
+
+  Every element of a repeated message field is encoded as the field's tag, the
+  length of the element and the element itself. A serialized MessageList is
+  thus simply the concatenation of its entries, which lets messages be
+  serialized only once, when they are queued.
+
+  Args:
+    message: rdf_flows.GrrMessage The message to serialize.
+
+  Returns:
+    bytes The serialized entry.
+  """
+  data = message.SerializeToBytes()
+  return b"".join(
+      [_MESSAGE_LIST_JOB_TAG, rdf_structs.VarintEncode(len(data)), data])
 
 
 class GRRClientWorker(threading.Thread):
@@ -368,7 +394,7 @@ class SizeLimitedQueue(object):
         timeout is exceeded.
     """
     # We only queue already serialized objects so we know how large they are.
-    message = message.SerializeToBytes()
+    message = EncodeMessageListEntry(message)
 
     if not block:
       if self.Full():
@@ -392,8 +418,8 @@ class SizeLimitedQueue(object):
     while self._queue:
       yield self._queue.pop()
 
-  def GetMessages(self, soft_size_limit=None):
-    """Retrieves and removes the messages from the queue.
+  def GetSerializedMessages(self, soft_size_limit=None):
+    """Retrieves and removes the messages from the queue, serialized.
 
     Args:
       soft_size_limit: int If there is more data in the queue than
@@ -402,20 +428,36 @@ class SizeLimitedQueue(object):
         currently on the queue.
 
     Returns:
-      rdf_flows.MessageList A list of messages that were .Put on the queue
-      earlier.
+      bytes A serialized rdf_flows.MessageList of messages that were .Put on
+      the queue earlier.
     """
     with self._lock:
-      ret = rdf_flows.MessageList()
+      ret = []
       ret_size = 0
       for message in self._Generate():
         self._total_size -= len(message)
-        ret.job.append(rdf_flows.GrrMessage.FromSerializedBytes(message))
+        ret.append(message)
         ret_size += len(message)
         if soft_size_limit is not None and ret_size > soft_size_limit:
           break
 
-      return ret
+      return b"".join(ret)
+
+  def GetMessages(self, soft_size_limit=None):
+    """Retrieves and removes the messages from the queue.
+
+    Args:
+      soft_size_limit: int If there is more data in the queue than
+        soft_size_limit bytes, the returned list of messages will be
+        approximately this large. If None (default), returns all messages
+        currently on the queue.
+
+    Returns:
+      rdf_flows.MessageList A list of messages that were .Put on the queue
+      earlier.
+    """
+    return rdf_flows.MessageList.FromSerializedBytes(
+        self.GetSerializedMessages(soft_size_limit=soft_size_limit))
 
   def Size(self):
     return self._total_size
@@ -4,9 +4,12 @@
 from unittest import mock
 
 from absl import app
+from absl.testing import absltest
 
 from grr_response_client import comms
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr.test_lib import test_lib
 
 
@@ -32,6 +35,47 @@ class GRRClientWorkerTest(test_lib.GRRBaseTest):
     self.assertEqual(messages[0].payload, rdfvalue.RDFDatetime(0))
 
 
+class SizeLimitedQueueTest(absltest.TestCase):
+
+  def _Message(self, i):
+    return rdf_flows.GrrMessage(
+        session_id="C.0123456789abcdef/ABCDEF%02d" % i,
+        request_id=1,
+        response_id=i + 1,
+        payload=rdf_protodict.DataBlob(data=b"x" * 100))
+
+  def testSerializedMessagesAreMessageList(self):
+    messages = [self._Message(i) for i in range(5)]
+    message_list = rdf_flows.MessageList(job=messages)
+
+    queue = comms.SizeLimitedQueue(heart_beat_cb=lambda: None)
+    for message in messages:
+      queue.Put(message)
+    self.assertEqual(queue.Size(), len(message_list.SerializeToBytes()))
+
+    serialized = queue.GetSerializedMessages()
+    self.assertEqual(
+        rdf_flows.MessageList.FromSerializedBytes(serialized), message_list)
+    self.assertEqual(queue.Size(), 0)
+
+  def testGetMessagesRespectsSoftSizeLimit(self):
+    messages = [self._Message(i) for i in range(10)]
+
+    queue = comms.SizeLimitedQueue(heart_beat_cb=lambda: None, maxsize=10000)
+    for message in messages:
+      queue.Put(message)
+
+    # Messages are returned until the soft limit is exceeded.
+    entry_size = len(comms.EncodeMessageListEntry(messages[0]))
+    first = queue.GetMessages(soft_size_limit=2 * entry_size + 1)
+    self.assertLen(first.job, 3)
+    self.assertEqual(list(first.job), messages[:3])
+
+    rest = queue.GetMessages()
+    self.assertEqual(list(rest.job), messages[3:])
+    self.assertEqual(queue.Size(), 0)
+
+
 def main(argv):
   test_lib.main(argv)
 
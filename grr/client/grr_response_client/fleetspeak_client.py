@@ -5,17 +5,18 @@ This module contains glue code necessary for Fleetspeak and the GRR client
 to work together.
 """
 
+import collections
 import logging
 import pdb
 import queue
 import struct
 import threading
 import time
-import zlib
 
 from absl import flags
 
 from grr_response_client import client_metrics
+from grr_response_client import client_utils_common
 from grr_response_client import comms
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
@@ -54,23 +55,43 @@ class BrokenFSConnectionError(Exception):
   pass
 
 
-def _EncodeMessageList(
-    message_list: rdf_flows.MessageList,
-    packed_message_list: rdf_flows.PackedMessageList,
-) -> None:
-  """Encode the MessageList into the packed_message_list rdfvalue."""
-  # By default uncompress
-  uncompressed_data = message_list.SerializeToBytes()
-  packed_message_list.message_list = uncompressed_data
+# A GrrMessage queued for sending.
+#
+# Attributes:
+#   data: The message serialized as an entry of a MessageList (see
+#     comms.EncodeMessageListEntry).
+#   background: Whether the message can be sent in the background.
+#   annotation: The value of the data ids annotation of the message, or None
+#     if the message has no such ids.
+_QueuedMessage = collections.namedtuple("_QueuedMessage",
+                                        ["data", "background", "annotation"])
+
+
+def _QueueMessage(grr_msg: rdf_flows.GrrMessage) -> _QueuedMessage:
+  """Serializes a GrrMessage and extracts what is needed to send it."""
+  if (grr_msg.session_id is None or grr_msg.request_id is None or
+      grr_msg.response_id is None):
+    annotation = None
+  else:
+    annotation = "%s:%d:%d" % (grr_msg.session_id.Basename(),
+                               grr_msg.request_id, grr_msg.response_id)
 
-  compressed_data = zlib.compress(uncompressed_data)
+  return _QueuedMessage(
+      data=comms.EncodeMessageListEntry(grr_msg),
+      background=not grr_msg.require_fastpoll,
+      annotation=annotation)
 
-  # Only compress if it buys us something.
-  if len(compressed_data) < len(uncompressed_data):
-    packed_message_list.compression = (
-        rdf_flows.PackedMessageList.CompressionType.ZCOMPRESSION
-    )
-    packed_message_list.message_list = compressed_data
+
+def _EncodeMessageList(
+    message_list: bytes,
+    packed_message_list: jobs_pb2.PackedMessageList,
+) -> None:
+  """Encode the serialized MessageList into the packed_message_list proto."""
+  # Uploaded file contents are usually compressed already, in which case the
+  # message list is sent as it is.
+  data, codec = client_utils_common.Compress(message_list)
+  packed_message_list.message_list = data
+  packed_message_list.compression = codec
 
 
 class GRRFleetspeakClient(object):
@@ -150,27 +171,25 @@ class GRRFleetspeakClient(object):
         require_fastpoll=False)
     time.sleep(period)
 
-  def _SendMessages(self, grr_msgs, background=False):
-    """Sends a block of messages through Fleetspeak."""
-    message_list = rdf_flows.PackedMessageList()
-    _EncodeMessageList(rdf_flows.MessageList(job=grr_msgs), message_list)
+  def _SendMessages(self, queued_msgs, background=False):
+    """Sends a block of queued messages through Fleetspeak."""
+    message_list = jobs_pb2.PackedMessageList()
+    _EncodeMessageList(b"".join(msg.data for msg in queued_msgs), message_list)
     fs_msg = fs_common_pb2.Message(
         message_type="MessageList",
         destination=fs_common_pb2.Address(service_name="GRR"),
         background=background)
-    fs_msg.data.Pack(message_list.AsPrimitiveProto())
+    fs_msg.data.Pack(message_list)
 
-    for grr_msg in grr_msgs:
-      if (grr_msg.session_id is None or grr_msg.request_id is None or
-          grr_msg.response_id is None):
+    for msg in queued_msgs:
+      if msg.annotation is None:
         continue
       # Place all ids in a single annotation, instead of having separate
       # annotations for the flow-id, request-id and response-id. This reduces
       # overall size of the annotations by half (~60 bytes to ~30 bytes).
       annotation = fs_msg.annotations.entries.add()
       annotation.key = _DATA_IDS_ANNOTATION_KEY
-      annotation.value = "%s:%d:%d" % (grr_msg.session_id.Basename(),
-                                       grr_msg.request_id, grr_msg.response_id)
+      annotation.value = msg.annotation
       if fs_msg.annotations.ByteSize() >= _MAX_ANNOTATIONS_BYTES:
         break
 
@@ -187,23 +206,23 @@ class GRRFleetspeakClient(object):
     msg = self._sender_queue.get()
     msgs = []
     background_msgs = []
-    if not msg.require_fastpoll:
+    if msg.background:
       background_msgs.append(msg)
     else:
       msgs.append(msg)
 
     count = 1
-    size = len(msg.SerializeToBytes())
+    size = len(msg.data)
 
     while count < _MAX_MSG_LIST_MSG_COUNT and size < _MAX_MSG_LIST_BYTES:
       try:
         msg = self._sender_queue.get(timeout=1)
-        if not msg.require_fastpoll:
+        if msg.background:
           background_msgs.append(msg)
         else:
           msgs.append(msg)
         count += 1
-        size += len(msg.SerializeToBytes())
+        size += len(msg.data)
       except queue.Empty:
         break
 
@@ -249,14 +268,16 @@ class _FleetspeakQueueForwarder(object):
 
   def Put(self, grr_msg, block=True, timeout=None):
     """Places a message in the queue."""
+    # Messages are serialized once, here, instead of by the sender thread.
+    queued_msg = _QueueMessage(grr_msg)
     if not block:
-      self._sender_queue.put(grr_msg, block=False)
+      self._sender_queue.put(queued_msg, block=False)
     else:
       t0 = time.time()
       while not timeout or (time.time() - t0 < timeout):
         self.heart_beat_cb()
         try:
-          self._sender_queue.put(grr_msg, timeout=1)
+          self._sender_queue.put(queued_msg, timeout=1)
           return
         except queue.Full:
           continue
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Benchmark measuring upload throughput of the Fleetspeak client.
+
+Chunks of a file upload are queued the way the client worker queues replies
+and sent by the sender loop of `GRRFleetspeakClient` to a fake Fleetspeak
+connection. Both the wall time and the CPU time spent per MiB of uploaded data
+are reported.
+"""
+
+import os
+import queue
+import time
+from unittest import mock
+
+from absl import app
+from absl import flags
+
+from grr_response_client import comms
+from grr_response_client import fleetspeak_client
+from grr_response_core.lib import config_lib
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr_response_core.stats import default_stats_collector
+from grr_response_core.stats import stats_collector_instance
+from fleetspeak.client_connector import connector as fs_client
+
+_CHUNKS = flags.DEFINE_integer(
+    "chunks",
+    default=1000,
+    help="Number of uploaded chunks.",
+)
+
+_CHUNK_SIZE = flags.DEFINE_integer(
+    "chunk_size",
+    default=64 * 1024,
+    help="Size of a single chunk in bytes.",
+)
+
+_MIB = 1024 * 1024
+
+
+def _MakeChunks(num_chunks, chunk_size):
+  # Half of every chunk is random, so that compressing it is neither free nor
+  # pointless.
+  return [
+      rdf_flows.GrrMessage(
+          session_id="C.0123456789abcdef/ABCDEF12",
+          name="TransferBuffer",
+          request_id=1,
+          response_id=i + 1,
+          payload=rdf_protodict.DataBlob(
+              data=os.urandom(chunk_size // 2) + bytes(chunk_size // 2)))
+      for i in range(num_chunks)
+  ]
+
+
+class _NonBlockingQueue(queue.Queue):
+  """A queue that never waits for new items to arrive.
+
+  Chunks are queued before the sender is run, so waiting for more of them
+  would only add idle time to the measurements.
+  """
+
+  def get(self, block=True, timeout=None):
+    del block, timeout  # Unused.
+    return super().get(block=False)
+
+
+class _FakeConnection(object):
+  """A Fleetspeak connection that only counts sent bytes."""
+
+  def __init__(self, *args, **kwargs):
+    del args, kwargs  # Unused.
+    self.sent_bytes = 0
+
+  def Send(self, fs_msg):
+    size = fs_msg.ByteSize()
+    self.sent_bytes += size
+    return size
+
+  def Heartbeat(self):
+    pass
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  config_lib.ParseConfigCommandLine()
+  stats_collector_instance.Set(default_stats_collector.DefaultStatsCollector())
+
+  chunks = _MakeChunks(_CHUNKS.value, _CHUNK_SIZE.value)
+  data_mib = _CHUNKS.value * _CHUNK_SIZE.value / _MIB
+
+  # The worker is not needed: chunks are queued directly.
+  with mock.patch.object(fs_client, "FleetspeakConnection", _FakeConnection), \
+      mock.patch.object(comms, "GRRClientWorker"):
+    client = fleetspeak_client.GRRFleetspeakClient()
+
+  # pylint: disable=protected-access
+  sender_queue = client._sender_queue = _NonBlockingQueue(
+      maxsize=client._sender_queue.maxsize)
+  forwarder = fleetspeak_client._FleetspeakQueueForwarder(sender_queue)
+
+  start = time.time()
+  start_cpu = time.process_time()
+  for chunk in chunks:
+    if sender_queue.full():
+      client._SendOp()
+    forwarder.Put(chunk)
+  while not sender_queue.empty():
+    client._SendOp()
+  duration = time.time() - start
+  cpu = time.process_time() - start_cpu
+  sent_mib = client._fs.sent_bytes / _MIB
+  # pylint: enable=protected-access
+
+  print("chunks\tdata\tsent\ttime\tMiB/s\tcpu/MiB")
+  print("{chunks}\t{data:.1f}MiB\t{sent:.1f}MiB\t{time:.2f}s\t{rate:.1f}\t"
+        "{cpu:.1f}ms".format(
+            chunks=_CHUNKS.value,
+            data=data_mib,
+            sent=sent_mib,
+            time=duration,
+            rate=data_mib / duration,
+            cpu=cpu / data_mib * 1000))
+
+
+if __name__ == "__main__":
+  app.run(main)
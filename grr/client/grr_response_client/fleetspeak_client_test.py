@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 import logging
+import os
 from unittest import mock
-import zlib
 
 from absl import app
 from absl.testing import absltest
@@ -10,6 +10,9 @@ from grr_response_client import comms
 from grr_response_client import fleetspeak_client
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr_response_core.lib.util import compression
+from grr_response_proto import jobs_pb2
 from grr.test_lib import test_lib
 from fleetspeak.src.common.proto.fleetspeak import common_pb2 as fs_common_pb2
 from fleetspeak.client_connector import connector as fs_client
@@ -19,17 +22,8 @@ def _DecompressMessageList(
     packed_message_list: rdf_flows.PackedMessageList,
 ) -> rdf_flows.MessageList:
   """Decompress the message data from packed_message_list."""
-  compression = packed_message_list.compression
-  if compression == rdf_flows.PackedMessageList.CompressionType.UNCOMPRESSED:
-    data = packed_message_list.message_list
-
-  elif compression == rdf_flows.PackedMessageList.CompressionType.ZCOMPRESSION:
-    try:
-      data = zlib.decompress(packed_message_list.message_list)
-    except zlib.error as e:
-      raise RuntimeError("Failed to decompress: %s" % e) from e
-  else:
-    raise RuntimeError("Compression scheme not supported")
+  data = compression.Decompress(packed_message_list.message_list,
+                                packed_message_list.compression)
 
   try:
     result = rdf_flows.MessageList.FromSerializedBytes(data)
@@ -69,7 +63,7 @@ class FleetspeakClientTest(absltest.TestCase):
       annotation.key = fleetspeak_client._DATA_IDS_ANNOTATION_KEY
       annotation.value = "%s:2:%d" % (flow_id, len(grr_messages) + 1)
       grr_messages.append(grr_message)
-      client._sender_queue.put(grr_message)
+      client._sender_queue.put(fleetspeak_client._QueueMessage(grr_message))
 
     # Add an extra GrrMessage whose annotation will not be captured.
     extra_message = rdf_flows.GrrMessage(
@@ -78,7 +72,7 @@ class FleetspeakClientTest(absltest.TestCase):
         request_id=3,
         response_id=1)
     grr_messages.append(extra_message)
-    client._sender_queue.put(extra_message)
+    client._sender_queue.put(fleetspeak_client._QueueMessage(extra_message))
 
     self.assertLess(
         len(grr_messages), fleetspeak_client._MAX_MSG_LIST_MSG_COUNT)
@@ -124,5 +118,33 @@ class FleetspeakClientTest(absltest.TestCase):
       self.assertIn("Broken local Fleetspeak connection", l.call_args[0][0])
 
 
+class EncodeMessageListTest(absltest.TestCase):
+
+  def _Encode(self, payload):
+    message = rdf_flows.GrrMessage(
+        session_id="C.0123456789abcdef/01234567",
+        name="TransferBuffer",
+        payload=rdf_protodict.DataBlob(data=payload))
+    data = comms.EncodeMessageListEntry(message)
+    packed_message_list = jobs_pb2.PackedMessageList()
+    fleetspeak_client._EncodeMessageList(data, packed_message_list)
+
+    message_list = _DecompressMessageList(
+        rdf_flows.PackedMessageList.FromSerializedBytes(
+            packed_message_list.SerializeToString()))
+    self.assertListEqual(list(message_list.job), [message])
+    return packed_message_list
+
+  def testCompressible(self):
+    packed_message_list = self._Encode(b"foobar" * 1024)
+    self.assertEqual(packed_message_list.compression,
+                     jobs_pb2.PackedMessageList.ZCOMPRESSION)
+
+  def testIncompressible(self):
+    packed_message_list = self._Encode(os.urandom(64 * 1024))
+    self.assertEqual(packed_message_list.compression,
+                     jobs_pb2.PackedMessageList.UNCOMPRESSED)
+
+
 if __name__ == "__main__":
   app.run(test_lib.main)
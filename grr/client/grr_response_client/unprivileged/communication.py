@@ -3,7 +3,9 @@
 
 import abc
 import contextlib
+import ctypes
 import enum
+import mmap
 import os
 import platform
 import struct
@@ -82,6 +84,183 @@ class Connection:
     return Message(data=data, attachment=attachment)
 
 
+# Size of the header of a shared memory ring. The header only holds the
+# number of bytes written by the writer and consumed by the reader, but is
+# padded to a cache line.
+_RING_HEADER_SIZE = 64
+
+
+class _SharedMemoryRing:
+  """A ring buffer in shared memory, written by one process and read by another.
+
+  The only state shared by the two processes is the number of bytes the writer
+  has written and the reader has consumed so far. The reader learns about
+  written data (and its size) from messages sent through the pipe, so data is
+  read in the order it is written.
+
+  The other process may be an untrusted sandboxed process, so sizes of reads
+  are checked against the data actually written before reading.
+  """
+
+  def __init__(self, buf: mmap.mmap, offset: int, size: int):
+    self._buf = buf
+    self._start = offset + _RING_HEADER_SIZE
+    self._size = size
+    # Aligned 64-bit integers are read and written atomically.
+    self._consumed = ctypes.c_uint64.from_buffer(buf, offset)
+    self._written = ctypes.c_uint64.from_buffer(buf, offset + 8)
+    # Number of bytes written (by a writer) or read (by a reader) so far.
+    self._position = 0
+
+  def Free(self) -> int:
+    """Returns the number of bytes that can be written without overwriting."""
+    return self._size - (self._position - self._consumed.value)
+
+  def Write(self, data: bytes) -> None:
+    """Writes data, which must fit into the free space."""
+    view = memoryview(data)
+    while view:
+      offset = self._position % self._size
+      part = view[:self._size - offset]
+      self._buf[self._start + offset:self._start + offset + len(part)] = part
+      self._position += len(part)
+      view = view[len(part):]
+    self._written.value = self._position
+
+  def Read(self, size: int) -> bytes:
+    """Reads data of the given size, which must have been written already.
+
+    Args:
+      size: The number of bytes to read.
+
+    Returns:
+      The data read.
+
+    Raises:
+      Error: if the size exceeds the ring's capacity or the data written so
+        far.
+    """
+    if size > self._size:
+      raise Error(f"Read of {size} bytes exceeds ring size {self._size}.")
+    available = self._written.value - self._position
+    if size > available:
+      raise Error(f"Read of {size} bytes exceeds {available} bytes written.")
+
+    offset = self._position % self._size
+    end = offset + size
+    if end <= self._size:
+      data = self._buf[self._start + offset:self._start + end]
+    else:
+      data = (
+          self._buf[self._start + offset:self._start + self._size] +
+          self._buf[self._start:self._start + end - self._size])
+    self._position += size
+    self._consumed.value = self._position
+    return data
+
+  def Close(self) -> None:
+    # The mmap can't be closed as long as the counters refer to it.
+    del self._consumed
+    del self._written
+
+
+class SharedMemory:
+  """Memory shared by a client and a server, with a ring for each direction."""
+
+  def __init__(self, file_descriptor: int):
+    """Constructor.
+
+    Args:
+      file_descriptor: A file descriptor of the shared memory, as created by
+        `Create`. It is not owned by the object.
+    """
+    ring_size = os.fstat(file_descriptor).st_size // 2 - _RING_HEADER_SIZE
+    self._mmap = mmap.mmap(file_descriptor, 0)
+    self.client_to_server = _SharedMemoryRing(self._mmap, 0, ring_size)
+    self.server_to_client = _SharedMemoryRing(
+        self._mmap, _RING_HEADER_SIZE + ring_size, ring_size)
+
+  @classmethod
+  def IsSupported(cls) -> bool:
+    return hasattr(os, "memfd_create")
+
+  @classmethod
+  def Create(cls, ring_size: int) -> int:
+    """Creates shared memory with rings of (at least) the given size.
+
+    Args:
+      ring_size: The size of a ring for each direction.
+
+    Returns:
+      A file descriptor of the shared memory, owned by the caller.
+    """
+    ring_size = -(-ring_size // mmap.PAGESIZE) * mmap.PAGESIZE
+    file_descriptor = os.memfd_create("grr_unprivileged")  # pytype: disable=module-attr
+    os.ftruncate(file_descriptor, 2 * (_RING_HEADER_SIZE + ring_size))
+    return file_descriptor
+
+  def Close(self) -> None:
+    self.client_to_server.Close()
+    self.server_to_client.Close()
+    self._mmap.close()
+
+
+_SHARED_MEMORY_HEADER_STRUCT = struct.Struct("<LLL")
+
+
+class SharedMemoryConnection(Connection):
+  """Connection passing attachments through shared memory.
+
+  Only headers and data messages (usually small protobuf messages) are sent
+  through the transport. Attachments are written to a shared memory ring,
+  unless they don't fit into its free space, in which case they are sent
+  through the transport too.
+  """
+
+  def __init__(self, transport: Transport, send_ring: _SharedMemoryRing,
+               recv_ring: _SharedMemoryRing):
+    super().__init__(transport)
+    self._send_ring = send_ring
+    self._recv_ring = recv_ring
+
+  def Send(self, message: Message) -> None:
+    """Sends a data message and an attachment."""
+    attachment = message.attachment
+    if attachment and len(attachment) <= self._send_ring.Free():
+      self._send_ring.Write(attachment)
+      header = _SHARED_MEMORY_HEADER_STRUCT.pack(
+          len(message.data), 0, len(attachment))
+      attachment = b""
+    else:
+      header = _SHARED_MEMORY_HEADER_STRUCT.pack(
+          len(message.data), len(attachment), 0)
+
+    self._transport.SendBytes(header)
+    if message.data:
+      self._transport.SendBytes(message.data)
+    if attachment:
+      self._transport.SendBytes(attachment)
+
+  def Recv(self) -> Message:
+    """Receives a data message and an attachment."""
+    header = self._transport.RecvBytes(_SHARED_MEMORY_HEADER_STRUCT.size)
+    data_len, attachment_len, shared_attachment_len = (
+        _SHARED_MEMORY_HEADER_STRUCT.unpack(header))
+    if data_len > 0:
+      data = self._transport.RecvBytes(data_len)
+    else:
+      data = b""
+    if attachment_len > 0 and shared_attachment_len > 0:
+      raise Error("Message has both a shared and a regular attachment.")
+    if attachment_len > 0:
+      attachment = self._transport.RecvBytes(attachment_len)
+    elif shared_attachment_len > 0:
+      attachment = self._recv_ring.Read(shared_attachment_len)
+    else:
+      attachment = b""
+    return Message(data=data, attachment=attachment)
+
+
 class Server(abc.ABC):
   """An unprivileged server."""
 
@@ -242,12 +421,26 @@ class Channel(NamedTuple):
   This is a file descriptor on UNIX, a handle on Windows.
   """
 
+  shared_memory: Optional[FileDescriptor] = None
+  """Shared memory (see `SharedMemory`) used for attachments, if any.
+
+  This is a file descriptor, only supported on Linux.
+  """
+
   @classmethod
-  def FromSerialized(cls, pipe_input: int, pipe_output: int) -> "Channel":
-    """Creates a channel from serialized pipe file descriptors."""
+  def FromSerialized(cls,
+                     pipe_input: int,
+                     pipe_output: int,
+                     shared_memory: int = -1) -> "Channel":
+    """Creates a channel from serialized file descriptors."""
+    if shared_memory < 0:
+      shared_memory_fd = None
+    else:
+      shared_memory_fd = FileDescriptor.FromFileDescriptor(shared_memory)
     return Channel(
         FileDescriptor.FromSerialized(pipe_input, Mode.READ),
-        FileDescriptor.FromSerialized(pipe_output, Mode.WRITE))
+        FileDescriptor.FromSerialized(pipe_output, Mode.WRITE),
+        shared_memory_fd)
 
 
 ArgsFactory = Callable[[Channel], List[str]]
@@ -267,13 +460,17 @@ class SubprocessServer(Server):
 
   def __init__(self,
                args_factory: ArgsFactory,
-               extra_file_descriptors: Optional[List[FileDescriptor]] = None):
+               extra_file_descriptors: Optional[List[FileDescriptor]] = None,
+               shared_memory_size: int = 0):
     """Constructor.
 
     Args:
       args_factory: Function which takes a channel and returns the args to run
         the server subprocess (as required by subprocess.Popen).
       extra_file_descriptors: Extra file desctiptors to map to the subprocess.
+      shared_memory_size: If positive (and shared memory is supported on the
+        platform), attachments are passed through shared memory rings of this
+        size instead of the pipes.
     """
     self._args_factory = args_factory
     self._process: Optional[subprocess.Popen] = None
@@ -284,9 +481,20 @@ class SubprocessServer(Server):
     if extra_file_descriptors is None:
       extra_file_descriptors = []
     self._extra_file_descriptors = extra_file_descriptors
+    self._shared_memory_size = shared_memory_size
+    self._shared_memory: Optional[SharedMemory] = None
 
   def Start(self) -> None:
     with contextlib.ExitStack() as stack:
+      if self._shared_memory_size > 0 and SharedMemory.IsSupported():
+        shared_memory_fd = SharedMemory.Create(self._shared_memory_size)
+        stack.callback(os.close, shared_memory_fd)
+        self._shared_memory = SharedMemory(shared_memory_fd)
+        shared_memory_fd_obj = FileDescriptor.FromFileDescriptor(
+            shared_memory_fd)
+      else:
+        shared_memory_fd_obj = None
+
       input_r_fd, input_w_fd = os.pipe()
       stack.callback(os.close, input_r_fd)
       self._input_w = os.fdopen(input_w_fd, "wb", buffering=0)
@@ -310,10 +518,15 @@ class SubprocessServer(Server):
                    output_w_fd_obj.ToHandle()] + extra_handles)
       else:
         args = self._args_factory(
-            Channel(pipe_input=input_r_fd_obj, pipe_output=output_w_fd_obj))
+            Channel(
+                pipe_input=input_r_fd_obj,
+                pipe_output=output_w_fd_obj,
+                shared_memory=shared_memory_fd_obj))
         extra_fds = [
             fd.ToFileDescriptor() for fd in self._extra_file_descriptors
         ]
+        if shared_memory_fd_obj is not None:
+          extra_fds.append(shared_memory_fd_obj.ToFileDescriptor())
         self._process = subprocess.Popen(
             args,
             close_fds=True,
@@ -338,9 +551,16 @@ class SubprocessServer(Server):
       self._input_w.close()
     if self._output_r is not None:
       self._output_r.close()
+    if self._shared_memory is not None:
+      self._shared_memory.Close()
+      self._shared_memory = None
 
   def Connect(self) -> Connection:
     transport = PipeTransport(self._output_r, self._input_w)
+    if self._shared_memory is not None:
+      return SharedMemoryConnection(transport,
+                                    self._shared_memory.client_to_server,
+                                    self._shared_memory.server_to_client)
     return Connection(transport)
 
   @classmethod
@@ -394,8 +614,17 @@ def Main(channel: Channel, connection_handler: ConnectionHandler, user: str,
         channel.pipe_output.ToFileDescriptor(), "wb",
         buffering=False) as pipe_output:
       transport = PipeTransport(pipe_input, pipe_output)
-      connection = Connection(transport)
-      connection_handler(connection)
+      if channel.shared_memory is None:
+        connection_handler(Connection(transport))
+        return
+
+      shared_memory = SharedMemory(channel.shared_memory.ToFileDescriptor())
+      try:
+        connection_handler(
+            SharedMemoryConnection(transport, shared_memory.server_to_client,
+                                   shared_memory.client_to_server))
+      finally:
+        shared_memory.Close()
 
 
 def TotalServerCpuTime() -> float:
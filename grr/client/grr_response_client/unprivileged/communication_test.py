@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import collections
 import io
+import mmap
 import os
 import platform
 from typing import List
@@ -16,12 +17,15 @@ from grr_response_client.unprivileged import sandbox
 
 def _MakeArgs(channel: communication.Channel) -> List[str]:
   assert channel.pipe_input is not None and channel.pipe_output is not None
-  return [
+  args = [
       sys.executable, "-m",
       "grr_response_client.unprivileged.echo_server",
       str(channel.pipe_input.Serialize()),
       str(channel.pipe_output.Serialize()),
   ]
+  if channel.shared_memory is not None:
+    args.append(str(channel.shared_memory.Serialize()))
+  return args
 
 
 class CommunicationTest(absltest.TestCase):
@@ -49,6 +53,42 @@ class CommunicationTest(absltest.TestCase):
 
     server.Stop()
 
+  @unittest.skipIf(not communication.SharedMemory.IsSupported(),
+                   "Shared memory is not supported.")
+  def testSharedMemory(self):
+    ring_size = mmap.PAGESIZE
+    server = communication.SubprocessServer(
+        _MakeArgs, shared_memory_size=ring_size)
+    server.Start()
+    self.addCleanup(server.Stop)
+    connection = server.Connect()
+    self.assertIsInstance(connection, communication.SharedMemoryConnection)
+
+    connection.Send(communication.Message(b"foo", b"bar"))
+    result = connection.Recv()
+    self.assertEqual(result.data, b"foox")
+    self.assertEqual(result.attachment, b"barx")
+
+    # Attachments of odd sizes wrap around the ring boundary.
+    for i in range(16):
+      attachment = os.urandom(ring_size // 3 + i)
+      connection.Send(communication.Message(b"foo", attachment))
+      result = connection.Recv()
+      self.assertEqual(result.data, b"foox")
+      self.assertEqual(result.attachment, attachment + b"x")
+
+    # Attachments larger than the ring are sent through the pipe.
+    attachment = os.urandom(ring_size * 3)
+    connection.Send(communication.Message(b"foo", attachment))
+    result = connection.Recv()
+    self.assertEqual(result.data, b"foox")
+    self.assertEqual(result.attachment, attachment + b"x")
+
+    connection.Send(communication.Message(b"", b""))
+    result = connection.Recv()
+    self.assertEqual(result.data, b"x")
+    self.assertEqual(result.attachment, b"x")
+
   @unittest.skipIf(platform.system() == "Windows",
                    "psutil is not used on Windows.")
   def testTotalServerCpuSysTime_usesPsutilProcess(self):
@@ -221,5 +261,38 @@ class PipeTransportTest(absltest.TestCase):
     self.assertEqual(short_write_io.getvalue(), b"foo bar baz")
 
 
+class SharedMemoryRingTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.buf = mmap.mmap(-1, mmap.PAGESIZE)
+    ring_size = mmap.PAGESIZE - communication._RING_HEADER_SIZE
+    self.writer = communication._SharedMemoryRing(self.buf, 0, ring_size)
+    self.reader = communication._SharedMemoryRing(self.buf, 0, ring_size)
+
+    def Close():
+      self.writer.Close()
+      self.reader.Close()
+      self.buf.close()
+
+    self.addCleanup(Close)
+
+  def testReadsWrittenData(self):
+    self.writer.Write(b"foo")
+    self.writer.Write(b"bar")
+    self.assertEqual(self.reader.Read(3), b"foo")
+    self.assertEqual(self.reader.Read(3), b"bar")
+
+  def testRejectsReadExceedingRingSize(self):
+    with self.assertRaises(communication.Error):
+      self.reader.Read(mmap.PAGESIZE)
+
+  def testRejectsReadExceedingWrittenData(self):
+    self.writer.Write(b"foo")
+    with self.assertRaises(communication.Error):
+      self.reader.Read(4)
+    self.assertEqual(self.reader.Read(3), b"foo")
+
+
 if __name__ == "__main__":
   absltest.main()
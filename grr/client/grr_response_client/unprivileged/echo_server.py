@@ -5,6 +5,9 @@ The server receives data and an attachment and replies with:
 
 * data + "x"
 * attachment + "x"
+
+The optional third argument is a file descriptor of shared memory to pass
+attachments through.
 """
 
 from absl import app
@@ -21,9 +24,12 @@ def Handler(connection: communication.Connection):
 
 
 def main(argv):
+  shared_memory = int(argv[3]) if len(argv) > 3 else -1
   communication.Main(
       communication.Channel.FromSerialized(
-          pipe_input=int(argv[1]), pipe_output=int(argv[2])),
+          pipe_input=int(argv[1]),
+          pipe_output=int(argv[2]),
+          shared_memory=shared_memory),
       Handler,
       user="",
       group="")
@@ -2,7 +2,8 @@
 """Unprivileged filesystem RPC client code."""
 
 import abc
-from typing import TypeVar, Generic, Optional, Sequence, BinaryIO, Tuple
+import collections
+from typing import BinaryIO, Deque, Dict, Generic, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple, TypeVar
 
 from grr_response_client.unprivileged import communication
 from grr_response_client.unprivileged.proto import filesystem_pb2
@@ -32,10 +33,21 @@ class OperationError(Exception):
 
 
 class ConnectionWrapper:
-  """Wraps a connection, adding protobuf serialization of messages."""
+  """Wraps a connection, adding protobuf serialization of messages.
+
+  Several requests can be in flight at the same time. Requests are identified
+  by a request id, which the server copies to their responses. Responses
+  received while waiting for the response to another request are kept until
+  they are waited for.
+  """
 
   def __init__(self, connection: communication.Connection):
     self._connection = connection
+    self._next_request_id = 1
+    self._responses: Dict[int, Tuple[filesystem_pb2.Response, bytes]] = {}
+    self._discarded_request_ids: Set[int] = set()
+    # Ids of requests whose responses haven't been received yet.
+    self._pending_request_ids: Set[int] = set()
 
   def Send(self, request: filesystem_pb2.Request, attachment: bytes) -> None:
     self._connection.Send(
@@ -47,6 +59,69 @@ class ConnectionWrapper:
     response.ParseFromString(raw_response)
     return response, attachment
 
+  def SendRequest(self, request: filesystem_pb2.Request,
+                  attachment: bytes) -> int:
+    """Sends a request and returns its request id."""
+    request_id = self._next_request_id
+    self._next_request_id += 1
+    request.request_id = request_id
+    self.Send(request, attachment)
+    self._pending_request_ids.add(request_id)
+    return request_id
+
+  def RecvResponse(self, request_id: int,
+                   device: 'Device') -> Tuple[filesystem_pb2.Response, bytes]:
+    """Receives the response to a request.
+
+    Device data requested by the server in the meantime is read from the
+    device and sent to the server.
+
+    Args:
+      request_id: The id of the request, as returned by `SendRequest`.
+      device: The device underlying the filesystem.
+
+    Returns:
+      The response and its attachment.
+
+    Raises:
+      Error: if a response without a request id is received while other
+        requests are pending, since it can't be told which one it belongs to.
+    """
+    if request_id in self._responses:
+      return self._responses.pop(request_id)
+
+    while True:
+      response, attachment = self.Recv()
+      if response.HasField('device_data_request'):
+        device_data_request = response.device_data_request
+        data = device.Read(device_data_request.offset, device_data_request.size)
+        device_data = filesystem_pb2.DeviceData()
+        self.Send(filesystem_pb2.Request(device_data=device_data), data)
+        continue
+
+      if not response.HasField('request_id'):
+        # A response to a request the server failed to parse. It can only be
+        # attributed if the request waited for is the only one pending.
+        if self._pending_request_ids != {request_id}:
+          raise Error(
+              'Received a response without a request id while requests {} '
+              'are pending.'.format(sorted(self._pending_request_ids)))
+        self._pending_request_ids.clear()
+        return response, attachment
+
+      self._pending_request_ids.discard(response.request_id)
+      if response.request_id == request_id:
+        return response, attachment
+      elif response.request_id in self._discarded_request_ids:
+        self._discarded_request_ids.remove(response.request_id)
+      else:
+        self._responses[response.request_id] = (response, attachment)
+
+  def DiscardResponse(self, request_id: int) -> None:
+    """Drops the response to a request, which won't be waited for."""
+    if self._responses.pop(request_id, None) is None:
+      self._discarded_request_ids.add(request_id)
+
 
 class Device(abc.ABC):
   """A device underlying a filesystem."""
@@ -94,28 +169,42 @@ class OperationHandler(abc.ABC, Generic[RequestType, ResponseType]):
     self._device = device
 
   def Run(self, request: RequestType) -> ResponseType:
-    self._connection.Send(self.PackRequest(request), b'')
+    return self.Wait(self.Start(request))
 
-    while True:
-      packed_response, attachment = self._connection.Recv()
-      if packed_response.HasField('device_data_request'):
-        device_data_request = packed_response.device_data_request
-        data = self._device.Read(device_data_request.offset,
-                                 device_data_request.size)
-        device_data = filesystem_pb2.DeviceData()
-        request = filesystem_pb2.Request(device_data=device_data)
-        self._connection.Send(request, data)
-      elif packed_response.HasField('exception'):
-        raise OperationError(packed_response.exception.message,
-                             packed_response.exception.formatted_exception)
-      else:
-        response = self.UnpackResponse(packed_response)
-        self.MergeResponseAttachment(response, attachment)
-        return response
+  def Start(self, request: RequestType) -> int:
+    """Sends a request without waiting for the response.
+
+    Args:
+      request: The request to send.
+
+    Returns:
+      The request id, to be passed to `Wait` (or to
+      `ConnectionWrapper.DiscardResponse`).
+    """
+    return self._connection.SendRequest(self.PackRequest(request), b'')
+
+  def Wait(self, request_id: int) -> ResponseType:
+    """Waits for the response to a request sent by `Start`."""
+    packed_response, attachment = self._connection.RecvResponse(
+        request_id, self._device)
+    if packed_response.HasField('exception'):
+      raise OperationError(packed_response.exception.message,
+                           packed_response.exception.formatted_exception)
+    response = self.UnpackResponse(packed_response)
+    self.MergeResponseAttachment(response, attachment,
+                                 list(packed_response.attachment_sizes))
+    return response
+
+  def MergeResponseAttachment(self, response: ResponseType, attachment: bytes,
+                              attachment_sizes: List[int]) -> None:
+    """Merges an attachment back into the response.
 
-  def MergeResponseAttachment(self, response: ResponseType,
-                              attachment: bytes) -> None:
-    """Merges an attachment back into the response."""
+    Args:
+      response: The response to merge the attachment into.
+      attachment: The attachment.
+      attachment_sizes: Sizes of the parts of the attachment, if it consists of
+        several of them.
+    """
     pass
 
   @abc.abstractmethod
@@ -168,7 +257,8 @@ class ReadHandler(OperationHandler[filesystem_pb2.ReadRequest,
     return filesystem_pb2.Request(read_request=request)
 
   def MergeResponseAttachment(self, response: filesystem_pb2.ReadResponse,
-                              attachment: bytes) -> None:
+                              attachment: bytes,
+                              attachment_sizes: List[int]) -> None:
     response.data = attachment
 
 
@@ -185,6 +275,42 @@ class StatHandler(OperationHandler[filesystem_pb2.StatRequest,
     return filesystem_pb2.Request(stat_request=request)
 
 
+class StatManyHandler(OperationHandler[filesystem_pb2.StatManyRequest,
+                                       filesystem_pb2.StatManyResponse]):
+  """Implements the StatMany RPC."""
+
+  def UnpackResponse(
+      self,
+      response: filesystem_pb2.Response) -> filesystem_pb2.StatManyResponse:
+    return response.stat_many_response
+
+  def PackRequest(
+      self, request: filesystem_pb2.StatManyRequest) -> filesystem_pb2.Request:
+    return filesystem_pb2.Request(stat_many_request=request)
+
+
+class ReadManyHandler(OperationHandler[filesystem_pb2.ReadManyRequest,
+                                       filesystem_pb2.ReadManyResponse]):
+  """Implements the ReadMany RPC."""
+
+  def UnpackResponse(
+      self,
+      response: filesystem_pb2.Response) -> filesystem_pb2.ReadManyResponse:
+    return response.read_many_response
+
+  def PackRequest(
+      self, request: filesystem_pb2.ReadManyRequest) -> filesystem_pb2.Request:
+    return filesystem_pb2.Request(read_many_request=request)
+
+  def MergeResponseAttachment(self, response: filesystem_pb2.ReadManyResponse,
+                              attachment: bytes,
+                              attachment_sizes: List[int]) -> None:
+    offset = 0
+    for read_response, size in zip(response.reads, attachment_sizes):
+      read_response.data = attachment[offset:offset + size]
+      offset += size
+
+
 class ListFilesHandler(OperationHandler[filesystem_pb2.ListFilesRequest,
                                         filesystem_pb2.ListFilesResponse]):
   """Implements the ListFiles RPC."""
@@ -242,8 +368,28 @@ class LookupCaseInsensitiveHandler(
     return filesystem_pb2.Request(lookup_case_insensitive_request=request)
 
 
+# Number of reads requested ahead of a sequential reader.
+_READ_AHEAD_COUNT = 2
+
+# Reads larger than this are not read ahead, to bound the memory used by data
+# read ahead.
+_MAX_READ_AHEAD_SIZE = 4 * 1024 * 1024
+
+
+class _PendingRead(NamedTuple):
+  offset: int
+  size: int
+  request_id: int
+
+
 class File:
-  """Wraps a remote file_id."""
+  """Wraps a remote file_id.
+
+  Sequential reads (of the same size) are read ahead: when a read starts where
+  the previous one ended, the following blocks are requested before waiting
+  for the data of the current one. The server reads the next block while the
+  client processes the current one.
+  """
 
   def __init__(self, connection: ConnectionWrapper, device: Device,
                file_id: int, inode: int):
@@ -251,14 +397,57 @@ class File:
     self._device = device
     self._file_id = file_id
     self._inode = inode
+    # Offset following the data of the last read.
+    self._next_offset: Optional[int] = None
+    # Reads requested ahead, in the order of offsets.
+    self._read_ahead: Deque[_PendingRead] = collections.deque()
 
   def Read(self, offset: int, size: int) -> bytes:
-    request = filesystem_pb2.ReadRequest(
-        file_id=self._file_id, offset=offset, size=size)
-    response = ReadHandler(self._connection, self._device).Run(request)
-    return response.data
+    """Reads data from the file."""
+    handler = ReadHandler(self._connection, self._device)
+
+    if (self._read_ahead and self._read_ahead[0].offset == offset and
+        self._read_ahead[0].size == size):
+      request_id = self._read_ahead.popleft().request_id
+    else:
+      self._DiscardReadAhead()
+      request_id = handler.Start(
+          filesystem_pb2.ReadRequest(
+              file_id=self._file_id, offset=offset, size=size))
+
+    if offset == self._next_offset and 0 < size <= _MAX_READ_AHEAD_SIZE:
+      if self._read_ahead:
+        read_ahead_offset = self._read_ahead[-1].offset + size
+      else:
+        read_ahead_offset = offset + size
+      while len(self._read_ahead) < _READ_AHEAD_COUNT:
+        read_ahead_request_id = handler.Start(
+            filesystem_pb2.ReadRequest(
+                file_id=self._file_id, offset=read_ahead_offset, size=size))
+        self._read_ahead.append(
+            _PendingRead(read_ahead_offset, size, read_ahead_request_id))
+        read_ahead_offset += size
+
+    try:
+      data = handler.Wait(request_id).data
+    except OperationError:
+      self._DiscardReadAhead()
+      self._next_offset = None
+      raise
+
+    if len(data) < size:
+      # The end of the file has been reached.
+      self._DiscardReadAhead()
+    self._next_offset = offset + len(data)
+    return data
+
+  def _DiscardReadAhead(self) -> None:
+    for pending_read in self._read_ahead:
+      self._connection.DiscardResponse(pending_read.request_id)
+    self._read_ahead.clear()
 
   def Close(self) -> None:
+    self._DiscardReadAhead()
     request = filesystem_pb2.CloseRequest(file_id=self._file_id)
     CloseHandler(self._connection, self._device).Run(request)
 
@@ -281,6 +470,10 @@ class File:
   def inode(self) -> int:
     return self._inode
 
+  @property
+  def file_id(self) -> int:
+    return self._file_id
+
   def LookupCaseInsensitive(self, name: str) -> Optional[str]:
     request = filesystem_pb2.LookupCaseInsensitiveRequest(
         file_id=self._file_id, name=name)
@@ -344,6 +537,31 @@ class Client:
     request = filesystem_pb2.OpenRequest(inode=inode, stream_name=stream_name)
     return self._Open(request)
 
+  def StatMany(self,
+               files: Sequence[File]) -> Sequence[filesystem_pb2.StatEntry]:
+    """Returns information about several files with a single RPC."""
+    request = filesystem_pb2.StatManyRequest(
+        file_ids=[file_obj.file_id for file_obj in files])
+    response = StatManyHandler(self._connection, self._device).Run(request)
+    return list(response.entries)
+
+  def ReadMany(self, reads: Iterable[Tuple[File, int, int]]) -> Sequence[bytes]:
+    """Reads data from several files with a single RPC.
+
+    Args:
+      reads: Tuples of a file, an offset and a size to read.
+
+    Returns:
+      Data read by each of the reads.
+    """
+    request = filesystem_pb2.ReadManyRequest(reads=[
+        filesystem_pb2.ReadRequest(
+            file_id=file_obj.file_id, offset=offset, size=size)
+        for file_obj, offset, size in reads
+    ])
+    response = ReadManyHandler(self._connection, self._device).Run(request)
+    return [read_response.data for read_response in response.reads]
+
   def _Open(self, request: filesystem_pb2.OpenRequest) -> File:
     response = OpenHandler(self._connection, self._device).Run(request)
     if response.status == filesystem_pb2.OpenResponse.Status.STALE_INODE:
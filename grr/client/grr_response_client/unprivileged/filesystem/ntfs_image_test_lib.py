@@ -415,3 +415,52 @@ class NtfsImageTest(absltest.TestCase, abc.ABC):
                                 "Attempting to read from a directory"):
       with self._client.Open(path=self._Path("\\a")) as file_obj:
         file_obj.Read(offset=0, size=1)
+
+  def testRead_sequential(self):
+    expected = b"".join(b"%d\n" % i for i in range(1, 1001))
+    with self._client.Open(path=self._Path("\\numbers.txt")) as file_obj:
+      data = b""
+      while True:
+        chunk = file_obj.Read(len(data), 100)
+        if not chunk:
+          break
+        data += chunk
+      self.assertEqual(data, expected)
+
+  def testRead_sequentialInterleaved(self):
+    expected = b"".join(b"%d\n" % i for i in range(1, 1001))
+    with self._client.Open(path=self._Path("\\numbers.txt")) as file_obj:
+      with self._client.Open(path=self._Path("\\a\\b1\\c1\\d")) as other_obj:
+        data = b""
+        for _ in range(5):
+          data += file_obj.Read(len(data), 10)
+          self.assertEqual(other_obj.Read(0, 100), b"foo\n")
+          self.assertEqual(other_obj.Stat().st_size, 4)
+        self.assertEqual(data, expected[:50])
+        # A non-sequential read in the middle of the read-ahead.
+        self.assertEqual(file_obj.Read(5, 10), expected[5:15])
+        self.assertEqual(file_obj.Read(15, 10), expected[15:25])
+
+  def testStatMany(self):
+    with self._client.Open(path=self._Path("\\numbers.txt")) as file_obj:
+      with self._client.Open(path=self._Path("\\a\\b1\\c1\\d")) as other_obj:
+        entries = self._client.StatMany([file_obj, other_obj, file_obj])
+        self.assertEqual([entry.st_size for entry in entries], [3893, 4, 3893])
+        self.assertEqual(entries[0], file_obj.Stat())
+        self.assertEqual(entries[1], other_obj.Stat())
+
+  def testReadMany(self):
+    with self._client.Open(path=self._Path("\\numbers.txt")) as file_obj:
+      with self._client.Open(path=self._Path("\\a\\b1\\c1\\d")) as other_obj:
+        data = self._client.ReadMany([
+            (file_obj, 0, 4),
+            (other_obj, 0, 100),
+            (file_obj, 3890, 100),
+            (other_obj, 4, 100),
+        ])
+        self.assertEqual(data, [b"1\n2\n", b"foo\n", b"00\n", b""])
+
+  def testReadMany_fromDirectoryRaises(self):
+    with self._client.Open(path=self._Path("\\a")) as file_obj:
+      with self.assertRaises(client.OperationError):
+        self._client.ReadMany([(file_obj, 0, 1)])
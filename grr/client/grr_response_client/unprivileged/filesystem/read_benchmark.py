@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""Benchmark of large sequential reads through the sandboxed filesystem.
+
+A file of random data is put on an ext4 image (created with `mke2fs`) and
+read sequentially through the TSK implementation of the unprivileged
+filesystem server. File data is returned as attachments, which are passed
+either through the pipe or through shared memory. Both the case of the server
+reading the image through a shared file descriptor and of the client serving
+reads of the image to the server are measured.
+
+Throughput and client CPU time per MiB of read data are reported.
+"""
+
+import os
+import subprocess
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from absl import app
+from absl import flags
+
+from grr_response_client.unprivileged import communication
+from grr_response_client.unprivileged import interface_registry
+from grr_response_client.unprivileged import server
+from grr_response_client.unprivileged.filesystem import client
+from grr_response_client.unprivileged.proto import filesystem_pb2
+from grr_response_core.lib import config_lib
+
+_SIZE = flags.DEFINE_integer(
+    "size",
+    default=64 * 1024 * 1024,
+    help="Size of the read file in bytes.",
+)
+
+_CHUNK_SIZE = flags.DEFINE_integer(
+    "chunk_size",
+    default=1024 * 1024,
+    help="Number of bytes read by a single request.",
+)
+
+_SHARED_MEMORY_SIZE = flags.DEFINE_integer(
+    "shared_memory_size",
+    default=4 * 1024 * 1024,
+    help="Size of the shared memory rings in bytes.",
+)
+
+_RUNS = flags.DEFINE_integer(
+    "runs",
+    default=3,
+    help="Number of runs per transport (the fastest one is reported).",
+)
+
+_MIB = 1024 * 1024
+
+_FILE_NAME = "data.bin"
+
+
+def _CreateImage(directory: str, size: int) -> str:
+  """Creates an ext4 image with a file of random data of the given size."""
+  source_dir = os.path.join(directory, "source")
+  os.mkdir(source_dir)
+  with open(os.path.join(source_dir, _FILE_NAME), "wb") as f:
+    f.write(os.urandom(size))
+
+  image_path = os.path.join(directory, "image.img")
+  image_size_kib = size // 1024 * 2 + 16 * 1024
+  args = [
+      "mke2fs", "-q", "-F", "-t", "ext4", "-d", source_dir, image_path,
+      "{}k".format(image_size_kib)
+  ]
+  subprocess.check_call(args, stdout=subprocess.DEVNULL)
+  return image_path
+
+
+class _UnsharedFileDevice(client.FileDevice):
+  """A file device which is read by the client on behalf of the server."""
+
+  @property
+  def file_descriptor(self) -> Optional[int]:
+    return None
+
+
+def _Run(image_path: str, share_device: bool,
+         shared_memory_size: int) -> Tuple[float, float]:
+  """Reads the file and returns the wall time and client CPU time."""
+  with open(image_path, "rb") as image:
+    extra_file_descriptors = []
+    if share_device:
+      extra_file_descriptors.append(
+          communication.FileDescriptor.FromFileDescriptor(image.fileno()))
+
+    server_obj = communication.SubprocessServer(
+        lambda channel: server._MakeServerArgs(  # pylint: disable=protected-access
+            channel, interface_registry.Interface.FILESYSTEM),
+        extra_file_descriptors,
+        shared_memory_size=shared_memory_size)
+    server_obj.Start()
+    try:
+      if share_device:
+        device = client.FileDevice(image)
+      else:
+        device = _UnsharedFileDevice(image)
+      with client.CreateFilesystemClient(server_obj.Connect(),
+                                         filesystem_pb2.TSK, device) as fs:
+        with fs.Open("/" + _FILE_NAME) as file_obj:
+          start = time.time()
+          start_cpu = time.process_time()
+          offset = 0
+          while True:
+            data = file_obj.Read(offset, _CHUNK_SIZE.value)
+            if not data:
+              break
+            offset += len(data)
+          duration = time.time() - start
+          cpu = time.process_time() - start_cpu
+    finally:
+      server_obj.Stop()
+
+  if offset != _SIZE.value:
+    raise AssertionError("Read {} bytes instead of {}.".format(
+        offset, _SIZE.value))
+  return duration, cpu
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  config_lib.ParseConfigCommandLine()
+  if not communication.SharedMemory.IsSupported():
+    raise app.UsageError("Shared memory is not supported on this platform.")
+
+  data_mib = _SIZE.value / _MIB
+  with tempfile.TemporaryDirectory() as directory:
+    image_path = _CreateImage(directory, _SIZE.value)
+
+    print("device\ttransport\tdata\tMiB/s\tcpu/MiB")
+    for share_device in [True, False]:
+      for transport, shared_memory_size in [
+          ("pipe", 0),
+          ("shared_memory", _SHARED_MEMORY_SIZE.value),
+      ]:
+        runs = [
+            _Run(image_path, share_device, shared_memory_size)
+            for _ in range(_RUNS.value)
+        ]
+        duration = min(run[0] for run in runs)
+        cpu = min(run[1] for run in runs)
+        print("{device}\t{transport}\t{data:.1f}MiB\t{rate:.1f}\t"
+              "{cpu:.1f}ms".format(
+                  device="shared" if share_device else "served",
+                  transport=transport,
+                  data=data_mib,
+                  rate=data_mib / duration,
+                  cpu=cpu / data_mib * 1000))
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -2,10 +2,11 @@
 """Unprivileged filesystem RPC server."""
 
 import abc
+import collections
 import os
 import sys
 import traceback
-from typing import TypeVar, Generic, Optional, Tuple
+from typing import Deque, TypeVar, Generic, List, Optional, Tuple, Union
 from grr_response_client.unprivileged import communication
 from grr_response_client.unprivileged.filesystem import filesystem
 from grr_response_client.unprivileged.filesystem import ntfs
@@ -35,10 +36,17 @@ class State:
 
 
 class ConnectionWrapper:
-  """Wraps a connection, adding protobuf serialization."""
+  """Wraps a connection, adding protobuf serialization.
+
+  The client may send requests before it receives the responses to previous
+  ones. Requests received while waiting for device data are queued and
+  returned by `RecvRequest` once the current operation is done.
+  """
 
   def __init__(self, connection: communication.Connection):
     self._connection = connection
+    self._queued_requests: Deque[Tuple[filesystem_pb2.Request,
+                                       bytes]] = collections.deque()
 
   def Send(self, response: filesystem_pb2.Response, attachment: bytes) -> None:
     self._connection.Send(
@@ -50,6 +58,20 @@ class ConnectionWrapper:
     request.ParseFromString(raw_request)
     return request, attachment
 
+  def RecvRequest(self) -> Tuple[filesystem_pb2.Request, bytes]:
+    """Receives the next request, which may have been queued before."""
+    if self._queued_requests:
+      return self._queued_requests.popleft()
+    return self.Recv()
+
+  def RecvDeviceData(self) -> bytes:
+    """Receives device data, queueing any requests received before it."""
+    while True:
+      request, attachment = self.Recv()
+      if request.HasField('device_data'):
+        return attachment
+      self._queued_requests.append((request, attachment))
+
 
 class RpcDevice(filesystem.Device):
   """A device implementation which reads data blocks via a connection."""
@@ -62,8 +84,7 @@ class RpcDevice(filesystem.Device):
         offset=offset, size=size)
     self._connection.Send(
         filesystem_pb2.Response(device_data_request=device_data_request), b'')
-    _, attachment = self._connection.Recv()
-    return attachment
+    return self._connection.RecvDeviceData()
 
 
 class FileDevice(filesystem.Device):
@@ -98,7 +119,13 @@ class OperationHandler(abc.ABC, Generic[RequestType, ResponseType]):
     request = self.UnpackRequest(self._request)
     response = self.HandleOperation(self._state, request)
     attachment = self.ExtractResponseAttachment(response)
-    self._connection.Send(self.PackResponse(response), attachment)
+    packed_response = self.PackResponse(response)
+    if self._request.HasField('request_id'):
+      packed_response.request_id = self._request.request_id
+    if isinstance(attachment, list):
+      packed_response.attachment_sizes.extend(len(part) for part in attachment)
+      attachment = b''.join(attachment)
+    self._connection.Send(packed_response, attachment)
 
   def CreateDevice(self) -> filesystem.Device:
     return RpcDevice(self._connection)
@@ -118,8 +145,16 @@ class OperationHandler(abc.ABC, Generic[RequestType, ResponseType]):
     """Extracts an inner Request message from a Request RPC message."""
     pass
 
-  def ExtractResponseAttachment(self, response: ResponseType) -> bytes:
-    """Extracts and clears an attachment from the response."""
+  def ExtractResponseAttachment(
+      self, response: ResponseType) -> Union[bytes, List[bytes]]:
+    """Extracts and clears an attachment from the response.
+
+    Args:
+      response: The response to extract the attachment from.
+
+    Returns:
+      The attachment or a list of its parts, if it consists of several of them.
+    """
     return b''
 
 
@@ -237,6 +272,58 @@ class StatHandler(OperationHandler[filesystem_pb2.StatRequest,
     return request.stat_request
 
 
+class StatManyHandler(OperationHandler[filesystem_pb2.StatManyRequest,
+                                       filesystem_pb2.StatManyResponse]):
+  """Implements the StatMany operation."""
+
+  def HandleOperation(
+      self, state: State, request: filesystem_pb2.StatManyRequest
+  ) -> filesystem_pb2.StatManyResponse:
+    return filesystem_pb2.StatManyResponse(entries=[
+        state.files.Get(file_id).Stat() for file_id in request.file_ids
+    ])
+
+  def PackResponse(
+      self,
+      response: filesystem_pb2.StatManyResponse) -> filesystem_pb2.Response:
+    return filesystem_pb2.Response(stat_many_response=response)
+
+  def UnpackRequest(
+      self, request: filesystem_pb2.Request) -> filesystem_pb2.StatManyRequest:
+    return request.stat_many_request
+
+
+class ReadManyHandler(OperationHandler[filesystem_pb2.ReadManyRequest,
+                                       filesystem_pb2.ReadManyResponse]):
+  """Implements the ReadMany operation."""
+
+  def HandleOperation(
+      self, state: State, request: filesystem_pb2.ReadManyRequest
+  ) -> filesystem_pb2.ReadManyResponse:
+    response = filesystem_pb2.ReadManyResponse()
+    for read_request in request.reads:
+      file = state.files.Get(read_request.file_id)
+      data = file.Read(offset=read_request.offset, size=read_request.size)
+      response.reads.add(data=data)
+    return response
+
+  def PackResponse(
+      self,
+      response: filesystem_pb2.ReadManyResponse) -> filesystem_pb2.Response:
+    return filesystem_pb2.Response(read_many_response=response)
+
+  def ExtractResponseAttachment(
+      self, response: filesystem_pb2.ReadManyResponse) -> List[bytes]:
+    attachment = [read_response.data for read_response in response.reads]
+    for read_response in response.reads:
+      read_response.ClearField('data')
+    return attachment
+
+  def UnpackRequest(
+      self, request: filesystem_pb2.Request) -> filesystem_pb2.ReadManyRequest:
+    return request.read_many_request
+
+
 class ListFilesHandler(OperationHandler[filesystem_pb2.ListFilesRequest,
                                         filesystem_pb2.ListFilesResponse]):
   """Implements the ListFiles operation."""
@@ -325,8 +412,9 @@ def DispatchWrapped(connection: ConnectionWrapper) -> None:
   """Dispatches a request to the proper OperationHandler."""
   state = State()
   while True:
+    request = None
     try:
-      request, att = connection.Recv()
+      request, att = connection.RecvRequest()
 
       if state.filesystem is None and not request.HasField('init_request'):
         raise DispatchError('The first request must be Init')
@@ -350,6 +438,10 @@ def DispatchWrapped(connection: ConnectionWrapper) -> None:
         handler_class = LookupCaseInsensitiveHandler
       elif request.HasField('list_names_request'):
         handler_class = ListNamesHandler
+      elif request.HasField('stat_many_request'):
+        handler_class = StatManyHandler
+      elif request.HasField('read_many_request'):
+        handler_class = ReadManyHandler
       else:
         raise DispatchError('No request set.')
 
@@ -359,7 +451,10 @@ def DispatchWrapped(connection: ConnectionWrapper) -> None:
       exception = filesystem_pb2.Exception(
           message=str(sys.exc_info()[1]),
           formatted_exception=traceback.format_exc())
-      connection.Send(filesystem_pb2.Response(exception=exception), b'')
+      response = filesystem_pb2.Response(exception=exception)
+      if request is not None and request.HasField('request_id'):
+        response.request_id = request.request_id
+      connection.Send(response, b'')
 
 
 def Dispatch(connection: communication.Connection):
@@ -25,6 +25,11 @@ def _MakeServerArgs(channel: communication.Channel,
       "--unprivileged_group",
       config.CONFIG["Client.unprivileged_group"],
   ]
+  if channel.shared_memory is not None:
+    named_flags.extend([
+        "--unprivileged_server_shared_memory",
+        str(channel.shared_memory.Serialize()),
+    ])
 
   # PyInstaller executable
   if getattr(sys, "frozen", False):
@@ -41,7 +46,9 @@ def _MakeServerArgs(channel: communication.Channel,
 def CreateServer(
     extra_file_descriptors: List[communication.FileDescriptor],
     interface: interface_registry.Interface) -> communication.Server:
+  shared_memory_size = config.CONFIG["Client.unprivileged_shared_memory_size"]
   server = communication.SubprocessServer(
       lambda channel: _MakeServerArgs(channel, interface),
-      extra_file_descriptors)
+      extra_file_descriptors,
+      shared_memory_size=shared_memory_size)
   return server
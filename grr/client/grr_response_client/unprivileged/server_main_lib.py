@@ -14,6 +14,10 @@ flags.DEFINE_integer(
     "unprivileged_server_pipe_output", -1,
     "The file descriptor of the output pipe used for communication.")
 
+flags.DEFINE_integer(
+    "unprivileged_server_shared_memory", -1,
+    "The file descriptor of the shared memory used for attachments, if any.")
+
 flags.DEFINE_string("unprivileged_server_interface", "",
                     "The name of the RPC interface used.")
 
@@ -29,7 +33,8 @@ def main(argv):
   communication.Main(
       communication.Channel.FromSerialized(
           pipe_input=flags.FLAGS.unprivileged_server_pipe_input,
-          pipe_output=flags.FLAGS.unprivileged_server_pipe_output),
+          pipe_output=flags.FLAGS.unprivileged_server_pipe_output,
+          shared_memory=flags.FLAGS.unprivileged_server_shared_memory),
       interface_registry.GetConnectionHandlerForInterfaceString(
           flags.FLAGS.unprivileged_server_interface),
       flags.FLAGS.unprivileged_user, flags.FLAGS.unprivileged_group)
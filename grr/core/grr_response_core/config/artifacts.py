@@ -83,3 +83,30 @@ config_lib.DEFINE_list(
     name="Artifacts.edr_agents",
     default=[],
     help="Artifacts used for collecting metadata about EDR agents.")
+
+config_lib.DEFINE_integer(
+    "Artifacts.parser_threads", 0,
+    help="Number of threads shared by all flows of a server process to run "
+    "artifact parsers concurrently. 0 runs parsers sequentially on the "
+    "thread processing the flow.")
+
+config_lib.DEFINE_integer(
+    "Artifacts.parser_processes", 0,
+    help="Number of processes shared by all flows of a server process to run "
+    "CPU-heavy artifact parsers in. If set, takes precedence over "
+    "Artifacts.parser_threads. Processes are spawned with a copy of the "
+    "server config. Parsers that can't be pickled and files that aren't read "
+    "in bulk (see Artifacts.parser_prefetch_max_bytes) are parsed in the "
+    "server process.")
+
+config_lib.DEFINE_integer(
+    "Artifacts.parser_prefetch_max_bytes", 64 * 1024 * 1024,
+    help="Maximum total size of collected files whose contents are read in "
+    "bulk before being parsed. Larger files are streamed from the blob store "
+    "while being parsed.")
+
+config_lib.DEFINE_integer(
+    "Artifacts.expansion_cache_size", 10000,
+    help="Maximum number of artifact expansions and knowledge base "
+    "interpolations cached by every server process. Clients with equal "
+    "knowledge bases share cached entries.")
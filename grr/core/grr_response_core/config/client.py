@@ -97,6 +97,14 @@ config_lib.DEFINE_integer("Client.max_post_size", 40000000,
 config_lib.DEFINE_integer("Client.max_out_queue", 51200000,
                           "Maximum size of the output queue.")
 
+config_lib.DEFINE_list(
+    name="Client.compression_codecs",
+    help="Codecs (values of DataBlob.CompressionType) the client compresses "
+    "uploaded data and messages with, in order of preference. Codecs the "
+    "client doesn't support are skipped and zlib (ZCOMPRESSION) is used if "
+    "none is left. Only list codecs all frontends are able to decompress.",
+    default=["ZCOMPRESSION"])
+
 config_lib.DEFINE_integer(
     "Client.foreman_check_frequency", 1800,
     "The minimum number of seconds before checking with "
@@ -152,6 +160,13 @@ config_lib.DEFINE_string(
     help="Name of (UNIX) group to run sandboxed code as.",
     default="")
 
+config_lib.DEFINE_integer(
+    name="Client.unprivileged_shared_memory_size",
+    help="Size (in bytes) of the shared memory buffers used to pass file data "
+    "to and from sandboxed code. If 0, or on platforms other than Linux, file "
+    "data is passed through pipes.",
+    default=0)
+
 # Windows client specific options.
 config_lib.DEFINE_string(
     "Client.config_hive",
@@ -10,6 +10,22 @@ config_lib.DEFINE_integer("Datastore.maximum_blob_size", 512 * 1024,
 config_lib.DEFINE_string("Blobstore.implementation", "DbBlobStore",
                          "Blob storage subsystem to use.")
 
+config_lib.DEFINE_integer(
+    "Blobstore.existence_cache_size",
+    default=100000,
+    help="Number of recently written or read blob ids to remember. Writes of "
+    "remembered blobs are skipped and their existence is checked without "
+    "querying the blob store. 0 disables the cache.")
+
+config_lib.DEFINE_integer(
+    "Blobstore.existence_bloom_filter_capacity",
+    default=0,
+    help="Number of blob ids a Bloom filter in front of the blob store is "
+    "sized for (about 1.2 bytes per blob id). Blobs not in the filter are "
+    "written without checking whether they exist. Blobs in the filter are "
+    "checked first and their writes are skipped if they exist. Requires "
+    "Blobstore.existence_cache_size to be set. 0 disables the filter.")
+
 config_lib.DEFINE_string("Database.implementation", "",
                          "Relational database system to use.")
 
@@ -50,6 +66,35 @@ config_lib.DEFINE_integer(
     help="The maximum number of flow-processing worker threads.",
 )
 
+config_lib.DEFINE_float(
+    "Mysql.flow_processing_poll_min",
+    default=0.1,
+    help="The minimum time in seconds between two polls of the flow "
+    "processing request queue when no requests are ready for processing.",
+)
+
+config_lib.DEFINE_float(
+    "Mysql.flow_processing_poll_max",
+    default=3,
+    help="The maximum time in seconds between two polls of the flow "
+    "processing request queue. The polling interval grows from the minimum "
+    "to this value while the queue stays idle.",
+)
+
+config_lib.DEFINE_integer(
+    "Mysql.flow_processing_notification_port",
+    default=0,
+    help="A UDP port on which workers listen for notifications about new flow "
+    "processing requests written by other processes. 0 disables listening.",
+)
+
+config_lib.DEFINE_list(
+    "Mysql.flow_processing_notification_peers",
+    default=[],
+    help="A list of host:port addresses of workers to notify when new flow "
+    "processing requests are written.",
+)
+
 config_lib.DEFINE_string(
     "Mysql.migrations_dir", "%(grr_response_server/databases/mysql_migrations@"
     "grr-response-server|resource)", "Folder with MySQL migrations files.")
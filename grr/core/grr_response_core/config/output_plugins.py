@@ -61,6 +61,19 @@ config_lib.DEFINE_string(
 config_lib.DEFINE_string("Splunk.index", None,
                          "The index assigned to all submitted events.")
 
+config_lib.DEFINE_integer(
+    "Splunk.batch_max_events", 1000,
+    "Maximum number of events sent to Splunk in a single request.")
+
+config_lib.DEFINE_integer(
+    "Splunk.batch_max_bytes", 5 * 1000 * 1000,
+    "Maximum size of a single request sent to Splunk. Note enforcement is "
+    "not exact: a single event larger than this is sent on its own.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Splunk.batch_max_age", "10s",
+    "Maximum time an event is buffered before it is sent to Splunk.")
+
 # Elasticsearch Output Plugin
 config_lib.DEFINE_string(
     "Elasticsearch.url", None, "Absolute URL of the Elasticsearch installation,"
@@ -79,3 +92,35 @@ config_lib.DEFINE_bool(
 
 config_lib.DEFINE_string("Elasticsearch.index", "grr-flows",
                          "The index assigned to all submitted events.")
+
+config_lib.DEFINE_integer(
+    "Elasticsearch.batch_max_events", 1000,
+    "Maximum number of documents indexed in a single bulk request.")
+
+config_lib.DEFINE_integer(
+    "Elasticsearch.batch_max_bytes", 5 * 1000 * 1000,
+    "Maximum size of a single bulk request. Note enforcement is not exact: a "
+    "single document larger than this is sent on its own.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Elasticsearch.batch_max_age", "10s",
+    "Maximum time a document is buffered before it is sent to Elasticsearch.")
+
+config_lib.DEFINE_integer(
+    "Export.metadata_cache_size", 10000,
+    "Maximum number of clients whose exported metadata is cached by a server "
+    "process. Shared by output plugins and exports.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Export.metadata_cache_ttl", "10m",
+    "Time exported client metadata is cached for. Changes made by the same "
+    "process are picked up right away, changes made by other processes once "
+    "cached metadata expires.")
+
+config_lib.DEFINE_integer(
+    "Export.processes", 0,
+    "Number of processes shared by all exports of a server process to "
+    "convert and serialize exported values in (e.g. when results are "
+    "downloaded as CSV or YAML through the API). 0 processes values "
+    "sequentially. Processes are spawned, not forked, and never access the "
+    "data store: only export converters marked as `process_safe` run there.")
@@ -39,6 +39,55 @@ config_lib.DEFINE_integer(
     "Worker.queue_shards", 5, "Queue notifications will be sharded across "
     "this number of datastore subjects.")
 
+config_lib.DEFINE_integer(
+    "Worker.flow_processing_batch_size", 10,
+    "Maximum number of flow processing requests a worker thread handles at "
+    "once. Flows in a batch are leased, read and released with a single "
+    "database call per step. 1 disables batching.")
+
+config_lib.DEFINE_bool(
+    "Worker.output_plugin_queue", False,
+    "If True, flow results are handed off to output plugins through a "
+    "database-backed queue drained by output plugin workers. Otherwise output "
+    "plugins run inline while the flow is processed. Flow output plugin states "
+    "updated by queued processing are not shown in flow details.")
+
+config_lib.DEFINE_integer(
+    "Worker.output_plugin_batch_size", 1000,
+    "Maximum number of queued output plugin requests a worker leases at once. "
+    "Requests for the same hunt (or flow) and plugin are processed together.")
+
+config_lib.DEFINE_integer(
+    "Worker.output_plugin_request_max_size", 4 * 1024 * 1024,
+    "Maximum size in bytes of the results stored in a single queued output "
+    "plugin request. Larger batches of results are split into several "
+    "requests.")
+
+config_lib.DEFINE_integer(
+    "Worker.output_plugin_threads", 10,
+    "Number of threads a worker uses to process leased output plugin "
+    "requests.")
+
+config_lib.DEFINE_integer(
+    "Worker.output_plugin_concurrency", 4,
+    "Maximum number of batches a worker processes concurrently with a single "
+    "output plugin. Plugins can override it with their `max_concurrency` "
+    "attribute.")
+
+config_lib.DEFINE_integer(
+    "Worker.output_plugin_max_attempts", 5,
+    "Number of times a failing output plugin request is attempted before it "
+    "is dropped and the failure is logged.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Worker.output_plugin_retry_delay", "30s",
+    "Time to wait before retrying a failed output plugin request. The delay "
+    "is doubled with every failed attempt.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Worker.output_plugin_lease_time", "10m",
+    "Time for which output plugin requests are leased by a worker.")
+
 config_lib.DEFINE_list("Frontend.well_known_flows", [], "Unused, Deprecated.")
 
 # Smtp settings.
@@ -102,6 +151,15 @@ config_lib.DEFINE_semantic_value(
     "default duration is 1w. In certain cases the duration might be extended "
     "to accommodate for the clients that rarely show up online.")
 
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration, "Foreman.rules_cache_ttl",
+    rdfvalue.Duration.From(10, rdfvalue.SECONDS),
+    "How long the foreman keeps using cached foreman rules. Changes made by "
+    "the same process are picked up right away. Changes made by other "
+    "processes (e.g. starting a hunt in the AdminUI) are not seen by the "
+    "foreman for up to this long, so hunts start on polling clients with at "
+    "most this much delay.")
+
 config_lib.DEFINE_string("Frontend.bind_address", "::",
                          "The ip address to bind.")
 
@@ -127,10 +185,32 @@ config_lib.DEFINE_integer(
     "Maximum time messages remain valid within the "
     "system.")
 
+config_lib.DEFINE_integer(
+    "Frontend.ingestion_queue_size", 1000,
+    "Maximum number of received message bundles waiting to be written to the "
+    "database. Bundles received concurrently from different clients are "
+    "written together. Once the queue is full, receiving new messages blocks. "
+    "0 writes every bundle on the thread that received it.")
+
+config_lib.DEFINE_integer(
+    "Frontend.ingestion_batch_size", 1000,
+    "Maximum number of received messages written to the database at once.")
+
+config_lib.DEFINE_integer(
+    "Frontend.ingestion_max_writers", 4,
+    "Maximum number of batches of received messages written to the database "
+    "concurrently.")
+
 config_lib.DEFINE_bool(
     "Server.initialized", False, "True once config_updater initialize has been "
     "run at least once.")
 
+config_lib.DEFINE_bool(
+    "Server.protobuf_codec", False,
+    "If True, GRR messages, flow responses and stat entries are parsed with "
+    "the generated protobuf classes and their fields are converted on access, "
+    "instead of being parsed in pure Python.")
+
 config_lib.DEFINE_string("Server.ip_resolver_class", "IPResolver",
                          "The ip resolver class to use.")
 
@@ -197,6 +277,39 @@ config_lib.DEFINE_integer(
     10000000,
     help="The number of bytes allowed for unbounded reads from a file object")
 
+config_lib.DEFINE_bool(
+    "Server.timeline_columnar_index",
+    True,
+    help="If True, timeline flows additionally store collected entries in a "
+    "columnar format that allows filtering and sorting timelines without "
+    "decoding all of their entries.")
+
+config_lib.DEFINE_integer(
+    "Server.timeline_columnar_segment_size",
+    16384,
+    help="Number of timeline entries stored in a single blob of the columnar "
+    "timeline format.")
+
+config_lib.DEFINE_integer(
+    "Server.blob_read_ahead_batches",
+    4,
+    help="Number of blob batches read concurrently ahead of a sequential "
+    "reader of a file in the file store. 0 disables read-ahead and makes "
+    "readers fetch blobs synchronously.")
+
+config_lib.DEFINE_integer(
+    "Server.blob_read_ahead_batch_size",
+    16,
+    help="Number of blobs fetched from the blob store with a single "
+    "ReadBlobs call when streaming files from the file store.")
+
+config_lib.DEFINE_integer(
+    "Server.blob_read_ahead_max_bytes",
+    64 * 1024 * 1024,
+    help="Upper bound on the size of blobs that were read ahead but not yet "
+    "consumed by a single file store reader. At least one batch is always "
+    "read, regardless of its size.")
+
 # Data retention policies.
 config_lib.DEFINE_semantic_value(
     rdfvalue.Duration,
@@ -99,6 +99,13 @@ class RDFValue(metaclass=RDFValueMetaclass):  # pylint: disable=invalid-metaclas
   def __copy__(self):
     return self.Copy()
 
+  def __getstate__(self):
+    # Hashes of bytes and strings differ between processes, so a hash computed
+    # before pickling must not be compared against one computed after.
+    state = self.__dict__.copy()
+    state.pop("_prev_hash", None)
+    return state
+
   @classmethod
   def FromWireFormat(cls, value):
     raise NotImplementedError(
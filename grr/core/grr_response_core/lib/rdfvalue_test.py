@@ -3,6 +3,7 @@
 
 
 import datetime
+import pickle
 import sys
 import unittest
 
@@ -33,6 +34,14 @@ class RDFValueTest(absltest.TestCase):
     self.assertEqual(str(rdfvalue.RDFInteger(1)), "1")
     self.assertEqual(str(rdfvalue.RDFString(long_string)), long_string)
 
+  def testPickleDropsHash(self):
+    value = rdfvalue.RDFBytes(b"foo")
+    hash(value)
+
+    unpickled = pickle.loads(pickle.dumps(value))
+    self.assertIsNone(unpickled._prev_hash)
+    self.assertEqual(unpickled, value)
+
   # TODO(hanuszczak): Current implementation of `repr` for RDF values is broken
   # and not in line with Python guidelines. For example, `repr` should be
   # unambiguous whereas current implementation will trim long representations
@@ -2,14 +2,19 @@
 """This module tests the RDFValue implementation for performance."""
 
 from typing import Text
+from unittest import mock
 
 from absl import app
 
 from grr_response_core.lib import type_info
 from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_proto import jobs_pb2
 from grr_response_proto import knowledge_base_pb2
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr.test_lib import benchmark_test_lib
 from grr.test_lib import test_lib
 
@@ -340,6 +345,100 @@ class RDFValueBenchmark(benchmark_test_lib.AverageMicroBenchmarks):
     self.TimeIt(RDFStructDecodeEncode)
     self.TimeIt(ProtoDecodeEncode)
 
+  def _StatEntry(self):
+    return rdf_client_fs.StatEntry(
+        pathspec=rdf_paths.PathSpec.OS(path="/home/user/.bash_history"),
+        st_mode=0o100644,
+        st_ino=1337,
+        st_dev=64769,
+        st_nlink=1,
+        st_uid=1000,
+        st_gid=1000,
+        st_size=4096,
+        st_atime=1600000000,
+        st_mtime=1600000001,
+        st_ctime=1600000002,
+        st_blocks=8,
+        st_blksize=4096)
+
+  def _TimeProtobufCodec(self, cls, value, access_fn, modify_fn):
+    """Times decode/encode cycles with and without the protobuf codec."""
+    data = value.SerializeToBytes()
+
+    def DecodeEncode():
+      new_value = cls.FromSerializedBytes(data)
+      access_fn(new_value)
+      return len(new_value.SerializeToBytes())
+
+    def DecodeModifyEncode():
+      new_value = cls.FromSerializedBytes(data)
+      access_fn(new_value)
+      modify_fn(new_value)
+      return len(new_value.SerializeToBytes())
+
+    rdf_structs.EnableProtobufCodec()
+    self.addCleanup(rdf_structs.EnableProtobufCodec, False)
+
+    for use_protobuf_codec in [False, True]:
+      with mock.patch.object(cls, "use_protobuf_codec", use_protobuf_codec):
+        new_value = cls.FromSerializedBytes(data)
+        access_fn(new_value)
+        self.assertEqual(new_value.SerializeToBytes(), data)
+        self.assertEqual(new_value, value)
+
+        mode = "protobuf codec" if use_protobuf_codec else "RDFStruct"
+        self.TimeIt(DecodeEncode,
+                    "%s decode/encode (%s)" % (cls.__name__, mode))
+        self.TimeIt(DecodeModifyEncode,
+                    "%s decode/modify/encode (%s)" % (cls.__name__, mode))
+
+  def testProtobufCodecGrrMessage(self):
+    message = rdf_flows.GrrMessage(
+        session_id="aff4:/C.1234567812345678/flows/F:ABCDEF12",
+        request_id=1,
+        response_id=2,
+        name="GetFileStat",
+        task_id=1234,
+        source="C.1234567812345678",
+        payload=self._StatEntry())
+
+    def Access(message):
+      self.assertEqual(message.payload.st_size, 4096)
+
+    def Modify(message):
+      message.response_id = 3
+
+    self._TimeProtobufCodec(rdf_flows.GrrMessage, message, Access, Modify)
+
+  def testProtobufCodecFlowResponse(self):
+    response = rdf_flow_objects.FlowResponse(
+        client_id="C.1234567812345678",
+        flow_id="ABCDEF12",
+        request_id=1,
+        response_id=2,
+        payload=self._StatEntry())
+
+    def Access(response):
+      self.assertEqual(response.payload.st_size, 4096)
+
+    def Modify(response):
+      response.response_id = 3
+
+    self._TimeProtobufCodec(rdf_flow_objects.FlowResponse, response, Access,
+                            Modify)
+
+  def testProtobufCodecStatEntry(self):
+
+    def Access(stat_entry):
+      self.assertEqual(stat_entry.st_mtime, 1600000001)
+      self.assertEqual(stat_entry.pathspec.path, "/home/user/.bash_history")
+
+    def Modify(stat_entry):
+      stat_entry.st_size = 42
+
+    self._TimeProtobufCodec(rdf_client_fs.StatEntry, self._StatEntry(), Access,
+                            Modify)
+
 
 def main(argv):
   # Run the full test suite
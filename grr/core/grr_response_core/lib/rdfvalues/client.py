@@ -125,6 +125,9 @@ class ClientURN(rdfvalue.RDFURN):
     return rdfvalue.RDFURN(utils.JoinPath(self._value, path))
 
 
+rdf_structs.RegisterImmutableType(ClientURN)
+
+
 class PCIDevice(rdf_structs.RDFProtoStruct):
   """A PCI device on the client.
 
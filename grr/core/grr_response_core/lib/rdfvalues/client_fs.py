@@ -164,6 +164,11 @@ class StatExtFlagsLinux(rdfvalue.RDFInteger):
   protobuf_type = "unsigned_integer_32"
 
 
+rdf_structs.RegisterImmutableType(StatMode)
+rdf_structs.RegisterImmutableType(StatExtFlagsOsx)
+rdf_structs.RegisterImmutableType(StatExtFlagsLinux)
+
+
 class ExtAttr(rdf_structs.RDFProtoStruct):
   """An RDF value representing an extended attributes of a file."""
 
@@ -173,6 +178,7 @@ class ExtAttr(rdf_structs.RDFProtoStruct):
 class StatEntry(rdf_structs.RDFProtoStruct):
   """Represent an extended stat response."""
   protobuf = jobs_pb2.StatEntry
+  use_protobuf_codec = True
   rdf_deps = [
       rdf_protodict.DataBlob,
       rdf_paths.PathSpec,
@@ -19,6 +19,7 @@ from grr_response_proto import jobs_pb2
 class GrrMessage(rdf_structs.RDFProtoStruct):
   """An RDFValue class to manage GRR messages."""
   protobuf = jobs_pb2.GrrMessage
+  use_protobuf_codec = True
   rdf_deps = [
       rdf_protodict.EmbeddedRDFValue,
       rdfvalue.FlowSessionID,
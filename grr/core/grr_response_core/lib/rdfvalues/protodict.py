@@ -319,6 +319,10 @@ class Dict(rdf_structs.RDFProtoStruct):
     self.dat = self._values.values()  # pytype: disable=annotation-type-mismatch
     return super()._CopyRawData()
 
+  def _DeepCopyRawData(self, container):
+    self.dat = self._values.values()  # pytype: disable=annotation-type-mismatch
+    return super()._DeepCopyRawData(container)
+
   def SetRawData(self, raw_data):
     super().SetRawData(raw_data)
     self._values = {}
@@ -24,10 +24,10 @@ class RegularExpression(rdfvalue.RDFString):
   def __init__(self, initializer=None):
     super().__init__(initializer=initializer)
     # Try compiling the pattern right away to fail fast for pattern errors.
-    self._Regex()
+    self._regex = re.compile(self._value, flags=re.I | re.S | re.M)
 
   def _Regex(self):
-    return re.compile(self._value, flags=re.I | re.S | re.M)
+    return self._regex
 
   def Search(self, text):
     """Search the text for our value."""
@@ -162,7 +162,7 @@ class ClientResourcesStats(rdf_structs.RDFProtoStruct):
 
   def __getstate__(self):
     # We can't pickle the lock.
-    res = self.__dict__.copy()
+    res = super().__getstate__()
     del res["lock"]
     return res
 
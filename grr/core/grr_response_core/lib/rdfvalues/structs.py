@@ -10,6 +10,8 @@ import struct
 from typing import ByteString, Iterator, Optional, Sequence, Text, Type, TypeVar, cast
 
 from google.protobuf import any_pb2
+from google.protobuf import descriptor as proto2_descriptor
+from google.protobuf import message_factory
 from google.protobuf import wrappers_pb2
 from google.protobuf import message as proto2_message
 from google.protobuf import text_format
@@ -22,6 +24,20 @@ from grr_response_core.lib.rdfvalues import proto2 as rdf_proto2
 from grr_response_core.lib.util import precondition
 from grr_response_proto import semantic_pb2
 
+# The unknown fields API and `GetMessageClass` are only available since
+# protobuf 4.21, older versions (which GRR still supports) expose the same
+# information through deprecated methods.
+try:
+  from google.protobuf import unknown_fields  # pylint: disable=g-import-not-at-top
+except ImportError:
+  unknown_fields = None
+
+_MESSAGE_FACTORY = message_factory.MessageFactory()
+
+# Whether structs setting `use_protobuf_codec` are parsed with the generated
+# protobuf classes (see `EnableProtobufCodec`).
+_protobuf_codec_enabled = False
+
 
 # pylint: disable=invalid-name
 VarintEncode = _semantic.varint_encode
@@ -104,6 +120,138 @@ def _SerializeEntries(entries):
   return b"".join(output)
 
 
+def EnableProtobufCodec(enabled: bool = True) -> None:
+  """Enables or disables the protobuf codec (see `RDFStruct.use_protobuf_codec`).
+
+  The codec is disabled by default. Servers enable it on startup if the
+  `Server.protobuf_codec` config option is set.
+
+  Args:
+    enabled: Whether structs setting `use_protobuf_codec` use the codec.
+  """
+  global _protobuf_codec_enabled
+  _protobuf_codec_enabled = enabled
+
+
+def _GetMessageClass(descriptor):
+  """Returns the generated class of the protobuf message descriptor."""
+  if hasattr(message_factory, "GetMessageClass"):
+    return message_factory.GetMessageClass(descriptor)
+
+  return _MESSAGE_FACTORY.GetPrototype(descriptor)
+
+
+def _HasUnknownFields(message) -> bool:
+  """Checks whether the parsed protobuf message has any unknown fields."""
+  if unknown_fields is not None:
+    return bool(unknown_fields.UnknownFieldSet(message))
+
+  return bool(message.UnknownFields())
+
+
+def _ProtoValueWireFormat(field, value):
+  """Encodes a single value of a parsed protobuf field into the wire format.
+
+  Args:
+    field: A descriptor of the protobuf field the value belongs to.
+    value: A value of the field (or an element of a repeated field).
+
+  Returns:
+    The wire format representation of the value (as used by `ReadIntoObject`).
+  """
+  message = _GetMessageClass(field.containing_type)()
+  container = getattr(message, field.name)
+
+  if field.label == proto2_descriptor.FieldDescriptor.LABEL_REPEATED:
+    if field.type == proto2_descriptor.FieldDescriptor.TYPE_MESSAGE:
+      container.add().CopyFrom(value)
+    else:
+      container.append(value)
+  elif field.type == proto2_descriptor.FieldDescriptor.TYPE_MESSAGE:
+    container.CopyFrom(value)
+  else:
+    setattr(message, field.name, value)
+
+  (wire_format,) = SplitBuffer(message.SerializeToString())
+  return wire_format
+
+
+# Types of field values that can not be modified in place (see
+# `RegisterImmutableType`). Only exact classes are listed, since subclasses may
+# add mutable state.
+_IMMUTABLE_TYPES = {
+    bool,
+    bytes,
+    float,
+    int,
+    str,
+    type(None),
+    rdfvalue.RDFBytes,
+    rdfvalue.RDFString,
+    rdfvalue.HashDigest,
+    rdfvalue.RDFInteger,
+    rdfvalue.ByteSize,
+    rdfvalue.RDFDatetime,
+    rdfvalue.RDFDatetimeSeconds,
+    rdfvalue.Duration,
+    rdfvalue.DurationSeconds,
+    rdfvalue.RDFURN,
+    rdfvalue.SessionID,
+    rdfvalue.FlowSessionID,
+}
+
+
+def RegisterImmutableType(cls):
+  """Marks values of the class as safe to share between copies of structs.
+
+  Args:
+    cls: A class whose instances can not be modified after construction.
+      Subclasses are not affected and have to be registered on their own.
+  """
+  _IMMUTABLE_TYPES.add(cls)
+
+
+def _IsImmutable(value):
+  """Checks whether a python format value can not be modified in place."""
+  return value.__class__ in _IMMUTABLE_TYPES
+
+
+def _CopyValue(value):
+  """Makes a shallow copy of a python format value of a field."""
+  if _IsImmutable(value):
+    return value
+
+  return copy.copy(value)
+
+
+def _DeepCopyValue(value, container=None):
+  """Copies a python format value of a field without serializing it.
+
+  Args:
+    value: A python format value of a struct field.
+    container: A struct the copied value will belong to.
+
+  Returns:
+    A copy of the value that shares no mutable state with the original.
+  """
+  if _IsImmutable(value):
+    return value
+
+  if isinstance(value, RDFStruct):
+    return value.DeepCopy()
+
+  if value.__class__ is RepeatedFieldHelper:
+    result = RepeatedFieldHelper(
+        wrapped_list=[(_DeepCopyValue(item), wire_format)
+                      for item, wire_format in value.wrapped_list],
+        type_descriptor=value.type_descriptor,
+        container=container)
+    result.dirty = value.dirty
+    return result
+
+  return copy.deepcopy(value)
+
+
 def ReadIntoObject(buff, index, value_obj, length=0):
   """Reads all tags until the next end group and store in the value_obj."""
   raw_data = value_obj.GetRawData()
@@ -252,6 +400,25 @@ class ProtoType(type_info.TypeInfoObject):
     """
     raise NotImplementedError
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    """Convert a value of a parsed protobuf field into the python format.
+
+    This is used by structs which delegate parsing to the generated protobuf
+    classes (see `RDFStruct.use_protobuf_codec`). Descriptors for hot types
+    override this to convert the value directly, by default the value is
+    re-encoded and passed to ConvertFromWireFormat().
+
+    Args:
+      value: A value of the field as exposed by the protobuf message.
+      field: A protobuf descriptor of the field.
+      container: The protobuf that contains this field.
+
+    Returns:
+      The parameter encoded in the python format representation.
+    """
+    return self.ConvertFromWireFormat(
+        _ProtoValueWireFormat(field, value), container=container)
+
   def ConvertToWireFormat(self, value):
     """Convert the parameter into the internal storage format.
 
@@ -355,6 +522,9 @@ class ProtoString(ProtoType):
     except UnicodeDecodeError:
       raise rdfvalue.DecodeError("Unicode decoding error")
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return value
+
   def ConvertToWireFormat(self, value):
     """Internally strings are utf8 encoded."""
     value = value.encode("utf8")
@@ -403,6 +573,9 @@ class ProtoBinary(ProtoType):
   def ConvertFromWireFormat(self, value, container=None):
     return value[2]
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return value
+
   def ConvertToWireFormat(self, value):
     return (self.encoded_tag, VarintEncode(len(value)), value)
 
@@ -436,6 +609,12 @@ class ProtoUnsignedInteger(ProtoType):
   def ConvertFromWireFormat(self, value, container=None):
     return VarintReader(value[2], 0)[0]
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    # Semantic integers are stored in signed fields but read as unsigned.
+    if value < 0:
+      value += 1 << 64
+    return value
+
   def ConvertToWireFormat(self, value):
     return (self.encoded_tag, b"", VarintEncode(value))
 
@@ -463,6 +642,9 @@ class ProtoSignedInteger(ProtoUnsignedInteger):
   def ConvertFromWireFormat(self, value, container=None):
     return SignedVarintReader(value[2])[0]
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return value
+
   def ConvertToWireFormat(self, value):
     return (self.encoded_tag, b"", SignedVarintEncode(value))
 
@@ -483,6 +665,11 @@ class ProtoFixed32(ProtoUnsignedInteger):
   def ConvertFromWireFormat(self, value, container=None):
     return struct.unpack("<L", value[2])[0]
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    # Fixed-width values are not unpacked by the unsigned varint conversion.
+    return ProtoType.ConvertFromProtoValue(
+        self, value, field, container=container)
+
 
 class ProtoFixed64(ProtoFixed32):
   _size = 8
@@ -530,6 +717,9 @@ class ProtoFloat(ProtoFixed32):
   def ConvertFromWireFormat(self, value, container=None):
     return struct.unpack("<f", value[2])[0]
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return value
+
 
 class ProtoDouble(ProtoFixed64):
   """A double.
@@ -550,6 +740,9 @@ class ProtoDouble(ProtoFixed64):
   def ConvertFromWireFormat(self, value, container=None):
     return struct.unpack("<d", value[2])[0]
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return value
+
 
 @functools.total_ordering
 class EnumNamedValue(rdfvalue.RDFPrimitive):
@@ -661,6 +854,9 @@ class EnumNamedValue(rdfvalue.RDFPrimitive):
     return self.id
 
 
+RegisterImmutableType(EnumNamedValue)
+
+
 class ProtoEnum(ProtoSignedInteger):
   """An enum native proto type.
 
@@ -750,6 +946,9 @@ class ProtoEnum(ProtoSignedInteger):
     value = SignedVarintReader(value[2], 0)[0]
     return EnumNamedValue(value, name=self.reverse_enum.get(value))
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return EnumNamedValue(value, name=self.reverse_enum.get(value))
+
 
 class ProtoBoolean(ProtoEnum):
   """A Boolean."""
@@ -778,6 +977,9 @@ class ProtoBoolean(ProtoEnum):
             super(ProtoBoolean,
                   self).ConvertFromWireFormat(value, container=container)))
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return bool(value)
+
   def ConvertToWireFormat(self, value):
     return super().ConvertToWireFormat(bool(value))
 
@@ -832,9 +1034,20 @@ class ProtoEmbedded(ProtoType):
 
     return result
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    """Wraps the parsed message, its fields are converted on access."""
+    protobuf = self.type.protobuf
+    if protobuf is None or value.DESCRIPTOR is not protobuf.DESCRIPTOR:
+      return super().ConvertFromProtoValue(value, field, container=container)
+
+    return self.type._FromParsedProto(value)  # pylint: disable=protected-access
+
   def ConvertToWireFormat(self, value):
     """Encode the nested protobuf into wire format."""
-    output = _SerializeEntries(_GetOrderedEntries(value.GetRawData()))
+    if value._proto is not None:  # pylint: disable=protected-access
+      output = value._SerializeProto()  # pylint: disable=protected-access
+    else:
+      output = _SerializeEntries(_GetOrderedEntries(value.GetRawData()))
     return (self.encoded_tag, VarintEncode(len(output)), output)
 
   def LateBind(self, target=None):
@@ -867,6 +1080,9 @@ class ProtoEmbedded(ProtoType):
     if proto.dirty:
       return True
 
+    if proto._ProtoIsCurrent():  # pylint: disable=protected-access
+      return False
+
     for python_format, _, type_descriptor in proto.GetRawData().values():
       if python_format is not None and type_descriptor.IsDirty(python_format):
         proto.dirty = True
@@ -934,6 +1150,9 @@ class ProtoDynamicEmbedded(ProtoType):
     """The wire format is simply a string."""
     return serialization.FromBytes(self._type(container), value[2])
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return serialization.FromBytes(self._type(container), value)
+
   def ConvertToWireFormat(self, value):
     """Encode the nested protobuf into wire format."""
     data = serialization.ToBytes(value)
@@ -991,6 +1210,13 @@ class ProtoDynamicAnyValueEmbedded(ProtoDynamicEmbedded):
     """The wire format is an AnyValue message."""
     result = AnyValue()
     ReadIntoObject(value[2], 0, result)
+    return self._Unpack(result, container)
+
+  def ConvertFromProtoValue(self, value, field, container=None):
+    return self._Unpack(value, container)
+
+  def _Unpack(self, result, container):
+    """Unpacks an `AnyValue` (or a parsed `Any` message) into its value."""
     if self._type is not None:
       converted_value = self._type(container)
     else:
@@ -1077,6 +1303,11 @@ class ProtoAnyValue(ProtoType):
 
     return AnyValue.FromSerializedBytes(value[2])
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    del field, container  # Unused.
+
+    return AnyValue._FromParsedProto(value)  # pylint: disable=protected-access
+
   def ConvertToWireFormat(self, value):
     precondition.AssertType(value, AnyValue)
 
@@ -1163,12 +1394,14 @@ class RepeatedFieldHelper(abc.Sequence, object):
             (self.type_descriptor.proto_type_name, type(rdf_value), e))
 
     self.wrapped_list.append((rdf_value, wire_format))
+    self.dirty = True
 
     return rdf_value
 
   def Pop(self, item):
     result = self[item]
     self.wrapped_list.pop(item)
+    self.dirty = True
     return result
 
   def Extend(self, iterable):
@@ -1314,6 +1547,16 @@ class ProtoList(ProtoType):
 
     return result
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    result = RepeatedFieldHelper(
+        type_descriptor=self.delegate, container=container)
+    for item in value:
+      item = self.delegate.ConvertFromProtoValue(
+          item, field, container=container)
+      result.wrapped_list.append((item, None))
+
+    return result
+
   def ConvertToWireFormat(self, value):
     """Convert to the wire format.
 
@@ -1499,6 +1742,12 @@ class ProtoRDFValue(ProtoType):
 
     return result
 
+  def ConvertFromProtoValue(self, value, field, container=None):
+    value = self.primitive_desc.ConvertFromProtoValue(
+        value, field, container=container)
+
+    return self.type(value)
+
   def ConvertToWireFormat(self, value):
     return self.primitive_desc.ConvertToWireFormat(
         value.SerializeToWireFormat())
@@ -1609,12 +1858,26 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
   # This is where the type infos are constructed.
   type_infos: type_info.TypeDescriptorSet = None
 
+  # If set and the codec is enabled (see `EnableProtobufCodec`),
+  # `FromSerializedBytes` parses data with the `protobuf` class (which is backed
+  # by the C++ implementation) and fields are converted on access. Serializing
+  # an unmodified struct then also delegates to the `protobuf`.
+  use_protobuf_codec = False
+
   # Mark as dirty each time we modify this object.
   dirty = False
 
   # Stores the raw data here.
   _data = None
 
+  # A parsed protobuf message backing this struct (see `use_protobuf_codec`).
+  # Fields of the message are converted into the raw data on first access and
+  # fields that are set are removed from it. The message may be shared with
+  # copies of the struct (or be a part of its parent's message) and is copied
+  # before it is modified, unless the struct owns it.
+  _proto = None
+  _owns_proto = False
+
   def __init__(self, initializer=None, **kwargs):
     super().__init__()
 
@@ -1658,6 +1921,12 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     Args:
       other: An instance of the same type of this class.
     """
+    if other._ProtoIsCurrent():  # pylint: disable=protected-access
+      self._data = {}
+      self._proto = other._proto  # pylint: disable=protected-access
+      other._owns_proto = False  # pylint: disable=protected-access
+      return
+
     self._data = {}
     for name, (obj, serialized, t_info) in other.GetRawData().items():
       if serialized is None:
@@ -1668,10 +1937,140 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
   def Clear(self):
     """Clear all the fields."""
     self._data = {}
+    self._proto = None
 
   def HasField(self, field_name):
     """Checks if the field exists."""
-    return field_name in self._data
+    if field_name in self._data:
+      return True
+
+    return self._proto is not None and self._ProtoField(field_name) is not None
+
+  @classmethod
+  def _FromParsedProto(cls, message, owned=False):
+    """Creates an instance backed by a parsed protobuf message."""
+    instance = cls()
+
+    # Unknown fields are only preserved (and reported) by the raw data, so such
+    # messages (and instances initialized with values) are read the usual way.
+    if instance._data or _HasUnknownFields(message):
+      ReadIntoObject(message.SerializeToString(), 0, instance)
+    else:
+      instance._proto = message
+      instance._owns_proto = owned
+
+    return instance
+
+  def _ProtoField(self, attr):
+    """Returns the descriptor of the field if it is set in the parsed proto."""
+    field = self._proto.DESCRIPTOR.fields_by_name.get(attr)
+    if field is None:
+      return None
+
+    # Repeated fields and proto3 scalars are only serialized if non-empty.
+    if field.has_presence:
+      if not self._proto.HasField(attr):
+        return None
+    elif not getattr(self._proto, attr):
+      return None
+
+    return field
+
+  def _ReadProtoField(self, attr):
+    """Converts the field of the parsed proto into the raw data."""
+    field = self._ProtoField(attr)
+    if field is None:
+      return None
+
+    type_descriptor = self._GetTypeDescriptor(attr)
+    python_format = type_descriptor.ConvertFromProtoValue(
+        getattr(self._proto, attr), field, container=self)
+
+    entry = (python_format, None, type_descriptor)
+    self._data[attr] = entry
+    return entry
+
+  def _ClearProtoField(self, attr):
+    """Removes a field that is being set from the parsed proto."""
+    if self._ProtoField(attr) is None:
+      return
+
+    if not self._owns_proto:
+      message = self._proto.__class__()
+      message.CopyFrom(self._proto)
+      self._proto = message
+      self._owns_proto = True
+
+    self._proto.ClearField(attr)
+
+  def _IsProtoEntryCurrent(self, attr, python_format):
+    """Checks whether the parsed proto still represents the raw data entry."""
+    if python_format.__class__ is RepeatedFieldHelper:
+      if python_format.dirty:
+        return False
+      # Empty repeated fields are not serialized at all.
+      if not python_format.wrapped_list:
+        return True
+
+    # Other fields set on the struct are removed from the parsed proto, so
+    # fields still in it hold values converted from it. These can only change
+    # by mutating nested structs or repeated fields.
+    if self._ProtoField(attr) is None:
+      return False
+
+    if isinstance(python_format, RDFStruct):
+      return python_format._ProtoIsCurrent()  # pylint: disable=protected-access
+
+    if python_format.__class__ is RepeatedFieldHelper:
+      for item, _ in python_format.wrapped_list:
+        if (isinstance(item, RDFStruct) and
+            not item._ProtoIsCurrent()):  # pylint: disable=protected-access
+          return False
+
+    return True
+
+  def _ProtoIsCurrent(self):
+    """Checks whether the parsed proto fully represents this struct."""
+    if self._proto is None:
+      return False
+
+    for attr, (python_format, _, _) in self._data.items():
+      if not self._IsProtoEntryCurrent(attr, python_format):
+        return False
+
+    return True
+
+  def _SerializeProto(self):
+    """Serializes the struct by merging changed fields into the parsed proto."""
+    changed = {}
+    for attr, entry in self._data.items():
+      if not self._IsProtoEntryCurrent(attr, entry[0]):
+        changed[attr] = entry
+
+    if not changed:
+      return self._proto.SerializeToString()
+
+    message = self._proto.__class__()
+    message.CopyFrom(self._proto)
+    for attr in changed:
+      if attr in message.DESCRIPTOR.fields_by_name:
+        message.ClearField(attr)
+
+    message.MergeFromString(_SerializeEntries(_GetOrderedEntries(changed)))
+    return message.SerializeToString()
+
+  def _DropProto(self):
+    """Reads the fields of the parsed proto that were not accessed yet."""
+    message = self._proto
+    if message is None:
+      return
+
+    self._proto = None
+    self._owns_proto = False
+    converted = self._data
+    self._data = {}
+    ReadIntoObject(message.SerializeToString(), 0, self)
+    self._data.update(converted)
 
   def _CopyRawData(self):
     new_raw_data = {}
@@ -1687,11 +2086,11 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     # flag. Type_infos can be just copied by reference.
     for name, (obj, serialized, t_info) in self._data.items():
       if serialized is None:
-        obj = copy.copy(obj)
+        obj = _CopyValue(obj)
       else:
         try:
           if t_info.IsDirty(obj):
-            obj, serialized = copy.copy(obj), None
+            obj, serialized = _CopyValue(obj), None
           else:
             obj = None
         except AttributeError:
@@ -1704,14 +2103,82 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     """Make an efficient copy of this protobuf."""
     result = self.__class__()
     result.SetRawData(self._CopyRawData())
+    # The parsed proto is shared, it is copied before any of them modifies it.
+    result._proto = self._proto  # pylint: disable=protected-access
+    self._owns_proto = False
     return result
 
-  def __deepcopy__(self, memo):
-    result = self.__class__()
-    result.SetRawData(copy.deepcopy(self._data, memo))
+  def _DeepCopyRawData(self, container):
+    """Copies entries of `_data` for a deep copy of this struct.
+
+    Args:
+      container: The struct the copied entries will belong to.
+
+    Returns:
+      A new raw data dictionary.
+    """
+    new_raw_data = {}
+
+    for name, entry in self._data.items():
+      obj, serialized, t_info = entry
+
+      # Fields that still match the (shared) parsed proto are read from it
+      # again on access.
+      if (self._proto is not None and
+          self._IsProtoEntryCurrent(name, obj)):
+        continue
+
+      # Entries are immutable tuples, so they are shared unless they hold a
+      # mutable value. Such values of clean entries are parsed again from the
+      # (immutable) serialized form on access (just like in `Copy`).
+      if serialized is not None:
+        try:
+          dirty = t_info.IsDirty(obj)
+        except AttributeError:
+          dirty = False
+
+        if not dirty:
+          if not _IsImmutable(obj):
+            entry = (None, serialized, t_info)
+          new_raw_data[name] = entry
+          continue
+
+        entry = (obj, None, t_info)
 
+      # Integers assigned to floating point fields are parsed back as floats,
+      # so copies match what a serialization round trip would produce.
+      if (obj.__class__ is int and
+          isinstance(t_info, (ProtoFloat, ProtoDouble))):
+        entry = (float(obj), None, t_info)
+
+      if not _IsImmutable(obj):
+        entry = (_DeepCopyValue(obj, container=container), None, t_info)
+      new_raw_data[name] = entry
+
+    return new_raw_data
+
+  def DeepCopy(self: T) -> T:
+    """Makes a copy of this struct that shares no mutable state with it.
+
+    Unlike `Copy`, nested structs and repeated fields are copied as well. Unlike
+    a serialization round trip, nothing is serialized or parsed: clean fields
+    share their serialized form (or the parsed proto), immutable values (see
+    `RegisterImmutableType`) are shared and other values are copied.
+
+    Returns:
+      A deep copy of this struct.
+    """
+    result = self.__class__()
+    result.SetRawData(self._DeepCopyRawData(result))
+    # The parsed proto is shared, it is copied before any of them modifies it.
+    result._proto = self._proto  # pylint: disable=protected-access
+    self._owns_proto = False
     return result
 
+  def __deepcopy__(self, memo):
+    del memo  # Unused.
+    return self.DeepCopy()
+
   def GetRawData(self):
     """Retrieves the raw python representation of the object.
 
@@ -1720,6 +2187,7 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     Returns:
       the raw python object representation (a dict).
     """
+    self._DropProto()
     return self._data
 
   def ListSetFields(self):
@@ -1729,19 +2197,42 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
       a tuple of (type_descriptor, value) for each field which is set.
     """
     for type_descriptor in self.type_infos:
-      if type_descriptor.name in self._data:
+      if self.HasField(type_descriptor.name):
         yield type_descriptor, self.Get(type_descriptor.name)
 
   def SetRawData(self, data):
     self._data = data
+    self._proto = None
+    self._owns_proto = False
     self.dirty = True
 
   def SerializeToBytes(self):
+    if self._proto is not None:
+      return self._SerializeProto()
+
     return _SerializeEntries(_GetOrderedEntries(self._data))
 
+  @classmethod
+  def UsesProtobufCodec(cls) -> bool:
+    """Checks whether instances are parsed with the generated protobuf class."""
+    return (_protobuf_codec_enabled and cls.use_protobuf_codec and
+            cls.protobuf is not None)
+
   @classmethod
   def FromSerializedBytes(cls, value: bytes):
     precondition.AssertType(value, bytes)
+
+    if cls.UsesProtobufCodec():
+      try:
+        message = cls.protobuf.FromString(value)
+      except proto2_message.DecodeError:
+        # Fall back to the pure Python parser which reports errors as before.
+        pass
+      else:
+        instance = cls._FromParsedProto(message, owned=True)
+        instance.dirty = True
+        return instance
+
     instance = cls()
 
     try:
@@ -1822,6 +2313,8 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
     """Validate the value and set the attribute with it."""
     attr = type_descriptor.name
     prev_value = self.Get(attr, allow_set_default=False)
+    if self._proto is not None:
+      self._ClearProtoField(attr)
 
     # A value of None means we clear the field.
     if value is None:
@@ -1876,6 +2369,9 @@ class RDFStruct(rdfvalue.RDFValue, metaclass=RDFStructMetaclass):  # pylint: dis
       The attribute's value, or the attribute's type's default value, if unset.
     """
     entry = self._data.get(attr)
+    if entry is None and self._proto is not None:
+      entry = self._ReadProtoField(attr)
+
     # We don't have this field, try the defaults.
     if entry is None:
       type_descriptor = self._GetTypeDescriptor(attr)
@@ -2077,6 +2573,9 @@ class RDFProtoStruct(RDFStruct):
         return value
 
   def __bool__(self):
+    if self._proto is not None and self._proto.ListFields():
+      return True
+
     return bool(self._data)
 
   @classmethod
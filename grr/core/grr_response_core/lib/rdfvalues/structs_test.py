@@ -5,6 +5,7 @@
 import base64
 import random
 from typing import Text
+from unittest import mock
 
 from absl import app
 from absl.testing import absltest
@@ -19,6 +20,7 @@ from grr_response_core.lib.rdfvalues import client_network as rdf_client_network
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.rdfvalues import test_base as rdf_test_base
 from grr_response_proto import tests_pb2
@@ -1101,6 +1103,354 @@ class NoDynamicTypeLookupTest(absltest.TestCase):
     self.assertEqual(proto.any.value, b"quux")
 
 
+class ProtobufCodecTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    rdf_structs.EnableProtobufCodec()
+    self.addCleanup(rdf_structs.EnableProtobufCodec, False)
+
+  def _StatEntry(self):
+    return rdf_client_fs.StatEntry(
+        pathspec=rdf_paths.PathSpec.OS(path="/foo/bar"),
+        st_mode=0o100644,
+        st_size=1337,
+        st_mtime=1600000000,
+        registry_type=rdf_client_fs.StatEntry.RegistryType.REG_SZ,
+        symlink="/baz",
+        ext_attrs=[
+            rdf_client_fs.ExtAttr(name=b"user.foo", value=b"bar"),
+            rdf_client_fs.ExtAttr(name=b"user.baz", value=b"quux"),
+        ])
+
+  def _Parse(self, data, use_protobuf_codec=True):
+    with mock.patch.object(rdf_client_fs.StatEntry, "use_protobuf_codec",
+                           use_protobuf_codec):
+      return rdf_client_fs.StatEntry.FromSerializedBytes(data)
+
+  def _AssertRoundTripsMatch(self, value, modify_fn):
+    """Checks that the codec and pure Python parsing give the same results."""
+    cls = value.__class__
+    self.assertTrue(cls.use_protobuf_codec)
+    data = value.SerializeToBytes()
+
+    with mock.patch.object(cls, "use_protobuf_codec", False):
+      expected = cls.FromSerializedBytes(data)
+    result = cls.FromSerializedBytes(data)
+
+    self.assertIsNotNone(result._proto)  # pylint: disable=protected-access
+    self.assertEqual(result.SerializeToBytes(), data)
+    self.assertEqual(result.ToPrimitiveDict(), expected.ToPrimitiveDict())
+    self.assertEqual(result, expected)
+
+    modify_fn(expected)
+    modify_fn(result)
+    self.assertEqual(result.SerializeToBytes(), expected.SerializeToBytes())
+
+    with mock.patch.object(cls, "use_protobuf_codec", False):
+      expected = cls.FromSerializedBytes(expected.SerializeToBytes())
+    result = cls.FromSerializedBytes(result.SerializeToBytes())
+    self.assertEqual(result.ToPrimitiveDict(), expected.ToPrimitiveDict())
+
+  def testIsOnlyUsedWhenEnabled(self):
+    data = self._StatEntry().SerializeToBytes()
+    rdf_structs.EnableProtobufCodec(False)
+
+    self.assertFalse(rdf_client_fs.StatEntry.UsesProtobufCodec())
+    stat_entry = rdf_client_fs.StatEntry.FromSerializedBytes(data)
+    self.assertIsNone(stat_entry._proto)  # pylint: disable=protected-access
+    self.assertEqual(stat_entry.st_size, 1337)
+
+  def testStatEntryRoundTripsMatchPurePython(self):
+
+    def Modify(stat_entry):
+      stat_entry.st_size = 42
+      stat_entry.pathspec.nested_path.path = "/baz"
+      stat_entry.ext_attrs[0].value = b"norf"
+
+    self._AssertRoundTripsMatch(self._StatEntry(), Modify)
+
+  def testGrrMessageRoundTripsMatchPurePython(self):
+
+    def Modify(message):
+      message.response_id = 3
+      message.payload.pathspec.path = "/foo/baz"
+
+    message = rdf_flows.GrrMessage(
+        session_id="aff4:/C.1234567812345678/flows/F:ABCDEF12",
+        request_id=1,
+        response_id=2,
+        name="GetFileStat",
+        task_id=1234,
+        source="C.1234567812345678",
+        type=rdf_flows.GrrMessage.Type.STATUS,
+        payload=self._StatEntry())
+    self._AssertRoundTripsMatch(message, Modify)
+
+  def testFlowResponseRoundTripsMatchPurePython(self):
+
+    def Modify(response):
+      response.response_id = 3
+      response.tag = None
+
+    response = rdf_flow_objects.FlowResponse(
+        client_id="C.1234567812345678",
+        flow_id="ABCDEF12",
+        request_id=1,
+        response_id=2,
+        hunt_id="ABCDEF12",
+        tag="foo",
+        payload=self._StatEntry())
+    self._AssertRoundTripsMatch(response, Modify)
+
+  def testModifiedDynamicPayloadIsSerialized(self):
+    response = rdf_flow_objects.FlowResponse(
+        request_id=1, response_id=2, payload=self._StatEntry())
+    response = rdf_flow_objects.FlowResponse.FromSerializedBytes(
+        response.SerializeToBytes())
+
+    # Unlike with pure Python parsing, where changes to a parsed payload are
+    # only serialized if the payload is set again.
+    response.payload.ext_attrs.Append(name=b"user.thud", value=b"blargh")
+
+    response = rdf_flow_objects.FlowResponse.FromSerializedBytes(
+        response.SerializeToBytes())
+    self.assertLen(response.payload.ext_attrs, 3)
+
+  def testRoundTripDoesNotParseFieldsInPython(self):
+    data = self._StatEntry().SerializeToBytes()
+
+    with mock.patch.object(
+        rdf_structs, "ReadIntoObject",
+        wraps=rdf_structs.ReadIntoObject) as read_into_object:
+      stat_entry = self._Parse(data)
+      self.assertEqual(stat_entry.pathspec.path, "/foo/bar")
+      self.assertEqual(stat_entry.ext_attrs[1].value, b"quux")
+      self.assertEqual(stat_entry.SerializeToBytes(), data)
+
+    read_into_object.assert_not_called()
+
+  def testFieldsMatchPurePythonParsing(self):
+    data = self._StatEntry().SerializeToBytes()
+
+    stat_entry = self._Parse(data)
+    expected = self._Parse(data, use_protobuf_codec=False)
+
+    self.assertEqual(stat_entry.st_mode, expected.st_mode)
+    self.assertIsInstance(stat_entry.st_mode, rdf_client_fs.StatMode)
+    self.assertEqual(stat_entry.st_mtime, expected.st_mtime)
+    self.assertIsInstance(stat_entry.st_mtime, rdfvalue.RDFDatetimeSeconds)
+    self.assertEqual(stat_entry.registry_type, expected.registry_type)
+    self.assertEqual(str(stat_entry.registry_type), "REG_SZ")
+    self.assertEqual(stat_entry.symlink, expected.symlink)
+    self.assertEqual(stat_entry.ToPrimitiveDict(), expected.ToPrimitiveDict())
+    self.assertEqual(stat_entry, expected)
+
+  def testUnsetFieldsAreNotReported(self):
+    data = rdf_client_fs.StatEntry(st_size=1).SerializeToBytes()
+    stat_entry = self._Parse(data)
+
+    self.assertTrue(stat_entry.HasField("st_size"))
+    self.assertFalse(stat_entry.HasField("st_mode"))
+    self.assertFalse(stat_entry.HasField("ext_attrs"))
+    self.assertEqual(stat_entry.st_mode, 0)
+    self.assertEqual(
+        [desc.name for desc, _ in stat_entry.ListSetFields()], ["st_size"])
+
+  def testModificationsMatchPurePythonSerialization(self):
+
+    def Modify(stat_entry):
+      stat_entry.st_size = 42
+      stat_entry.symlink = None
+      stat_entry.pathspec.path = "/foo/baz"
+      stat_entry.ext_attrs.Append(name=b"user.thud", value=b"blargh")
+      stat_entry.st_ino = 1
+
+    data = self._StatEntry().SerializeToBytes()
+
+    stat_entry = self._Parse(data)
+    Modify(stat_entry)
+    expected = self._Parse(data, use_protobuf_codec=False)
+    Modify(expected)
+
+    self.assertEqual(stat_entry.SerializeToBytes(), expected.SerializeToBytes())
+    self.assertFalse(stat_entry.HasField("symlink"))
+
+  def testModifiedNestedFieldIsSerialized(self):
+    stat_entry = self._Parse(self._StatEntry().SerializeToBytes())
+    stat_entry.ext_attrs[0].value = b"norf"
+
+    stat_entry = self._Parse(stat_entry.SerializeToBytes())
+    self.assertEqual(stat_entry.ext_attrs[0].value, b"norf")
+    self.assertEqual(stat_entry.ext_attrs[1].value, b"quux")
+
+  def testCopiesAreIndependent(self):
+    stat_entry = self._Parse(self._StatEntry().SerializeToBytes())
+    copy = stat_entry.Copy()
+
+    copy.st_size = 1
+    stat_entry.st_size = 2
+
+    self.assertEqual(self._Parse(copy.SerializeToBytes()).st_size, 1)
+    self.assertEqual(self._Parse(stat_entry.SerializeToBytes()).st_size, 2)
+
+  def testUnknownFieldsArePreserved(self):
+    # Field 1000 with varint value 1 is not known to the `StatEntry` proto.
+    data = self._StatEntry().SerializeToBytes() + b"\xc0\x3e\x01"
+
+    stat_entry = self._Parse(data)
+
+    self.assertEqual(stat_entry.st_size, 1337)
+    self.assertEqual(stat_entry.SerializeToBytes(), data)
+
+  def testDeepCopiesAreIndependent(self):
+    stat_entry = self._Parse(self._StatEntry().SerializeToBytes())
+    stat_entry.ext_attrs[0].value = b"norf"
+    copy = stat_entry.DeepCopy()
+
+    copy.ext_attrs[0].value = b"thud"
+    stat_entry.pathspec.path = "/foo/baz"
+
+    copy = self._Parse(copy.SerializeToBytes())
+    self.assertEqual(copy.ext_attrs[0].value, b"thud")
+    self.assertEqual(copy.pathspec.path, "/foo/bar")
+    stat_entry = self._Parse(stat_entry.SerializeToBytes())
+    self.assertEqual(stat_entry.ext_attrs[0].value, b"norf")
+    self.assertEqual(stat_entry.pathspec.path, "/foo/baz")
+
+
+class DeepCopyTest(absltest.TestCase):
+
+  def _StatEntry(self):
+    return rdf_client_fs.StatEntry(
+        pathspec=rdf_paths.PathSpec.OS(path="/foo/bar"),
+        st_size=1337,
+        st_mtime=1600000000,
+        ext_attrs=[
+            rdf_client_fs.ExtAttr(name=b"user.foo", value=b"bar"),
+            rdf_client_fs.ExtAttr(name=b"user.baz", value=b"quux"),
+        ])
+
+  def testCopyIsEqual(self):
+    stat_entry = self._StatEntry()
+    copy = stat_entry.DeepCopy()
+
+    self.assertIsNot(copy, stat_entry)
+    self.assertEqual(copy, stat_entry)
+    self.assertEqual(copy.SerializeToBytes(), stat_entry.SerializeToBytes())
+
+  def testDoesNotSerialize(self):
+    stat_entry = self._StatEntry()
+
+    with mock.patch.object(
+        rdf_client_fs.StatEntry, "SerializeToBytes",
+        side_effect=AssertionError("Serialized.")):
+      copy = stat_entry.DeepCopy()
+      self.assertEqual(copy.pathspec.path, "/foo/bar")
+      self.assertEqual(copy.ext_attrs[1].value, b"quux")
+
+  def testModifyingCopyDoesNotModifyOriginal(self):
+    stat_entry = self._StatEntry()
+    copy = stat_entry.DeepCopy()
+
+    copy.st_size = 42
+    copy.pathspec.path = "/foo/baz"
+    copy.pathspec.nested_path.path = "/quux"
+    copy.ext_attrs[0].value = b"norf"
+    copy.ext_attrs.Append(name=b"user.thud", value=b"blargh")
+
+    self.assertEqual(stat_entry, self._StatEntry())
+
+  def testModifyingOriginalDoesNotModifyCopy(self):
+    stat_entry = self._StatEntry()
+    copy = stat_entry.DeepCopy()
+
+    stat_entry.st_size = 42
+    stat_entry.pathspec.path = "/foo/baz"
+    stat_entry.ext_attrs[0].value = b"norf"
+    stat_entry.ext_attrs.Append(name=b"user.thud", value=b"blargh")
+
+    self.assertEqual(copy, self._StatEntry())
+
+  def testModifyingHeldFieldsDoesNotModifyCopy(self):
+    stat_entry = self._StatEntry()
+    pathspec = stat_entry.pathspec
+    ext_attrs = stat_entry.ext_attrs
+    copy = stat_entry.DeepCopy()
+
+    pathspec.path = "/foo/baz"
+    ext_attrs[0].value = b"norf"
+    ext_attrs.Append(name=b"user.thud", value=b"blargh")
+
+    self.assertEqual(copy, self._StatEntry())
+
+  def testShallowCopiesOfCopiesDoNotModifyCopies(self):
+    copy = self._StatEntry().DeepCopy()
+    copy_of_copy = copy.DeepCopy()
+    shallow_copy = copy.Copy()
+
+    shallow_copy.ext_attrs[0].value = b"norf"
+
+    self.assertEqual(copy_of_copy, self._StatEntry())
+
+  def testCopiesOfCopiesAreIndependent(self):
+    stat_entry = self._StatEntry()
+    copies = [stat_entry.DeepCopy() for _ in range(3)]
+    copies.append(copies[0].DeepCopy())
+
+    for idx, copy in enumerate(copies):
+      copy.pathspec.path = "/foo/%d" % idx
+      copy.ext_attrs[1].value = b"%d" % idx
+
+    self.assertEqual(stat_entry, self._StatEntry())
+    for idx, copy in enumerate(copies):
+      self.assertEqual(copy.pathspec.path, "/foo/%d" % idx)
+      self.assertEqual(copy.ext_attrs[1].value, b"%d" % idx)
+
+  def testRawDataOfCopyIsNotShared(self):
+    stat_entry = self._StatEntry()
+    copy = stat_entry.DeepCopy()
+
+    pathspec = stat_entry.GetRawData()["pathspec"][0]
+    pathspec.path = "/foo/baz"
+
+    self.assertEqual(copy.pathspec.path, "/foo/bar")
+
+  def testReadingCopiedStructDoesNotChangeItsRawData(self):
+    stat_entry = self._StatEntry()
+    stat_entry.DeepCopy()
+    raw_data = dict(stat_entry.GetRawData())
+
+    stat_entry.Get("pathspec")
+    stat_entry.Get("ext_attrs")
+
+    for name, entry in stat_entry.GetRawData().items():
+      self.assertIs(entry, raw_data[name])
+
+  def testCopiesDicts(self):
+    dct = rdf_protodict.Dict(foo=1, bar=[1, 2])
+    copy = dct.DeepCopy()
+
+    copy["foo"] = 2
+    copy["baz"] = 3
+
+    self.assertEqual(dct.ToDict(), {"foo": 1, "bar": [1, 2]})
+    self.assertEqual(copy.ToDict(), {"foo": 2, "bar": [1, 2], "baz": 3})
+
+  def testCopiesDynamicFields(self):
+    response = rdf_flow_objects.FlowResponse(
+        request_id=1, response_id=2, payload=self._StatEntry())
+    copy = response.DeepCopy()
+
+    copy.payload.pathspec.path = "/foo/baz"
+
+    self.assertEqual(response.payload.pathspec.path, "/foo/bar")
+    self.assertEqual(copy.payload.pathspec.path, "/foo/baz")
+    self.assertEqual(
+        rdf_flow_objects.FlowResponse.FromSerializedBytes(
+            copy.SerializeToBytes()).payload.pathspec.path, "/foo/baz")
+
+
 class AnyValueTest(absltest.TestCase):
 
   def testFromProto2(self):
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""Compression of data exchanged between clients and the server.
+
+Both `PackedMessageList` and `DataBlob` messages specify how their payload is
+compressed with a `CompressionType` enum and both enums share their values, so
+codecs are identified by these values here.
+
+Senders compress with the first of their preferred codecs that is available
+and do not compress at all data that looks like it is already compressed (or
+encrypted), as judged by the entropy of a small sample of it. Receivers
+decompress any codec that is available to them.
+"""
+
+import logging
+from typing import Iterable, List, Tuple
+import zlib
+
+from grr_response_proto import jobs_pb2
+
+# Zstandard is an optional dependency: clients and servers without it simply
+# never use (and can't read) data compressed with it.
+try:
+  # pytype: disable=import-error
+  import zstandard  # pylint: disable=g-import-not-at-top
+  # pytype: enable=import-error
+except ImportError:
+  zstandard = None
+
+UNCOMPRESSED = jobs_pb2.DataBlob.UNCOMPRESSED
+ZCOMPRESSION = jobs_pb2.DataBlob.ZCOMPRESSION
+ZSTD = jobs_pb2.DataBlob.ZSTD
+
+# Data shorter than this is never compressed: framing of the compressed data
+# would outweigh anything that could be saved.
+_MIN_COMPRESSIBLE_SIZE = 64
+
+# Entropy of data is estimated from this many evenly spaced windows of it. Data
+# that is not much larger than the sample is compressed without looking at it
+# first.
+_SAMPLE_WINDOW_COUNT = 4
+_SAMPLE_WINDOW_SIZE = 1024
+_SAMPLE_SIZE = _SAMPLE_WINDOW_COUNT * _SAMPLE_WINDOW_SIZE
+
+# Data with more bits of entropy per byte than this is not compressed.
+# Compressed or encrypted data has close to 8 bits of entropy per byte, text
+# and executables are well below 7.
+_MAX_COMPRESSIBLE_ENTROPY = 7.5
+
+_ZSTD_LEVEL = 3
+
+
+class DecompressionError(ValueError):
+  """Raised when data can't be decompressed."""
+
+
+def AvailableCodecs() -> List[int]:
+  """Returns codecs that can be used for compression and decompression."""
+  codecs = [UNCOMPRESSED, ZCOMPRESSION]
+  if zstandard is not None:
+    codecs.append(ZSTD)
+  return codecs
+
+
+def ParseCodecs(names: Iterable[str]) -> List[int]:
+  """Parses names of codecs (e.g. `ZCOMPRESSION`), skipping unknown ones."""
+  codecs = []
+  for name in names:
+    try:
+      codecs.append(jobs_pb2.DataBlob.CompressionType.Value(name))
+    except ValueError:
+      logging.warning("Unknown compression codec: %s", name)
+  return codecs
+
+
+def EstimateEntropy(data: bytes) -> float:
+  """Estimates the entropy of data (in bits per byte) from a sample of it.
+
+  The estimate is the size of the sample compressed with the fastest zlib
+  level. This is an upper bound of the entropy of the sample, yet it is close
+  enough and (unlike counting bytes in Python) cheap to compute.
+
+  Args:
+    data: Data to estimate the entropy of.
+
+  Returns:
+    Estimated number of bits of entropy per byte, between 0 and 8.
+  """
+  if len(data) > _SAMPLE_SIZE:
+    stride = (len(data) - _SAMPLE_WINDOW_SIZE) // (_SAMPLE_WINDOW_COUNT - 1)
+    data = b"".join(data[i * stride:i * stride + _SAMPLE_WINDOW_SIZE]
+                    for i in range(_SAMPLE_WINDOW_COUNT))
+  if not data:
+    return 0.0
+
+  return min(8.0, 8 * len(zlib.compress(data, 1)) / len(data))
+
+
+def IsLikelyIncompressible(data: bytes) -> bool:
+  """Checks whether compressing data is likely to be a waste of time."""
+  if len(data) <= 2 * _SAMPLE_SIZE:
+    return False
+  return EstimateEntropy(data) > _MAX_COMPRESSIBLE_ENTROPY
+
+
+def _ChooseCodec(codecs: Iterable[int]) -> int:
+  available = AvailableCodecs()
+  for codec in codecs:
+    if codec in available:
+      return codec
+  return ZCOMPRESSION
+
+
+def Compress(
+    data: bytes,
+    codecs: Iterable[int] = (ZCOMPRESSION,),
+) -> Tuple[bytes, int]:
+  """Compresses data unless that doesn't make it smaller.
+
+  Args:
+    data: Data to compress.
+    codecs: Codecs to use, in order of preference. Codecs that are not
+      available are skipped. If none of them is available, zlib is used.
+
+  Returns:
+    A tuple of the (possibly) compressed data and the codec it is compressed
+    with (`UNCOMPRESSED` if it is not compressed).
+  """
+  if len(data) < _MIN_COMPRESSIBLE_SIZE or IsLikelyIncompressible(data):
+    return data, UNCOMPRESSED
+
+  codec = _ChooseCodec(codecs)
+  if codec == ZCOMPRESSION:
+    compressed_data = zlib.compress(data)
+  elif codec == ZSTD:
+    compressed_data = zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+  else:
+    return data, UNCOMPRESSED
+
+  if len(compressed_data) >= len(data):
+    return data, UNCOMPRESSED
+  return compressed_data, codec
+
+
+def Decompress(data: bytes, codec: int) -> bytes:
+  """Decompresses data.
+
+  Args:
+    data: Data to decompress.
+    codec: A codec the data is compressed with.
+
+  Returns:
+    Decompressed data.
+
+  Raises:
+    DecompressionError: If the codec is not supported or the data is corrupt.
+  """
+  codec = int(codec)
+  if codec == UNCOMPRESSED:
+    return data
+
+  if codec == ZCOMPRESSION:
+    try:
+      return zlib.decompress(data)
+    except zlib.error as e:
+      raise DecompressionError("Failed to decompress: %s" % e) from e
+
+  if codec == ZSTD and zstandard is not None:
+    try:
+      return zstandard.ZstdDecompressor().decompress(data)
+    except zstandard.ZstdError as e:
+      raise DecompressionError("Failed to decompress: %s" % e) from e
+
+  raise DecompressionError("Compression scheme not supported: %s" % codec)
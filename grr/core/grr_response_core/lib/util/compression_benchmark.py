@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Benchmark of compressing uploaded file chunks.
+
+Files are split into chunks the way the transfer store uploader splits them
+and every chunk is compressed and decompressed. Three mixes of files are used:
+files as they are on disk, the same files gzipped (standing in for archives,
+media and other already compressed content) and an even mix of both.
+
+Compressing every chunk with zlib (what clients used to do) is compared with
+the adaptive compression of the `compression` module, with every available
+codec. CPU time per MiB of uploaded data is reported for both the client
+(compression) and the server (decompression) side.
+"""
+
+import gzip
+import os
+import time
+from typing import Callable, List, Tuple
+import zlib
+
+from absl import app
+from absl import flags
+
+from grr_response_core.lib.util import compression
+from grr_response_proto import jobs_pb2
+
+_PATH = flags.DEFINE_string(
+    "path",
+    default=os.path.dirname(os.__file__),
+    help="Folder with files to compress (defaults to the Python library).",
+)
+
+_SIZE = flags.DEFINE_integer(
+    "size",
+    default=32 * 1024 * 1024,
+    help="Number of bytes of files to compress.",
+)
+
+_CHUNK_SIZE = flags.DEFINE_integer(
+    "chunk_size",
+    default=512 * 1024,
+    help="Size of a single uploaded chunk in bytes.",
+)
+
+_RUNS = flags.DEFINE_integer(
+    "runs",
+    default=3,
+    help="Number of runs per strategy (the fastest one is reported).",
+)
+
+_MIB = 1024 * 1024
+
+
+def _ReadFiles(path: str, size: int) -> List[bytes]:
+  """Reads (sorted, for repeatability) files from a folder up to given size."""
+  contents = []
+  for root, dirs, files in os.walk(path):
+    dirs.sort()
+    for name in sorted(files):
+      try:
+        with open(os.path.join(root, name), "rb") as filedesc:
+          content = filedesc.read(size)
+      except OSError:
+        continue
+
+      if content:
+        contents.append(content)
+        size -= len(content)
+      if size <= 0:
+        return contents
+  return contents
+
+
+def _Chunks(contents: List[bytes], chunk_size: int) -> List[bytes]:
+  return [
+      content[offset:offset + chunk_size]
+      for content in contents
+      for offset in range(0, len(content), chunk_size)
+  ]
+
+
+def _CompressAlways(data: bytes) -> Tuple[bytes, int]:
+  return zlib.compress(data), compression.ZCOMPRESSION
+
+
+def _Run(
+    chunks: List[bytes],
+    compress: Callable[[bytes], Tuple[bytes, int]],
+) -> Tuple[int, float, float]:
+  """Returns compressed size and compression and decompression CPU time."""
+  start = time.process_time()
+  compressed = [compress(chunk) for chunk in chunks]
+  compression_time = time.process_time() - start
+
+  start = time.process_time()
+  for data, codec in compressed:
+    compression.Decompress(data, codec)
+  decompression_time = time.process_time() - start
+
+  compressed_size = sum(len(data) for data, _ in compressed)
+  return compressed_size, compression_time, decompression_time
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  files = _ReadFiles(_PATH.value, _SIZE.value)
+  gzipped_files = [gzip.compress(content, compresslevel=6) for content in files]
+  half = len(files) // 2
+  mixes = [
+      ("files", files),
+      ("gzipped", gzipped_files),
+      ("mixed", files[:half] + gzipped_files[half:]),
+  ]
+
+  strategies = [("zlib_always", _CompressAlways)]
+  for codec in compression.AvailableCodecs():
+    if codec == compression.UNCOMPRESSED:
+      continue
+    name = "adaptive_{}".format(
+        jobs_pb2.DataBlob.CompressionType.Name(codec).lower())
+    strategies.append(
+        (name, lambda data, codec=codec: compression.Compress(data, [codec])))
+
+  print("mix\tstrategy\tdata\tratio\tcompress/MiB\tdecompress/MiB")
+  for mix_name, contents in mixes:
+    chunks = _Chunks(contents, _CHUNK_SIZE.value)
+    size = sum(len(chunk) for chunk in chunks)
+    data_mib = size / _MIB
+
+    for strategy_name, compress in strategies:
+      runs = [_Run(chunks, compress) for _ in range(_RUNS.value)]
+      compressed_size = runs[0][0]
+      compression_time = min(run[1] for run in runs)
+      decompression_time = min(run[2] for run in runs)
+      print("{mix}\t{strategy}\t{data:.1f}MiB\t{ratio:.3f}\t{compress:.1f}ms\t"
+            "{decompress:.1f}ms".format(
+                mix=mix_name,
+                strategy=strategy_name,
+                data=data_mib,
+                ratio=compressed_size / size,
+                compress=compression_time / data_mib * 1000,
+                decompress=decompression_time / data_mib * 1000))
+
+
+if __name__ == "__main__":
+  app.run(main)
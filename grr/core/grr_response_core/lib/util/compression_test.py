@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+import os
+import random
+import unittest
+from unittest import mock
+import zlib
+
+from absl.testing import absltest
+
+from grr_response_core.lib.util import compression
+
+_WORDS = [b"foo", b"bar", b"baz", b"quux", b"norf", b"thud", b"blargh"]
+_TEXT = b" ".join(random.Random(0).choices(_WORDS, k=32 * 1024))
+
+
+class EstimateEntropyTest(absltest.TestCase):
+
+  def testEmpty(self):
+    self.assertEqual(compression.EstimateEntropy(b""), 0.0)
+
+  def testRepeatedByte(self):
+    self.assertLess(compression.EstimateEntropy(b"\x00" * 1024 * 1024), 0.5)
+
+  def testRandom(self):
+    self.assertEqual(compression.EstimateEntropy(os.urandom(1024 * 1024)), 8.0)
+
+  def testCompressed(self):
+    data = zlib.compress(_TEXT)
+    self.assertGreater(compression.EstimateEntropy(data), 7.5)
+
+  def testText(self):
+    self.assertLess(compression.EstimateEntropy(_TEXT), 5.0)
+
+
+class IsLikelyIncompressibleTest(absltest.TestCase):
+
+  def testText(self):
+    self.assertFalse(compression.IsLikelyIncompressible(_TEXT))
+
+  def testCompressed(self):
+    data = zlib.compress(_TEXT) + os.urandom(64 * 1024)
+    self.assertTrue(compression.IsLikelyIncompressible(data))
+
+  def testShortData(self):
+    # Short data is not worth sampling.
+    self.assertFalse(compression.IsLikelyIncompressible(os.urandom(1024)))
+
+
+class CompressTest(absltest.TestCase):
+
+  def testZlib(self):
+    data, codec = compression.Compress(_TEXT)
+    self.assertEqual(codec, compression.ZCOMPRESSION)
+    self.assertEqual(zlib.decompress(data), _TEXT)
+
+  def testShortData(self):
+    self.assertEqual(
+        compression.Compress(b"foobar"), (b"foobar", compression.UNCOMPRESSED))
+
+  def testIncompressibleData(self):
+    data = zlib.compress(_TEXT) + os.urandom(64 * 1024)
+    _, codec = compression.Compress(data)
+    self.assertEqual(codec, compression.UNCOMPRESSED)
+
+  def testUncompressedPreferred(self):
+    self.assertEqual(
+        compression.Compress(_TEXT, [compression.UNCOMPRESSED]),
+        (_TEXT, compression.UNCOMPRESSED))
+
+  def testUnavailableCodecFallsBackToZlib(self):
+    with mock.patch.object(compression, "zstandard", None):
+      data, codec = compression.Compress(_TEXT, [compression.ZSTD])
+
+    self.assertEqual(codec, compression.ZCOMPRESSION)
+    self.assertEqual(zlib.decompress(data), _TEXT)
+
+  @unittest.skipIf(compression.zstandard is None, "requires zstandard")
+  def testZstd(self):
+    data, codec = compression.Compress(
+        _TEXT, [compression.ZSTD, compression.ZCOMPRESSION])
+    self.assertEqual(codec, compression.ZSTD)
+    self.assertEqual(compression.Decompress(data, codec), _TEXT)
+
+
+class DecompressTest(absltest.TestCase):
+
+  def testUncompressed(self):
+    self.assertEqual(
+        compression.Decompress(b"foo", compression.UNCOMPRESSED), b"foo")
+
+  def testZlib(self):
+    self.assertEqual(
+        compression.Decompress(
+            zlib.compress(b"foo"), compression.ZCOMPRESSION), b"foo")
+
+  def testCorruptData(self):
+    with self.assertRaises(compression.DecompressionError):
+      compression.Decompress(b"foo", compression.ZCOMPRESSION)
+
+  def testUnsupportedCodec(self):
+    with self.assertRaises(compression.DecompressionError):
+      compression.Decompress(b"foo", 42)
+
+  def testUnavailableCodec(self):
+    with mock.patch.object(compression, "zstandard", None):
+      with self.assertRaises(compression.DecompressionError):
+        compression.Decompress(b"foo", compression.ZSTD)
+
+
+class ParseCodecsTest(absltest.TestCase):
+
+  def testKnownNames(self):
+    self.assertEqual(
+        compression.ParseCodecs(["ZSTD", "ZCOMPRESSION"]),
+        [compression.ZSTD, compression.ZCOMPRESSION])
+
+  def testUnknownNamesAreSkipped(self):
+    self.assertEqual(
+        compression.ParseCodecs(["LZMA", "ZCOMPRESSION"]),
+        [compression.ZCOMPRESSION])
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -139,6 +139,11 @@ setup_args = dict(
         "requests==2.25.1",
         "yara-python==4.2.3",
     ],
+    extras_require={
+        # This is an optional component. Install to be able to compress data
+        # exchanged between clients and the server with Zstandard.
+        "zstd": ["zstandard==0.22.0"],
+    },
     # Data files used by GRR. Access these via the config_lib "resource" filter.
     data_files=data_files,
 )
@@ -1,15 +1,25 @@
 #!/usr/bin/env python
 """Base classes for artifacts."""
 
+from concurrent import futures
+import copy
 import logging
+import multiprocessing
+import pickle
+import threading
+from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import Iterable
 from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Sequence
+from typing import Tuple
 
 from grr_response_core import config
 from grr_response_core.lib import artifact_utils
+from grr_response_core.lib import config_lib
 from grr_response_core.lib import parsers
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
@@ -336,6 +346,91 @@ class ParseResults(object):
     return iter(self._errors)
 
 
+def _RunParser(
+    parse: Callable[..., Iterable[rdfvalue.RDFValue]],
+    *args: Any,
+) -> Tuple[List[rdfvalue.RDFValue], Optional[parsers.ParseError]]:
+  """Runs a single parser method and returns its results or parse error."""
+  try:
+    return list(parse(*args)), None
+  except parsers.ParseError as error:
+    return [], error
+
+
+def _IsPicklable(obj: Any) -> bool:
+  """Checks whether an object can be sent to a process pool."""
+  try:
+    pickle.dumps(obj)
+  except (pickle.PicklingError, AttributeError, TypeError):
+    return False
+  return True
+
+
+_picklable_parser_classes: Dict[type, bool] = {}
+
+
+def _IsPicklableParser(parse: Callable[..., Any]) -> bool:
+  """Checks whether a parser method can be sent to a process pool.
+
+  The check is done only once per parser class.
+
+  Args:
+    parse: A bound method of a parser.
+
+  Returns:
+    True if the parser can be pickled.
+  """
+  parser_cls = type(parse.__self__)
+  try:
+    return _picklable_parser_classes[parser_cls]
+  except KeyError:
+    result = _IsPicklable(parse)
+    _picklable_parser_classes[parser_cls] = result
+    return result
+
+
+def _IsPrefetched(arg: Any) -> bool:
+  """Checks whether a parser argument can be used without the blob store."""
+  if isinstance(arg, file_store.BlobStream):
+    return arg.IsPrefetched()
+  if isinstance(arg, list):
+    return all(map(_IsPrefetched, arg))
+  return True
+
+
+def _InitParserProcess(server_config: config_lib.GrrConfigManager) -> None:
+  """Initializes a spawned parser process with the config of the server."""
+  vars(config.CONFIG).update(vars(server_config))
+  rdf_structs.EnableProtobufCodec(config.CONFIG["Server.protobuf_codec"])
+
+
+_parser_executor_lock = threading.Lock()
+_parser_executor: Optional[futures.Executor] = None
+
+
+def _GetParserExecutor() -> Optional[futures.Executor]:
+  """Returns the executor parsers of this process run on, if configured."""
+  global _parser_executor
+
+  with _parser_executor_lock:
+    if _parser_executor is None:
+      num_processes = config.CONFIG["Artifacts.parser_processes"]
+      num_threads = config.CONFIG["Artifacts.parser_threads"]
+      if num_processes > 0:
+        # Parser processes are spawned rather than forked, so that they don't
+        # inherit threads and locks of the server process. Some parsers read
+        # config options, so processes get a copy of the server config.
+        _parser_executor = futures.ProcessPoolExecutor(
+            max_workers=num_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_InitParserProcess,
+            initargs=(config.CONFIG.CopyConfig(),))
+      elif num_threads > 0:
+        _parser_executor = futures.ThreadPoolExecutor(
+            max_workers=num_threads, thread_name_prefix="ArtifactParser")
+    return _parser_executor
+
+
 class ParserApplicator(object):
   """An utility class for applying many parsers to responses."""
 
@@ -345,6 +440,7 @@ class ParserApplicator(object):
       client_id: str,
       knowledge_base: rdf_client.KnowledgeBase,
       timestamp: Optional[rdfvalue.RDFDatetime] = None,
+      executor: Optional[futures.Executor] = None,
   ):
     """Initializes the applicator.
 
@@ -357,11 +453,15 @@ class ParserApplicator(object):
       timestamp: An optional timestamp at which parsers should interpret the
         results. For example, parsers that depend on files, will receive content
         of files as it was at the given timestamp.
+      executor: An optional executor to run parsers concurrently on. If not
+        given, parsers are run sequentially. Results are always ordered as if
+        parsers were run sequentially.
     """
     self._factory = factory
     self._client_id = client_id
     self._knowledge_base = knowledge_base
     self._timestamp = timestamp
+    self._executor = executor
     self._results = ParseResults()
 
   def Apply(self, responses: Sequence[rdfvalue.RDFValue]):
@@ -370,10 +470,14 @@ class ParserApplicator(object):
     Args:
       responses: A sequence of responses to apply the parsers to.
     """
+    tasks = []
+
     for response in responses:
-      self._ApplySingleResponse(response)
+      for parser in self._factory.SingleResponseParsers():
+        tasks.append((parser.ParseResponse, self._knowledge_base, response))
 
-    self._ApplyMultiResponse(responses)
+    for parser in self._factory.MultiResponseParsers():
+      tasks.append((parser.ParseResponses, self._knowledge_base, responses))
 
     # File parsers accept only stat responses. It might be possible that an
     # artifact declares multiple sources and has multiple parsers attached (each
@@ -398,13 +502,56 @@ class ParserApplicator(object):
       # past and now only a stat entry response came. A proper solution would be
       # to tag responses with artifact source and then make parsers define what
       # sources they support.
-      pathspecs = list(filter(self._HasFile, pathspecs))
-      filedescs = [self._OpenFile(pathspec) for pathspec in pathspecs]
+      opened = self._OpenFiles(pathspecs)
+      pathspecs = [p for p, fd in zip(pathspecs, opened) if fd is not None]
+      filedescs = [fd for fd in opened if fd is not None]
 
+      # Every parser gets its own, unread copy of the files, so that parsers
+      # don't depend on each other, no matter whether they run concurrently.
       for pathspec, filedesc in zip(pathspecs, filedescs):
-        self._ApplySingleFile(pathspec, filedesc)
+        for parser in self._factory.SingleFileParsers():
+          tasks.append((parser.ParseFile, self._knowledge_base, pathspec,
+                        copy.copy(filedesc)))
+
+      for parser in self._factory.MultiFileParsers():
+        tasks.append((parser.ParseFiles, self._knowledge_base, pathspecs,
+                      [copy.copy(filedesc) for filedesc in filedescs]))
+
+    if self._executor is None:
+      outcomes = [_RunParser(*task) for task in tasks]
+    else:
+      outcomes = [
+          future.result() for future in [self._Submit(task) for task in tasks]
+      ]
+
+    for results, error in outcomes:
+      if error is not None:
+        self._results.AddError(error)
+      else:
+        self._results.AddResponses(results)
+
+  def _Submit(self, task: Tuple[Any, ...]) -> futures.Future:
+    """Submits a parser task to the executor.
+
+    Processes of a process pool can't access the data store. Tasks with
+    parsers that can't be pickled (e.g. ones defined in a function) or with
+    files that weren't prefetched (see `Artifacts.parser_prefetch_max_bytes`)
+    are run in this process instead.
 
-      self._ApplyMultiFile(pathspecs, filedescs)
+    Args:
+      task: A tuple of a parser method and its arguments.
+
+    Returns:
+      A future with the outcome of the task.
+    """
+    if isinstance(self._executor, futures.ProcessPoolExecutor):
+      parse, *args = task
+      if not (_IsPicklableParser(parse) and all(map(_IsPrefetched, args))):
+        future = futures.Future()
+        future.set_result(_RunParser(*task))
+        return future
+
+    return self._executor.submit(_RunParser, *task)
 
   def Responses(self) -> Iterator[rdfvalue.RDFValue]:
     """Returns an iterator over all parsed responses."""
@@ -414,67 +561,55 @@ class ParserApplicator(object):
     """Returns an iterator over errors that occurred during parsing."""
     yield from self._results.Errors()
 
-  def _ApplySingleResponse(
-      self,
-      response: rdfvalue.RDFValue,
-  ) -> None:
-    """Applies all single-response parsers to the given response."""
-    for parser in self._factory.SingleResponseParsers():
-      try:
-        results = parser.ParseResponse(self._knowledge_base, response)
-        self._results.AddResponses(results)
-      except parsers.ParseError as error:
-        self._results.AddError(error)
-
-  def _ApplyMultiResponse(
-      self,
-      responses: Iterable[rdfvalue.RDFValue],
-  ) -> None:
-    """Applies all multi-response parsers to the given responses."""
-    for parser in self._factory.MultiResponseParsers():
-      try:
-        results = parser.ParseResponses(self._knowledge_base, responses)
-        self._results.AddResponses(results)
-      except parsers.ParseError as error:
-        self._results.AddError(error)
-
-  def _ApplySingleFile(
+  def _OpenFiles(
       self,
-      pathspec: rdf_paths.PathSpec,
-      filedesc: file_store.BlobStream,
-  ) -> None:
-    """Applies all single-file parsers to the given file."""
-    for parser in self._factory.SingleFileParsers():
-      try:
-        results = parser.ParseFile(self._knowledge_base, pathspec, filedesc)
-        self._results.AddResponses(results)
-      except parsers.ParseError as error:
-        self._results.AddError(error)
+      pathspecs: Sequence[rdf_paths.PathSpec],
+  ) -> List[Optional[file_store.BlobStream]]:
+    """Opens files for the given pathspecs in bulk.
 
-  def _ApplyMultiFile(
-      self,
-      pathspecs: Iterable[rdf_paths.PathSpec],
-      filedescs: Iterable[file_store.BlobStream],
-  ) -> None:
-    """Applies all multi-file parsers to the given file."""
-    for parser in self._factory.MultiFileParsers():
-      try:
-        results = parser.ParseFiles(self._knowledge_base, pathspecs, filedescs)
-        self._results.AddResponses(results)
-      except parsers.ParseError as error:
-        self._results.AddError(error)
+    Args:
+      pathspecs: Pathspecs of the files to open.
 
-  def _HasFile(self, pathspec: rdf_paths.PathSpec) -> bool:
-    """Checks whether any file for the given pathspec was ever collected."""
-    client_path = db.ClientPath.FromPathSpec(self._client_id, pathspec)
-    return file_store.GetLastCollectionPathInfo(client_path) is not None
+    Returns:
+      A list of opened files, aligned with `pathspecs`. Contains None for files
+      that were never collected.
 
-  def _OpenFile(self, pathspec: rdf_paths.PathSpec) -> file_store.BlobStream:
-    # TODO(amoser): This is not super efficient, AFF4 provided an api to open
-    # all pathspecs at the same time, investigate if optimizing this is worth
-    # it.
-    client_path = db.ClientPath.FromPathSpec(self._client_id, pathspec)
-    return file_store.OpenFile(client_path, max_timestamp=self._timestamp)
+    Raises:
+      FileHasNoContentError: if a file wasn't collected before the applicator's
+        timestamp.
+    """
+    client_paths = [
+        db.ClientPath.FromPathSpec(self._client_id, pathspec)
+        for pathspec in pathspecs
+    ]
+
+    # Files are parsed if they were ever collected, but their content is read
+    # as of the applicator's timestamp.
+    if not client_paths:
+      return []
+
+    collected = file_store.GetLastCollectionPathInfos(list(set(client_paths)))
+    collected_paths = [
+        client_path for client_path, path_info in collected.items()
+        if path_info is not None
+    ]
+    if not collected_paths:
+      return [None] * len(client_paths)
+
+    filedescs = file_store.OpenFiles(
+        collected_paths,
+        max_timestamp=self._timestamp,
+        prefetch_max_bytes=config.CONFIG["Artifacts.parser_prefetch_max_bytes"])
+
+    result = []
+    for client_path in client_paths:
+      if collected[client_path] is None:
+        result.append(None)
+      elif client_path not in filedescs:
+        raise file_store.FileHasNoContentError(client_path)
+      else:
+        result.append(filedescs[client_path])
+    return result
 
 
 def ApplyParsersToResponses(parser_factory, responses, flow_obj):
@@ -495,7 +630,11 @@ def ApplyParsersToResponses(parser_factory, responses, flow_obj):
   knowledge_base = flow_obj.state.knowledge_base
   client_id = flow_obj.client_id
 
-  applicator = ParserApplicator(parser_factory, client_id, knowledge_base)
+  applicator = ParserApplicator(
+      parser_factory,
+      client_id,
+      knowledge_base,
+      executor=_GetParserExecutor())
   applicator.Apply(responses)
 
   for error in applicator.Errors():
@@ -104,6 +104,8 @@ class ArtifactRegistry(object):
     self._artifacts = {}
     self._sources = ArtifactRegistrySources()
     self._dirty = False
+    # Incremented whenever the set of registered artifacts changes.
+    self._generation = 0
     # Field required by the utils.Synchronized annotation.
     self.lock = threading.RLock()
 
@@ -287,6 +289,7 @@ class ArtifactRegistry(object):
     # Clear any stale errors.
     artifact_rdfvalue.error_message = None
     self._artifacts[artifact_rdfvalue.name] = artifact_rdfvalue
+    self._generation += 1
 
   @utils.Synchronized
   def UnregisterArtifact(self, artifact_name):
@@ -294,15 +297,18 @@ class ArtifactRegistry(object):
       del self._artifacts[artifact_name]
     except KeyError:
       raise ValueError("Artifact %s unknown." % artifact_name)
+    self._generation += 1
 
   @utils.Synchronized
   def ClearRegistry(self):
     self._artifacts = {}
     self._dirty = True
+    self._generation += 1
 
   def _ReloadArtifacts(self):
     """Load artifacts from all sources."""
     self._artifacts = {}
+    self._generation += 1
     self._LoadArtifactsFromFiles(self._sources.GetAllFiles())
     self.ReloadDatastoreArtifacts()
 
@@ -314,6 +320,8 @@ class ArtifactRegistry(object):
         to_remove.append(name)
     for key in to_remove:
       self._artifacts.pop(key)
+    if to_remove:
+      self._generation += 1
 
   @utils.Synchronized
   def ReloadDatastoreArtifacts(self):
@@ -329,6 +337,19 @@ class ArtifactRegistry(object):
       if reload_datastore_artifacts:
         self.ReloadDatastoreArtifacts()
 
+  @utils.Synchronized
+  def Generation(self) -> int:
+    """Returns a number that changes whenever registered artifacts change.
+
+    Values derived from registered artifacts can be cached together with the
+    generation they were computed at, and recomputed when it changes.
+
+    Returns:
+      The current generation of the registry.
+    """
+    self._CheckDirty()
+    return self._generation
+
   @utils.Synchronized
   def GetArtifacts(self,
                    os_name=None,
@@ -280,6 +280,22 @@ class ArtifactRegistryTest(absltest.TestCase):
 
     self.assertIsNotNone(registry.GetArtifact("Foo"))
 
+  def testGenerationChangesWhenArtifactsChange(self):
+    registry = ar.ArtifactRegistry()
+    generations = [registry.Generation()]
+
+    registry.RegisterArtifact(rdf_artifacts.Artifact(name="Foo"))
+    generations.append(registry.Generation())
+    self.assertEqual(registry.Generation(), generations[-1])
+
+    registry.UnregisterArtifact("Foo")
+    generations.append(registry.Generation())
+
+    registry.ClearRegistry()
+    generations.append(registry.Generation())
+
+    self.assertLen(set(generations), len(generations))
+
 
 if __name__ == "__main__":
   app.run(test_lib.main)
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 """Tests for artifacts."""
 
+from concurrent import futures
 import io
 import logging
+import multiprocessing
 import os
 import subprocess
+import time as time_lib
 from typing import Collection
 from typing import IO
 from typing import Iterable
@@ -830,6 +833,39 @@ class GrrKbDarwinTest(GrrKbTest):
     self.assertEqual(user.homedir, "/Users/scalzi")
 
 
+class _PicklableFileParser(parsers.SingleFileParser[rdfvalue.RDFString]):
+  """A file parser that can be run in a process pool."""
+
+  supported_artifacts = ["Picklable"]
+
+  def ParseFile(
+      self,
+      knowledge_base: rdf_client.KnowledgeBase,
+      pathspec: rdf_paths.PathSpec,
+      filedesc: file_store.BlobStream,
+  ) -> Iterator[rdfvalue.RDFString]:
+    del pathspec  # Unused.
+    content = filedesc.Read().decode("utf-8")
+    yield rdfvalue.RDFString(f"{knowledge_base.os}:{content}")
+
+
+class _PidFileParser(parsers.SingleFileParser[rdfvalue.RDFString]):
+  """A file parser that reports a config option and where it runs."""
+
+  supported_artifacts = ["Pid"]
+
+  def ParseFile(
+      self,
+      knowledge_base: rdf_client.KnowledgeBase,
+      pathspec: rdf_paths.PathSpec,
+      filedesc: file_store.BlobStream,
+  ) -> Iterator[rdfvalue.RDFString]:
+    del knowledge_base, pathspec  # Unused.
+    content = filedesc.Read().decode("utf-8")
+    max_bytes = config.CONFIG["Artifacts.parser_prefetch_max_bytes"]
+    yield rdfvalue.RDFString(f"{content}:{max_bytes}:{os.getpid()}")
+
+
 class ParserApplicatorTest(absltest.TestCase):
 
   def setUp(self):
@@ -1270,6 +1306,251 @@ class ParserApplicatorTest(absltest.TestCase):
       self.assertLen(responses, 1)
       self.assertEqual(responses[0], b"OLD")
 
+  def testExecutorKeepsResultsInOrder(self):
+
+    class FooParser(parsers.SingleResponseParser[rdfvalue.RDFInteger]):
+
+      supported_artifacts = ["Foo"]
+
+      def ParseResponse(
+          self,
+          knowledge_base: rdf_client.KnowledgeBase,
+          response: rdf_client_fs.StatEntry,
+      ) -> Iterator[rdfvalue.RDFInteger]:
+        del knowledge_base  # Unused.
+        # Earlier responses take longer to parse.
+        time_lib.sleep(0.01 * (5 - response.st_dev))
+        yield rdfvalue.RDFInteger(response.st_dev)
+
+    class BarParser(parsers.MultiResponseParser[rdfvalue.RDFInteger]):
+
+      supported_artifacts = ["Foo"]
+
+      def ParseResponses(
+          self,
+          knowledge_base: rdf_client.KnowledgeBase,
+          responses: Collection[rdf_client_fs.StatEntry],
+      ) -> Iterator[rdfvalue.RDFInteger]:
+        del knowledge_base  # Unused.
+        yield rdfvalue.RDFInteger(sum(r.st_dev for r in responses))
+
+    with parser_test_lib._ParserContext("Foo", FooParser):
+      with parser_test_lib._ParserContext("Bar", BarParser):
+        factory = parsers.ArtifactParserFactory("Foo")
+        responses = [rdf_client_fs.StatEntry(st_dev=i) for i in range(5)]
+
+        with futures.ThreadPoolExecutor(max_workers=5) as executor:
+          applicator = artifact.ParserApplicator(
+              factory,
+              client_id=self.client_id,
+              knowledge_base=rdf_client.KnowledgeBase(),
+              executor=executor)
+          applicator.Apply(responses)
+
+        self.assertEmpty(list(applicator.Errors()))
+        self.assertEqual(list(applicator.Responses()), [0, 1, 2, 3, 4, 10])
+
+  def testExecutorKeepsErrorsInOrder(self):
+
+    class FooParseError(parsers.ParseError):
+      pass
+
+    class FooParser(parsers.SingleResponseParser[rdfvalue.RDFInteger]):
+
+      supported_artifacts = ["Foo"]
+
+      def ParseResponse(
+          self,
+          knowledge_base: rdf_client.KnowledgeBase,
+          response: rdf_client_fs.StatEntry,
+      ) -> Iterator[rdfvalue.RDFInteger]:
+        del knowledge_base  # Unused.
+        time_lib.sleep(0.01 * (5 - response.st_dev))
+        if response.st_dev % 2:
+          raise FooParseError(str(response.st_dev))
+        yield rdfvalue.RDFInteger(response.st_dev)
+
+    with parser_test_lib._ParserContext("Foo", FooParser):
+      factory = parsers.ArtifactParserFactory("Foo")
+      responses = [rdf_client_fs.StatEntry(st_dev=i) for i in range(5)]
+
+      with futures.ThreadPoolExecutor(max_workers=5) as executor:
+        applicator = artifact.ParserApplicator(
+            factory,
+            client_id=self.client_id,
+            knowledge_base=rdf_client.KnowledgeBase(),
+            executor=executor)
+        applicator.Apply(responses)
+
+      self.assertEqual([str(e) for e in applicator.Errors()], ["1", "3"])
+      self.assertEqual(list(applicator.Responses()), [0, 2, 4])
+
+  def testFileParsersReadFilesIndependently(self):
+
+    class NorfParser(parsers.SingleFileParser[rdfvalue.RDFBytes]):
+
+      supported_artifacts = ["Norf"]
+
+      def ParseFile(
+          self,
+          knowledge_base: rdf_client.KnowledgeBase,
+          pathspec: rdf_paths.PathSpec,
+          filedesc: file_store.BlobStream,
+      ) -> Iterable[rdfvalue.RDFBytes]:
+        del knowledge_base, pathspec  # Unused.
+        return [rdfvalue.RDFBytes(filedesc.Read())]
+
+    class ThudParser(parsers.MultiFileParser[rdfvalue.RDFBytes]):
+
+      supported_artifacts = ["Norf"]
+
+      def ParseFiles(
+          self,
+          knowledge_base: rdf_client.KnowledgeBase,
+          pathspecs: Collection[rdf_paths.PathSpec],
+          filedescs: Collection[file_store.BlobStream],
+      ) -> Iterable[rdfvalue.RDFBytes]:
+        del knowledge_base, pathspecs  # Unused.
+        return [rdfvalue.RDFBytes(filedesc.Read()) for filedesc in filedescs]
+
+    with parser_test_lib._ParserContext("Norf", NorfParser):
+      with parser_test_lib._ParserContext("Thud", ThudParser):
+        factory = parsers.ArtifactParserFactory("Norf")
+
+        stat_entry = rdf_client_fs.StatEntry()
+        stat_entry.pathspec.path = "foo/bar/baz"
+        stat_entry.pathspec.pathtype = rdf_paths.PathSpec.PathType.OS
+        self._WriteFile(stat_entry.pathspec.path, b"4815162342")
+
+        applicator = artifact.ParserApplicator(
+            factory,
+            client_id=self.client_id,
+            knowledge_base=rdf_client.KnowledgeBase())
+        applicator.Apply([stat_entry])
+
+        self.assertEmpty(list(applicator.Errors()))
+        self.assertEqual(
+            list(applicator.Responses()), [b"4815162342", b"4815162342"])
+
+  def _ParserProcessPool(self, **overrides):
+    overrides["Artifacts.parser_processes"] = 1
+    with test_lib.ConfigOverrider(overrides):
+      with mock.patch.object(artifact, "_parser_executor", None):
+        executor = artifact._GetParserExecutor()
+    self.addCleanup(executor.shutdown)
+    return executor
+
+  def testProcessPoolExecutor(self):
+    with parser_test_lib._ParserContext("Picklable", _PicklableFileParser):
+      factory = parsers.ArtifactParserFactory("Picklable")
+
+      stat_entry = rdf_client_fs.StatEntry()
+      stat_entry.pathspec.path = "foo/bar/baz"
+      stat_entry.pathspec.pathtype = rdf_paths.PathSpec.PathType.OS
+      self._WriteFile(stat_entry.pathspec.path, b"4815162342")
+
+      context = multiprocessing.get_context("spawn")
+      with futures.ProcessPoolExecutor(
+          max_workers=1, mp_context=context) as executor:
+        applicator = artifact.ParserApplicator(
+            factory,
+            client_id=self.client_id,
+            knowledge_base=rdf_client.KnowledgeBase(os="Linux"),
+            executor=executor)
+        applicator.Apply([stat_entry])
+
+      self.assertEmpty(list(applicator.Errors()))
+      self.assertEqual(list(applicator.Responses()), ["Linux:4815162342"])
+
+  def testParserProcessesAreSpawnedWithServerConfig(self):
+    executor = self._ParserProcessPool(
+        **{"Artifacts.parser_prefetch_max_bytes": 4242})
+    self.assertEqual(executor._mp_context.get_start_method(), "spawn")
+
+    with parser_test_lib._ParserContext("Pid", _PidFileParser):
+      factory = parsers.ArtifactParserFactory("Pid")
+
+      stat_entry = rdf_client_fs.StatEntry()
+      stat_entry.pathspec.path = "foo/bar/baz"
+      stat_entry.pathspec.pathtype = rdf_paths.PathSpec.PathType.OS
+      self._WriteFile(stat_entry.pathspec.path, b"quux")
+
+      with test_lib.ConfigOverrider(
+          {"Artifacts.parser_prefetch_max_bytes": 4242}):
+        applicator = artifact.ParserApplicator(
+            factory,
+            client_id=self.client_id,
+            knowledge_base=rdf_client.KnowledgeBase(),
+            executor=executor)
+        applicator.Apply([stat_entry])
+
+      self.assertEmpty(list(applicator.Errors()))
+      (response,) = list(applicator.Responses())
+      content, max_bytes, pid = response.split(":")
+      self.assertEqual(content, "quux")
+      self.assertEqual(max_bytes, "4242")
+      self.assertNotEqual(pid, str(os.getpid()))
+
+  def testProcessPoolExecutorParsesFilesNotPrefetchedInProcess(self):
+    executor = self._ParserProcessPool()
+
+    with parser_test_lib._ParserContext("Pid", _PidFileParser):
+      factory = parsers.ArtifactParserFactory("Pid")
+
+      stat_entry = rdf_client_fs.StatEntry()
+      stat_entry.pathspec.path = "foo/bar/baz"
+      stat_entry.pathspec.pathtype = rdf_paths.PathSpec.PathType.OS
+      self._WriteFile(stat_entry.pathspec.path, b"quux")
+
+      with test_lib.ConfigOverrider({"Artifacts.parser_prefetch_max_bytes": 0}):
+        applicator = artifact.ParserApplicator(
+            factory,
+            client_id=self.client_id,
+            knowledge_base=rdf_client.KnowledgeBase(),
+            executor=executor)
+        applicator.Apply([stat_entry])
+
+      self.assertEmpty(list(applicator.Errors()))
+      self.assertEqual(
+          list(applicator.Responses()), [f"quux:0:{os.getpid()}"])
+
+  def testProcessPoolExecutorRunsUnpicklableParsersInProcess(self):
+
+    class FooParser(parsers.SingleResponseParser[rdfvalue.RDFInteger]):
+
+      supported_artifacts = ["Foo"]
+
+      def ParseResponse(
+          self,
+          knowledge_base: rdf_client.KnowledgeBase,
+          response: rdf_client_fs.StatEntry,
+      ) -> Iterator[rdfvalue.RDFInteger]:
+        del knowledge_base  # Unused.
+        yield rdfvalue.RDFInteger(response.st_dev)
+
+    with parser_test_lib._ParserContext("Foo", FooParser):
+      factory = parsers.ArtifactParserFactory("Foo")
+      responses = [rdf_client_fs.StatEntry(st_dev=i) for i in range(3)]
+
+      context = multiprocessing.get_context("spawn")
+      with futures.ProcessPoolExecutor(
+          max_workers=1, mp_context=context) as executor:
+        applicator = artifact.ParserApplicator(
+            factory,
+            client_id=self.client_id,
+            knowledge_base=rdf_client.KnowledgeBase(),
+            executor=executor)
+        with mock.patch.object(artifact, "_picklable_parser_classes", {}):
+          with mock.patch.object(
+              artifact, "_IsPicklable",
+              wraps=artifact._IsPicklable) as picklable:
+            applicator.Apply(responses)
+
+      self.assertEmpty(list(applicator.Errors()))
+      self.assertEqual(list(applicator.Responses()), [0, 1, 2])
+      # Picklability is only checked once per parser class.
+      self.assertEqual(picklable.call_count, 1)
+
 
 def main(argv):
   # Run the full test suite
@@ -272,6 +272,18 @@ parser_rotate_key.add_argument(
     help="The key length for the new server key. "
     "Defaults to the Server.rsa_key_length config option.")
 
+parser_rebuild_hunt_counters = subparsers.add_parser(
+    "rebuild_hunt_counters",
+    help="Recompute hunt counters and client resources stats from hunt "
+    "flows. Run it once after upgrading to fill in counters of existing "
+    "hunts.")
+
+parser_rebuild_hunt_counters.add_argument(
+    "--hunt_id",
+    default=[],
+    action="append",
+    help="The hunts to rebuild counters of. Defaults to all hunts.")
+
 
 def main(args):
   """Main."""
@@ -388,6 +400,9 @@ def main(args):
     artifact_registry.DeleteArtifactsFromDatastore(artifact_list)
     print("Artifacts %s deleted." % artifact_list)
 
+  elif args.subparser_name == "rebuild_hunt_counters":
+    config_updater_util.RebuildHuntCounters(args.hunt_id)
+
   elif args.subparser_name == "rotate_server_key":
     print("""
 You are about to rotate the server key. Note that:
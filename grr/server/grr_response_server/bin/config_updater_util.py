@@ -24,6 +24,7 @@ from grr_api_client import root as api_root
 from grr_response_client_builder import repacking
 from grr_response_core import config as grr_config
 from grr_response_core.lib import package
+from grr_response_server import data_store
 from grr_response_server import maintenance_utils
 from grr_response_server import server_startup
 from grr_response_server.bin import config_updater_keys_util
@@ -49,6 +50,9 @@ _MYSQL_RETRY_WAIT_SECS = 2
 # Python hacks or executables larger than this limit will not be uploaded.
 _MAX_SIGNED_BINARY_BYTES = 100 << 20  # 100 MiB
 
+# Number of hunts read at once when rebuilding counters of all hunts.
+_REBUILD_HUNT_COUNTERS_BATCH_SIZE = 1000
+
 
 class ConfigInitError(Exception):
   """Exception raised to abort config initialization."""
@@ -1079,6 +1083,38 @@ def SwitchToRelDB(config):
   print("Configuration updated.")
 
 
+def _IterHuntIds():
+  """Yields ids of all hunts, reading them in batches."""
+  offset = 0
+  while True:
+    hunts = data_store.REL_DB.ListHuntObjects(
+        offset=offset, count=_REBUILD_HUNT_COUNTERS_BATCH_SIZE)
+    for hunt in hunts:
+      yield hunt.hunt_id
+
+    if len(hunts) < _REBUILD_HUNT_COUNTERS_BATCH_SIZE:
+      break
+    # Hunts are listed newest first, so hunts created in the meantime shift
+    # the remaining ones to later offsets. Such hunts can be listed twice, but
+    # never skipped.
+    offset += len(hunts)
+
+
+def RebuildHuntCounters(hunt_ids=None):
+  """Recomputes counters of given hunts (of all hunts if none are given).
+
+  Counters of every hunt are rebuilt in a separate transaction, so that only
+  flows of a single hunt are locked at a time. This also fills in counters of
+  hunts created before the database maintained them.
+
+  Args:
+    hunt_ids: Ids of the hunts to rebuild counters of.
+  """
+  for hunt_id in hunt_ids or _IterHuntIds():
+    data_store.REL_DB.RebuildHuntCounters(hunt_id)
+    print("Rebuilt counters of hunt %s." % hunt_id)
+
+
 def ArgparseBool(raw_value):
   """Returns the boolean value of a raw argparse value.
 
@@ -20,6 +20,7 @@ from grr_response_proto.api import config_pb2
 from grr_response_server import data_store
 from grr_response_server import signed_binary_utils
 from grr_response_server.bin import config_updater_util
+from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr.test_lib import test_lib
 
 
@@ -244,6 +245,49 @@ class ConfigUpdaterLibTest(test_lib.GRRBaseTest):
       self.assertEqual(user.user_type,
                        objects_pb2.GRRUser.UserType.USER_TYPE_ADMIN)
 
+  def testRebuildHuntCountersOfAllHunts(self):
+    data_store.REL_DB.WriteGRRUser("user")
+    hunt_ids = []
+    for _ in range(3):
+      hunt_obj = rdf_hunt_objects.Hunt(creator="user")
+      data_store.REL_DB.WriteHuntObject(hunt_obj)
+      hunt_ids.append(hunt_obj.hunt_id)
+
+    with mock.patch.object(data_store.REL_DB,
+                           "RebuildHuntCounters") as rebuild_mock:
+      config_updater_util.RebuildHuntCounters()
+
+    rebuilt_hunt_ids = [args[0] for args, _ in rebuild_mock.call_args_list]
+    self.assertCountEqual(rebuilt_hunt_ids, hunt_ids)
+
+  @mock.patch.object(config_updater_util, "_REBUILD_HUNT_COUNTERS_BATCH_SIZE",
+                     2)
+  def testRebuildHuntCountersOfAllHuntsInBatches(self):
+    data_store.REL_DB.WriteGRRUser("user")
+    hunt_ids = []
+    for _ in range(5):
+      hunt_obj = rdf_hunt_objects.Hunt(creator="user")
+      data_store.REL_DB.WriteHuntObject(hunt_obj)
+      hunt_ids.append(hunt_obj.hunt_id)
+
+    with mock.patch.object(
+        data_store.REL_DB, "ListHuntObjects",
+        wraps=data_store.REL_DB.ListHuntObjects) as list_mock:
+      with mock.patch.object(data_store.REL_DB,
+                             "RebuildHuntCounters") as rebuild_mock:
+        config_updater_util.RebuildHuntCounters()
+
+    rebuilt_hunt_ids = [args[0] for args, _ in rebuild_mock.call_args_list]
+    self.assertCountEqual(rebuilt_hunt_ids, hunt_ids)
+    self.assertEqual(list_mock.call_count, 3)
+
+  def testRebuildHuntCountersOfGivenHunts(self):
+    with mock.patch.object(data_store.REL_DB,
+                           "RebuildHuntCounters") as rebuild_mock:
+      config_updater_util.RebuildHuntCounters(["12345678"])
+
+    rebuild_mock.assert_called_once_with("12345678")
+
   def testArgparseBool_CaseInsensitive(self):
     parser = argparse.ArgumentParser()
     parser.add_argument("--foo", type=config_updater_util.ArgparseBool)
@@ -2,10 +2,13 @@
 """The blob store abstraction."""
 
 import abc
+import math
+import threading
 import time
-from typing import Dict, Iterable, List, Optional
+from typing import Collection, Dict, Iterable, List, Optional
 
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.util import precondition
 from grr_response_core.stats import metrics
 from grr_response_server.rdfvalues import objects as rdf_objects
@@ -22,6 +25,12 @@ BLOB_STORE_POLL_HIT_LATENCY = metrics.Event(
 BLOB_STORE_POLL_HIT_ITERATION = metrics.Event(
     "blob_store_poll_hit_iteration", bins=[1, 2, 5, 10, 20, 50])
 
+BLOB_EXISTENCE_CACHE_HITS = metrics.Counter(
+    "blob_existence_cache_hits", fields=[("source", str)])
+BLOB_EXISTENCE_CACHE_MISSES = metrics.Counter("blob_existence_cache_misses")
+BLOB_EXISTENCE_CACHE_FALSE_POSITIVES = metrics.Counter(
+    "blob_existence_cache_false_positives")
+
 
 class BlobStoreTimeoutError(Exception):
   """An exception class raised when certain blob store operation times out."""
@@ -254,3 +263,175 @@ class BlobStoreValidationWrapper(BlobStore):
       blob_ids: Iterable[rdf_objects.BlobID]) -> Dict[rdf_objects.BlobID, bool]:
     precondition.AssertIterableType(blob_ids, rdf_objects.BlobID)
     return self.delegate.CheckBlobsExist(blob_ids)
+
+
+class BlobBloomFilter(object):
+  """A Bloom filter of blob identifiers.
+
+  Blob identifiers are SHA-256 hashes, so bit positions are derived directly
+  from their bytes instead of hashing them again. Once more blobs than the
+  filter's capacity are added, the filter is cleared to keep its false
+  positive rate bounded.
+  """
+
+  def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+    if capacity < 1 or not 0 < false_positive_rate < 1:
+      raise ValueError("Invalid Bloom filter parameters: %d, %f." %
+                       (capacity, false_positive_rate))
+
+    self.capacity = capacity
+    self.num_bits = int(
+        math.ceil(-capacity * math.log(false_positive_rate) / math.log(2)**2))
+    self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+
+    self._lock = threading.Lock()
+    self._bits = bytearray((self.num_bits + 7) // 8)
+    self._count = 0
+
+  def _Positions(self, blob_id: rdf_objects.BlobID) -> Iterable[int]:
+    blob_id_bytes = blob_id.AsBytes()
+    h1 = int.from_bytes(blob_id_bytes[:8], "little")
+    h2 = int.from_bytes(blob_id_bytes[8:16], "little") | 1
+    return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+  def Add(self, blob_id: rdf_objects.BlobID) -> None:
+    positions = self._Positions(blob_id)
+    with self._lock:
+      if self._count >= self.capacity:
+        self._bits = bytearray(len(self._bits))
+        self._count = 0
+
+      for pos in positions:
+        self._bits[pos >> 3] |= 1 << (pos & 7)
+      self._count += 1
+
+  def __contains__(self, blob_id: rdf_objects.BlobID) -> bool:
+    positions = self._Positions(blob_id)
+    with self._lock:
+      return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in positions)
+
+  def Clear(self) -> None:
+    with self._lock:
+      self._bits = bytearray(len(self._bits))
+      self._count = 0
+
+
+class BlobStoreExistenceCacheWrapper(BlobStore):
+  """BlobStore wrapper that remembers which blobs are known to exist.
+
+  Blobs are content-addressed, so a blob that was written or seen once doesn't
+  have to be written again. The wrapper keeps an LRU cache of recently written
+  or seen blob ids. Writes of cached blobs are skipped and existence checks for
+  them are answered without contacting the delegate.
+
+  An optional Bloom filter remembers many more blob ids than the LRU cache.
+  Since it can report false positives, blobs found only in the filter are
+  checked with the delegate before their writes are skipped. Blobs not in the
+  filter are written right away without such a check.
+
+  The blob store API doesn't support deleting blobs, so cached entries are
+  never invalidated.
+  """
+
+  def __init__(self,
+               delegate: BlobStore,
+               cache_size: int,
+               bloom_filter_capacity: int = 0):
+    """Initializes the wrapper.
+
+    Args:
+      delegate: The blob store to wrap.
+      cache_size: Maximum number of blob ids in the LRU cache.
+      bloom_filter_capacity: Number of blob ids the Bloom filter is sized for.
+        0 disables the filter.
+    """
+    super().__init__()
+    self.delegate = delegate
+    self._cache = utils.FastStore(max_size=cache_size)
+    if bloom_filter_capacity:
+      self._bloom_filter = BlobBloomFilter(bloom_filter_capacity)
+    else:
+      self._bloom_filter = None
+
+  def Flush(self) -> None:
+    """Forgets all blobs known to exist.
+
+    Has to be called if blobs are removed from the delegate behind the
+    wrapper's back (e.g. when a test database is cleared).
+    """
+    self._cache.Flush()
+    if self._bloom_filter is not None:
+      self._bloom_filter.Clear()
+
+  def _MarkExisting(self, blob_ids: Iterable[rdf_objects.BlobID]) -> None:
+    for blob_id in blob_ids:
+      self._cache.Put(blob_id.AsBytes(), True)
+      if self._bloom_filter is not None:
+        self._bloom_filter.Add(blob_id)
+
+  def _Uncached(
+      self, blob_ids: Collection[rdf_objects.BlobID]
+  ) -> List[rdf_objects.BlobID]:
+    """Returns blob ids that are not in the LRU cache."""
+    uncached = []
+    for blob_id in blob_ids:
+      try:
+        # Refreshes the entry in the LRU cache.
+        self._cache.Get(blob_id.AsBytes())
+      except KeyError:
+        uncached.append(blob_id)
+
+    num_hits = len(blob_ids) - len(uncached)
+    if num_hits:
+      BLOB_EXISTENCE_CACHE_HITS.Increment(delta=num_hits, fields=["lru"])
+
+    return uncached
+
+  def WriteBlobs(self, blob_id_data_map: Dict[rdf_objects.BlobID,
+                                              bytes]) -> None:
+    uncached = self._Uncached(blob_id_data_map)
+
+    if self._bloom_filter is not None:
+      maybe_existing = [b for b in uncached if b in self._bloom_filter]
+      if maybe_existing:
+        existing = set(
+            blob_id for blob_id, exists in self.delegate.CheckBlobsExist(
+                maybe_existing).items() if exists)
+        if existing:
+          BLOB_EXISTENCE_CACHE_HITS.Increment(
+              delta=len(existing), fields=["bloom_filter"])
+          self._MarkExisting(existing)
+        false_positives = len(maybe_existing) - len(existing)
+        if false_positives:
+          BLOB_EXISTENCE_CACHE_FALSE_POSITIVES.Increment(delta=false_positives)
+
+        uncached = [b for b in uncached if b not in existing]
+
+    if not uncached:
+      return
+
+    BLOB_EXISTENCE_CACHE_MISSES.Increment(delta=len(uncached))
+    self.delegate.WriteBlobs({b: blob_id_data_map[b] for b in uncached})
+    self._MarkExisting(uncached)
+
+  def ReadBlobs(
+      self, blob_ids: Iterable[rdf_objects.BlobID]
+  ) -> Dict[rdf_objects.BlobID, Optional[bytes]]:
+    result = self.delegate.ReadBlobs(blob_ids)
+    self._MarkExisting(b for b, data in result.items() if data is not None)
+    return result
+
+  def CheckBlobsExist(
+      self,
+      blob_ids: Iterable[rdf_objects.BlobID]) -> Dict[rdf_objects.BlobID, bool]:
+    blob_ids = list(blob_ids)
+    uncached = self._Uncached(blob_ids)
+
+    result = {blob_id: True for blob_id in blob_ids}
+    if uncached:
+      BLOB_EXISTENCE_CACHE_MISSES.Increment(delta=len(uncached))
+      delegate_result = self.delegate.CheckBlobsExist(uncached)
+      result.update(delegate_result)
+      self._MarkExisting(b for b, exists in delegate_result.items() if exists)
+
+    return result
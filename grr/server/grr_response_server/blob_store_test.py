@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""Tests for blob store wrappers."""
+
+import os
+from unittest import mock
+
+from absl import app
+from absl.testing import absltest
+
+from grr_response_server import blob_store
+from grr_response_server import blob_store_test_mixin
+from grr_response_server.databases import mem as mem_db
+from grr_response_server.rdfvalues import objects as rdf_objects
+from grr.test_lib import stats_test_lib
+from grr.test_lib import test_lib
+
+
+def _Blob():
+  data = os.urandom(16)
+  return rdf_objects.BlobID.FromBlobData(data), data
+
+
+class BlobStoreExistenceCacheWrapperConformanceTest(
+    blob_store_test_mixin.BlobStoreTestMixin, absltest.TestCase):
+  # Test methods are defined in the base mixin class.
+
+  def CreateBlobStore(self):
+    bs = blob_store.BlobStoreExistenceCacheWrapper(
+        mem_db.InMemoryDB(), cache_size=100, bloom_filter_capacity=1000)
+    return bs, None
+
+
+class BlobStoreExistenceCacheWrapperTest(stats_test_lib.StatsTestMixin,
+                                         absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.delegate = mem_db.InMemoryDB()
+
+  def _Wrapper(self, **kwargs):
+    return blob_store.BlobStoreExistenceCacheWrapper(
+        mock.Mock(wraps=self.delegate), **kwargs)
+
+  def testWritingCachedBlobIsSkipped(self):
+    bs = self._Wrapper(cache_size=10)
+    blob_id, data = _Blob()
+
+    bs.WriteBlobs({blob_id: data})
+    with self.assertStatsCounterDelta(
+        1, blob_store.BLOB_EXISTENCE_CACHE_HITS, fields=["lru"]):
+      bs.WriteBlobs({blob_id: data})
+
+    bs.delegate.WriteBlobs.assert_called_once()
+    self.assertEqual(self.delegate.ReadBlob(blob_id), data)
+
+  def testCheckBlobsExistDoesNotQueryDelegateForCachedBlobs(self):
+    bs = self._Wrapper(cache_size=10)
+    cached_id, cached_data = _Blob()
+    missing_id, _ = _Blob()
+    bs.WriteBlobs({cached_id: cached_data})
+
+    result = bs.CheckBlobsExist([cached_id, missing_id])
+
+    self.assertEqual(result, {cached_id: True, missing_id: False})
+    bs.delegate.CheckBlobsExist.assert_called_once_with([missing_id])
+
+  def testBlobsSeenInReadsAreCached(self):
+    bs = self._Wrapper(cache_size=10)
+    blob_id, data = _Blob()
+    self.delegate.WriteBlobs({blob_id: data})
+
+    bs.ReadBlobs([blob_id])
+    bs.WriteBlobs({blob_id: data})
+
+    bs.delegate.WriteBlobs.assert_not_called()
+
+  def testLeastRecentlyUsedBlobsAreEvicted(self):
+    bs = self._Wrapper(cache_size=2)
+    blobs = [_Blob() for _ in range(3)]
+    for blob_id, data in blobs:
+      bs.WriteBlobs({blob_id: data})
+
+    bs.delegate.CheckBlobsExist.reset_mock()
+    bs.CheckBlobsExist([blob_id for blob_id, _ in blobs])
+
+    bs.delegate.CheckBlobsExist.assert_called_once_with([blobs[0][0]])
+
+  def testBloomFilterHitSkipsWriteOfExistingBlob(self):
+    bs = self._Wrapper(cache_size=1, bloom_filter_capacity=100)
+    blob_id, data = _Blob()
+    other_id, other_data = _Blob()
+
+    bs.WriteBlobs({blob_id: data})
+    # Evicts the first blob from the LRU cache.
+    bs.WriteBlobs({other_id: other_data})
+    bs.delegate.WriteBlobs.reset_mock()
+
+    with self.assertStatsCounterDelta(
+        1, blob_store.BLOB_EXISTENCE_CACHE_HITS, fields=["bloom_filter"]):
+      bs.WriteBlobs({blob_id: data})
+
+    bs.delegate.CheckBlobsExist.assert_called_once_with([blob_id])
+    bs.delegate.WriteBlobs.assert_not_called()
+
+  def testBloomFilterFalsePositiveIsWritten(self):
+    bs = self._Wrapper(cache_size=1, bloom_filter_capacity=100)
+    blob_id, data = _Blob()
+
+    with mock.patch.object(
+        blob_store.BlobBloomFilter, "__contains__", return_value=True):
+      with self.assertStatsCounterDelta(
+          1, blob_store.BLOB_EXISTENCE_CACHE_FALSE_POSITIVES):
+        bs.WriteBlobs({blob_id: data})
+
+    bs.delegate.WriteBlobs.assert_called_once_with({blob_id: data})
+    self.assertEqual(self.delegate.ReadBlob(blob_id), data)
+
+  def testFlushForgetsExistingBlobs(self):
+    bs = self._Wrapper(cache_size=10, bloom_filter_capacity=100)
+    blob_id, data = _Blob()
+    bs.WriteBlobs({blob_id: data})
+
+    bs.Flush()
+    bs.WriteBlobs({blob_id: data})
+
+    self.assertEqual(bs.delegate.WriteBlobs.call_count, 2)
+    bs.delegate.CheckBlobsExist.assert_not_called()
+
+  def testBlobsNotInBloomFilterAreWrittenWithoutCheck(self):
+    bs = self._Wrapper(cache_size=1, bloom_filter_capacity=100)
+    blob_id, data = _Blob()
+
+    with self.assertStatsCounterDelta(1,
+                                      blob_store.BLOB_EXISTENCE_CACHE_MISSES):
+      bs.WriteBlobs({blob_id: data})
+
+    bs.delegate.CheckBlobsExist.assert_not_called()
+    bs.delegate.WriteBlobs.assert_called_once_with({blob_id: data})
+
+
+class BlobBloomFilterTest(absltest.TestCase):
+
+  def testContainsAddedBlobs(self):
+    bloom_filter = blob_store.BlobBloomFilter(capacity=1000)
+    blob_ids = [_Blob()[0] for _ in range(1000)]
+    for blob_id in blob_ids:
+      bloom_filter.Add(blob_id)
+
+    for blob_id in blob_ids:
+      self.assertIn(blob_id, bloom_filter)
+
+  def testFalsePositiveRateIsBounded(self):
+    bloom_filter = blob_store.BlobBloomFilter(
+        capacity=1000, false_positive_rate=0.01)
+    for _ in range(1000):
+      bloom_filter.Add(_Blob()[0])
+
+    false_positives = sum(_Blob()[0] in bloom_filter for _ in range(10000))
+    # The expected number is 100; leave a wide margin to avoid flakiness.
+    self.assertLess(false_positives, 300)
+
+  def testIsClearedWhenOverCapacity(self):
+    bloom_filter = blob_store.BlobBloomFilter(capacity=10)
+    blob_id = _Blob()[0]
+    bloom_filter.Add(blob_id)
+    for _ in range(10):
+      bloom_filter.Add(_Blob()[0])
+
+    self.assertNotIn(blob_id, bloom_filter)
+
+  def testRaisesOnInvalidParameters(self):
+    with self.assertRaises(ValueError):
+      blob_store.BlobBloomFilter(capacity=0)
+    with self.assertRaises(ValueError):
+      blob_store.BlobBloomFilter(capacity=10, false_positive_rate=1)
+
+
+if __name__ == "__main__":
+  app.run(test_lib.main)
@@ -1,5 +1,10 @@
 #!/usr/bin/env python
-"""Benchmark to compare different BlobStore implementations."""
+"""Benchmark to compare different BlobStore implementations.
+
+Measures latency of blob writes and, unless --read_file_size is 0, throughput
+of sequential reads of a file through `file_store.BlobStream` with and without
+blob read-ahead.
+"""
 
 import io
 import time
@@ -8,8 +13,11 @@ from absl import app
 from absl import flags
 import numpy as np
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_server import blob_store
+from grr_response_server import data_store
+from grr_response_server import file_store
 from grr_response_server import server_startup
 from grr_response_server.rdfvalues import objects as rdf_objects
 
@@ -35,6 +43,31 @@ _PER_SIZE_DURATION_SECONDS = flags.DEFINE_integer(
     help="Benchmark duration per blob size in seconds.",
 )
 
+_READ_FILE_SIZE = flags.DEFINE_string(
+    "read_file_size",
+    default="64M",
+    help="Size of the file used to benchmark sequential reads. 0 disables "
+    "the read benchmark.",
+)
+
+_READ_BLOB_SIZE = flags.DEFINE_string(
+    "read_blob_size",
+    default="512K",
+    help="Size of the blobs the file used for the read benchmark consists of.",
+)
+
+_READ_CHUNK_SIZE = flags.DEFINE_string(
+    "read_chunk_size",
+    default="1M",
+    help="Size of individual reads from the file in the read benchmark.",
+)
+
+_READ_RUNS = flags.DEFINE_integer(
+    "read_runs",
+    default=3,
+    help="Number of times the file is read in each read-ahead mode.",
+)
+
 
 def _MakeBlobStore(blobstore_name):
   try:
@@ -88,6 +121,62 @@ def _RunBenchmark(bs, size_b, duration_sec, random_fd):
   return durations
 
 
+def _WriteFile(bs, file_size_b, blob_size_b, random_fd):
+  """Writes blobs making up a file and returns their references."""
+  blob_refs = []
+  offset = 0
+  while offset < file_size_b:
+    blob_id, blob_data = _MakeRandomBlob(
+        min(blob_size_b, file_size_b - offset), random_fd)
+    bs.WriteBlobs({blob_id: blob_data})
+    blob_refs.append(
+        rdf_objects.BlobReference(
+            offset=offset, size=len(blob_data), blob_id=blob_id))
+    offset += len(blob_data)
+  return blob_refs
+
+
+def _ReadFile(blob_refs, chunk_size_b):
+  """Reads a file sequentially, returns the number of bytes read."""
+  stream = file_store.BlobStream(None, blob_refs, None)
+  total = 0
+  try:
+    while True:
+      chunk = stream.read(chunk_size_b)
+      if not chunk:
+        return total
+      total += len(chunk)
+  finally:
+    stream.close()
+
+
+def _RunReadBenchmark(bs, random_fd):
+  """Prints sequential read throughput with and without read-ahead."""
+  file_size_b = rdfvalue.ByteSize(_READ_FILE_SIZE.value)
+  blob_refs = _WriteFile(bs, file_size_b,
+                         rdfvalue.ByteSize(_READ_BLOB_SIZE.value), random_fd)
+  chunk_size_b = rdfvalue.ByteSize(_READ_CHUNK_SIZE.value)
+
+  data_store.BLOBS = bs
+  read_ahead_batches = config.CONFIG["Server.blob_read_ahead_batches"]
+
+  print()
+  print("sequential read of {} in {} blobs".format(_READ_FILE_SIZE.value,
+                                                   len(blob_refs)))
+  print("mode\t\ttotal\t  b/sec")
+  for mode, batches in [("synchronous", 0),
+                        ("read-ahead", max(read_ahead_batches, 1))]:
+    config.CONFIG.Set("Server.blob_read_ahead_batches", batches)
+    for _ in range(_READ_RUNS.value):
+      read_b, read_time = _Timed(_ReadFile, blob_refs, chunk_size_b)
+      print("{mode}\t{total:.2f}s\t{bps: >7}".format(
+          mode=mode,
+          total=read_time,
+          bps=str(rdfvalue.ByteSize(int(read_b / read_time))).replace("iB",
+                                                                      "")))
+  config.CONFIG.Set("Server.blob_read_ahead_batches", read_ahead_batches)
+
+
 def main(argv):
   """Main."""
   del argv  # Unused.
@@ -114,6 +203,9 @@ def main(argv):
         )
         _PrintStats(size, size_b, durations)
 
+      if rdfvalue.ByteSize(_READ_FILE_SIZE.value):
+        _RunReadBenchmark(bs, random_fd)
+
 
 if __name__ == "__main__":
   app.run(main)
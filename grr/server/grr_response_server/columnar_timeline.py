@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+"""A columnar representation of collected timelines.
+
+Timeline entries are stored in segments of a fixed number of entries. Every
+segment keeps each numeric field of its entries in a separate NumPy array and
+the paths in a dictionary of parent folders plus a list of base names. Segments
+are stored compressed in the blob store.
+
+A segment index keeps minimum and maximum values of timestamps and sizes of
+every segment, so that segments that cannot contain entries matching a filter
+are skipped without being read. Within a segment, filters are evaluated on
+whole columns and only matching entries are converted back to protos.
+"""
+
+import io
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from grr_response_proto import timeline_pb2
+from grr_response_server import data_store
+from grr_response_server.rdfvalues import objects as rdf_objects
+
+# Numeric fields of timeline entries along with NumPy types they are stored as.
+_COLUMNS: Dict[str, np.dtype] = {
+    "mode": np.int64,
+    "size": np.uint64,
+    "dev": np.int64,
+    "ino": np.uint64,
+    "uid": np.int64,
+    "gid": np.int64,
+    "attributes": np.uint64,
+    "atime_ns": np.int64,
+    "mtime_ns": np.int64,
+    "ctime_ns": np.int64,
+    "btime_ns": np.int64,
+}
+
+# Columns for which the segment index keeps minimum and maximum values.
+RANGE_COLUMNS = ("atime_ns", "mtime_ns", "ctime_ns", "btime_ns", "size")
+
+# Columns (or "path") timeline entries can be sorted by.
+SORT_KEYS = RANGE_COLUMNS + ("path",)
+
+_BLOB_ID_SIZE = 32
+
+
+class Filter(NamedTuple):
+  """A filter of timeline entries.
+
+  All conditions have to be satisfied for an entry to match the filter. Ranges
+  are inclusive and unset bounds are not checked.
+  """
+  # A column the timestamp range applies to, e.g. `mtime_ns`.
+  timestamp_column: str = "mtime_ns"
+  min_timestamp_ns: Optional[int] = None
+  max_timestamp_ns: Optional[int] = None
+  # A prefix the path of an entry has to start with.
+  path_prefix: Optional[bytes] = None
+  min_size: Optional[int] = None
+  max_size: Optional[int] = None
+
+  def Ranges(self) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """Returns (column, min, max) triples of ranges constrained by the filter."""
+    ranges = []
+    if self.min_timestamp_ns is not None or self.max_timestamp_ns is not None:
+      ranges.append((self.timestamp_column, self.min_timestamp_ns,
+                     self.max_timestamp_ns))
+    if self.min_size is not None or self.max_size is not None:
+      ranges.append(("size", self.min_size, self.max_size))
+    return ranges
+
+
+def _SplitPath(path: bytes) -> Tuple[bytes, bytes]:
+  """Splits the path into a folder (with the trailing separator) and a name."""
+  idx = max(path.rfind(b"/"), path.rfind(b"\\"))
+  return path[:idx + 1], path[idx + 1:]
+
+
+def _PackBytes(items: Sequence[bytes]) -> Tuple[np.ndarray, np.ndarray]:
+  """Packs byte strings into a single array of bytes and array of offsets."""
+  offsets = np.zeros(len(items) + 1, dtype=np.int64)
+  np.cumsum([len(item) for item in items], out=offsets[1:])
+  data = np.frombuffer(b"".join(items), dtype=np.uint8)
+  return data, offsets
+
+
+class Segment(object):
+  """Timeline entries stored column-wise."""
+
+  def __init__(self, arrays: Dict[str, np.ndarray]):
+    """Initializes the segment.
+
+    Args:
+      arrays: A dictionary of named arrays, as created by `FromEntries`. Can
+        also be a lazily loaded `.npz` file.
+    """
+    self._arrays = arrays
+    self._cache: Dict[str, np.ndarray] = {}
+    self._dirs: Optional[List[bytes]] = None
+
+  @classmethod
+  def FromEntries(
+      cls,
+      entries: Sequence[timeline_pb2.TimelineEntry],
+  ) -> "Segment":
+    """Creates a segment out of the given timeline entries."""
+    arrays = {}
+    for name, dtype in _COLUMNS.items():
+      arrays[name] = np.fromiter((getattr(entry, name) for entry in entries),
+                                 dtype=dtype,
+                                 count=len(entries))
+
+    # Numeric fields set in the entries, so that unset fields stay unset.
+    present = np.zeros(len(entries), dtype=np.uint16)
+    for bit, name in enumerate(_COLUMNS):
+      present |= np.fromiter(
+          (entry.HasField(name) for entry in entries),
+          dtype=bool,
+          count=len(entries)).astype(np.uint16) << bit
+    arrays["present"] = present
+
+    dir_ids_by_dir: Dict[bytes, int] = {}
+    dir_ids = np.empty(len(entries), dtype=np.int32)
+    names = []
+    for i, entry in enumerate(entries):
+      dirname, name = _SplitPath(entry.path)
+      dir_ids[i] = dir_ids_by_dir.setdefault(dirname, len(dir_ids_by_dir))
+      names.append(name)
+
+    arrays["dir_ids"] = dir_ids
+    arrays["dirs_data"], arrays["dirs_offsets"] = _PackBytes(
+        list(dir_ids_by_dir))
+    arrays["names_data"], arrays["names_offsets"] = _PackBytes(names)
+
+    return cls(arrays)
+
+  @classmethod
+  def FromSerializedBytes(cls, data: bytes) -> "Segment":
+    # Arrays of `.npz` files are only decompressed when accessed.
+    return cls(np.load(io.BytesIO(data), allow_pickle=False))
+
+  def SerializeToBytes(self) -> bytes:
+    buf = io.BytesIO()
+    arrays = {name: self._Array(name) for name in self._arrays}
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
+
+  def _Array(self, name: str) -> np.ndarray:
+    try:
+      return self._cache[name]
+    except KeyError:
+      array = self._cache[name] = self._arrays[name]
+      return array
+
+  def __len__(self) -> int:
+    return len(self._Array("dir_ids"))
+
+  def Column(self, name: str) -> np.ndarray:
+    """Returns values of the given numeric field of all entries."""
+    if name not in _COLUMNS:
+      raise ValueError(f"Unknown timeline column: {name}")
+    return self._Array(name)
+
+  def _Dirs(self) -> List[bytes]:
+    if self._dirs is None:
+      data = self._Array("dirs_data").tobytes()
+      offsets = self._Array("dirs_offsets")
+      self._dirs = [
+          data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)
+      ]
+    return self._dirs
+
+  def Path(self, idx: int) -> bytes:
+    dirname = self._Dirs()[self._Array("dir_ids")[idx]]
+    start, end = self._Array("names_offsets")[idx:idx + 2]
+    return dirname + self._Array("names_data")[start:end].tobytes()
+
+  def Paths(self, indices: np.ndarray) -> List[bytes]:
+    return [self.Path(idx) for idx in indices]
+
+  def _PathPrefixMask(self, prefix: bytes) -> np.ndarray:
+    """Returns a mask of entries with paths starting with the prefix."""
+    dirs = self._Dirs()
+    dir_ids = self._Array("dir_ids")
+
+    full_matches = np.array([d.startswith(prefix) for d in dirs], dtype=bool)
+    mask = full_matches[dir_ids]
+
+    # Entries in folders that are prefixes of the searched prefix (i.e. the
+    # prefix extends into the name) have to be checked individually.
+    partial_dir_ids = [
+        dir_id for dir_id, d in enumerate(dirs)
+        if not full_matches[dir_id] and prefix.startswith(d)
+    ]
+    if partial_dir_ids:
+      for idx in np.flatnonzero(np.isin(dir_ids, partial_dir_ids)):
+        mask[idx] = self.Path(idx).startswith(prefix)
+
+    return mask
+
+  def Select(self, entry_filter: Filter) -> np.ndarray:
+    """Returns indices of entries matching the filter."""
+    mask = np.ones(len(self), dtype=bool)
+    for column, min_value, max_value in entry_filter.Ranges():
+      values = self.Column(column)
+      if min_value is not None:
+        mask &= values >= min_value
+      if max_value is not None:
+        mask &= values <= max_value
+
+    if entry_filter.path_prefix:
+      mask &= self._PathPrefixMask(entry_filter.path_prefix)
+
+    return np.flatnonzero(mask)
+
+  def Entry(self, idx: int) -> timeline_pb2.TimelineEntry:
+    """Returns a timeline entry proto for the entry with the given index."""
+    entry = timeline_pb2.TimelineEntry(path=self.Path(idx))
+    present = int(self._Array("present")[idx])
+    for bit, name in enumerate(_COLUMNS):
+      if present & (1 << bit):
+        setattr(entry, name, int(self._Array(name)[idx]))
+    return entry
+
+  def Entries(self,
+              indices: Iterable[int]) -> Iterator[timeline_pb2.TimelineEntry]:
+    """Yields timeline entry protos for entries with the given indices."""
+    return map(self.Entry, indices)
+
+
+class SegmentIndex(object):
+  """An index of segments of a single timeline."""
+
+  def __init__(self, arrays: Optional[Dict[str, np.ndarray]] = None):
+    if arrays is None:
+      arrays = {"blob_ids": np.empty((0, _BLOB_ID_SIZE), dtype=np.uint8)}
+      for column in RANGE_COLUMNS:
+        arrays[f"min_{column}"] = np.empty(0, dtype=_COLUMNS[column])
+        arrays[f"max_{column}"] = np.empty(0, dtype=_COLUMNS[column])
+      arrays["counts"] = np.empty(0, dtype=np.int64)
+
+    self._arrays = {name: arrays[name] for name in arrays}
+
+  @classmethod
+  def FromSerializedBytes(cls, data: bytes) -> "SegmentIndex":
+    return cls(np.load(io.BytesIO(data), allow_pickle=False))
+
+  @classmethod
+  def Concatenate(cls, indices: Sequence["SegmentIndex"]) -> "SegmentIndex":
+    """Creates an index of all segments of the given indices (in order)."""
+    result = cls()
+    if not indices:
+      return result
+
+    for name in result._arrays:
+      result._arrays[name] = np.concatenate(
+          [index._arrays[name] for index in indices])
+    return result
+
+  def SerializeToBytes(self) -> bytes:
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **self._arrays)
+    return buf.getvalue()
+
+  def __len__(self) -> int:
+    return len(self._arrays["counts"])
+
+  @property
+  def entry_count(self) -> int:
+    return int(self._arrays["counts"].sum())
+
+  def Add(self, blob_id: rdf_objects.BlobID, segment: Segment) -> None:
+    """Adds a segment stored under the given blob id to the index."""
+    row = {
+        "blob_ids": np.frombuffer(blob_id.AsBytes(), dtype=np.uint8)[None, :],
+        "counts": np.array([len(segment)], dtype=np.int64),
+    }
+    for column in RANGE_COLUMNS:
+      values = segment.Column(column)
+      row[f"min_{column}"] = values.min(keepdims=True)
+      row[f"max_{column}"] = values.max(keepdims=True)
+
+    for name, value in row.items():
+      self._arrays[name] = np.concatenate([self._arrays[name], value])
+
+  def BlobIds(self, entry_filter: Filter) -> List[rdf_objects.BlobID]:
+    """Returns blob ids of segments that may contain matching entries."""
+    mask = self._arrays["counts"] > 0
+    for column, min_value, max_value in entry_filter.Ranges():
+      if min_value is not None:
+        mask &= self._arrays[f"max_{column}"] >= min_value
+      if max_value is not None:
+        mask &= self._arrays[f"min_{column}"] <= max_value
+
+    return [
+        rdf_objects.BlobID(row.tobytes())
+        for row in self._arrays["blob_ids"][mask]
+    ]
+
+
+def WriteSegments(
+    entries: Iterable[timeline_pb2.TimelineEntry],
+    index: SegmentIndex,
+    segment_size: int,
+) -> None:
+  """Writes entries to the blob store as segments and adds them to the index.
+
+  Args:
+    entries: Timeline entries to write.
+    index: A segment index to add the written segments to.
+    segment_size: A maximum number of entries in a single segment.
+  """
+  batch = []
+
+  def Flush():
+    segment = Segment.FromEntries(batch)
+    blob_id = data_store.BLOBS.WriteBlobWithUnknownHash(
+        segment.SerializeToBytes())
+    index.Add(blob_id, segment)
+    batch.clear()
+
+  for entry in entries:
+    batch.append(entry)
+    if len(batch) >= segment_size:
+      Flush()
+
+  if batch:
+    Flush()
+
+
+def WriteIndexPart(
+    index: SegmentIndex,
+    previous_blob_id: Optional[rdf_objects.BlobID],
+) -> rdf_objects.BlobID:
+  """Writes the index to the blob store as a part linked to a previous part.
+
+  Parts form a chain from the last written part to the first one, so that an
+  index built in many batches never has to be rewritten and is identified by
+  a single blob id.
+
+  Args:
+    index: An index of segments written since the previous part.
+    previous_blob_id: A blob id of the previous part, if any.
+
+  Returns:
+    A blob id of the written part.
+  """
+  if previous_blob_id is None:
+    previous = np.empty((0, _BLOB_ID_SIZE), dtype=np.uint8)
+  else:
+    previous = np.frombuffer(previous_blob_id.AsBytes(), dtype=np.uint8)[None, :]
+
+  buf = io.BytesIO()
+  # pylint: disable=protected-access
+  np.savez_compressed(buf, previous_blob_id=previous, **index._arrays)
+  # pylint: enable=protected-access
+  return data_store.BLOBS.WriteBlobWithUnknownHash(buf.getvalue())
+
+
+def ReadIndex(blob_id: rdf_objects.BlobID) -> SegmentIndex:
+  """Reads an index from the chain of parts ending with the given blob id."""
+  parts = []
+
+  while blob_id is not None:
+    data = data_store.BLOBS.ReadBlob(blob_id)
+    if data is None:
+      raise AssertionError(f"Reference to non-existing blob: '{blob_id}'")
+
+    arrays = dict(np.load(io.BytesIO(data), allow_pickle=False))
+    previous = arrays.pop("previous_blob_id")
+    parts.append(SegmentIndex(arrays))
+
+    if previous.size:
+      blob_id = rdf_objects.BlobID(previous[0].tobytes())
+    else:
+      blob_id = None
+
+  parts.reverse()
+  return SegmentIndex.Concatenate(parts)
+
+
+def _ReadSegments(
+    index: SegmentIndex,
+    entry_filter: Filter,
+) -> Iterator[Segment]:
+  for blob_id in index.BlobIds(entry_filter):
+    data = data_store.BLOBS.ReadBlob(blob_id)
+    if data is None:
+      raise AssertionError(f"Reference to non-existing blob: '{blob_id}'")
+    yield Segment.FromSerializedBytes(data)
+
+
+def Query(
+    index: SegmentIndex,
+    entry_filter: Filter,
+    sort_key: Optional[str] = None,
+) -> Iterator[timeline_pb2.TimelineEntry]:
+  """Yields timeline entries matching the filter.
+
+  Args:
+    index: An index of the segments of the timeline to query.
+    entry_filter: A filter entries have to match.
+    sort_key: If set, entries are sorted by the given column (one of
+      `SORT_KEYS`). Otherwise entries are yielded in the collection order.
+
+  Yields:
+    Timeline entry protos.
+  """
+  if sort_key is not None and sort_key not in SORT_KEYS:
+    raise ValueError(f"Unsupported timeline sort key: {sort_key}")
+
+  if sort_key is None:
+    for segment in _ReadSegments(index, entry_filter):
+      yield from segment.Entries(segment.Select(entry_filter))
+    return
+
+  segments = []
+  segment_ids = []
+  indices = []
+  keys = []
+  for segment in _ReadSegments(index, entry_filter):
+    selected = segment.Select(entry_filter)
+    if not selected.size:
+      continue
+
+    segment_ids.append(np.full(len(selected), len(segments), dtype=np.int64))
+    segments.append(segment)
+    indices.append(selected)
+    if sort_key == "path":
+      keys.append(np.array(segment.Paths(selected), dtype=object))
+    else:
+      keys.append(segment.Column(sort_key)[selected])
+
+  if not segments:
+    return
+
+  segment_ids = np.concatenate(segment_ids)
+  indices = np.concatenate(indices)
+  order = np.argsort(np.concatenate(keys), kind="stable")
+
+  for i in order:
+    yield segments[segment_ids[i]].Entry(indices[i])
+
+
+def Filtered(
+    entries: Iterable[timeline_pb2.TimelineEntry],
+    entry_filter: Filter,
+    sort_key: Optional[str] = None,
+) -> Iterator[timeline_pb2.TimelineEntry]:
+  """Filters (and sorts) timeline entries that have no columnar index.
+
+  This has the same semantics as `Query`, but requires all entries to be
+  decoded.
+
+  Args:
+    entries: Timeline entries to filter.
+    entry_filter: A filter entries have to match.
+    sort_key: If set, entries are sorted by the given column (one of
+      `SORT_KEYS`).
+
+  Returns:
+    An iterator over matching timeline entries.
+  """
+  if sort_key is not None and sort_key not in SORT_KEYS:
+    raise ValueError(f"Unsupported timeline sort key: {sort_key}")
+
+  def Matches(entry: timeline_pb2.TimelineEntry) -> bool:
+    for column, min_value, max_value in entry_filter.Ranges():
+      value = getattr(entry, column)
+      if min_value is not None and value < min_value:
+        return False
+      if max_value is not None and value > max_value:
+        return False
+
+    prefix = entry_filter.path_prefix
+    return not prefix or entry.path.startswith(prefix)
+
+  result = filter(Matches, entries)
+  if sort_key is not None:
+    result = iter(sorted(result, key=lambda entry: getattr(entry, sort_key)))
+  return result
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+import random
+from unittest import mock
+
+from absl import app
+
+from grr_response_proto import timeline_pb2
+from grr_response_server import columnar_timeline
+from grr_response_server import data_store
+from grr.test_lib import test_lib
+
+
+def _Entry(path, size=0, mtime_ns=0, **kwargs):
+  return timeline_pb2.TimelineEntry(
+      path=path, size=size, mtime_ns=mtime_ns, **kwargs)
+
+
+def _RandomEntries(count):
+  entries = []
+  for idx in range(count):
+    entries.append(
+        timeline_pb2.TimelineEntry(
+            path=b"/%s/%s/file%d" % (random.choice([b"foo", b"bar", b"baz"]),
+                                     random.choice([b"a", b"ab", b"b"]), idx),
+            size=random.randint(0, 1024),
+            mode=random.randint(0, 0o777),
+            ino=random.randint(0, 2**64 - 1),
+            atime_ns=random.randint(0, 10**18),
+            mtime_ns=random.randint(0, 10**18),
+            ctime_ns=random.randint(0, 10**18),
+            btime_ns=random.randint(0, 10**18)))
+  return entries
+
+
+class SegmentTest(test_lib.GRRBaseTest):
+
+  def testSerializationRoundTrip(self):
+    entries = _RandomEntries(100)
+    entries.append(_Entry(b"/"))
+    entries.append(_Entry(b"C:\\Windows\\notepad.exe"))
+    entries.append(_Entry(b"relative"))
+
+    segment = columnar_timeline.Segment.FromEntries(entries)
+    data = segment.SerializeToBytes()
+    segment = columnar_timeline.Segment.FromSerializedBytes(data)
+
+    self.assertLen(segment, len(entries))
+    self.assertEqual(list(segment.Entries(range(len(entries)))), entries)
+
+  def testSelectByRanges(self):
+    entries = [
+        _Entry(b"/foo", size=1, mtime_ns=10),
+        _Entry(b"/bar", size=2, mtime_ns=20),
+        _Entry(b"/baz", size=3, mtime_ns=30),
+    ]
+    segment = columnar_timeline.Segment.FromEntries(entries)
+
+    entry_filter = columnar_timeline.Filter(
+        min_timestamp_ns=20, max_timestamp_ns=30)
+    self.assertEqual(list(segment.Select(entry_filter)), [1, 2])
+
+    entry_filter = columnar_timeline.Filter(max_size=2)
+    self.assertEqual(list(segment.Select(entry_filter)), [0, 1])
+
+    entry_filter = columnar_timeline.Filter(min_timestamp_ns=20, max_size=2)
+    self.assertEqual(list(segment.Select(entry_filter)), [1])
+
+  def testSelectByPathPrefix(self):
+    entries = [
+        _Entry(b"/foo"),
+        _Entry(b"/foobar"),
+        _Entry(b"/foo/bar"),
+        _Entry(b"/foo/bar/baz"),
+        _Entry(b"/quux/foo"),
+    ]
+    segment = columnar_timeline.Segment.FromEntries(entries)
+
+    entry_filter = columnar_timeline.Filter(path_prefix=b"/foo")
+    self.assertEqual(list(segment.Select(entry_filter)), [0, 1, 2, 3])
+
+    entry_filter = columnar_timeline.Filter(path_prefix=b"/foo/")
+    self.assertEqual(list(segment.Select(entry_filter)), [2, 3])
+
+    entry_filter = columnar_timeline.Filter(path_prefix=b"/foo/ba")
+    self.assertEqual(list(segment.Select(entry_filter)), [2, 3])
+
+
+class QueryTest(test_lib.GRRBaseTest):
+
+  def _Index(self, entries, segment_size=10):
+    index = columnar_timeline.SegmentIndex()
+    columnar_timeline.WriteSegments(entries, index, segment_size=segment_size)
+    # Make sure that the index survives serialization.
+    return columnar_timeline.SegmentIndex.FromSerializedBytes(
+        index.SerializeToBytes())
+
+  def testWritesSegments(self):
+    index = self._Index(_RandomEntries(25))
+
+    self.assertLen(index, 3)
+    self.assertEqual(index.entry_count, 25)
+
+  def testConcatenatesIndices(self):
+    entries = _RandomEntries(25)
+    index = columnar_timeline.SegmentIndex.Concatenate(
+        [self._Index(entries[:12]),
+         self._Index(entries[12:20]),
+         self._Index(entries[20:])])
+
+    self.assertLen(index, 4)
+    self.assertEqual(index.entry_count, 25)
+
+    result = list(columnar_timeline.Query(index, columnar_timeline.Filter()))
+    self.assertEqual(result, entries)
+
+  def testReadsChainedIndexParts(self):
+    entries = _RandomEntries(25)
+
+    blob_id = None
+    for part in [entries[:12], entries[12:20], entries[20:]]:
+      index = columnar_timeline.SegmentIndex()
+      columnar_timeline.WriteSegments(part, index, segment_size=10)
+      blob_id = columnar_timeline.WriteIndexPart(index, blob_id)
+
+    index = columnar_timeline.ReadIndex(blob_id)
+    self.assertLen(index, 4)
+    self.assertEqual(index.entry_count, 25)
+
+    result = list(columnar_timeline.Query(index, columnar_timeline.Filter()))
+    self.assertEqual(result, entries)
+
+  def testQueryWithoutFilterReturnsAllEntries(self):
+    entries = _RandomEntries(25)
+    index = self._Index(entries)
+
+    result = list(columnar_timeline.Query(index, columnar_timeline.Filter()))
+    self.assertEqual(result, entries)
+
+  def testSkipsSegmentsOutsideOfRange(self):
+    entries = [_Entry(b"/file%d" % idx, mtime_ns=idx) for idx in range(100)]
+    index = self._Index(entries)
+
+    entry_filter = columnar_timeline.Filter(
+        min_timestamp_ns=42, max_timestamp_ns=47)
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlob",
+        wraps=data_store.BLOBS.ReadBlob) as read_blob:
+      result = list(columnar_timeline.Query(index, entry_filter))
+
+    self.assertEqual(result, entries[42:48])
+    self.assertEqual(read_blob.call_count, 1)
+
+  def testSortsEntries(self):
+    entries = _RandomEntries(50)
+    index = self._Index(entries)
+
+    for sort_key in columnar_timeline.SORT_KEYS:
+      result = list(
+          columnar_timeline.Query(
+              index, columnar_timeline.Filter(), sort_key=sort_key))
+      expected = sorted(entries, key=lambda entry: getattr(entry, sort_key))  # pylint: disable=cell-var-from-loop
+      self.assertEqual(result, expected)
+
+  def testRaisesOnUnknownSortKey(self):
+    index = self._Index(_RandomEntries(5))
+
+    with self.assertRaises(ValueError):
+      list(
+          columnar_timeline.Query(
+              index, columnar_timeline.Filter(), sort_key="mode"))
+
+  def testQueryMatchesFilteredEntries(self):
+    entries = _RandomEntries(200)
+    index = self._Index(entries, segment_size=32)
+
+    entry_filters = [
+        columnar_timeline.Filter(min_size=100, max_size=900),
+        columnar_timeline.Filter(
+            timestamp_column="atime_ns",
+            min_timestamp_ns=10**17,
+            max_timestamp_ns=5 * 10**17),
+        columnar_timeline.Filter(path_prefix=b"/foo/a"),
+        columnar_timeline.Filter(
+            timestamp_column="btime_ns",
+            min_timestamp_ns=10**17,
+            path_prefix=b"/bar/",
+            max_size=512),
+    ]
+    for entry_filter in entry_filters:
+      for sort_key in [None, "ctime_ns", "path"]:
+        self.assertEqual(
+            list(columnar_timeline.Query(index, entry_filter, sort_key)),
+            list(columnar_timeline.Filtered(entries, entry_filter, sort_key)))
+
+
+if __name__ == "__main__":
+  app.run(test_lib.main)
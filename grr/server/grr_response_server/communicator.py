@@ -4,13 +4,13 @@
 import abc
 import struct
 import time
-import zlib
 
 from grr_response_core.lib import communicator
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import type_info
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.util import compression
 from grr_response_core.stats import metrics
 
 
@@ -63,17 +63,10 @@ class Communicator(metaclass=abc.ABCMeta):
   @classmethod
   def EncodeMessageList(cls, message_list, packed_message_list):
     """Encode the MessageList into the packed_message_list rdfvalue."""
-    # By default uncompress
-    uncompressed_data = message_list.SerializeToBytes()
-    packed_message_list.message_list = uncompressed_data
-
-    compressed_data = zlib.compress(uncompressed_data)
-
-    # Only compress if it buys us something.
-    if len(compressed_data) < len(uncompressed_data):
-      packed_message_list.compression = (
-          rdf_flows.PackedMessageList.CompressionType.ZCOMPRESSION)
-      packed_message_list.message_list = compressed_data
+    # Clients may not support any other codec than zlib.
+    data, codec = compression.Compress(message_list.SerializeToBytes())
+    packed_message_list.message_list = data
+    packed_message_list.compression = codec
 
   def _ClearServerCipherCache(self):
     self.server_cipher = None
@@ -194,18 +187,11 @@ class Communicator(metaclass=abc.ABCMeta):
     Raises:
       DecodingError: If decompression fails.
     """
-    compression = packed_message_list.compression
-    if compression == rdf_flows.PackedMessageList.CompressionType.UNCOMPRESSED:
-      data = packed_message_list.message_list
-
-    elif (compression ==
-          rdf_flows.PackedMessageList.CompressionType.ZCOMPRESSION):
-      try:
-        data = zlib.decompress(packed_message_list.message_list)
-      except zlib.error as e:
-        raise DecodingError("Failed to decompress: %s" % e)
-    else:
-      raise DecodingError("Compression scheme not supported")
+    try:
+      data = compression.Decompress(packed_message_list.message_list,
+                                    packed_message_list.compression)
+    except compression.DecompressionError as e:
+      raise DecodingError(str(e))
 
     try:
       result = rdf_flows.MessageList.FromSerializedBytes(data)
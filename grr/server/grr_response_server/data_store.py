@@ -95,4 +95,30 @@ def InitializeDataStore():
     cls = blob_store.REGISTRY[blobstore_name]
   except KeyError:
     raise ValueError("No blob store %s found." % blobstore_name)
-  BLOBS = blob_store.BlobStoreValidationWrapper(cls())
+  blobs = cls()
+
+  cache_size = config.CONFIG["Blobstore.existence_cache_size"]
+  if cache_size:
+    blobs = blob_store.BlobStoreExistenceCacheWrapper(
+        blobs,
+        cache_size=cache_size,
+        bloom_filter_capacity=config
+        .CONFIG["Blobstore.existence_bloom_filter_capacity"])
+
+  BLOBS = blob_store.BlobStoreValidationWrapper(blobs)
+
+
+def FlushCaches() -> None:
+  """Drops all data cached in-process from the data stores.
+
+  Has to be called if the data stores are changed behind the back of the
+  in-process caches, e.g. when a test database is cleared.
+  """
+  if isinstance(REL_DB, db.DatabaseValidationWrapper):
+    REL_DB.FlushCaches()
+
+  blobs = BLOBS
+  if isinstance(blobs, blob_store.BlobStoreValidationWrapper):
+    blobs = blobs.delegate
+  if isinstance(blobs, blob_store.BlobStoreExistenceCacheWrapper):
+    blobs.Flush()
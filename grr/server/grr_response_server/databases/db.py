@@ -8,6 +8,9 @@ a logical relational database model.
 import abc
 import collections
 import re
+import threading
+from typing import Callable
+from typing import Any
 from typing import Collection
 from typing import Dict
 from typing import Iterable
@@ -30,6 +33,7 @@ from grr_response_core.lib.rdfvalues import client_network as rdf_client_network
 from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import search as rdf_search
 from grr_response_core.lib.rdfvalues import stats as rdf_stats
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
@@ -70,6 +74,12 @@ CLIENT_IDS_BATCH_SIZE = 500000
 _EMAIL_REGEX = re.compile(r"[^@]+@([^@]+)$")
 MAX_EMAIL_LENGTH = 255
 
+# Requests of a single flow that are ready for processing as returned by
+# `Database.ReadFlowRequestsReadyForProcessing`: a dict mapping request ids to
+# (request, sorted list of responses) tuples.
+ReadyFlowRequests = Dict[int, Tuple[rdf_flow_objects.FlowRequest,
+                                    List[rdf_flow_objects.FlowResponse]]]
+
 
 class Error(Exception):
   """Base exception class for DB exceptions."""
@@ -312,6 +322,20 @@ class UnknownHuntOutputPluginStateError(NotFoundError):
                     (self.hunt_id, self.state_index))
 
 
+class UnknownFlowOutputPluginStateError(NotFoundError):
+
+  def __init__(self, client_id, flow_id, output_plugin_id):
+    super().__init__(client_id, flow_id, output_plugin_id)
+
+    self.client_id = client_id
+    self.flow_id = flow_id
+    self.output_plugin_id = output_plugin_id
+
+    self.message = ("Output plugin state for flow '%s' of client '%s' with "
+                    "id '%s' does not exist" %
+                    (self.flow_id, self.client_id, self.output_plugin_id))
+
+
 class AtLeastOneUnknownFlowError(NotFoundError):
 
   def __init__(self, flow_keys, cause=None):
@@ -1460,7 +1484,6 @@ class Database(metaclass=abc.ABCMeta):
     return self.ListDescendantPathInfos(
         client_id, path_type, components, max_depth=1, timestamp=timestamp)
 
-  @abc.abstractmethod
   def ListDescendantPathInfos(self,
                               client_id,
                               path_type,
@@ -1480,6 +1503,57 @@ class Database(metaclass=abc.ABCMeta):
 
     Returns:
       A list of `rdf_objects.PathInfo` instances sorted by path components.
+      Implementations should return a consistent snapshot of the paths.
+    """
+    path_infos = self.IterDescendantPathInfos(
+        client_id,
+        path_type,
+        components,
+        timestamp=timestamp,
+        max_depth=max_depth)
+    return sorted(path_infos, key=lambda _: tuple(_.components))
+
+  @abc.abstractmethod
+  def IterDescendantPathInfos(
+      self,
+      client_id: Text,
+      path_type: rdf_objects.PathInfo.PathType,
+      components: Sequence[Text],
+      timestamp: Optional[rdfvalue.RDFDatetime] = None,
+      max_depth: Optional[int] = None,
+  ) -> Iterator[rdf_objects.PathInfo]:
+    """Yields path info records that correspond to descendants of given path.
+
+    Unlike `ListDescendantPathInfos`, this method doesn't hold all descendants
+    in memory. Descendants may be read in pages, each in its own transaction,
+    so the result is not guaranteed to be a consistent snapshot if paths are
+    written while it's consumed: paths written after the iteration started may
+    or may not be yielded, and stat and hash entries of later pages may be
+    newer than those of earlier ones. Every path is yielded at most once.
+
+    Path infos are yielded in the order of their canonical paths, i.e. by the
+    code points of `"/" + "/".join(components)`. This means that every path is
+    yielded after all its ancestors, but unlike the order of path components,
+    "/foo/bar" comes after "/foo-bar".
+
+    Args:
+      client_id: An identifier string for a client.
+      path_type: A type of a path to retrieve path information for.
+      components: A tuple of path components of a path to retrieve descendent
+        path information for.
+      timestamp: If set, yields only descendants that existed at that
+        timestamp.
+      max_depth: If set, the maximum number of generations to descend, otherwise
+        unlimited.
+
+    Yields:
+      `rdf_objects.PathInfo` instances.
+
+    Raises:
+      UnknownPathError: If the given path doesn't exist (raised when the first
+        item is requested).
+      NotDirectoryPathError: If the given path is not a directory (raised when
+        the first item is requested).
     """
 
   @abc.abstractmethod
@@ -1704,6 +1778,130 @@ class Database(metaclass=abc.ABCMeta):
       timeout: A timeout in seconds for joining the handler thread.
     """
 
+  @abc.abstractmethod
+  def WriteOutputPluginRequests(
+      self, requests: Sequence[rdf_flow_objects.OutputPluginRequest]) -> None:
+    """Writes a list of output plugin requests to the database.
+
+    For requests of flow output plugins, the `output_plugin_state` snapshot
+    is stored as the plugin's queued state (see
+    `ReadQueuedFlowOutputPluginState`) unless a state is already stored.
+
+    Args:
+      requests: List of rdf_flow_objects.OutputPluginRequest.
+    """
+
+  @abc.abstractmethod
+  def ReadOutputPluginRequests(
+      self) -> Sequence[rdf_flow_objects.OutputPluginRequest]:
+    """Reads all output plugin requests from the database.
+
+    Returns:
+      A list of rdf_flow_objects.OutputPluginRequest, sorted by timestamp,
+      newest first.
+    """
+
+  @abc.abstractmethod
+  def DeleteOutputPluginRequests(
+      self, requests: Sequence[rdf_flow_objects.OutputPluginRequest]) -> None:
+    """Deletes a list of output plugin requests from the database.
+
+    Args:
+      requests: List of rdf_flow_objects.OutputPluginRequest.
+    """
+
+  @abc.abstractmethod
+  def DelayOutputPluginRequests(
+      self,
+      requests: Sequence[rdf_flow_objects.OutputPluginRequest],
+      delay: rdfvalue.Duration,
+  ) -> None:
+    """Releases leased output plugin requests to be retried after a delay.
+
+    The number of attempts of every request is incremented. Requests can't be
+    leased again until the delay passes.
+
+    Args:
+      requests: List of leased rdf_flow_objects.OutputPluginRequest.
+      delay: rdfvalue.Duration to wait before the requests can be leased again.
+    """
+
+  @abc.abstractmethod
+  def RegisterOutputPluginHandler(
+      self,
+      handler: Callable[[Sequence[rdf_flow_objects.OutputPluginRequest]], None],
+      lease_time: rdfvalue.Duration,
+      limit: int = 1000,
+  ) -> None:
+    """Registers an output plugin handler to receive batches of requests.
+
+    Args:
+      handler: Method, which will be called repeatedly with lists of leased
+        rdf_flow_objects.OutputPluginRequest. Required.
+      lease_time: rdfvalue.Duration indicating how long the lease should be
+        valid. Required.
+      limit: Limit for the number of leased requests to give one execution of
+        handler.
+    """
+
+  @abc.abstractmethod
+  def UnregisterOutputPluginHandler(self,
+                                    timeout: Optional[float] = None) -> None:
+    """Unregisters any registered output plugin handler.
+
+    Args:
+      timeout: A timeout in seconds for joining the handler thread.
+    """
+
+  @abc.abstractmethod
+  def ReadQueuedFlowOutputPluginState(
+      self,
+      client_id: str,
+      flow_id: str,
+      output_plugin_id: str,
+  ) -> rdf_flow_runner.OutputPluginState:
+    """Reads the state of a flow output plugin processing queued requests.
+
+    Args:
+      client_id: The client id on which the flow is running.
+      flow_id: The id of the flow.
+      output_plugin_id: The id of the output plugin.
+
+    Returns:
+      An rdf_flow_runner.OutputPluginState.
+
+    Raises:
+      UnknownFlowOutputPluginStateError: if no requests were ever queued for
+          the plugin.
+    """
+
+  @abc.abstractmethod
+  def UpdateQueuedFlowOutputPluginState(
+      self,
+      client_id: str,
+      flow_id: str,
+      output_plugin_id: str,
+      update_fn: Callable[[rdf_protodict.AttributedDict],
+                          rdf_protodict.AttributedDict],
+  ) -> rdf_flow_runner.OutputPluginState:
+    """Updates the state of a flow output plugin processing queued requests.
+
+    Args:
+      client_id: The client id on which the flow is running.
+      flow_id: The id of the flow.
+      output_plugin_id: The id of the output plugin.
+      update_fn: A function accepting the plugin state (an AttributedDict).
+        The function is expected to return a modified state (it's ok to modify
+        it in-place).
+
+    Returns:
+      The updated rdf_flow_runner.OutputPluginState.
+
+    Raises:
+      UnknownFlowOutputPluginStateError: if no requests were ever queued for
+          the plugin.
+    """
+
   @abc.abstractmethod
   def WriteCronJob(self, cronjob):
     """Writes a cronjob to the database.
@@ -2047,6 +2245,28 @@ class Database(metaclass=abc.ABCMeta):
       And rdf_flow_objects.Flow object.
     """
 
+  @abc.abstractmethod
+  def LeaseFlowsForProcessing(
+      self,
+      flow_keys: Collection[Tuple[str, str]],
+      processing_time: rdfvalue.Duration,
+  ) -> Dict[Tuple[str, str], rdf_flow_objects.Flow]:
+    """Marks multiple flows as being processed on this worker and returns them.
+
+    Unlike `LeaseFlowForProcessing`, this method doesn't raise if a flow can't
+    be leased. Unknown flows, flows that are already being processed and flows
+    whose parent hunt is not running are simply left out of the result.
+
+    Args:
+      flow_keys: A collection of (client_id, flow_id) tuples.
+      processing_time: Duration that the worker has to finish processing before
+        the flows are considered stuck.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to leased
+      rdf_flow_objects.Flow objects.
+    """
+
   @abc.abstractmethod
   def ReleaseProcessedFlow(self, flow_obj):
     """Releases a flow that the worker was processing to the database.
@@ -2064,6 +2284,23 @@ class Database(metaclass=abc.ABCMeta):
       this method will return false and the flow will not be written.
     """
 
+  @abc.abstractmethod
+  def ReleaseProcessedFlows(
+      self,
+      flow_objs: Sequence[rdf_flow_objects.Flow],
+  ) -> Dict[Tuple[str, str], bool]:
+    """Releases multiple flows that the worker was processing to the database.
+
+    This is a batched version of `ReleaseProcessedFlow`.
+
+    Args:
+      flow_objs: A sequence of rdf_flow_objects.Flow objects to return.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to booleans indicating if it
+      was possible to return the corresponding flow to the database.
+    """
+
   @abc.abstractmethod
   def UpdateFlow(self,
                  client_id,
@@ -2189,6 +2426,25 @@ class Database(metaclass=abc.ABCMeta):
       sorted list of responses for the request).
     """
 
+  @abc.abstractmethod
+  def MultiReadFlowRequestsReadyForProcessing(
+      self,
+      next_needed_requests: Mapping[Tuple[str, str], int],
+  ) -> Dict[Tuple[str, str], ReadyFlowRequests]:
+    """Reads requests that can be processed by the worker for multiple flows.
+
+    This is a batched version of `ReadFlowRequestsReadyForProcessing`.
+
+    Args:
+      next_needed_requests: A mapping from (client_id, flow_id) tuples to the
+        next request id that the corresponding flow needs to process.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to dicts in the format
+      returned by `ReadFlowRequestsReadyForProcessing`. Flows without any
+      requests ready for processing are mapped to empty dicts.
+    """
+
   @abc.abstractmethod
   def WriteFlowProcessingRequests(self, requests):
     """Writes a list of flow processing requests to the database.
@@ -2219,12 +2475,14 @@ class Database(metaclass=abc.ABCMeta):
     """Deletes all flow processing requests from the database."""
 
   @abc.abstractmethod
-  def RegisterFlowProcessingHandler(self, handler):
+  def RegisterFlowProcessingHandler(self, handler, batch_size=None):
     """Registers a handler to receive flow processing messages.
 
     Args:
-      handler: Method, which will be called repeatedly with lists of
-        rdf_flows.FlowProcessingRequest. Required.
+      handler: Method, which will be called repeatedly with
+        rdf_flows.FlowProcessingRequest objects. Required.
+      batch_size: If set, the handler is called with lists of up to this many
+        rdf_flows.FlowProcessingRequest objects instead.
     """
 
   @abc.abstractmethod
@@ -2897,6 +3155,18 @@ class Database(metaclass=abc.ABCMeta):
       rdf_stats.ClientResourcesStats object.
     """
 
+  @abc.abstractmethod
+  def RebuildHuntCounters(self, hunt_id):
+    """Recomputes hunt counters and client resources stats from hunt flows.
+
+    Databases that maintain hunt counters incrementally use this to repair
+    them (or to fill them in for hunts created before counters were
+    maintained). Databases computing counters on read do nothing.
+
+    Args:
+      hunt_id: The id of the hunt to rebuild counters for.
+    """
+
   @abc.abstractmethod
   def ReadHuntFlowsStatesAndTimestamps(self, hunt_id):
     """Reads hunt flows states and timestamps.
@@ -3106,6 +3376,58 @@ class DatabaseValidationWrapper(Database):
   def __init__(self, delegate: Database):
     super().__init__()
     self.delegate = delegate
+    # Incremented whenever foreman rules are changed through this object. Lets
+    # in-process caches of foreman rules notice the changes right away.
+    self.foreman_rules_version = 0
+    self._client_change_listeners: List[Callable[[Collection[str]], None]] = []
+    self._caches: Dict[str, Any] = {}
+    self._caches_lock = threading.Lock()
+
+  def GetCache(self, name: str, factory: Callable[["Database"], Any]) -> Any:
+    """Returns an in-process cache of data read through this object.
+
+    Caches live as long as the database object and are created on first use,
+    so replacing the database (e.g. in tests) never leaves caches populated from
+    the old one behind.
+
+    Args:
+      name: A name identifying the cache.
+      factory: A function creating the cache, called with this object.
+
+    Returns:
+      The cache registered under the given name.
+    """
+    with self._caches_lock:
+      cache = self._caches.get(name)
+      if cache is None:
+        cache = factory(self)
+        self._caches[name] = cache
+      return cache
+
+  def FlushCaches(self) -> None:
+    """Drops all data cached by caches returned by `GetCache`."""
+    with self._caches_lock:
+      caches = list(self._caches.values())
+
+    for cache in caches:
+      cache.Flush()
+
+  def AddClientChangeListener(
+      self, listener: Callable[[Collection[str]], None]) -> None:
+    """Registers a function called when clients are changed through this object.
+
+    The function is called with ids of clients whose snapshots or labels were
+    written, or that were deleted. Lets in-process caches of client data drop
+    stale entries right away.
+
+    Args:
+      listener: A function to call with a collection of client ids.
+    """
+    self._client_change_listeners.append(listener)
+
+  def _NotifyClientChange(self, client_ids: Collection[str]) -> None:
+    for listener in self._client_change_listeners:
+      listener(client_ids)
 
   def Now(self) -> rdfvalue.RDFDatetime:
     return self.delegate.Now()
@@ -3168,7 +3490,10 @@ class DatabaseValidationWrapper(Database):
 
   def DeleteClient(self, client_id):
     precondition.ValidateClientId(client_id)
-    return self.delegate.DeleteClient(client_id)
+    try:
+      return self.delegate.DeleteClient(client_id)
+    finally:
+      self._NotifyClientChange([client_id])
 
   def MultiReadClientMetadata(self, client_ids):
     _ValidateClientIds(client_ids)
@@ -3182,7 +3507,10 @@ class DatabaseValidationWrapper(Database):
                           _MAX_CLIENT_PLATFORM_LENGTH)
     _ValidateStringLength("Platform Release", snapshot.Uname(),
                           _MAX_CLIENT_PLATFORM_RELEASE_LENGTH)
-    return self.delegate.WriteClientSnapshot(snapshot)
+    try:
+      return self.delegate.WriteClientSnapshot(snapshot)
+    finally:
+      self._NotifyClientChange([snapshot.client_id])
 
   def MultiReadClientSnapshot(self, client_ids):
     _ValidateClientIds(client_ids)
@@ -3227,7 +3555,10 @@ class DatabaseValidationWrapper(Database):
         message = "Unexpected client id '%s' instead of '%s'"
         raise ValueError(message % (client.client_id, client_id))
 
-    return self.delegate.WriteClientSnapshotHistory(clients)
+    try:
+      return self.delegate.WriteClientSnapshotHistory(clients)
+    finally:
+      self._NotifyClientChange([client_id])
 
   def ReadClientSnapshotHistory(self, client_id, timerange=None):
     precondition.ValidateClientId(client_id)
@@ -3332,7 +3663,10 @@ class DatabaseValidationWrapper(Database):
     for label in labels:
       _ValidateLabel(label)
 
-    return self.delegate.AddClientLabels(client_id, owner, labels)
+    try:
+      return self.delegate.AddClientLabels(client_id, owner, labels)
+    finally:
+      self._NotifyClientChange([client_id])
 
   def MultiAddClientLabels(
       self,
@@ -3341,7 +3675,10 @@ class DatabaseValidationWrapper(Database):
       labels: Collection[str],
   ) -> None:
     """Attaches user labels to the specified clients."""
-    return self.delegate.MultiAddClientLabels(client_ids, owner, labels)
+    try:
+      return self.delegate.MultiAddClientLabels(client_ids, owner, labels)
+    finally:
+      self._NotifyClientChange(client_ids)
 
   def MultiReadClientLabels(
       self,
@@ -3359,7 +3696,10 @@ class DatabaseValidationWrapper(Database):
     for label in labels:
       _ValidateLabel(label)
 
-    return self.delegate.RemoveClientLabels(client_id, owner, labels)
+    try:
+      return self.delegate.RemoveClientLabels(client_id, owner, labels)
+    finally:
+      self._NotifyClientChange([client_id])
 
   def ReadAllClientLabels(self) -> Collection[str]:
     result = self.delegate.ReadAllClientLabels()
@@ -3412,7 +3752,10 @@ class DatabaseValidationWrapper(Database):
     if not rule.hunt_id:
       raise ValueError("Foreman rule has no hunt_id: %s" % rule)
 
-    return self.delegate.WriteForemanRule(rule)
+    try:
+      return self.delegate.WriteForemanRule(rule)
+    finally:
+      self.foreman_rules_version += 1
 
   def CountClientVersionStringsByLabel(
       self, day_buckets: Set[int]) -> fleet_utils.FleetStats:
@@ -3431,13 +3774,19 @@ class DatabaseValidationWrapper(Database):
 
   def RemoveForemanRule(self, hunt_id):
     _ValidateHuntId(hunt_id)
-    return self.delegate.RemoveForemanRule(hunt_id)
+    try:
+      return self.delegate.RemoveForemanRule(hunt_id)
+    finally:
+      self.foreman_rules_version += 1
 
   def ReadAllForemanRules(self):
     return self.delegate.ReadAllForemanRules()
 
   def RemoveExpiredForemanRules(self):
-    return self.delegate.RemoveExpiredForemanRules()
+    try:
+      return self.delegate.RemoveExpiredForemanRules()
+    finally:
+      self.foreman_rules_version += 1
 
   def WriteGRRUser(self,
                    username,
@@ -3581,6 +3930,27 @@ class DatabaseValidationWrapper(Database):
         timestamp=timestamp,
         max_depth=max_depth)
 
+  def IterDescendantPathInfos(
+      self,
+      client_id: Text,
+      path_type: rdf_objects.PathInfo.PathType,
+      components: Sequence[Text],
+      timestamp: Optional[rdfvalue.RDFDatetime] = None,
+      max_depth: Optional[int] = None,
+  ) -> Iterator[rdf_objects.PathInfo]:
+    precondition.ValidateClientId(client_id)
+    _ValidateEnumType(path_type, rdf_objects.PathInfo.PathType)
+    _ValidatePathComponents(components)
+    precondition.AssertOptionalType(timestamp, rdfvalue.RDFDatetime)
+    precondition.AssertOptionalType(max_depth, int)
+
+    return self.delegate.IterDescendantPathInfos(
+        client_id,
+        path_type,
+        components,
+        timestamp=timestamp,
+        max_depth=max_depth)
+
   def FindPathInfoByPathID(self, client_id, path_type, path_id, timestamp=None):
     precondition.ValidateClientId(client_id)
 
@@ -3747,6 +4117,81 @@ class DatabaseValidationWrapper(Database):
   def UnregisterMessageHandler(self, timeout=None):
     return self.delegate.UnregisterMessageHandler(timeout=timeout)
 
+  def WriteOutputPluginRequests(
+      self, requests: Sequence[rdf_flow_objects.OutputPluginRequest]) -> None:
+    precondition.AssertIterableType(requests,
+                                    rdf_flow_objects.OutputPluginRequest)
+    for request in requests:
+      precondition.ValidateClientId(request.client_id)
+      precondition.ValidateFlowId(request.flow_id)
+      if request.hunt_id:
+        _ValidateHuntId(request.hunt_id)
+      _ValidateOutputPluginId(request.output_plugin_id)
+    return self.delegate.WriteOutputPluginRequests(requests)
+
+  def ReadOutputPluginRequests(
+      self) -> Sequence[rdf_flow_objects.OutputPluginRequest]:
+    return self.delegate.ReadOutputPluginRequests()
+
+  def DeleteOutputPluginRequests(
+      self, requests: Sequence[rdf_flow_objects.OutputPluginRequest]) -> None:
+    precondition.AssertIterableType(requests,
+                                    rdf_flow_objects.OutputPluginRequest)
+    return self.delegate.DeleteOutputPluginRequests(requests)
+
+  def DelayOutputPluginRequests(
+      self,
+      requests: Sequence[rdf_flow_objects.OutputPluginRequest],
+      delay: rdfvalue.Duration,
+  ) -> None:
+    precondition.AssertIterableType(requests,
+                                    rdf_flow_objects.OutputPluginRequest)
+    _ValidateDuration(delay)
+    return self.delegate.DelayOutputPluginRequests(requests, delay)
+
+  def RegisterOutputPluginHandler(
+      self,
+      handler: Callable[[Sequence[rdf_flow_objects.OutputPluginRequest]], None],
+      lease_time: rdfvalue.Duration,
+      limit: int = 1000,
+  ) -> None:
+    if handler is None:
+      raise ValueError("handler must be provided")
+
+    _ValidateDuration(lease_time)
+    return self.delegate.RegisterOutputPluginHandler(
+        handler, lease_time, limit=limit)
+
+  def UnregisterOutputPluginHandler(self,
+                                    timeout: Optional[float] = None) -> None:
+    return self.delegate.UnregisterOutputPluginHandler(timeout=timeout)
+
+  def ReadQueuedFlowOutputPluginState(
+      self,
+      client_id: str,
+      flow_id: str,
+      output_plugin_id: str,
+  ) -> rdf_flow_runner.OutputPluginState:
+    precondition.ValidateClientId(client_id)
+    precondition.ValidateFlowId(flow_id)
+    _ValidateOutputPluginId(output_plugin_id)
+    return self.delegate.ReadQueuedFlowOutputPluginState(
+        client_id, flow_id, output_plugin_id)
+
+  def UpdateQueuedFlowOutputPluginState(
+      self,
+      client_id: str,
+      flow_id: str,
+      output_plugin_id: str,
+      update_fn: Callable[[rdf_protodict.AttributedDict],
+                          rdf_protodict.AttributedDict],
+  ) -> rdf_flow_runner.OutputPluginState:
+    precondition.ValidateClientId(client_id)
+    precondition.ValidateFlowId(flow_id)
+    _ValidateOutputPluginId(output_plugin_id)
+    return self.delegate.UpdateQueuedFlowOutputPluginState(
+        client_id, flow_id, output_plugin_id, update_fn)
+
   def WriteCronJob(self, cronjob):
     precondition.AssertType(cronjob, rdf_cronjobs.CronJob)
     _ValidateCronJobId(cronjob.cron_job_id)
@@ -3912,10 +4357,28 @@ class DatabaseValidationWrapper(Database):
     return self.delegate.LeaseFlowForProcessing(client_id, flow_id,
                                                 processing_time)
 
+  def LeaseFlowsForProcessing(
+      self,
+      flow_keys: Collection[Tuple[str, str]],
+      processing_time: rdfvalue.Duration,
+  ) -> Dict[Tuple[str, str], rdf_flow_objects.Flow]:
+    for client_id, flow_id in flow_keys:
+      precondition.ValidateClientId(client_id)
+      precondition.ValidateFlowId(flow_id)
+    _ValidateDuration(processing_time)
+    return self.delegate.LeaseFlowsForProcessing(flow_keys, processing_time)
+
   def ReleaseProcessedFlow(self, flow_obj):
     precondition.AssertType(flow_obj, rdf_flow_objects.Flow)
     return self.delegate.ReleaseProcessedFlow(flow_obj)
 
+  def ReleaseProcessedFlows(
+      self,
+      flow_objs: Sequence[rdf_flow_objects.Flow],
+  ) -> Dict[Tuple[str, str], bool]:
+    precondition.AssertIterableType(flow_objs, rdf_flow_objects.Flow)
+    return self.delegate.ReleaseProcessedFlows(flow_objs)
+
   def UpdateFlow(self,
                  client_id,
                  flow_id,
@@ -3996,6 +4459,18 @@ class DatabaseValidationWrapper(Database):
     return self.delegate.ReadFlowRequestsReadyForProcessing(
         client_id, flow_id, next_needed_request=next_needed_request)
 
+  def MultiReadFlowRequestsReadyForProcessing(
+      self,
+      next_needed_requests: Mapping[Tuple[str, str], int],
+  ) -> Dict[Tuple[str, str], ReadyFlowRequests]:
+    for flow_key, next_needed_request in next_needed_requests.items():
+      client_id, flow_id = flow_key
+      precondition.ValidateClientId(client_id)
+      precondition.ValidateFlowId(flow_id)
+      precondition.AssertType(next_needed_request, int)
+    return self.delegate.MultiReadFlowRequestsReadyForProcessing(
+        next_needed_requests)
+
   def WriteFlowProcessingRequests(self, requests):
     precondition.AssertIterableType(requests, rdf_flows.FlowProcessingRequest)
     return self.delegate.WriteFlowProcessingRequests(requests)
@@ -4010,10 +4485,13 @@ class DatabaseValidationWrapper(Database):
   def DeleteAllFlowProcessingRequests(self):
     return self.delegate.DeleteAllFlowProcessingRequests()
 
-  def RegisterFlowProcessingHandler(self, handler):
+  def RegisterFlowProcessingHandler(self, handler, batch_size=None):
     if handler is None:
       raise ValueError("handler must be provided")
-    return self.delegate.RegisterFlowProcessingHandler(handler)
+    if batch_size is not None and batch_size < 1:
+      raise ValueError("batch_size must be positive, got %d" % batch_size)
+    return self.delegate.RegisterFlowProcessingHandler(
+        handler, batch_size=batch_size)
 
   def UnregisterFlowProcessingHandler(self, timeout=None):
     return self.delegate.UnregisterFlowProcessingHandler(timeout=timeout)
@@ -4438,6 +4916,10 @@ class DatabaseValidationWrapper(Database):
     _ValidateHuntId(hunt_id)
     return self.delegate.ReadHuntClientResourcesStats(hunt_id)
 
+  def RebuildHuntCounters(self, hunt_id):
+    _ValidateHuntId(hunt_id)
+    self.delegate.RebuildHuntCounters(hunt_id)
+
   def ReadHuntFlowsStatesAndTimestamps(self, hunt_id):
     _ValidateHuntId(hunt_id)
     return self.delegate.ReadHuntFlowsStatesAndTimestamps(hunt_id)
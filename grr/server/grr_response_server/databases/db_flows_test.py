@@ -847,6 +847,30 @@ class DatabaseTestFlowMixin(object):
     # This one is.
     self.assertEqual(requests_triggered, 1)
 
+  def testFlowProcessingHandlerWithBatchSizeReceivesLists(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_ids = [
+        db_test_utils.InitializeFlow(self.db, client_id) for _ in range(3)
+    ]
+
+    handled = queue.Queue()
+    self.db.RegisterFlowProcessingHandler(handled.put, batch_size=2)
+    self.addCleanup(self.db.UnregisterFlowProcessingHandler)
+
+    self.db.WriteFlowProcessingRequests([
+        rdf_flows.FlowProcessingRequest(client_id=client_id, flow_id=flow_id)
+        for flow_id in flow_ids
+    ])
+
+    got = []
+    while len(got) < 3:
+      batch = handled.get(timeout=10)
+      self.assertIsInstance(batch, list)
+      self.assertBetween(len(batch), 1, 2)
+      got.extend(r.flow_id for r in batch)
+
+    self.assertCountEqual(got, flow_ids)
+
   def testFlowRequestsWithStartTimeAreCorrectlyDelayed(self):
     client_id = db_test_utils.InitializeClient(self.db)
     flow_id = db_test_utils.InitializeFlow(
@@ -1599,6 +1623,78 @@ class DatabaseTestFlowMixin(object):
     read_flow = self.db.ReadFlowObject(client_id, flow_id)
     self.assertBetween(read_flow.last_update_time, t2, t3)
 
+  def testLeaseFlowsForProcessing(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id_1 = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id_2 = db_test_utils.InitializeFlow(self.db, client_id)
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+
+    leased = self.db.LeaseFlowsForProcessing(
+        [(client_id, flow_id_1), (client_id, flow_id_2)], processing_time)
+
+    self.assertCountEqual(leased, [(client_id, flow_id_1),
+                                   (client_id, flow_id_2)])
+    for (_, flow_id), rdf_flow in leased.items():
+      self.assertEqual(rdf_flow.flow_id, flow_id)
+      self.assertTrue(rdf_flow.processing_on)
+      self.assertIsNotNone(rdf_flow.processing_deadline)
+
+    read_flow = self.db.ReadFlowObject(client_id, flow_id_1)
+    self.assertEqual(read_flow.processing_on, leased[(client_id,
+                                                      flow_id_1)].processing_on)
+
+  def testLeaseFlowsForProcessingOmitsFlowsThatCanNotBeLeased(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    self.db.UpdateHuntObject(
+        hunt_id, hunt_state=rdf_hunt_objects.Hunt.HuntState.STOPPED)
+
+    client_id = db_test_utils.InitializeClient(self.db)
+    hunt_flow_id = db_test_utils.InitializeFlow(
+        self.db, client_id, parent_hunt_id=hunt_id)
+    leased_flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+
+    self.db.LeaseFlowForProcessing(client_id, leased_flow_id, processing_time)
+
+    leased = self.db.LeaseFlowsForProcessing([
+        (client_id, hunt_flow_id),
+        (client_id, leased_flow_id),
+        (client_id, "ABCDEF12"),
+        (client_id, flow_id),
+    ], processing_time)
+
+    self.assertEqual(list(leased), [(client_id, flow_id)])
+
+  def testReleaseProcessedFlows(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id_1 = db_test_utils.InitializeFlow(
+        self.db, client_id, next_request_to_process=2)
+    flow_id_2 = db_test_utils.InitializeFlow(
+        self.db, client_id, next_request_to_process=2)
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+
+    leased = self.db.LeaseFlowsForProcessing(
+        [(client_id, flow_id_1), (client_id, flow_id_2)], processing_time)
+
+    # Request #2 of the second flow is ready for processing.
+    self.db.WriteFlowRequests([
+        rdf_flow_objects.FlowRequest(
+            client_id=client_id,
+            flow_id=flow_id_2,
+            request_id=2,
+            needs_processing=True)
+    ])
+
+    released = self.db.ReleaseProcessedFlows(list(leased.values()))
+    self.assertEqual(released, {
+        (client_id, flow_id_1): True,
+        (client_id, flow_id_2): False,
+    })
+
+    # The first flow can be leased again.
+    self.db.LeaseFlowForProcessing(client_id, flow_id_1, processing_time)
+
   def testReleaseProcessedFlow(self):
     client_id = db_test_utils.InitializeClient(self.db)
     flow_id = db_test_utils.InitializeFlow(
@@ -1851,6 +1947,53 @@ class DatabaseTestFlowMixin(object):
 
     self.assertEqual(requests_for_processing[4][1], responses)
 
+  def testMultiReadFlowRequestsReadyForProcessing(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id_1 = db_test_utils.InitializeFlow(
+        self.db, client_id, next_request_to_process=1)
+    flow_id_2 = db_test_utils.InitializeFlow(
+        self.db, client_id, next_request_to_process=2)
+    flow_id_3 = db_test_utils.InitializeFlow(
+        self.db, client_id, next_request_to_process=1)
+
+    requests = []
+    for flow_id in [flow_id_1, flow_id_2]:
+      for request_id in [1, 2, 4]:
+        requests.append(
+            rdf_flow_objects.FlowRequest(
+                client_id=client_id,
+                flow_id=flow_id,
+                request_id=request_id,
+                needs_processing=True))
+    self.db.WriteFlowRequests(requests)
+
+    responses = [
+        rdf_flow_objects.FlowResponse(
+            client_id=client_id, flow_id=flow_id_2, request_id=2, response_id=i)
+        for i in range(3)
+    ]
+    self.db.WriteFlowResponses(responses)
+
+    result = self.db.MultiReadFlowRequestsReadyForProcessing({
+        (client_id, flow_id_1): 1,
+        (client_id, flow_id_2): 2,
+        (client_id, flow_id_3): 1,
+    })
+
+    self.assertEqual(list(result[(client_id, flow_id_1)]), [1, 2])
+    self.assertEqual(list(result[(client_id, flow_id_2)]), [2])
+    self.assertEqual(result[(client_id, flow_id_2)][2][1], responses)
+    self.assertEqual(result[(client_id, flow_id_3)], {})
+
+    for (_, flow_id), ready in result.items():
+      self.assertEqual(
+          ready,
+          self.db.ReadFlowRequestsReadyForProcessing(
+              client_id,
+              flow_id,
+              next_needed_request=self.db.ReadFlowObject(
+                  client_id, flow_id).next_request_to_process))
+
   def testReadFlowRequestsReadyForProcessingHandlesIncrementalResponses(self):
     client_id = db_test_utils.InitializeClient(self.db)
     flow_id = db_test_utils.InitializeFlow(self.db, client_id)
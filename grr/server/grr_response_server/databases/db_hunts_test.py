@@ -1726,6 +1726,83 @@ class DatabaseTestHuntMixin(object):
     self.assertAlmostEqual(hunt_counters.total_cpu_seconds, 14.5)
     self.assertEqual(hunt_counters.total_network_bytes_sent, 42)
 
+  def testReadHuntCountersReflectsFlowUpdates(self):
+    self.db.WriteGRRUser("user")
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo", creator="user")
+    self.db.WriteHuntObject(hunt_obj)
+
+    client_id, flow_id = self._SetupHuntClientAndFlow(
+        flow_state=rdf_flow_objects.Flow.FlowState.RUNNING,
+        hunt_id=hunt_obj.hunt_id)
+    other_client_id, _ = self._SetupHuntClientAndFlow(
+        flow_state=rdf_flow_objects.Flow.FlowState.RUNNING,
+        hunt_id=hunt_obj.hunt_id)
+
+    flow_obj = self.db.ReadFlowObject(client_id, flow_id)
+    flow_obj.flow_state = rdf_flow_objects.Flow.FlowState.FINISHED
+    flow_obj.cpu_time_used.user_cpu_time = 3
+    flow_obj.cpu_time_used.system_cpu_time = 2
+    flow_obj.network_bytes_sent = 42
+    self.db.UpdateFlow(client_id, flow_id, flow_obj=flow_obj)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 2)
+    self.assertEqual(hunt_counters.num_successful_clients, 1)
+    self.assertEqual(hunt_counters.num_running_clients, 1)
+    self.assertAlmostEqual(hunt_counters.total_cpu_seconds, 5)
+    self.assertEqual(hunt_counters.total_network_bytes_sent, 42)
+
+    usage_stats = self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id)
+    self.assertEqual(usage_stats.user_cpu_stats.num, 2)
+    self.assertAlmostEqual(usage_stats.user_cpu_stats.sum, 3)
+    self.assertAlmostEqual(usage_stats.user_cpu_stats.stddev, 1.5)
+    user_cpu_bins = usage_stats.user_cpu_stats.histogram.bins
+    self.assertEqual(sum(b.num for b in user_cpu_bins), 2)
+
+    self.db.DeleteClient(other_client_id)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_running_clients, 0)
+
+    usage_stats = self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id)
+    self.assertEqual(usage_stats.user_cpu_stats.num, 1)
+    user_cpu_bins = usage_stats.user_cpu_stats.histogram.bins
+    self.assertEqual(sum(b.num for b in user_cpu_bins), 1)
+
+  def testRebuildHuntCountersKeepsCountersAndStats(self):
+    self.db.WriteGRRUser("user")
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo", creator="user")
+    self.db.WriteHuntObject(hunt_obj)
+
+    for i in range(5):
+      self._SetupHuntClientAndFlow(
+          flow_state=rdf_flow_objects.Flow.FlowState.FINISHED,
+          cpu_time_used=rdf_client_stats.CpuSeconds(
+              user_cpu_time=i, system_cpu_time=2 * i),
+          network_bytes_sent=1000 * i,
+          hunt_id=hunt_obj.hunt_id)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    usage_stats = self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id)
+
+    self.db.RebuildHuntCounters(hunt_obj.hunt_id)
+
+    self.assertEqual(self.db.ReadHuntCounters(hunt_obj.hunt_id), hunt_counters)
+    self.assertEqual(
+        self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id), usage_stats)
+
+  def testRebuildHuntCountersForHuntWithoutFlows(self):
+    self.db.WriteGRRUser("user")
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo", creator="user")
+    self.db.WriteHuntObject(hunt_obj)
+
+    self.db.RebuildHuntCounters(hunt_obj.hunt_id)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 0)
+    self.assertEqual(hunt_counters.total_cpu_seconds, 0)
+
   def testReadHuntClientResourcesStatsIgnoresSubflows(self):
     self.db.WriteGRRUser("user")
     hunt_obj = rdf_hunt_objects.Hunt(description="foo", creator="user")
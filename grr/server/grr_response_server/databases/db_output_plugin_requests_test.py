@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+"""Tests for the output plugin requests database api."""
+
+import queue
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr_response_server.databases import db
+from grr_response_server.databases import db_test_utils
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
+from grr_response_server.rdfvalues import output_plugin as rdf_output_plugin
+
+
+def _Requests(count):
+  return [
+      rdf_flow_objects.OutputPluginRequest(
+          client_id="C.1000000000000000",
+          flow_id="ABCDEF%02d" % i,
+          output_plugin_id="0",
+          request_id=i * 100 + 1,
+          source_urn="aff4:/C.1000000000000000/ABCDEF%02d" % i,
+          results=[
+              rdf_flow_objects.FlowResult(
+                  client_id="C.1000000000000000",
+                  flow_id="ABCDEF%02d" % i,
+                  payload=rdf_client.ClientSummary(client_id="C.%016d" % i))
+          ]) for i in range(count)
+  ]
+
+
+def _ClearMetadata(requests):
+  for r in requests:
+    r.timestamp = None
+    r.leased_until = None
+    r.leased_by = None
+    r.attempts = None
+
+
+class DatabaseTestOutputPluginRequestsMixin(object):
+  """An abstract class for testing db.Database implementations.
+
+  This mixin adds methods to test the handling of output plugin requests.
+  """
+
+  def testOutputPluginRequests(self):
+    requests = _Requests(5)
+
+    self.db.WriteOutputPluginRequests(requests)
+
+    read = self.db.ReadOutputPluginRequests()
+    for r in read:
+      self.assertTrue(r.timestamp)
+      self.assertEqual(r.attempts, 0)
+    _ClearMetadata(read)
+
+    self.assertEqual(sorted(read, key=lambda req: req.request_id), requests)
+
+    self.db.DeleteOutputPluginRequests(requests[:2])
+    self.db.DeleteOutputPluginRequests(requests[4:5])
+
+    read = self.db.ReadOutputPluginRequests()
+    self.assertLen(read, 2)
+    read = sorted(read, key=lambda req: req.request_id)
+    _ClearMetadata(read)
+
+    self.assertEqual(requests[2:4], read)
+    self.db.DeleteOutputPluginRequests(read)
+    self.assertEmpty(self.db.ReadOutputPluginRequests())
+
+  def testDeleteOutputPluginRequestsWithNoRequests(self):
+    self.db.DeleteOutputPluginRequests([])
+    self.db.DelayOutputPluginRequests([],
+                                      rdfvalue.Duration.From(
+                                          1, rdfvalue.MINUTES))
+
+  def testDelayOutputPluginRequests(self):
+    requests = _Requests(3)
+    self.db.WriteOutputPluginRequests(requests)
+
+    delay = rdfvalue.Duration.From(10, rdfvalue.MINUTES)
+    before_delay = rdfvalue.RDFDatetime.Now()
+    self.db.DelayOutputPluginRequests(requests[:1], delay)
+    self.db.DelayOutputPluginRequests(requests[:1], delay)
+
+    read = {r.request_id: r for r in self.db.ReadOutputPluginRequests()}
+    delayed = read[requests[0].request_id]
+    self.assertEqual(delayed.attempts, 2)
+    self.assertGreaterEqual(delayed.leased_until, before_delay + delay)
+    self.assertFalse(delayed.leased_by)
+
+    for r in requests[1:]:
+      self.assertEqual(read[r.request_id].attempts, 0)
+      self.assertFalse(read[r.request_id].leased_until)
+
+  def testOutputPluginRequestLeasing(self):
+    requests = _Requests(10)
+    lease_time = rdfvalue.Duration.From(5, rdfvalue.MINUTES)
+
+    leased = queue.Queue()
+    self.db.RegisterOutputPluginHandler(leased.put, lease_time, limit=5)
+
+    self.db.WriteOutputPluginRequests(requests)
+
+    got = []
+    while len(got) < 10:
+      try:
+        l = leased.get(True, timeout=6)
+      except queue.Empty:
+        self.fail("Timed out waiting for requests, expected 10, got %d" %
+                  len(got))
+      self.assertLessEqual(len(l), 5)
+      for r in l:
+        self.assertEqual(r.leased_by, utils.ProcessIdString())
+        self.assertGreater(r.leased_until, rdfvalue.RDFDatetime.Now())
+        self.assertLess(r.timestamp, rdfvalue.RDFDatetime.Now())
+        self.assertEqual(r.attempts, 0)
+      got += l
+
+    self.db.UnregisterOutputPluginHandler()
+    self.db.DeleteOutputPluginRequests(got)
+
+    _ClearMetadata(got)
+    got.sort(key=lambda req: req.request_id)
+    self.assertEqual(requests, got)
+
+  def testDelayedOutputPluginRequestsAreLeasedAfterDelay(self):
+    requests = _Requests(2)
+    self.db.WriteOutputPluginRequests(requests)
+    self.db.DelayOutputPluginRequests(
+        requests[:1], rdfvalue.Duration.From(1, rdfvalue.HOURS))
+
+    leased = queue.Queue()
+    self.db.RegisterOutputPluginHandler(
+        leased.put, rdfvalue.Duration.From(5, rdfvalue.MINUTES), limit=5)
+
+    try:
+      l = leased.get(True, timeout=6)
+    except queue.Empty:
+      self.fail("Timed out waiting for requests.")
+    self.db.UnregisterOutputPluginHandler()
+
+    self.assertEqual([r.request_id for r in l], [requests[1].request_id])
+    self.assertTrue(leased.empty())
+
+  def _QueueFlowPluginRequests(self, index):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+    request = rdf_flow_objects.OutputPluginRequest(
+        client_id=client_id,
+        flow_id=flow_id,
+        output_plugin_id="0",
+        request_id=1,
+        output_plugin_state=rdf_flow_runner.OutputPluginState(
+            plugin_descriptor=rdf_output_plugin.OutputPluginDescriptor(
+                plugin_name="DummyFlowOutputPlugin"),
+            plugin_state=rdf_protodict.AttributedDict({"index": index})))
+    self.db.WriteOutputPluginRequests([request])
+    return client_id, flow_id, request
+
+  def testQueuedFlowOutputPluginState(self):
+    client_id, flow_id, request = self._QueueFlowPluginRequests(0)
+
+    state = self.db.ReadQueuedFlowOutputPluginState(client_id, flow_id, "0")
+    self.assertEqual(state, request.output_plugin_state)
+
+    def UpdateFn(plugin_state):
+      plugin_state.index += 1
+      return plugin_state
+
+    updated = self.db.UpdateQueuedFlowOutputPluginState(
+        client_id, flow_id, "0", UpdateFn)
+    self.assertEqual(updated.plugin_state.index, 1)
+
+    state = self.db.ReadQueuedFlowOutputPluginState(client_id, flow_id, "0")
+    self.assertEqual(state.plugin_state.index, 1)
+    self.assertEqual(state.plugin_descriptor.plugin_name,
+                     "DummyFlowOutputPlugin")
+
+  def testQueuedFlowOutputPluginStateIsNotOverwrittenByNewRequests(self):
+    client_id, flow_id, request = self._QueueFlowPluginRequests(0)
+
+    def UpdateFn(plugin_state):
+      plugin_state.index = 42
+      return plugin_state
+
+    self.db.UpdateQueuedFlowOutputPluginState(client_id, flow_id, "0",
+                                              UpdateFn)
+
+    request.request_id = 2
+    self.db.WriteOutputPluginRequests([request])
+
+    state = self.db.ReadQueuedFlowOutputPluginState(client_id, flow_id, "0")
+    self.assertEqual(state.plugin_state.index, 42)
+
+  def testUnknownQueuedFlowOutputPluginStateRaises(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+
+    with self.assertRaises(db.UnknownFlowOutputPluginStateError):
+      self.db.ReadQueuedFlowOutputPluginState(client_id, flow_id, "0")
+
+    with self.assertRaises(db.UnknownFlowOutputPluginStateError):
+      self.db.UpdateQueuedFlowOutputPluginState(client_id, flow_id, "0",
+                                                lambda s: s)
+
+  def testQueuedFlowOutputPluginStateIsDeletedWithClient(self):
+    client_id, flow_id, _ = self._QueueFlowPluginRequests(0)
+
+    self.db.DeleteClient(client_id)
+
+    with self.assertRaises(db.UnknownFlowOutputPluginStateError):
+      self.db.ReadQueuedFlowOutputPluginState(client_id, flow_id, "0")
+
+
+# This file is a test library and thus does not require a __main__ block.
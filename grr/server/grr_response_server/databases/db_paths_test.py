@@ -485,6 +485,26 @@ class DatabaseTestPathsMixin(object):
     self.assertEqual(result_2.stat_entry.st_size, 42)
     self.assertEqual(result_2.hash_entry.sha256, b"bar")
 
+  def testWritePathInfosIsNotAffectedByLaterModifications(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    stat_entry = rdf_client_fs.StatEntry(st_size=42)
+    path_info = rdf_objects.PathInfo.OS(components=["foo"])
+    path_info.stat_entry = stat_entry
+    self.db.WritePathInfos(client_id, [path_info])
+
+    stat_entry.st_size = 1337
+
+    result = self.db.ReadPathInfo(
+        client_id, rdf_objects.PathInfo.PathType.OS, components=("foo",))
+    self.assertEqual(result.stat_entry.st_size, 42)
+
+    result.stat_entry.st_size = 1337
+
+    result = self.db.ReadPathInfo(
+        client_id, rdf_objects.PathInfo.PathType.OS, components=("foo",))
+    self.assertEqual(result.stat_entry.st_size, 42)
+
   def testReadPathInfosEmptyComponentsList(self):
     client_id = db_test_utils.InitializeClient(self.db)
     results = self.db.ReadPathInfos(client_id, rdf_objects.PathInfo.PathType.OS,
@@ -1198,6 +1218,92 @@ class DatabaseTestPathsMixin(object):
     self.assertEqual(results[0].components, ("__", "__bar__"))
     self.assertEqual(results[1].components, ("__", "__baz__"))
 
+  def testIterDescendantPathInfosNonexistentDirectory(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    path_infos = self.db.IterDescendantPathInfos(
+        client_id=client_id,
+        path_type=rdf_objects.PathInfo.PathType.OS,
+        components=("foo", "bar"))
+    with self.assertRaises(db.UnknownPathError):
+      next(path_infos)
+
+  def testIterDescendantPathInfosOrder(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    self.db.WritePathInfos(client_id, [
+        rdf_objects.PathInfo.OS(components=("foo", "bar", "baz")),
+        rdf_objects.PathInfo.OS(components=("foo-bar",)),
+        rdf_objects.PathInfo.OS(components=("Foo",)),
+    ])
+
+    results = list(
+        self.db.IterDescendantPathInfos(
+            client_id=client_id,
+            path_type=rdf_objects.PathInfo.PathType.OS,
+            components=()))
+    self.assertEqual([tuple(_.components) for _ in results], [
+        ("Foo",),
+        ("foo",),
+        ("foo-bar",),
+        ("foo", "bar"),
+        ("foo", "bar", "baz"),
+    ])
+
+    # Lists are still sorted by path components.
+    results = self.db.ListDescendantPathInfos(
+        client_id=client_id,
+        path_type=rdf_objects.PathInfo.PathType.OS,
+        components=())
+    self.assertEqual([tuple(_.components) for _ in results], [
+        ("Foo",),
+        ("foo",),
+        ("foo", "bar"),
+        ("foo", "bar", "baz"),
+        ("foo-bar",),
+    ])
+
+  def testIterDescendantPathInfosIsCaseSensitive(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    self.db.WritePathInfos(client_id, [
+        rdf_objects.PathInfo.OS(components=("foo", "bar")),
+        rdf_objects.PathInfo.OS(components=("FOO", "BAR")),
+    ])
+
+    results = list(
+        self.db.IterDescendantPathInfos(
+            client_id=client_id,
+            path_type=rdf_objects.PathInfo.PathType.OS,
+            components=("foo",)))
+    self.assertLen(results, 1)
+    self.assertEqual(results[0].components, ("foo", "bar"))
+
+  def testIterDescendantPathInfosTimestampInterleavedSubtrees(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    path_info_1 = rdf_objects.PathInfo.OS(components=("foo", "bar", "baz"))
+    path_info_1.stat_entry.st_size = 1
+    path_info_2 = rdf_objects.PathInfo.OS(components=("foo-bar",))
+    path_info_2.hash_entry.sha256 = b"quux"
+    path_info_3 = rdf_objects.PathInfo.OS(components=("foo", "thud", "blargh"))
+    path_info_4 = rdf_objects.PathInfo.OS(components=("foo-norf", "thud"))
+    self.db.WritePathInfos(
+        client_id, [path_info_1, path_info_2, path_info_3, path_info_4])
+
+    results = list(
+        self.db.IterDescendantPathInfos(
+            client_id=client_id,
+            path_type=rdf_objects.PathInfo.PathType.OS,
+            components=(),
+            timestamp=self.db.Now()))
+    self.assertEqual([tuple(_.components) for _ in results], [
+        ("foo",),
+        ("foo-bar",),
+        ("foo", "bar"),
+        ("foo", "bar", "baz"),
+    ])
+    self.assertEqual(results[1].hash_entry.sha256, b"quux")
+    self.assertEqual(results[3].stat_entry.st_size, 1)
+
   def testListChildPathInfosRoot(self):
     client_id = db_test_utils.InitializeClient(self.db)
 
@@ -35,8 +35,10 @@ class DatabaseSetupMixin(DatabaseProvider):
     if cleanup:
       self.addCleanup(cleanup)
 
-    # In case a test registers a message handler, unregister it.
+    # In case a test registers a message or output plugin handler, unregister
+    # it.
     self.addCleanup(self.db.UnregisterMessageHandler)
+    self.addCleanup(self.db.UnregisterOutputPluginHandler)
 
     super().setUp()
 
@@ -83,7 +85,9 @@ class GlobalDatabaseTestMixin(DatabaseProvider):
     if cleanup:
       self.addCleanup(cleanup)
 
-    # In case a test registers a message handler, unregister it.
+    # In case a test registers a message or output plugin handler, unregister
+    # it.
     self.addCleanup(data_store.REL_DB.UnregisterMessageHandler)
+    self.addCleanup(data_store.REL_DB.UnregisterOutputPluginHandler)
 
     super().setUp()
@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 """Utility functions/decorators for DB implementations."""
+import collections
 import functools
+import itertools
 import logging
 import time
 
 from typing import Generic
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Sequence
 from typing import Text
@@ -113,6 +117,113 @@ def EscapeBackslashes(string: Text) -> Text:
   return string.replace("\\", "\\\\")
 
 
+def CanonicalPath(components: Sequence[Text]) -> Text:
+  """Returns the canonical path that path infos are ordered by when streamed.
+
+  See `db.Database.IterDescendantPathInfos` for details.
+
+  Args:
+    components: Path components.
+
+  Returns:
+    The canonical path of the given components.
+  """
+  return "/" + "/".join(components)
+
+
+def FilterDescendantPathInfos(
+    client_id: Text,
+    path_type: rdf_objects.PathInfo.PathType,
+    components: Sequence[Text],
+    path_infos: Iterable[rdf_objects.PathInfo],
+    only_explicit: bool,
+) -> Iterator[rdf_objects.PathInfo]:
+  """Post-processes a stream of path infos of a path and its descendants.
+
+  Args:
+    client_id: An identifier string of the client the path belongs to.
+    path_type: A type of the path.
+    components: Path components of the path.
+    path_infos: Path infos of the path itself and all its descendants, sorted by
+      their canonical paths (see `CanonicalPath`).
+    only_explicit: If set, only explicit descendants (paths that have an
+      associated stat or hash entry or have an explicit descendant) are
+      yielded.
+
+  Yields:
+    Path infos of the descendants, in the order of `path_infos`.
+
+  Raises:
+    db.UnknownPathError: If the path doesn't exist.
+    db.NotDirectoryPathError: If the path is not a directory.
+  """
+  components = tuple(components)
+  path_infos = iter(path_infos)
+
+  # The first entry should be always the base directory itself unless it is a
+  # root directory that was never collected.
+  first = next(path_infos, None)
+  if first is None or tuple(first.components) != components:
+    if components:
+      raise db.UnknownPathError(client_id, path_type, components)
+    if first is not None:
+      path_infos = itertools.chain([first], path_infos)
+  elif not first.directory:
+    raise db.NotDirectoryPathError(client_id, path_type, components)
+
+  if not only_explicit:
+    yield from path_infos
+    return
+
+  # Whether an implicit directory is yielded is only known once one of its
+  # descendants turns out to be explicit or once its subtree ends. Entries are
+  # `[path_info, decision]` pairs kept in the input order until all entries
+  # before them are decided. Open directories are undecided directories whose
+  # subtree might still follow: since every path that sorts between a
+  # directory and the end of its subtree starts with the directory's path,
+  # there are never more of them than there are characters in a path.
+  pending = collections.deque()
+  open_dirs = []
+
+  for path_info in path_infos:
+    path = CanonicalPath(path_info.components)
+    explicit = (
+        path_info.HasField("stat_entry") or path_info.HasField("hash_entry"))
+
+    still_open = []
+    for dir_path, entry in open_dirs:
+      if path.startswith(dir_path + "/"):
+        if explicit:
+          entry[1] = True
+        else:
+          still_open.append((dir_path, entry))
+      # "0" is the character following "/", so all paths of the subtree sort
+      # before `dir_path + "0"`.
+      elif path < dir_path + "0":
+        still_open.append((dir_path, entry))
+      else:
+        entry[1] = False
+    open_dirs = still_open
+
+    if explicit:
+      entry = [path_info, True]
+    elif path_info.directory:
+      entry = [path_info, None]
+      open_dirs.append((path, entry))
+    else:
+      entry = [path_info, False]
+    pending.append(entry)
+
+    while pending and pending[0][1] is not None:
+      path_info, decision = pending.popleft()
+      if decision:
+        yield path_info
+
+  for path_info, decision in pending:
+    if decision:
+      yield path_info
+
+
 def ClientIdFromGrrMessage(m):
   if m.queue:
     return m.queue.Split()[0]
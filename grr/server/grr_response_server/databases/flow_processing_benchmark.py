@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""Benchmark measuring flow processing latency of the configured database.
+
+The benchmark starts flows that schedule a chain of `CallState` steps and
+measures the time between consecutive steps, i.e. the latency of a flow
+processing request going through the database and back to a worker.
+"""
+
+import collections
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+
+from grr_response_core.lib.util import random
+from grr_response_server import data_store
+from grr_response_server import flow
+from grr_response_server import flow_base
+from grr_response_server import server_startup
+from grr_response_server import worker_lib
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+
+_STEPS = flags.DEFINE_integer(
+    "steps",
+    default=100,
+    help="Number of CallState steps each benchmark flow goes through.",
+)
+
+_RUNS = flags.DEFINE_integer(
+    "runs",
+    default=3,
+    help="Number of benchmark flows to run one after another.",
+)
+
+_TIMEOUT_SECONDS = flags.DEFINE_integer(
+    "timeout_seconds",
+    default=600,
+    help="Maximum time to wait for a single benchmark flow to finish.",
+)
+
+# Maps flow ids to timestamps of the processed steps.
+_STEP_TIMESTAMPS = collections.defaultdict(list)
+
+
+class CallStateChainFlow(flow_base.FlowBase):
+  """A flow that calls its own state over and over again."""
+
+  def Start(self):
+    self.state.steps_left = _STEPS.value
+    _STEP_TIMESTAMPS[self.rdf_flow.flow_id].append(time.time())
+    self.CallState(next_state=self.Step.__name__)
+
+  def Step(self, responses):
+    del responses  # Unused.
+    _STEP_TIMESTAMPS[self.rdf_flow.flow_id].append(time.time())
+
+    self.state.steps_left -= 1
+    if self.state.steps_left > 0:
+      self.CallState(next_state=self.Step.__name__)
+
+
+def _WaitForFlow(client_id, flow_id, timeout):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    rdf_flow = data_store.REL_DB.ReadFlowObject(client_id, flow_id)
+    if rdf_flow.flow_state != rdf_flow_objects.Flow.FlowState.RUNNING:
+      return rdf_flow
+    time.sleep(0.05)
+
+  raise TimeoutError("Flow %s/%s didn't finish in time." % (client_id, flow_id))
+
+
+def _PrintStats(run, total_s, latencies):
+  latencies_ms = np.array(latencies) * 1000
+  print("{run}\t{total:.2f}s\t{num}\t{mean:.1f}\t{p50:.1f}\t{p90:.1f}"
+        "\t{p99:.1f}\t{max:.1f}".format(
+            run=run,
+            total=total_s,
+            num=len(latencies),
+            mean=np.mean(latencies_ms),
+            p50=np.percentile(latencies_ms, 50),
+            p90=np.percentile(latencies_ms, 90),
+            p99=np.percentile(latencies_ms, 99),
+            max=np.max(latencies_ms),
+        ))
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  server_startup.Init()
+
+  client_id = "C.%016x" % random.UInt64()
+  data_store.REL_DB.WriteClientMetadata(client_id)
+
+  worker = worker_lib.GRRWorker()
+  data_store.REL_DB.RegisterFlowProcessingHandler(worker.ProcessFlow)
+  try:
+    print("Step-to-step latency for a chain of %d CallStates (ms)." %
+          _STEPS.value)
+    print("run\ttotal\tsteps\tmean\tp50\tp90\tp99\tmax")
+    for run in range(_RUNS.value):
+      start = time.time()
+      flow_id = flow.StartFlow(client_id=client_id, flow_cls=CallStateChainFlow)
+      rdf_flow = _WaitForFlow(client_id, flow_id, _TIMEOUT_SECONDS.value)
+      total_s = time.time() - start
+
+      if rdf_flow.flow_state != rdf_flow_objects.Flow.FlowState.FINISHED:
+        print("Flow %s ended in state %s: %s" %
+              (flow_id, rdf_flow.flow_state, rdf_flow.error_message))
+        continue
+
+      timestamps = _STEP_TIMESTAMPS.pop(flow_id)
+      _PrintStats(run, total_s, np.diff(timestamps))
+  finally:
+    worker.Shutdown()
+
+
+if __name__ == "__main__":
+  app.run(main)
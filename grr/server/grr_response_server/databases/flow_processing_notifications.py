@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+"""Wake-up notifications for flow processing request handler loops.
+
+Database implementations that lease flow processing requests by polling (e.g.
+MySQL) use a `Waiter` to block their handler loop. Writers of flow processing
+requests notify the waiter, so that requests written in the same process are
+picked up right away. Requests written by other processes (e.g. frontends) are
+announced through a `NotificationChannel`. When no notifications arrive, the
+waiter falls back to polling with an exponential backoff.
+"""
+
+import abc
+import logging
+import socket
+import struct
+import threading
+from typing import Callable
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.stats import metrics
+
+FLOW_PROCESSING_NOTIFICATIONS = metrics.Counter(
+    "flow_processing_notifications", fields=[("source", str)])
+
+# Datagram payload: microseconds since epoch of the earliest delivery time of
+# the written requests, 0 if at least one of them is ready right away.
+_PAYLOAD_FORMAT = "!Q"
+_PAYLOAD_SIZE = struct.calcsize(_PAYLOAD_FORMAT)
+
+
+def EarliestDeliveryTime(
+    requests: Sequence[rdfvalue.RDFValue]) -> Optional[rdfvalue.RDFDatetime]:
+  """Returns the earliest delivery time of the given requests.
+
+  Args:
+    requests: A sequence of rdf_flows.FlowProcessingRequest objects.
+
+  Returns:
+    None if at least one of the requests can be processed right away, the
+    earliest delivery time of all requests otherwise.
+  """
+  result = None
+  for r in requests:
+    if r.delivery_time is None:
+      return None
+    if result is None or r.delivery_time < result:
+      result = r.delivery_time
+  return result
+
+
+class Waiter(object):
+  """Blocks a flow processing request handler loop until there is work to do.
+
+  The waiter is woken up by `Notify` calls. When the loop finds nothing to
+  process, the wait timeout doubles with every unsuccessful attempt, from
+  `min_wait` up to `max_wait` seconds, and it is reset to `min_wait` as soon as
+  the loop finds work again.
+  """
+
+  def __init__(self, min_wait: float, max_wait: float):
+    """Initializes the waiter.
+
+    Args:
+      min_wait: The shortest polling interval in seconds.
+      max_wait: The longest polling interval in seconds.
+    """
+    if min_wait <= 0 or max_wait < min_wait:
+      raise ValueError("Invalid polling intervals: %s, %s." %
+                       (min_wait, max_wait))
+
+    self.min_wait = min_wait
+    self.max_wait = max_wait
+
+    self._event = threading.Event()
+    self._lock = threading.Lock()
+    self._backoff = min_wait
+    self._next_delivery_time = None
+
+  def Notify(self,
+             delivery_time: Optional[rdfvalue.RDFDatetime] = None) -> None:
+    """Signals that new flow processing requests were written.
+
+    Args:
+      delivery_time: If set, the requests can't be processed before this time.
+    """
+    if delivery_time is not None:
+      with self._lock:
+        if (self._next_delivery_time is None or
+            delivery_time < self._next_delivery_time):
+          self._next_delivery_time = delivery_time
+    else:
+      with self._lock:
+        self._backoff = self.min_wait
+
+    self._event.set()
+
+  def Reset(self) -> None:
+    """Resets the backoff after the loop has found work to do."""
+    with self._lock:
+      self._backoff = self.min_wait
+
+  def _NextTimeout(self) -> float:
+    """Returns the next wait timeout and advances the backoff."""
+    with self._lock:
+      timeout = self._backoff
+      self._backoff = min(self._backoff * 2, self.max_wait)
+
+      if self._next_delivery_time is not None:
+        now = rdfvalue.RDFDatetime.Now()
+        if self._next_delivery_time <= now:
+          self._next_delivery_time = None
+          return 0
+        until_delivery = (self._next_delivery_time - now).ToFractional(
+            rdfvalue.SECONDS)
+        if until_delivery <= timeout:
+          self._next_delivery_time = None
+          timeout = until_delivery
+
+      return timeout
+
+  def Wait(self, timeout: Optional[float] = None) -> bool:
+    """Waits until notified or until the current backoff timeout expires.
+
+    Args:
+      timeout: If set, wait at most this many seconds and leave the backoff
+        unchanged.
+
+    Returns:
+      True if the waiter was notified, False if the wait timed out.
+    """
+    if timeout is None:
+      timeout = self._NextTimeout()
+
+    notified = self._event.wait(timeout)
+    self._event.clear()
+    return notified
+
+
+class NotificationChannel(metaclass=abc.ABCMeta):
+  """A channel propagating flow processing notifications between processes."""
+
+  @abc.abstractmethod
+  def Send(self, delivery_time: Optional[rdfvalue.RDFDatetime]) -> None:
+    """Announces newly written flow processing requests to other processes.
+
+    Args:
+      delivery_time: The earliest delivery time of the written requests or None
+        if some of them can be processed right away.
+    """
+
+  @abc.abstractmethod
+  def Listen(
+      self, callback: Callable[[Optional[rdfvalue.RDFDatetime]], None]) -> None:
+    """Starts passing notifications sent by other processes to the callback."""
+
+  @abc.abstractmethod
+  def Close(self) -> None:
+    """Stops listening and releases all resources held by the channel."""
+
+
+class NullNotificationChannel(NotificationChannel):
+  """A channel that doesn't propagate any notifications."""
+
+  def Send(self, delivery_time: Optional[rdfvalue.RDFDatetime]) -> None:
+    pass
+
+  def Listen(
+      self, callback: Callable[[Optional[rdfvalue.RDFDatetime]], None]) -> None:
+    pass
+
+  def Close(self) -> None:
+    pass
+
+
+def _ParseAddress(address: str) -> Tuple[str, int]:
+  host, sep, port = address.rpartition(":")
+  if not sep or not host or not port.isdigit():
+    raise ValueError("Invalid notification peer address: %r." % address)
+  return host.strip("[]"), int(port)
+
+
+class UdpNotificationChannel(NotificationChannel):
+  """A channel sending notifications as UDP datagrams.
+
+  Every notification is a single fire-and-forget datagram sent to each of the
+  configured peers. Lost datagrams only delay processing until the next poll.
+  """
+
+  def __init__(self, listen_port: int, peers: Sequence[str]):
+    """Initializes the channel.
+
+    Args:
+      listen_port: A port to receive notifications on. 0 disables listening.
+      peers: A list of "host:port" addresses to send notifications to.
+    """
+    self._listen_port = listen_port
+    self._peers = [_ParseAddress(p) for p in peers]
+
+    self._send_socket = None
+    self._send_lock = threading.Lock()
+
+    self._listen_socket = None
+    self._listen_thread = None
+    self._closing = False
+
+  def Send(self, delivery_time: Optional[rdfvalue.RDFDatetime]) -> None:
+    """Announces newly written flow processing requests to all peers."""
+    if not self._peers:
+      return
+
+    if delivery_time is None:
+      payload = struct.pack(_PAYLOAD_FORMAT, 0)
+    else:
+      payload = struct.pack(_PAYLOAD_FORMAT,
+                            delivery_time.AsMicrosecondsSinceEpoch())
+
+    with self._send_lock:
+      if self._send_socket is None:
+        self._send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+      for peer in self._peers:
+        try:
+          self._send_socket.sendto(payload, peer)
+        except OSError as e:
+          logging.warning("Failed to notify %s:%d: %s", peer[0], peer[1], e)
+
+  def Listen(
+      self, callback: Callable[[Optional[rdfvalue.RDFDatetime]], None]) -> None:
+    """Starts a thread passing received notifications to the callback."""
+    if not self._listen_port or self._listen_thread:
+      return
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+      sock.bind(("", self._listen_port))
+    except OSError as e:
+      sock.close()
+      logging.error(
+          "Can't listen for flow processing notifications on port %d (%s), "
+          "falling back to polling.", self._listen_port, e)
+      return
+
+    self._closing = False
+    self._listen_socket = sock
+    self._listen_thread = threading.Thread(
+        name="flow_processing_notifications",
+        target=self._ListenLoop,
+        args=(sock, callback))
+    self._listen_thread.daemon = True
+    self._listen_thread.start()
+
+  @property
+  def listen_address(self) -> Optional[Tuple[str, int]]:
+    """The address the channel receives notifications on, if listening."""
+    if self._listen_socket is None:
+      return None
+    return self._listen_socket.getsockname()
+
+  def _ListenLoop(
+      self, sock: socket.socket,
+      callback: Callable[[Optional[rdfvalue.RDFDatetime]], None]) -> None:
+    while not self._closing:
+      try:
+        payload = sock.recv(_PAYLOAD_SIZE)
+      except OSError:
+        # The socket has been closed.
+        return
+
+      if self._closing:
+        return
+
+      if len(payload) != _PAYLOAD_SIZE:
+        continue
+
+      (delivery_micros,) = struct.unpack(_PAYLOAD_FORMAT, payload)
+      if delivery_micros:
+        delivery_time = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+            delivery_micros)
+      else:
+        delivery_time = None
+
+      FLOW_PROCESSING_NOTIFICATIONS.Increment(fields=["remote"])
+      callback(delivery_time)
+
+  def Close(self) -> None:
+    self._closing = True
+
+    if self._listen_socket is not None:
+      try:
+        self._listen_socket.shutdown(socket.SHUT_RDWR)
+      except OSError:
+        pass
+      self._listen_socket.close()
+      self._listen_socket = None
+
+    if self._listen_thread is not None:
+      self._listen_thread.join()
+      self._listen_thread = None
+
+    with self._send_lock:
+      if self._send_socket is not None:
+        self._send_socket.close()
+        self._send_socket = None
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""Tests for flow_processing_notifications.py."""
+
+import queue
+import threading
+import time
+
+from absl import app
+from absl.testing import absltest
+import portpicker
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_server.databases import flow_processing_notifications
+from grr.test_lib import test_lib
+
+
+class EarliestDeliveryTimeTest(absltest.TestCase):
+
+  def testReturnsNoneIfAnyRequestIsReady(self):
+    requests = [
+        rdf_flows.FlowProcessingRequest(
+            delivery_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(10)),
+        rdf_flows.FlowProcessingRequest(),
+    ]
+    self.assertIsNone(
+        flow_processing_notifications.EarliestDeliveryTime(requests))
+
+  def testReturnsEarliestDeliveryTime(self):
+    requests = [
+        rdf_flows.FlowProcessingRequest(
+            delivery_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(20)),
+        rdf_flows.FlowProcessingRequest(
+            delivery_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(10)),
+    ]
+    self.assertEqual(
+        flow_processing_notifications.EarliestDeliveryTime(requests),
+        rdfvalue.RDFDatetime.FromSecondsSinceEpoch(10))
+
+
+class WaiterTest(absltest.TestCase):
+
+  def testRaisesOnInvalidIntervals(self):
+    with self.assertRaises(ValueError):
+      flow_processing_notifications.Waiter(min_wait=0, max_wait=1)
+    with self.assertRaises(ValueError):
+      flow_processing_notifications.Waiter(min_wait=2, max_wait=1)
+
+  def testWaitReturnsImmediatelyAfterNotify(self):
+    waiter = flow_processing_notifications.Waiter(min_wait=60, max_wait=60)
+    waiter.Notify()
+
+    start = time.time()
+    self.assertTrue(waiter.Wait())
+    self.assertLess(time.time() - start, 10)
+
+  def testNotifyWakesUpWaitingThread(self):
+    waiter = flow_processing_notifications.Waiter(min_wait=60, max_wait=60)
+    results = queue.Queue()
+
+    thread = threading.Thread(target=lambda: results.put(waiter.Wait()))
+    thread.start()
+    waiter.Notify()
+    thread.join(10)
+
+    self.assertFalse(thread.is_alive())
+    self.assertTrue(results.get_nowait())
+
+  def testWaitTimesOutWithoutNotify(self):
+    waiter = flow_processing_notifications.Waiter(min_wait=0.01, max_wait=0.01)
+    self.assertFalse(waiter.Wait())
+
+  def testBackoffGrowsUntilReset(self):
+    waiter = flow_processing_notifications.Waiter(min_wait=1, max_wait=4)
+
+    # pylint: disable=protected-access
+    self.assertEqual(waiter._NextTimeout(), 1)
+    self.assertEqual(waiter._NextTimeout(), 2)
+    self.assertEqual(waiter._NextTimeout(), 4)
+    self.assertEqual(waiter._NextTimeout(), 4)
+
+    waiter.Reset()
+    self.assertEqual(waiter._NextTimeout(), 1)
+    self.assertEqual(waiter._NextTimeout(), 2)
+
+    waiter.Notify()
+    self.assertEqual(waiter._NextTimeout(), 1)
+    # pylint: enable=protected-access
+
+  def testDelayedNotificationShortensTimeout(self):
+    waiter = flow_processing_notifications.Waiter(min_wait=60, max_wait=60)
+    waiter.Notify(rdfvalue.RDFDatetime.Now() +
+                  rdfvalue.Duration.From(1, rdfvalue.SECONDS))
+
+    # pylint: disable=protected-access
+    self.assertLessEqual(waiter._NextTimeout(), 1)
+    # The delivery time is consumed by the first timeout computation.
+    self.assertEqual(waiter._NextTimeout(), 60)
+    # pylint: enable=protected-access
+
+  def testDelayedNotificationDoesNotResetBackoff(self):
+    waiter = flow_processing_notifications.Waiter(min_wait=1, max_wait=4)
+    # pylint: disable=protected-access
+    waiter._NextTimeout()
+    waiter.Notify(rdfvalue.RDFDatetime.Now() +
+                  rdfvalue.Duration.From(1, rdfvalue.HOURS))
+    self.assertEqual(waiter._NextTimeout(), 2)
+    # pylint: enable=protected-access
+
+
+class UdpNotificationChannelTest(absltest.TestCase):
+
+  def _Channel(self, *args, **kwargs):
+    channel = flow_processing_notifications.UdpNotificationChannel(
+        *args, **kwargs)
+    self.addCleanup(channel.Close)
+    return channel
+
+  def testRejectsInvalidPeers(self):
+    with self.assertRaises(ValueError):
+      flow_processing_notifications.UdpNotificationChannel(0, ["localhost"])
+
+  def testDoesNotListenWithoutPort(self):
+    channel = self._Channel(0, [])
+    channel.Listen(lambda _: None)
+    self.assertIsNone(channel.listen_address)
+
+  def testSendWithoutPeersIsNoop(self):
+    channel = self._Channel(0, [])
+    channel.Send(None)
+
+  def testDeliversNotifications(self):
+    port = portpicker.pick_unused_port()
+    received = queue.Queue()
+
+    receiver = self._Channel(port, [])
+    receiver.Listen(received.put)
+    sender = self._Channel(0, ["127.0.0.1:%d" % port])
+
+    delivery_time = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42)
+    sender.Send(None)
+    sender.Send(delivery_time)
+
+    self.assertIsNone(received.get(timeout=10))
+    self.assertEqual(received.get(timeout=10), delivery_time)
+
+  def testCloseStopsListening(self):
+    port = portpicker.pick_unused_port()
+
+    receiver = self._Channel(port, [])
+    receiver.Listen(lambda _: None)
+    self.assertIsNotNone(receiver.listen_address)
+
+    receiver.Close()
+    self.assertIsNone(receiver.listen_address)
+
+
+if __name__ == "__main__":
+  app.run(test_lib.main)
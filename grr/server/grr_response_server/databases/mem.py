@@ -7,6 +7,7 @@ import threading
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.util import precondition
 from grr_response_server.databases import db
 from grr_response_server.databases import mem_artifacts
@@ -90,6 +91,13 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     self.users = {}
     self.handler_thread = None
     self.handler_stop = True
+    # Maps request ids to OutputPluginRequest rdfvalues.
+    self.output_plugin_requests = {}
+    # Maps (client_id, flow_id, output_plugin_id) to serialized
+    # OutputPluginState of flow output plugins processing queued requests.
+    self.output_plugin_request_states = {}
+    self.output_plugin_handler_thread = None
+    self.output_plugin_handler_stop = True
     # Maps (client_id, flow_id) to flow objects.
     self.flows = {}
     # Maps (client_id, flow_id) to flow request id to the request.
@@ -106,6 +114,7 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     self.flow_log_entries = {}
     self.flow_output_plugin_log_entries = {}
     self.flow_handler_target = None
+    self.flow_handler_batch_size = None
     self.flow_handler_thread = None
     self.flow_handler_stop = True
     self.flow_handler_num_being_processed = 0
@@ -120,6 +129,7 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
   @utils.Synchronized
   def ClearTestDB(self):
     self.UnregisterMessageHandler()
+    self.UnregisterOutputPluginHandler()
     self._Init()
 
   def _AllPathIDs(self):
@@ -146,10 +156,13 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     return (from_time, to_time)
 
   def _DeepCopy(self, obj):
-    """Creates an object copy by serializing/deserializing it.
+    """Creates an object copy that shares no mutable state with the original.
 
     RDFStruct.Copy() doesn't deep-copy repeated fields which may lead to
-    hard to catch bugs.
+    hard to catch bugs. RDFStruct.DeepCopy() does, without going through a
+    serialization round trip. Structs parsed by the generated protobuf classes
+    (see `RDFStruct.use_protobuf_codec`) are still copied through a round trip,
+    which is cheaper for them than copying their fields one by one.
 
     Args:
       obj: RDFValue to be copied.
@@ -159,6 +172,10 @@ class InMemoryDB(mem_artifacts.InMemoryDBArtifactsMixin,
     """
     precondition.AssertType(obj, rdfvalue.RDFValue)
 
+    if (isinstance(obj, rdf_structs.RDFStruct) and
+        not obj.UsesProtobufCodec()):
+      return obj.DeepCopy()
+
     return obj.__class__.FromSerializedBytes(obj.SerializeToBytes())
 
   def Now(self) -> rdfvalue.RDFDatetime:
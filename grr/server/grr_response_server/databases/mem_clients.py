@@ -544,6 +544,10 @@ class InMemoryDBClientMixin(object):
       self.flow_processing_requests.pop(key)
     for key in [k for k in self.client_action_requests if k[0] == client_id]:
       self.client_action_requests.pop(key)
+    for key in [
+        k for k in self.output_plugin_request_states if k[0] == client_id
+    ]:
+      self.output_plugin_request_states.pop(key)
 
     for kw in self.keywords:
       self.keywords[kw].pop(client_id, None)
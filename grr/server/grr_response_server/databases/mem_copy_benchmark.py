@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""Benchmark measuring object copying overhead of the in-memory database.
+
+The benchmark runs workloads similar to the ones of `mem_flows_large_test` (and
+a few other read-heavy ones) against the in-memory database. Every workload is
+run twice: once with objects copied through a serialization round trip (the
+way `InMemoryDB._DeepCopy` used to work) and once with the default structural
+deep copy. Objects parsed by the generated protobuf classes (e.g. flow
+responses) are copied through a round trip in both runs.
+"""
+
+import time
+from unittest import mock
+
+from absl import app
+from absl import flags
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_server.databases import db_test_utils
+from grr_response_server.databases import mem
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
+
+_COUNT = flags.DEFINE_integer(
+    "count",
+    default=40001,
+    help="Number of requests, responses and results written by workloads.",
+)
+
+_HUNT_COUNT = flags.DEFINE_integer(
+    "hunt_count",
+    default=1000,
+    help="Number of hunts written and read by the hunt workload.",
+)
+
+_READS = flags.DEFINE_integer(
+    "reads",
+    default=3,
+    help="Number of times each workload reads the written objects back.",
+)
+
+
+def _RoundTripCopy(self, obj):
+  del self  # Unused.
+  return obj.__class__.FromSerializedBytes(obj.SerializeToBytes())
+
+
+def _StatEntry(idx):
+  return rdf_client_fs.StatEntry(
+      pathspec=rdf_paths.PathSpec.OS(path="/usr/bin/file%d" % idx),
+      st_size=idx,
+      st_mode=0o100644,
+      st_mtime=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(idx))
+
+
+def _RequestsWorkload(db):
+  """Writes flow requests and reads them back with their responses."""
+  client_id = db_test_utils.InitializeClient(db)
+  flow_id = db_test_utils.InitializeFlow(
+      db, client_id, next_request_to_process=2)
+  requests = [
+      rdf_flow_objects.FlowRequest(
+          client_id=client_id, flow_id=flow_id, request_id=i)
+      for i in range(_COUNT.value)
+  ]
+
+  def Run():
+    db.WriteFlowRequests(requests)
+    for _ in range(_READS.value):
+      db.ReadAllFlowRequestsAndResponses(client_id, flow_id)
+
+  return Run
+
+
+def _ResponsesWorkload(db):
+  """Writes flow responses and reads them back as ready for processing."""
+  client_id = db_test_utils.InitializeClient(db)
+  flow_id = db_test_utils.InitializeFlow(
+      db, client_id, next_request_to_process=2)
+
+  db.WriteFlowRequests([
+      rdf_flow_objects.FlowRequest(
+          client_id=client_id, flow_id=flow_id, request_id=2)
+  ])
+  responses = [
+      rdf_flow_objects.FlowResponse(
+          client_id=client_id,
+          flow_id=flow_id,
+          request_id=2,
+          response_id=i,
+          payload=_StatEntry(i)) for i in range(1, _COUNT.value)
+  ]
+  responses.append(
+      rdf_flow_objects.FlowStatus(
+          client_id=client_id,
+          flow_id=flow_id,
+          request_id=2,
+          response_id=_COUNT.value))
+
+  def Run():
+    db.WriteFlowResponses(responses)
+    for _ in range(_READS.value):
+      db.ReadFlowRequestsReadyForProcessing(
+          client_id, flow_id, next_needed_request=2)
+
+  return Run
+
+
+def _ResultsWorkload(db):
+  """Writes flow results and reads them back."""
+  client_id = db_test_utils.InitializeClient(db)
+  flow_id = db_test_utils.InitializeFlow(db, client_id)
+  results = [
+      rdf_flow_objects.FlowResult(
+          client_id=client_id, flow_id=flow_id, payload=_StatEntry(i))
+      for i in range(_COUNT.value)
+  ]
+
+  def Run():
+    db.WriteFlowResults(results)
+    for _ in range(_READS.value):
+      db.ReadFlowResults(client_id, flow_id, 0, _COUNT.value)
+
+  return Run
+
+
+def _HuntsWorkload(db):
+  """Writes hunts and lists them back."""
+  creator = db_test_utils.InitializeUser(db)
+  hunt_objs = []
+  for i in range(_HUNT_COUNT.value):
+    hunt_obj = rdf_hunt_objects.Hunt(
+        hunt_id="%08X" % i, creator=creator, description="Hunt %d" % i)
+    hunt_obj.args.standard.flow_name = "GetFile"
+    hunt_objs.append(hunt_obj)
+
+  def Run():
+    for hunt_obj in hunt_objs:
+      db.WriteHuntObject(hunt_obj)
+    for _ in range(_READS.value):
+      db.ReadHuntObjects(0, _HUNT_COUNT.value)
+
+  return Run
+
+
+_WORKLOADS = [
+    ("requests", _RequestsWorkload),
+    ("responses", _ResponsesWorkload),
+    ("results", _ResultsWorkload),
+    ("hunts", _HuntsWorkload),
+]
+
+
+def _Time(workload):
+  run = workload(mem.InMemoryDB())
+  start = time.time()
+  run()
+  return time.time() - start
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  print("workload\tround trip\tdeep copy\tspeedup")
+  for name, workload in _WORKLOADS:
+    with mock.patch.object(mem.InMemoryDB, "_DeepCopy", _RoundTripCopy):
+      round_trip_s = _Time(workload)
+    deep_copy_s = _Time(workload)
+
+    print("{name}\t{round_trip:.2f}s\t{deep_copy:.2f}s\t{speedup:.2f}x".format(
+        name=name,
+        round_trip=round_trip_s,
+        deep_copy=deep_copy_s,
+        speedup=round_trip_s / deep_copy_s))
+
+
+if __name__ == "__main__":
+  app.run(main)
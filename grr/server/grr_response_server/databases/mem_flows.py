@@ -17,8 +17,10 @@ from typing import Text
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.util import collection
 from grr_response_server.databases import db
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
 from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr_response_server.rdfvalues import objects as rdf_objects
 
@@ -40,7 +42,7 @@ class InMemoryDBFlowMixin(object):
     now = rdfvalue.RDFDatetime.Now()
     for r in requests:
       flow_dict = self.message_handler_requests.setdefault(r.handler_name, {})
-      cloned_request = r.Copy()
+      cloned_request = self._DeepCopy(r)
       cloned_request.timestamp = now
       flow_dict[cloned_request.request_id] = cloned_request
 
@@ -51,7 +53,7 @@ class InMemoryDBFlowMixin(object):
     leases = self.message_handler_leases
     for requests in self.message_handler_requests.values():
       for r in requests.values():
-        res.append(r.Copy())
+        res.append(self._DeepCopy(r))
         existing_lease = leases.get(r.handler_name, {}).get(r.request_id, None)
         res[-1].leased_until = existing_lease
 
@@ -124,6 +126,127 @@ class InMemoryDBFlowMixin(object):
 
     return leased_requests
 
+  @utils.Synchronized
+  def WriteOutputPluginRequests(self, requests):
+    """Writes a list of output plugin requests to the database."""
+    now = rdfvalue.RDFDatetime.Now()
+    for r in requests:
+      cloned_request = self._DeepCopy(r)
+      cloned_request.timestamp = now
+      cloned_request.attempts = 0
+      cloned_request.leased_until = None
+      cloned_request.leased_by = None
+      self.output_plugin_requests[cloned_request.request_id] = cloned_request
+
+      if r.HasField("output_plugin_state"):
+        key = (r.client_id, r.flow_id, r.output_plugin_id)
+        if key not in self.output_plugin_request_states:
+          self.output_plugin_request_states[key] = (
+              r.output_plugin_state.SerializeToBytes())
+
+  @utils.Synchronized
+  def ReadOutputPluginRequests(self):
+    """Reads all output plugin requests from the database."""
+    res = [self._DeepCopy(r) for r in self.output_plugin_requests.values()]
+    return sorted(res, key=lambda r: r.timestamp, reverse=True)
+
+  @utils.Synchronized
+  def DeleteOutputPluginRequests(self, requests):
+    """Deletes a list of output plugin requests from the database."""
+    for r in requests:
+      self.output_plugin_requests.pop(r.request_id, None)
+
+  @utils.Synchronized
+  def DelayOutputPluginRequests(self, requests, delay):
+    """Releases leased output plugin requests to be retried after a delay."""
+    leased_until = rdfvalue.RDFDatetime.Now() + delay
+    for r in requests:
+      stored_request = self.output_plugin_requests.get(r.request_id)
+      if stored_request is None:
+        continue
+
+      stored_request.attempts += 1
+      stored_request.leased_until = leased_until
+      stored_request.leased_by = None
+
+  @utils.Synchronized
+  def ReadQueuedFlowOutputPluginState(self, client_id, flow_id,
+                                      output_plugin_id):
+    """Reads the state of a flow output plugin processing queued requests."""
+    key = (client_id, flow_id, output_plugin_id)
+    try:
+      return rdf_flow_runner.OutputPluginState.FromSerializedBytes(
+          self.output_plugin_request_states[key])
+    except KeyError:
+      raise db.UnknownFlowOutputPluginStateError(client_id, flow_id,
+                                                 output_plugin_id)
+
+  @utils.Synchronized
+  def UpdateQueuedFlowOutputPluginState(self, client_id, flow_id,
+                                        output_plugin_id, update_fn):
+    """Updates the state of a flow output plugin processing queued requests."""
+    state = self.ReadQueuedFlowOutputPluginState(client_id, flow_id,
+                                                 output_plugin_id)
+    state.plugin_state = update_fn(state.plugin_state)
+
+    key = (client_id, flow_id, output_plugin_id)
+    self.output_plugin_request_states[key] = state.SerializeToBytes()
+    return state
+
+  def RegisterOutputPluginHandler(self, handler, lease_time, limit=1000):
+    """Registers an output plugin handler to receive batches of requests."""
+    self.UnregisterOutputPluginHandler()
+
+    self.output_plugin_handler_stop = False
+    self.output_plugin_handler_thread = threading.Thread(
+        name="output_plugin_handler",
+        target=self._OutputPluginHandlerLoop,
+        args=(handler, lease_time, limit))
+    self.output_plugin_handler_thread.daemon = True
+    self.output_plugin_handler_thread.start()
+
+  def UnregisterOutputPluginHandler(self, timeout=None):
+    """Unregisters any registered output plugin handler."""
+    if self.output_plugin_handler_thread:
+      self.output_plugin_handler_stop = True
+      self.output_plugin_handler_thread.join(timeout)
+      if self.output_plugin_handler_thread.is_alive():
+        raise RuntimeError("Output plugin handler thread did not join in time.")
+      self.output_plugin_handler_thread = None
+
+  def _OutputPluginHandlerLoop(self, handler, lease_time, limit):
+    while not self.output_plugin_handler_stop:
+      try:
+        requests = self._LeaseOutputPluginRequests(lease_time, limit)
+        if requests:
+          handler(requests)
+        else:
+          time.sleep(0.2)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("_LeaseOutputPluginRequests raised %s.", e)
+
+  @utils.Synchronized
+  def _LeaseOutputPluginRequests(self, lease_time, limit):
+    """Read and lease some outstanding output plugin requests."""
+    leased_requests = []
+
+    now = rdfvalue.RDFDatetime.Now()
+    expiration_time = now + lease_time
+
+    # Oldest requests are leased first.
+    for r in sorted(
+        self.output_plugin_requests.values(), key=lambda r: r.timestamp):
+      if r.leased_until and r.leased_until >= now:
+        continue
+
+      r.leased_until = expiration_time
+      r.leased_by = utils.ProcessIdString()
+      leased_requests.append(self._DeepCopy(r))
+      if len(leased_requests) >= limit:
+        break
+
+    return leased_requests
+
   @utils.Synchronized
   def ReadAllClientActionRequests(self, client_id):
     """Reads all client action requests available for a given client_id."""
@@ -133,7 +256,7 @@ class InMemoryDBFlowMixin(object):
       if request_client_id != client_id:
         continue
 
-      request = orig_request.Copy()
+      request = self._DeepCopy(orig_request)
       current_lease = self.client_action_request_leases.get(key)
       request.ttl = db.Database.CLIENT_MESSAGES_TTL
       if current_lease is not None:
@@ -232,7 +355,7 @@ class InMemoryDBFlowMixin(object):
 
     now = rdfvalue.RDFDatetime.Now()
 
-    clone = flow_obj.Copy()
+    clone = self._DeepCopy(flow_obj)
     clone.last_update_time = now
     clone.create_time = now
 
@@ -242,7 +365,7 @@ class InMemoryDBFlowMixin(object):
   def ReadFlowObject(self, client_id, flow_id):
     """Reads a flow object from the database."""
     try:
-      return self.flows[(client_id, flow_id)].Copy()
+      return self._DeepCopy(self.flows[(client_id, flow_id)])
     except KeyError:
       raise db.UnknownFlowError(client_id, flow_id)
 
@@ -265,7 +388,7 @@ class InMemoryDBFlowMixin(object):
           (max_create_time is None or flow.create_time <= max_create_time) and
           (include_child_flows or not flow.parent_flow_id) and
           (not_created_by is None or flow.creator not in not_created_by)):
-        res.append(flow.Copy())
+        res.append(self._DeepCopy(flow))
     return res
 
   @utils.Synchronized
@@ -297,6 +420,19 @@ class InMemoryDBFlowMixin(object):
     rdf_flow.processing_deadline = processing_deadline
     return rdf_flow
 
+  @utils.Synchronized
+  def LeaseFlowsForProcessing(self, flow_keys, processing_time):
+    """Marks multiple flows as being processed on this worker."""
+    result = {}
+    for client_id, flow_id in flow_keys:
+      try:
+        result[(client_id, flow_id)] = self.LeaseFlowForProcessing(
+            client_id, flow_id, processing_time)
+      except (db.UnknownFlowError, db.ParentHuntIsNotRunningError,
+              ValueError) as e:
+        logging.info("Not leasing flow %s/%s: %s", client_id, flow_id, e)
+    return result
+
   @utils.Synchronized
   def UpdateFlow(self,
                  client_id,
@@ -315,7 +451,7 @@ class InMemoryDBFlowMixin(object):
       raise db.UnknownFlowError(client_id, flow_id)
 
     if flow_obj != db.Database.unchanged:
-      new_flow = flow_obj.Copy()
+      new_flow = self._DeepCopy(flow_obj)
 
       # Some fields cannot be updated.
       new_flow.client_id = flow.client_id
@@ -354,7 +490,7 @@ class InMemoryDBFlowMixin(object):
     for request in requests:
       key = (request.client_id, request.flow_id)
       request_dict = self.flow_requests.setdefault(key, {})
-      request_dict[request.request_id] = request.Copy()
+      request_dict[request.request_id] = self._DeepCopy(request)
       request_dict[request.request_id].timestamp = rdfvalue.RDFDatetime.Now()
 
       if request.needs_processing:
@@ -428,7 +564,7 @@ class InMemoryDBFlowMixin(object):
         continue
 
       response_dict = self.flow_responses.setdefault(flow_key, {})
-      clone = response.Copy()
+      clone = self._DeepCopy(response)
       clone.timestamp = rdfvalue.RDFDatetime.Now()
 
       response_dict.setdefault(response.request_id,
@@ -549,15 +685,9 @@ class InMemoryDBFlowMixin(object):
       responses = sorted(
           response_dict.get(request_id, {}).values(),
           key=lambda response: response.response_id)
-      # Serialize/deserialize responses to better simulate the
-      # real DB behavior (where serialization/deserialization is almost
-      # guaranteed to be done).
-      # TODO(user): change mem-db implementation to do
-      # serialization/deserialization everywhere in a generic way.
-      responses = [
-          r.__class__.FromSerializedBytes(r.SerializeToBytes())
-          for r in responses
-      ]
+      # Deep-copy responses to better simulate the real DB behavior (where
+      # returned objects never share state with the stored ones).
+      responses = [self._DeepCopy(r) for r in responses]
       res[request_id] = (request, responses)
       next_needed_request += 1
 
@@ -577,19 +707,23 @@ class InMemoryDBFlowMixin(object):
       ]
       responses = sorted(responses, key=lambda response: response.response_id)
 
-      # Serialize/deserialize responses to better simulate the
-      # real DB behavior (where serialization/deserialization is almost
-      # guaranteed to be done).
-      # TODO(user): change mem-db implementation to do
-      # serialization/deserialization everywhere in a generic way.
-      responses = [
-          r.__class__.FromSerializedBytes(r.SerializeToBytes())
-          for r in responses
-      ]
+      # Deep-copy responses to better simulate the real DB behavior (where
+      # returned objects never share state with the stored ones).
+      responses = [self._DeepCopy(r) for r in responses]
       res[request_id] = (request, responses)
 
     return res
 
+  @utils.Synchronized
+  def MultiReadFlowRequestsReadyForProcessing(self, next_needed_requests):
+    """Reads requests that can be processed for multiple flows."""
+    return {
+        (client_id, flow_id): self.ReadFlowRequestsReadyForProcessing(
+            client_id, flow_id, next_needed_request=next_needed_request)
+        for (client_id, flow_id), next_needed_request in
+        next_needed_requests.items()
+    }
+
   @utils.Synchronized
   def ReleaseProcessedFlow(self, flow_obj):
     """Releases a flow that the worker was processing to the database."""
@@ -613,6 +747,12 @@ class InMemoryDBFlowMixin(object):
         processing_deadline=None)
     return True
 
+  @utils.Synchronized
+  def ReleaseProcessedFlows(self, flow_objs):
+    """Releases multiple flows that the worker was processing."""
+    return {(flow_obj.client_id, flow_obj.flow_id):
+            self.ReleaseProcessedFlow(flow_obj) for flow_obj in flow_objs}
+
   def _InlineProcessingOK(self, requests):
     for r in requests:
       if r.delivery_time is not None:
@@ -627,8 +767,8 @@ class InMemoryDBFlowMixin(object):
     # queue the requests normally.
     if not self.flow_handler_thread and self.flow_handler_target:
       if self._InlineProcessingOK(requests):
-        for r in requests:
-          self.flow_handler_target(r)
+        for batch in self._BatchFlowProcessingRequests(requests):
+          self._CallFlowProcessingHandler(self.flow_handler_target, batch)
         return
       else:
         self._RegisterFlowProcessingHandler(self.flow_handler_target)
@@ -636,7 +776,7 @@ class InMemoryDBFlowMixin(object):
 
     now = rdfvalue.RDFDatetime.Now()
     for r in requests:
-      cloned_request = r.Copy()
+      cloned_request = self._DeepCopy(r)
       cloned_request.timestamp = now
       key = (r.client_id, r.flow_id)
       self.flow_processing_requests[key] = cloned_request
@@ -658,19 +798,35 @@ class InMemoryDBFlowMixin(object):
   def DeleteAllFlowProcessingRequests(self):
     self.flow_processing_requests = {}
 
-  def RegisterFlowProcessingHandler(self, handler):
+  def _BatchFlowProcessingRequests(self, requests):
+    """Splits requests into batches to be passed to the handler."""
+    if self.flow_handler_batch_size is None:
+      return [[r] for r in requests]
+    return list(collection.Batch(requests, self.flow_handler_batch_size))
+
+  def _CallFlowProcessingHandler(self, handler, batch):
+    """Passes a batch of requests to the handler."""
+    if self.flow_handler_batch_size is None:
+      handler(batch[0])
+    else:
+      handler(batch)
+
+  def RegisterFlowProcessingHandler(self, handler, batch_size=None):
     """Registers a message handler to receive flow processing messages."""
     self.UnregisterFlowProcessingHandler()
 
     # For the in memory db, we just call the handler straight away if there is
     # no delay in starting times so we don't run the thread here.
     self.flow_handler_target = handler
+    self.flow_handler_batch_size = batch_size
 
-    for request in self._GetFlowRequestsReadyForProcessing():
-      handler(request)
+    todo = self._GetFlowRequestsReadyForProcessing()
+    for batch in self._BatchFlowProcessingRequests(todo):
+      self._CallFlowProcessingHandler(handler, batch)
       with self.lock:
-        self.flow_processing_requests.pop((request.client_id, request.flow_id),
-                                          None)
+        for request in batch:
+          self.flow_processing_requests.pop(
+              (request.client_id, request.flow_id), None)
 
   def _RegisterFlowProcessingHandler(self, handler):
     """Registers a handler to receive flow processing messages."""
@@ -743,10 +899,10 @@ class InMemoryDBFlowMixin(object):
           del self.flow_processing_requests[(request.client_id,
                                              request.flow_id)]
 
-      for request in todo:
-        handler(request)
+      for batch in self._BatchFlowProcessingRequests(todo):
+        self._CallFlowProcessingHandler(handler, batch)
         with self.lock:
-          self.flow_handler_num_being_processed -= 1
+          self.flow_handler_num_being_processed -= len(batch)
 
       time.sleep(0.2)
 
@@ -754,7 +910,7 @@ class InMemoryDBFlowMixin(object):
   def _WriteFlowResultsOrErrors(self, container, items):
     for i in items:
       dest = container.setdefault((i.client_id, i.flow_id), [])
-      to_write = i.Copy()
+      to_write = self._DeepCopy(i)
       to_write.timestamp = rdfvalue.RDFDatetime.Now()
       dest.append(to_write)
 
@@ -774,7 +930,7 @@ class InMemoryDBFlowMixin(object):
                                with_substring=None):
     """Reads flow results/errors of a given flow using given query options."""
     results = sorted(
-        [x.Copy() for x in container.get((client_id, flow_id), [])],
+        [self._DeepCopy(x) for x in container.get((client_id, flow_id), [])],
         key=lambda r: r.timestamp)
 
     # This is done in order to pass the tests that try to deserialize
@@ -902,7 +1058,7 @@ class InMemoryDBFlowMixin(object):
     if key not in self.flows:
       raise db.UnknownFlowError(entry.client_id, entry.flow_id)
 
-    entry = entry.Copy()
+    entry = self._DeepCopy(entry)
     entry.timestamp = rdfvalue.RDFDatetime.Now()
 
     self.flow_log_entries.setdefault(key, []).append(entry)
@@ -940,7 +1096,7 @@ class InMemoryDBFlowMixin(object):
     if key not in self.flows:
       raise db.UnknownFlowError(entry.client_id, entry.flow_id)
 
-    entry = entry.Copy()
+    entry = self._DeepCopy(entry)
     entry.timestamp = rdfvalue.RDFDatetime.Now()
 
     self.flow_output_plugin_log_entries.setdefault(key, []).append(entry)
@@ -994,7 +1150,7 @@ class InMemoryDBFlowMixin(object):
 
     full_id = (scheduled_flow.client_id, scheduled_flow.creator,
                scheduled_flow.scheduled_flow_id)
-    self.scheduled_flows[full_id] = scheduled_flow.Copy()
+    self.scheduled_flows[full_id] = self._DeepCopy(scheduled_flow)
 
   @utils.Synchronized
   def DeleteScheduledFlow(self, client_id: str, creator: str,
@@ -1014,7 +1170,7 @@ class InMemoryDBFlowMixin(object):
       creator: str) -> Sequence[rdf_flow_objects.ScheduledFlow]:
     """See base class."""
     return [
-        sf.Copy()
+        self._DeepCopy(sf)
         for sf in self.scheduled_flows.values()
         if sf.client_id == client_id and sf.creator == creator
     ]
@@ -372,6 +372,10 @@ class InMemoryDBHuntMixin(object):
     return rdf_stats.ClientResourcesStats.FromSerializedBytes(
         result.SerializeToBytes())
 
+  def RebuildHuntCounters(self, hunt_id):
+    """Recomputes hunt counters (a no-op, they are computed on read)."""
+    del hunt_id  # Unused.
+
   @utils.Synchronized
   def ReadHuntFlowsStatesAndTimestamps(self, hunt_id):
     """Reads hunt flows states and timestamps."""
@@ -11,6 +11,7 @@ from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.util import collection
 from grr_response_server.databases import db
+from grr_response_server.databases import db_utils
 from grr_response_server.rdfvalues import objects as rdf_objects
 
 
@@ -108,7 +109,7 @@ class _PathRecord(object):
       raise ValueError("PathInfo with timestamp %r was added before." %
                        path_info.timestamp)
 
-    new_path_info = path_info.Copy()
+    new_path_info = path_info.DeepCopy()
     if new_path_info.timestamp is None:
       new_path_info.timestamp = rdfvalue.RDFDatetime.Now()
     self._path_infos[new_path_info.timestamp] = new_path_info
@@ -136,7 +137,7 @@ class _PathRecord(object):
     """
     path_info_timestamp = self._LastEntryTimestamp(self._path_infos, timestamp)
     try:
-      result = self._path_infos[path_info_timestamp].Copy()
+      result = self._path_infos[path_info_timestamp].DeepCopy()
     except KeyError:
       result = rdf_objects.PathInfo(
           path_type=self._path_type,
@@ -146,12 +147,18 @@ class _PathRecord(object):
     stat_entry_timestamp = self._LastEntryTimestamp(self._stat_entries,
                                                     timestamp)
     result.last_stat_entry_timestamp = stat_entry_timestamp
-    result.stat_entry = self._stat_entries.get(stat_entry_timestamp)
+    stat_entry = self._stat_entries.get(stat_entry_timestamp)
+    if stat_entry is not None:
+      stat_entry = stat_entry.DeepCopy()
+    result.stat_entry = stat_entry
 
     hash_entry_timestamp = self._LastEntryTimestamp(self._hash_entries,
                                                     timestamp)
     result.last_hash_entry_timestamp = hash_entry_timestamp
-    result.hash_entry = self._hash_entries.get(hash_entry_timestamp)
+    hash_entry = self._hash_entries.get(hash_entry_timestamp)
+    if hash_entry is not None:
+      hash_entry = hash_entry.DeepCopy()
+    result.hash_entry = hash_entry
 
     return result
 
@@ -209,82 +216,39 @@ class InMemoryDBPathMixin(object):
     return result
 
   @utils.Synchronized
-  def ListDescendantPathInfos(self,
+  def IterDescendantPathInfos(self,
                               client_id,
                               path_type,
                               components,
                               timestamp=None,
                               max_depth=None):
-    """Lists path info records that correspond to children of given path."""
-    result = []
-    root_dir_exists = False
+    """Yields path info records that correspond to descendants of given path."""
+    components = tuple(components)
 
+    # Path records are collected eagerly, so that the lock isn't held while
+    # the results are consumed.
+    path_infos = []
     for path_idx, path_record in self.path_records.items():
       other_client_id, other_path_type, other_components = path_idx
-      path_info = path_record.GetPathInfo(timestamp=timestamp)
 
       if client_id != other_client_id or path_type != other_path_type:
         continue
-      if other_components == tuple(components):
-        root_dir_exists = True
-        if not path_info.directory:
-          raise db.NotDirectoryPathError(client_id, path_type, components)
-      if len(other_components) == len(components):
-        continue
       if not collection.StartsWith(other_components, components):
         continue
       if (max_depth is not None and
           len(other_components) - len(components) > max_depth):
         continue
 
-      result.append(path_info)
-
-    if not root_dir_exists and components:
-      raise db.UnknownPathError(client_id, path_type, components)
-
-    if timestamp is None:
-      return sorted(result, key=lambda _: tuple(_.components))
-
-    # We need to filter implicit path infos if specific timestamp is given.
-
-    # TODO(hanuszczak): If we were to switch to use path trie instead of storing
-    # records by path id, everything would be much easier.
-
-    class TrieNode(object):
-      """A trie of path components with path infos as values."""
-
-      def __init__(self):
-        self.path_info = None
-        self.children = {}
-        self.explicit = False
-
-      def Add(self, path_info, idx=0):
-        """Adds given path info to the trie (or one of its subtrees)."""
-        components = path_info.components
-        if idx == len(components):
-          self.path_info = path_info
-          self.explicit |= (
-              path_info.HasField("stat_entry") or
-              path_info.HasField("hash_entry"))
-        else:
-          child = self.children.setdefault(components[idx], TrieNode())
-          child.Add(path_info, idx=idx + 1)
-          self.explicit |= child.explicit
-
-      def Collect(self, path_infos):
-        if self.path_info is not None and self.explicit:
-          path_infos.append(self.path_info)
-
-        for component in sorted(self.children):
-          self.children[component].Collect(path_infos)
+      path_infos.append(path_record.GetPathInfo(timestamp=timestamp))
 
-    trie = TrieNode()
-    for path_info in result:
-      trie.Add(path_info)
+    path_infos.sort(key=lambda _: db_utils.CanonicalPath(_.components))
 
-    explicit_path_infos = []
-    trie.Collect(explicit_path_infos)
-    return explicit_path_infos
+    return db_utils.FilterDescendantPathInfos(
+        client_id,
+        path_type,
+        components,
+        path_infos,
+        only_explicit=timestamp is not None)
 
   def _GetPathRecord(self, client_id, path_info, set_default=True):
     components = tuple(path_info.components)
@@ -22,6 +22,7 @@ from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_server import threadpool
 from grr_response_server.databases import db as db_module
+from grr_response_server.databases import flow_processing_notifications
 from grr_response_server.databases import mysql_artifacts
 from grr_response_server.databases import mysql_blob_keys
 from grr_response_server.databases import mysql_blobs
@@ -507,6 +508,9 @@ class MysqlDB(mysql_artifacts.MySQLDBArtifactsMixin,
     self.handler_thread = None
     self.handler_stop = True
 
+    self.output_plugin_handler_thread = None
+    self.output_plugin_handler_stop = True
+
     self.flow_processing_request_handler_thread = None
     self.flow_processing_request_handler_stop = None
     self.flow_processing_request_handler_pool = (
@@ -515,11 +519,19 @@ class MysqlDB(mysql_artifacts.MySQLDBArtifactsMixin,
             min_threads=config.CONFIG["Mysql.flow_processing_threads_min"],
             max_threads=config.CONFIG["Mysql.flow_processing_threads_max"]))
     self.flow_processing_request_handler_pool.Start()
+    self.flow_processing_request_waiter = flow_processing_notifications.Waiter(
+        min_wait=config.CONFIG["Mysql.flow_processing_poll_min"],
+        max_wait=config.CONFIG["Mysql.flow_processing_poll_max"])
+    self.flow_processing_notification_channel = (
+        flow_processing_notifications.UdpNotificationChannel(
+            config.CONFIG["Mysql.flow_processing_notification_port"],
+            config.CONFIG["Mysql.flow_processing_notification_peers"]))
 
   def _Connect(self):
     return _Connect(**self._connect_args)
 
   def Close(self):
+    self.flow_processing_notification_channel.Close()
     self.pool.close()
 
   def _RunInTransaction(self,
@@ -1058,6 +1058,12 @@ class MySQLDBClientMixin(object):
       last_startup_timestamp = NULL
     WHERE client_id = %s""", [db_utils.ClientIDToInt(client_id)])
 
+    # Hunt counters are maintained by triggers on the `flows` table, which
+    # don't fire for rows deleted by a cascading foreign key.
+    cursor.execute(
+        "DELETE FROM flows WHERE client_id = %s AND parent_hunt_id IS NOT NULL",
+        [db_utils.ClientIDToInt(client_id)])
+
     cursor.execute("DELETE FROM clients WHERE client_id = %s",
                    [db_utils.ClientIDToInt(client_id)])
 
@@ -24,6 +24,7 @@ from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import random
 from grr_response_server.databases import db
 from grr_response_server.databases import db_utils
+from grr_response_server.databases import flow_processing_notifications
 from grr_response_server.databases import mysql_utils
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
@@ -150,6 +151,214 @@ class MySQLDBFlowMixin(object):
 
     return res
 
+  @mysql_utils.WithTransaction()
+  def WriteOutputPluginRequests(self, requests, cursor=None):
+    """Writes a list of output plugin requests to the database."""
+    query = ("INSERT IGNORE INTO output_plugin_requests "
+             "(request_id, request) VALUES ")
+
+    value_templates = []
+    args = []
+    for r in requests:
+      args.extend([r.request_id, r.SerializeToBytes()])
+      value_templates.append("(%s, %s)")
+
+    query += ",".join(value_templates)
+    cursor.execute(query, args)
+
+    value_templates = []
+    args = []
+    for r in requests:
+      if r.HasField("output_plugin_state"):
+        args.extend([
+            db_utils.ClientIDToInt(r.client_id),
+            db_utils.FlowIDToInt(r.flow_id),
+            db_utils.OutputPluginIDToInt(r.output_plugin_id),
+            r.output_plugin_state.SerializeToBytes(),
+        ])
+        value_templates.append("(%s, %s, %s, %s)")
+
+    if value_templates:
+      # States of plugins that already processed requests are not reset.
+      query = ("INSERT IGNORE INTO output_plugin_request_states "
+               "(client_id, flow_id, output_plugin_id, state) VALUES ")
+      query += ",".join(value_templates)
+      cursor.execute(query, args)
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadQueuedFlowOutputPluginState(self,
+                                      client_id,
+                                      flow_id,
+                                      output_plugin_id,
+                                      cursor=None):
+    """Reads the state of a flow output plugin processing queued requests."""
+    query = ("SELECT state FROM output_plugin_request_states "
+             "WHERE client_id = %s AND flow_id = %s AND output_plugin_id = %s")
+    args = [
+        db_utils.ClientIDToInt(client_id),
+        db_utils.FlowIDToInt(flow_id),
+        db_utils.OutputPluginIDToInt(output_plugin_id),
+    ]
+    if cursor.execute(query, args) == 0:
+      raise db.UnknownFlowOutputPluginStateError(client_id, flow_id,
+                                                 output_plugin_id)
+
+    (state,) = cursor.fetchone()
+    return rdf_flow_runner.OutputPluginState.FromSerializedBytes(state)
+
+  @mysql_utils.WithTransaction()
+  def UpdateQueuedFlowOutputPluginState(self,
+                                        client_id,
+                                        flow_id,
+                                        output_plugin_id,
+                                        update_fn,
+                                        cursor=None):
+    """Updates the state of a flow output plugin processing queued requests."""
+    query = ("SELECT state FROM output_plugin_request_states "
+             "WHERE client_id = %s AND flow_id = %s AND output_plugin_id = %s "
+             "FOR UPDATE")
+    args = [
+        db_utils.ClientIDToInt(client_id),
+        db_utils.FlowIDToInt(flow_id),
+        db_utils.OutputPluginIDToInt(output_plugin_id),
+    ]
+    if cursor.execute(query, args) == 0:
+      raise db.UnknownFlowOutputPluginStateError(client_id, flow_id,
+                                                 output_plugin_id)
+
+    (state,) = cursor.fetchone()
+    state = rdf_flow_runner.OutputPluginState.FromSerializedBytes(state)
+    state.plugin_state = update_fn(state.plugin_state)
+
+    query = ("UPDATE output_plugin_request_states SET state = %s "
+             "WHERE client_id = %s AND flow_id = %s AND output_plugin_id = %s")
+    cursor.execute(query, [state.SerializeToBytes()] + args)
+    return state
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadOutputPluginRequests(self, cursor=None):
+    """Reads all output plugin requests from the database."""
+    query = ("SELECT UNIX_TIMESTAMP(timestamp), request, attempts, "
+             "       UNIX_TIMESTAMP(leased_until), leased_by "
+             "FROM output_plugin_requests "
+             "ORDER BY timestamp DESC")
+
+    cursor.execute(query)
+
+    res = []
+    for (timestamp, request, attempts, leased_until,
+         leased_by) in cursor.fetchall():
+      req = rdf_flow_objects.OutputPluginRequest.FromSerializedBytes(request)
+      req.timestamp = mysql_utils.TimestampToRDFDatetime(timestamp)
+      req.attempts = attempts
+      req.leased_by = leased_by
+      req.leased_until = mysql_utils.TimestampToRDFDatetime(leased_until)
+      res.append(req)
+    return res
+
+  @mysql_utils.WithTransaction()
+  def DeleteOutputPluginRequests(self, requests, cursor=None):
+    """Deletes a list of output plugin requests from the database."""
+    request_ids = set([r.request_id for r in requests])
+    if not request_ids:
+      return
+
+    query = "DELETE FROM output_plugin_requests WHERE request_id IN ({})"
+    query = query.format(",".join(["%s"] * len(request_ids)))
+    cursor.execute(query, list(request_ids))
+
+  @mysql_utils.WithTransaction()
+  def DelayOutputPluginRequests(self, requests, delay, cursor=None):
+    """Releases leased output plugin requests to be retried after a delay."""
+    request_ids = set([r.request_id for r in requests])
+    if not request_ids:
+      return
+
+    leased_until = rdfvalue.RDFDatetime.Now() + delay
+    query = ("UPDATE output_plugin_requests "
+             "SET attempts=attempts+1, leased_until=FROM_UNIXTIME(%s), "
+             "    leased_by=NULL "
+             "WHERE request_id IN ({})")
+    query = query.format(",".join(["%s"] * len(request_ids)))
+    args = [mysql_utils.RDFDatetimeToTimestamp(leased_until)]
+    args.extend(request_ids)
+    cursor.execute(query, args)
+
+  def RegisterOutputPluginHandler(self, handler, lease_time, limit=1000):
+    """Registers an output plugin handler to receive batches of requests."""
+    self.UnregisterOutputPluginHandler()
+
+    if handler:
+      self.output_plugin_handler_stop = False
+      self.output_plugin_handler_thread = threading.Thread(
+          name="output_plugin_handler",
+          target=self._OutputPluginHandlerLoop,
+          args=(handler, lease_time, limit))
+      self.output_plugin_handler_thread.daemon = True
+      self.output_plugin_handler_thread.start()
+
+  def UnregisterOutputPluginHandler(self, timeout=None):
+    """Unregisters any registered output plugin handler."""
+    if self.output_plugin_handler_thread:
+      self.output_plugin_handler_stop = True
+      self.output_plugin_handler_thread.join(timeout)
+      if self.output_plugin_handler_thread.is_alive():
+        raise RuntimeError("Output plugin handler thread did not join in time.")
+      self.output_plugin_handler_thread = None
+
+  _OUTPUT_PLUGIN_HANDLER_POLL_TIME_SECS = 5
+
+  def _OutputPluginHandlerLoop(self, handler, lease_time, limit):
+    while not self.output_plugin_handler_stop:
+      try:
+        requests = self._LeaseOutputPluginRequests(lease_time, limit)
+        if requests:
+          handler(requests)
+        else:
+          time.sleep(self._OUTPUT_PLUGIN_HANDLER_POLL_TIME_SECS)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("_LeaseOutputPluginRequests raised %s.", e)
+
+  @mysql_utils.WithTransaction()
+  def _LeaseOutputPluginRequests(self, lease_time, limit, cursor=None):
+    """Leases a number of output plugin requests up to the indicated limit."""
+
+    now = rdfvalue.RDFDatetime.Now()
+    now_str = mysql_utils.RDFDatetimeToTimestamp(now)
+
+    expiry = now + lease_time
+    expiry_str = mysql_utils.RDFDatetimeToTimestamp(expiry)
+
+    # Oldest requests are leased first.
+    query = ("UPDATE output_plugin_requests "
+             "SET leased_until=FROM_UNIXTIME(%s), leased_by=%s "
+             "WHERE leased_until IS NULL OR leased_until < FROM_UNIXTIME(%s) "
+             "ORDER BY timestamp "
+             "LIMIT %s")
+
+    id_str = utils.ProcessIdString()
+    args = (expiry_str, id_str, now_str, limit)
+    updated = cursor.execute(query, args)
+
+    if updated == 0:
+      return []
+
+    cursor.execute(
+        "SELECT UNIX_TIMESTAMP(timestamp), request, attempts "
+        "FROM output_plugin_requests "
+        "WHERE leased_by=%s AND leased_until=FROM_UNIXTIME(%s) LIMIT %s",
+        (id_str, expiry_str, updated))
+    res = []
+    for timestamp, request, attempts in cursor.fetchall():
+      req = rdf_flow_objects.OutputPluginRequest.FromSerializedBytes(request)
+      req.timestamp = mysql_utils.TimestampToRDFDatetime(timestamp)
+      req.attempts = attempts
+      req.leased_until = expiry
+      req.leased_by = id_str
+      res.append(req)
+
+    return res
+
   @mysql_utils.WithTransaction(readonly=True)
   def ReadAllClientActionRequests(self, client_id, cursor=None):
     """Reads all client messages available for a given client_id."""
@@ -536,6 +745,81 @@ class MySQLDBFlowMixin(object):
     rdf_flow.processing_deadline = processing_deadline
     return rdf_flow
 
+  @mysql_utils.WithTransaction()
+  def LeaseFlowsForProcessing(self, flow_keys, processing_time, cursor=None):
+    """Marks multiple flows as being processed on this worker."""
+    flow_keys = set(flow_keys)
+    if not flow_keys:
+      return {}
+
+    key_args = []
+    for client_id, flow_id in flow_keys:
+      key_args.append(db_utils.ClientIDToInt(client_id))
+      key_args.append(db_utils.FlowIDToInt(flow_id))
+    key_match_list = ", ".join(("(%s, %s)",) * len(flow_keys))
+
+    query = (f"SELECT {self.FLOW_DB_FIELDS} FROM flows "
+             f"WHERE (client_id, flow_id) IN ({key_match_list})")
+    cursor.execute(query, key_args)
+
+    now = rdfvalue.RDFDatetime.Now()
+    candidates = []
+    for row in cursor.fetchall():
+      rdf_flow = self._FlowObjectFromRow(row)
+      if rdf_flow.processing_on and rdf_flow.processing_deadline > now:
+        logging.info("Flow %s on client %s is already being processed.",
+                     rdf_flow.flow_id, rdf_flow.client_id)
+        continue
+      candidates.append(rdf_flow)
+
+    hunt_ids = set(f.parent_hunt_id for f in candidates if f.parent_hunt_id)
+    if hunt_ids:
+      hunt_id_ints = [db_utils.HuntIDToInt(hunt_id) for hunt_id in hunt_ids]
+      query = ("SELECT hunt_id, hunt_state FROM hunts WHERE hunt_id IN ({})"
+              ).format(", ".join(["%s"] * len(hunt_id_ints)))
+      cursor.execute(query, hunt_id_ints)
+
+      stopped_hunt_ids = set()
+      for hunt_id_int, hunt_state in cursor.fetchall():
+        if (hunt_state is not None and
+            not rdf_hunt_objects.IsHuntSuitableForFlowProcessing(hunt_state)):
+          stopped_hunt_ids.add(db_utils.IntToHuntID(hunt_id_int))
+
+      candidates = [
+          f for f in candidates if f.parent_hunt_id not in stopped_hunt_ids
+      ]
+
+    if not candidates:
+      return {}
+
+    processing_deadline = now + processing_time
+    process_id_string = utils.ProcessIdString()
+
+    args = [
+        process_id_string,
+        mysql_utils.RDFDatetimeToTimestamp(now),
+        mysql_utils.RDFDatetimeToTimestamp(processing_deadline),
+    ]
+    for rdf_flow in candidates:
+      args.append(db_utils.ClientIDToInt(rdf_flow.client_id))
+      args.append(db_utils.FlowIDToInt(rdf_flow.flow_id))
+    key_match_list = ", ".join(("(%s, %s)",) * len(candidates))
+
+    update_query = ("UPDATE flows SET "
+                    "processing_on=%s, "
+                    "processing_since=FROM_UNIXTIME(%s), "
+                    "processing_deadline=FROM_UNIXTIME(%s) "
+                    f"WHERE (client_id, flow_id) IN ({key_match_list})")
+    cursor.execute(update_query, args)
+
+    result = {}
+    for rdf_flow in candidates:
+      rdf_flow.processing_on = process_id_string
+      rdf_flow.processing_since = now
+      rdf_flow.processing_deadline = processing_deadline
+      result[(rdf_flow.client_id, rdf_flow.flow_id)] = rdf_flow
+    return result
+
   @mysql_utils.WithTransaction()
   def UpdateFlow(self,
                  client_id,
@@ -614,9 +898,14 @@ class MySQLDBFlowMixin(object):
     query += ", ".join(templates)
     cursor.execute(query, args)
 
-  @mysql_utils.WithTransaction()
-  def WriteFlowRequests(self, requests, cursor=None):
+  def WriteFlowRequests(self, requests):
     """Writes a list of flow requests to the database."""
+    flow_processing_requests = self._WriteFlowRequests(requests)
+    self._NotifyFlowProcessingRequestsWritten(flow_processing_requests)
+
+  @mysql_utils.WithTransaction()
+  def _WriteFlowRequests(self, requests, cursor=None):
+    """Writes flow requests and returns flow processing requests written."""
     args = []
     templates = []
     flow_keys = []
@@ -643,8 +932,8 @@ class MySQLDBFlowMixin(object):
           r.SerializeToBytes(),
       ])
 
+    flow_processing_requests = []
     if needs_processing:
-      flow_processing_requests = []
       nr_conditions = []
       nr_args = []
       for client_id, flow_id in needs_processing:
@@ -689,6 +978,8 @@ class MySQLDBFlowMixin(object):
     except MySQLdb.IntegrityError as e:
       raise db.AtLeastOneUnknownFlowError(flow_keys, cause=e)
 
+    return flow_processing_requests
+
   def _WriteResponses(self, responses, cursor):
     """Builds the writes to store the given responses in the db."""
 
@@ -904,7 +1195,15 @@ class MySQLDBFlowMixin(object):
 
   @mysql_utils.WithTransaction()
   def _UpdateRequestsAndScheduleFPRs(self, responses, cursor=None):
-    """Updates requests and writes FlowProcessingRequests if needed."""
+    """Updates requests and writes FlowProcessingRequests if needed.
+
+    Args:
+      responses: A list of FlowResponse objects that have been written.
+      cursor: MySQLdb cursor to use.
+
+    Returns:
+      A tuple (affected_requests, written_flow_processing_requests).
+    """
 
     request_keys = set(
         (r.client_id, r.flow_id, r.request_id) for r in responses)
@@ -918,7 +1217,7 @@ class MySQLDBFlowMixin(object):
         request_keys, response_counts, cursor)
 
     if not affected_requests:
-      return []
+      return {}, []
 
     fprs_to_write = []
     for request_key, r in affected_requests.items():
@@ -933,7 +1232,7 @@ class MySQLDBFlowMixin(object):
     if fprs_to_write:
       self._WriteFlowProcessingRequests(fprs_to_write, cursor)
 
-    return affected_requests
+    return affected_requests, fprs_to_write
 
   @db_utils.CallLoggedAndAccounted
   def WriteFlowResponses(self, responses):
@@ -946,7 +1245,9 @@ class MySQLDBFlowMixin(object):
 
       self._WriteFlowResponsesAndExpectedUpdates(batch)
 
-      completed_requests = self._UpdateRequestsAndScheduleFPRs(batch)
+      completed_requests, flow_processing_requests = (
+          self._UpdateRequestsAndScheduleFPRs(batch))
+      self._NotifyFlowProcessingRequestsWritten(flow_processing_requests)
 
       if completed_requests:
         self._DeleteClientActionRequest(completed_requests)
@@ -1062,32 +1363,59 @@ class MySQLDBFlowMixin(object):
                                          next_needed_request,
                                          cursor=None):
     """Reads all requests for a flow that can be processed by the worker."""
-    query = ("SELECT request, needs_processing, responses_expected, "
-             "callback_state, next_response_id, "
+    flow_key = (client_id, flow_id)
+    return self._ReadFlowRequestsReadyForProcessing(
+        {flow_key: next_needed_request}, cursor)[flow_key]
+
+  @mysql_utils.WithTransaction(readonly=True)
+  def MultiReadFlowRequestsReadyForProcessing(self,
+                                              next_needed_requests,
+                                              cursor=None):
+    """Reads requests that can be processed for multiple flows."""
+    if not next_needed_requests:
+      return {}
+    return self._ReadFlowRequestsReadyForProcessing(next_needed_requests,
+                                                    cursor)
+
+  def _ReadFlowRequestsReadyForProcessing(self, next_needed_requests, cursor):
+    """Reads requests that can be processed for the given flows."""
+    args = []
+    for client_id, flow_id in next_needed_requests:
+      args.append(db_utils.ClientIDToInt(client_id))
+      args.append(db_utils.FlowIDToInt(flow_id))
+    key_match_list = ", ".join(("(%s, %s)",) * len(next_needed_requests))
+
+    query = ("SELECT client_id, flow_id, request, needs_processing, "
+             "responses_expected, callback_state, next_response_id, "
              "UNIX_TIMESTAMP(timestamp) "
              "FROM flow_requests "
-             "WHERE client_id=%s AND flow_id=%s")
-    args = [db_utils.ClientIDToInt(client_id), db_utils.FlowIDToInt(flow_id)]
+             f"WHERE (client_id, flow_id) IN ({key_match_list})")
     cursor.execute(query, args)
 
     requests = {}
-    for (req, needs_processing, responses_expected, callback_state,
-         next_response_id, ts) in cursor.fetchall():
+    for (client_id_int, flow_id_int, req, needs_processing, responses_expected,
+         callback_state, next_response_id, ts) in cursor.fetchall():
+      flow_key = (db_utils.IntToClientID(client_id_int),
+                  db_utils.IntToFlowID(flow_id_int))
       request = rdf_flow_objects.FlowRequest.FromSerializedBytes(req)
       request.needs_processing = needs_processing
       request.nr_responses_expected = responses_expected
       request.callback_state = callback_state
       request.next_response_id = next_response_id
       request.timestamp = mysql_utils.TimestampToRDFDatetime(ts)
-      requests[request.request_id] = request
+      requests.setdefault(flow_key, {})[request.request_id] = request
 
-    query = ("SELECT response, status, iterator, UNIX_TIMESTAMP(timestamp) "
+    query = ("SELECT client_id, flow_id, response, status, iterator, "
+             "UNIX_TIMESTAMP(timestamp) "
              "FROM flow_responses "
-             "WHERE client_id=%s AND flow_id=%s")
+             f"WHERE (client_id, flow_id) IN ({key_match_list})")
     cursor.execute(query, args)
 
     responses = {}
-    for res, status, iterator, ts in cursor.fetchall():
+    for client_id_int, flow_id_int, res, status, iterator, ts in (
+        cursor.fetchall()):
+      flow_key = (db_utils.IntToClientID(client_id_int),
+                  db_utils.IntToFlowID(flow_id_int))
       if status:
         response = rdf_flow_objects.FlowStatus.FromSerializedBytes(status)
       elif iterator:
@@ -1095,8 +1423,19 @@ class MySQLDBFlowMixin(object):
       else:
         response = rdf_flow_objects.FlowResponse.FromSerializedBytes(res)
       response.timestamp = mysql_utils.TimestampToRDFDatetime(ts)
-      responses.setdefault(response.request_id, []).append(response)
-
+      responses.setdefault(flow_key, {}).setdefault(response.request_id,
+                                                    []).append(response)
+
+    result = {}
+    for flow_key, next_needed_request in next_needed_requests.items():
+      result[flow_key] = self._RequestsReadyForProcessing(
+          requests.get(flow_key, {}), responses.get(flow_key, {}),
+          next_needed_request)
+    return result
+
+  def _RequestsReadyForProcessing(self, requests, responses,
+                                  next_needed_request):
+    """Selects requests of a single flow that can be processed."""
     res = {}
 
     # Do a pass for completed requests.
@@ -1131,6 +1470,17 @@ class MySQLDBFlowMixin(object):
   @mysql_utils.WithTransaction()
   def ReleaseProcessedFlow(self, flow_obj, cursor=None):
     """Releases a flow that the worker was processing to the database."""
+    return self._ReleaseProcessedFlow(flow_obj, cursor)
+
+  @mysql_utils.WithTransaction()
+  def ReleaseProcessedFlows(self, flow_objs, cursor=None):
+    """Releases multiple flows that the worker was processing."""
+    return {(flow_obj.client_id, flow_obj.flow_id):
+            self._ReleaseProcessedFlow(flow_obj, cursor)
+            for flow_obj in flow_objs}
+
+  def _ReleaseProcessedFlow(self, flow_obj, cursor):
+    """Releases a flow using the given cursor."""
 
     update_query = """
     UPDATE flows
@@ -1193,11 +1543,29 @@ class MySQLDBFlowMixin(object):
     rows_updated = cursor.execute(update_query, args)
     return rows_updated == 1
 
-  @mysql_utils.WithTransaction()
-  def WriteFlowProcessingRequests(self, requests, cursor=None):
+  def WriteFlowProcessingRequests(self, requests):
     """Writes a list of flow processing requests to the database."""
+    self._WriteFlowProcessingRequestsInTransaction(requests)
+    self._NotifyFlowProcessingRequestsWritten(requests)
+
+  @mysql_utils.WithTransaction()
+  def _WriteFlowProcessingRequestsInTransaction(self, requests, cursor=None):
     self._WriteFlowProcessingRequests(requests, cursor)
 
+  def _NotifyFlowProcessingRequestsWritten(self, requests):
+    """Wakes up flow processing handlers after requests were committed."""
+    if not requests:
+      return
+
+    delivery_time = flow_processing_notifications.EarliestDeliveryTime(requests)
+    flow_processing_notifications.FLOW_PROCESSING_NOTIFICATIONS.Increment(
+        fields=["local"])
+    self.flow_processing_request_waiter.Notify(delivery_time)
+    try:
+      self.flow_processing_notification_channel.Send(delivery_time)
+    except Exception as e:  # pylint: disable=broad-except
+      logging.warning("Failed to send flow processing notification: %s", e)
+
   @mysql_utils.WithTransaction(readonly=True)
   def ReadFlowProcessingRequests(self, cursor=None):
     """Reads all flow processing requests from the database."""
@@ -1298,30 +1666,45 @@ class MySQLDBFlowMixin(object):
 
     return res
 
-  _FLOW_REQUEST_POLL_TIME_SECS = 3
-
-  def _FlowProcessingRequestHandlerLoop(self, handler):
+  def _FlowProcessingRequestHandlerLoop(self, handler, batch_size):
     """The main loop for the flow processing request queue."""
+    waiter = self.flow_processing_request_waiter
     while not self.flow_processing_request_handler_stop:
       thread_pool = self.flow_processing_request_handler_pool
       free_threads = thread_pool.max_threads - thread_pool.busy_threads
       if free_threads == 0:
-        time.sleep(self._FLOW_REQUEST_POLL_TIME_SECS)
+        # Checking for free threads doesn't hit the database, so we can do it
+        # as often as we would poll a busy queue.
+        waiter.Wait(waiter.min_wait)
         continue
       try:
-        msgs = self._LeaseFlowProcessingRequests(free_threads)
+        limit = free_threads * (batch_size or 1)
+        msgs = self._LeaseFlowProcessingRequests(limit)
         if msgs:
-          for m in msgs:
-            self.flow_processing_request_handler_pool.AddTask(
-                target=handler, args=(m,))
+          waiter.Reset()
+          if batch_size is None:
+            for m in msgs:
+              self.flow_processing_request_handler_pool.AddTask(
+                  target=handler, args=(m,))
+          else:
+            for batch in collection.Batch(msgs, batch_size):
+              self.flow_processing_request_handler_pool.AddTask(
+                  target=handler, args=(batch,))
+          # If we leased as many requests as we could, there are likely more
+          # waiting, so we try again right away.
+          if len(msgs) < limit:
+            waiter.Wait()
         else:
-          time.sleep(self._FLOW_REQUEST_POLL_TIME_SECS)
+          waiter.Wait()
 
       except Exception as e:  # pylint: disable=broad-except
         logging.exception("_FlowProcessingRequestHandlerLoop raised %s.", e)
-        time.sleep(self._FLOW_REQUEST_POLL_TIME_SECS)
+        waiter.Wait(waiter.max_wait)
+
+  def _WakeUpFlowProcessingRequestHandler(self, delivery_time):
+    self.flow_processing_request_waiter.Notify(delivery_time)
 
-  def RegisterFlowProcessingHandler(self, handler):
+  def RegisterFlowProcessingHandler(self, handler, batch_size=None):
     """Registers a handler to receive flow processing messages."""
     self.UnregisterFlowProcessingHandler()
 
@@ -1330,14 +1713,18 @@ class MySQLDBFlowMixin(object):
       self.flow_processing_request_handler_thread = threading.Thread(
           name="flow_processing_request_handler",
           target=self._FlowProcessingRequestHandlerLoop,
-          args=(handler,))
+          args=(handler, batch_size))
       self.flow_processing_request_handler_thread.daemon = True
       self.flow_processing_request_handler_thread.start()
+      self.flow_processing_notification_channel.Listen(
+          self._WakeUpFlowProcessingRequestHandler)
 
   def UnregisterFlowProcessingHandler(self, timeout=None):
     """Unregisters any registered flow processing handler."""
     if self.flow_processing_request_handler_thread:
       self.flow_processing_request_handler_stop = True
+      # Wake up the loop so that it notices the stop flag right away.
+      self.flow_processing_request_waiter.Notify()
       self.flow_processing_request_handler_thread.join(timeout)
       if self.flow_processing_request_handler_thread.is_alive():
         raise RuntimeError("Flow processing handler did not join in time.")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 """The MySQL database methods for flow handling."""
 
+import math
+
 import MySQLdb
 
 from grr_response_core.lib import rdfvalue
@@ -38,6 +40,69 @@ _HUNT_OUTPUT_PLUGINS_STATES_COLUMNS = (
     "plugin_state",
 )
 
+# Counters of a hunt are spread over this many rows, chosen by the client id of
+# the flow. Counters are maintained by triggers on the `flows` table (see
+# mysql_migrations/0022.sql).
+_HUNT_COUNTERS_SHARDS = 16
+
+_FlowState = rdf_flow_objects.Flow.FlowState
+
+
+def _SquaresSum(column):
+  return "SUM(CAST(IFNULL({c}, 0) AS DECIMAL(65, 0)) * IFNULL({c}, 0))".format(
+      c=column)
+
+
+# Columns of the `hunt_counters` table and aggregates computing them from hunt
+# flows.
+_HUNT_COUNTERS_COLUMNS, _HUNT_COUNTERS_AGGREGATES = zip(
+    ("num_flows", "COUNT(*)"),
+    ("num_running_flows", "SUM(flow_state <=> %d)" % _FlowState.RUNNING),
+    ("num_finished_flows", "SUM(flow_state <=> %d)" % _FlowState.FINISHED),
+    ("num_failed_flows", "SUM(flow_state <=> %d)" % _FlowState.ERROR),
+    ("num_crashed_flows", "SUM(flow_state <=> %d)" % _FlowState.CRASHED),
+    ("num_flows_with_results", "SUM(IFNULL(num_replies_sent, 0) > 0)"),
+    ("num_results", "SUM(IFNULL(num_replies_sent, 0))"),
+    ("user_cpu_time_used_micros", "SUM(IFNULL(user_cpu_time_used_micros, 0))"),
+    ("user_cpu_time_used_micros_squared",
+     _SquaresSum("user_cpu_time_used_micros")),
+    ("system_cpu_time_used_micros",
+     "SUM(IFNULL(system_cpu_time_used_micros, 0))"),
+    ("system_cpu_time_used_micros_squared",
+     _SquaresSum("system_cpu_time_used_micros")),
+    ("network_bytes_sent", "SUM(IFNULL(network_bytes_sent, 0))"),
+    ("network_bytes_sent_squared", _SquaresSum("network_bytes_sent")),
+)
+
+# Histograms of the `hunt_resource_histograms` table: their ids, the flows
+# columns they are computed from and bins of these columns.
+_HUNT_RESOURCE_HISTOGRAMS = (
+    (0, "user_cpu_time_used_micros", [
+        int(1000000 * b) for b in rdf_stats.ClientResourcesStats.CPU_STATS_BINS
+    ]),
+    (1, "system_cpu_time_used_micros", [
+        int(1000000 * b) for b in rdf_stats.ClientResourcesStats.CPU_STATS_BINS
+    ]),
+    (2, "network_bytes_sent",
+     rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS),
+)
+
+
+def _BinIndexExpression(column, bins):
+  """Builds an SQL expression computing the index of the bin of a value."""
+  # With the current StatsHistogram implementation the last bin simply
+  # takes all the values that are greater than range_max_value of
+  # the one-before-the-last bin. range_max_value of the last bin
+  # is thus effectively ignored. Values of NULL get an index of -1.
+  return "INTERVAL({}, {})".format(column, ", ".join(map(str, bins[:-1])))
+
+
+def _StdDev(num, values_sum, squares_sum):
+  """Computes the population standard deviation of integer values exactly."""
+  if not num:
+    return 0.0
+  return math.isqrt(max(num * squares_sum - values_sum * values_sum, 0)) / num
+
 
 class MySQLDBHuntMixin(object):
   """MySQLDB mixin for flow handling."""
@@ -734,173 +799,101 @@ class MySQLDBHuntMixin(object):
     cursor.execute(query, args)
     return cursor.fetchone()[0]
 
+  def _ReadHuntCountersSums(self, hunt_id, cursor):
+    """Reads materialized counters of a hunt, summed up over all shards."""
+    query = "SELECT {columns} FROM hunt_counters WHERE hunt_id = %s".format(
+        columns=", ".join("SUM(%s)" % c for c in _HUNT_COUNTERS_COLUMNS))
+    cursor.execute(query, [db_utils.HuntIDToInt(hunt_id)])
+    return dict(
+        zip(_HUNT_COUNTERS_COLUMNS, [int(v or 0) for v in cursor.fetchone()]))
+
   @mysql_utils.WithTransaction(readonly=True)
   def ReadHuntCounters(self, hunt_id, cursor=None):
     """Reads hunt counters."""
-    hunt_id_int = db_utils.HuntIDToInt(hunt_id)
-
-    query = ("SELECT flow_state, COUNT(*) "
-             "FROM flows "
-             "FORCE INDEX(flows_by_hunt) "
-             "WHERE parent_hunt_id = %s AND parent_flow_id IS NULL "
-             "GROUP BY flow_state")
-
-    cursor.execute(query, [hunt_id_int])
-    counts_by_state = dict(cursor.fetchall())
-
-    num_successful_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.FINISHED), 0)
-    num_failed_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.ERROR), 0)
-    num_crashed_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.CRASHED), 0)
-    num_running_clients = counts_by_state.get(
-        int(rdf_flow_objects.Flow.FlowState.RUNNING), 0)
-    num_clients = sum(counts_by_state.values())
-
-    query = """
-    SELECT * FROM
-
-      (
-      SELECT COUNT(client_id)
-      FROM flows
-      FORCE INDEX(flows_by_hunt)
-      WHERE parent_hunt_id = %s AND parent_flow_id IS NULL AND
-            num_replies_sent > 0) counters,
-
-      (
-      SELECT SUM(user_cpu_time_used_micros + system_cpu_time_used_micros),
-             SUM(network_bytes_sent),
-             SUM(num_replies_sent)
-      FROM flows
-      FORCE INDEX(flows_by_hunt)
-      WHERE parent_hunt_id = %s AND parent_flow_id IS NULL) resources
-    """
+    counters = self._ReadHuntCountersSums(hunt_id, cursor)
 
-    cursor.execute(query, [hunt_id_int, hunt_id_int])
-    (
-        num_clients_with_results,
-        total_cpu_seconds,
-        total_network_bytes_sent,
-        num_results,
-    ) = cursor.fetchone()
+    total_cpu_micros = (
+        counters["user_cpu_time_used_micros"] +
+        counters["system_cpu_time_used_micros"])
 
     return db.HuntCounters(
-        num_clients=num_clients,
-        num_successful_clients=num_successful_clients,
-        num_failed_clients=num_failed_clients,
-        num_clients_with_results=num_clients_with_results,
-        num_crashed_clients=num_crashed_clients,
-        num_running_clients=num_running_clients,
-        num_results=int(num_results or 0),
-        total_cpu_seconds=db_utils.MicrosToSeconds(int(total_cpu_seconds or 0)),
-        total_network_bytes_sent=int(total_network_bytes_sent or 0))
-
-  def _BinsToQuery(self, bins, column_name):
-    """Builds an SQL query part to fetch counts corresponding to given bins."""
-    result = []
-    # With the current StatsHistogram implementation the last bin simply
-    # takes all the values that are greater than range_max_value of
-    # the one-before-the-last bin. range_max_value of the last bin
-    # is thus effectively ignored.
-    for prev_b, next_b in zip([0] + bins[:-1], bins[:-1] + [None]):
-      query = "COUNT(CASE WHEN %s >= %f" % (column_name, prev_b)
-      if next_b is not None:
-        query += " AND %s < %f" % (column_name, next_b)
-
-      query += " THEN 1 END)"
-
-      result.append(query)
-
-    return ", ".join(result)
+        num_clients=counters["num_flows"],
+        num_successful_clients=counters["num_finished_flows"],
+        num_failed_clients=counters["num_failed_flows"],
+        num_clients_with_results=counters["num_flows_with_results"],
+        num_crashed_clients=counters["num_crashed_flows"],
+        num_running_clients=counters["num_running_flows"],
+        num_results=counters["num_results"],
+        total_cpu_seconds=db_utils.MicrosToSeconds(total_cpu_micros),
+        total_network_bytes_sent=counters["network_bytes_sent"])
 
   @mysql_utils.WithTransaction(readonly=True)
   def ReadHuntClientResourcesStats(self, hunt_id, cursor=None):
     """Read/calculate hunt client resources stats."""
     hunt_id_int = db_utils.HuntIDToInt(hunt_id)
 
-    query = """
-      SELECT
-        COUNT(*),
-        SUM(user_cpu_time_used_micros),
-        STDDEV_POP(user_cpu_time_used_micros),
-        SUM(system_cpu_time_used_micros),
-        STDDEV_POP(system_cpu_time_used_micros),
-        SUM(network_bytes_sent),
-        STDDEV_POP(network_bytes_sent),
-    """
-
-    scaled_bins = [
-        int(1000000 * b) for b in rdf_stats.ClientResourcesStats.CPU_STATS_BINS
-    ]
-
-    query += self._BinsToQuery(scaled_bins, "(user_cpu_time_used_micros)")
-    query += ","
-    query += self._BinsToQuery(scaled_bins, "(system_cpu_time_used_micros)")
-    query += ","
-    query += self._BinsToQuery(
-        rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS, "network_bytes_sent")
-
-    query += " FROM flows "
-    query += "FORCE INDEX(flows_by_hunt) "
-    query += "WHERE parent_hunt_id = %s AND parent_flow_id IS NULL"
-
-    cursor.execute(query, [hunt_id_int])
+    counters = self._ReadHuntCountersSums(hunt_id, cursor)
+    count = counters["num_flows"]
 
-    response = cursor.fetchone()
-    (count, user_sum, user_stddev, system_sum, system_stddev, network_sum,
-     network_stddev) = response[:7]
+    def StdDev(column):
+      return _StdDev(count, counters[column], counters[column + "_squared"])
 
     stats = rdf_stats.ClientResourcesStats(
         user_cpu_stats=rdf_stats.RunningStats(
             num=count,
-            sum=db_utils.MicrosToSeconds(int(user_sum or 0)),
-            stddev=int(user_stddev or 0) / 1e6,
+            sum=db_utils.MicrosToSeconds(
+                counters["user_cpu_time_used_micros"]),
+            stddev=int(StdDev("user_cpu_time_used_micros")) / 1e6,
         ),
         system_cpu_stats=rdf_stats.RunningStats(
             num=count,
-            sum=db_utils.MicrosToSeconds(int(system_sum or 0)),
-            stddev=int(system_stddev or 0) / 1e6,
+            sum=db_utils.MicrosToSeconds(
+                counters["system_cpu_time_used_micros"]),
+            stddev=int(StdDev("system_cpu_time_used_micros")) / 1e6,
         ),
         network_bytes_sent_stats=rdf_stats.RunningStats(
             num=count,
-            sum=float(network_sum or 0),
-            stddev=float(network_stddev or 0),
+            sum=float(counters["network_bytes_sent"]),
+            stddev=StdDev("network_bytes_sent"),
         ),
     )
 
-    offset = 7
-    stats.user_cpu_stats.histogram = rdf_stats.StatsHistogram()
-    for b_num, b_max_value in zip(
-        response[offset:], rdf_stats.ClientResourcesStats.CPU_STATS_BINS):
-      stats.user_cpu_stats.histogram.bins.append(
-          rdf_stats.StatsHistogramBin(range_max_value=b_max_value, num=b_num))
-
-    offset += len(rdf_stats.ClientResourcesStats.CPU_STATS_BINS)
-    stats.system_cpu_stats.histogram = rdf_stats.StatsHistogram()
-    for b_num, b_max_value in zip(
-        response[offset:], rdf_stats.ClientResourcesStats.CPU_STATS_BINS):
-      stats.system_cpu_stats.histogram.bins.append(
-          rdf_stats.StatsHistogramBin(range_max_value=b_max_value, num=b_num))
-
-    offset += len(rdf_stats.ClientResourcesStats.CPU_STATS_BINS)
-    stats.network_bytes_sent_stats.histogram = rdf_stats.StatsHistogram()
-    for b_num, b_max_value in zip(
-        response[offset:], rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS):
-      stats.network_bytes_sent_stats.histogram.bins.append(
-          rdf_stats.StatsHistogramBin(range_max_value=b_max_value, num=b_num))
+    query = """
+      SELECT histogram, bin_index, SUM(num)
+      FROM hunt_resource_histograms
+      WHERE hunt_id = %s
+      GROUP BY histogram, bin_index
+    """
+    cursor.execute(query, [hunt_id_int])
+    bin_nums = {(h, b): int(num) for h, b, num in cursor.fetchall()}
+
+    histograms = [
+        (stats.user_cpu_stats, rdf_stats.ClientResourcesStats.CPU_STATS_BINS),
+        (stats.system_cpu_stats,
+         rdf_stats.ClientResourcesStats.CPU_STATS_BINS),
+        (stats.network_bytes_sent_stats,
+         rdf_stats.ClientResourcesStats.NETWORK_STATS_BINS),
+    ]
+    for (histogram, _, _), (running_stats, bins) in zip(
+        _HUNT_RESOURCE_HISTOGRAMS, histograms):
+      running_stats.histogram = rdf_stats.StatsHistogram()
+      for b_index, b_max_value in enumerate(bins):
+        running_stats.histogram.bins.append(
+            rdf_stats.StatsHistogramBin(
+                range_max_value=b_max_value,
+                num=bin_nums.get((histogram, b_index), 0)))
 
     query = """
       SELECT
         client_id, flow_id, user_cpu_time_used_micros,
         system_cpu_time_used_micros, network_bytes_sent
       FROM flows
-      FORCE INDEX(flows_by_hunt)
+      FORCE INDEX(flows_by_hunt_and_cpu_time)
       WHERE parent_hunt_id = %s AND parent_flow_id IS NULL AND
             (user_cpu_time_used_micros > 0 OR
              system_cpu_time_used_micros > 0 OR
              network_bytes_sent > 0)
-      ORDER BY (user_cpu_time_used_micros + system_cpu_time_used_micros) DESC
+      ORDER BY total_cpu_time_used_micros DESC
       LIMIT 10
     """
 
@@ -921,6 +914,64 @@ class MySQLDBHuntMixin(object):
 
     return stats
 
+  @mysql_utils.WithTransaction()
+  def RebuildHuntCounters(self, hunt_id, cursor=None):
+    """Recomputes hunt counters and client resources stats from hunt flows."""
+    hunt_id_int = db_utils.HuntIDToInt(hunt_id)
+
+    # Reading hunt flows with a shared lock keeps them (and thus the counters
+    # maintained by triggers) from changing until the transaction commits.
+    query = """
+      SELECT MOD(client_id, {shards}), {aggregates}
+      FROM flows
+      FORCE INDEX(flows_by_hunt)
+      WHERE parent_hunt_id = %s AND parent_flow_id IS NULL
+      GROUP BY MOD(client_id, {shards})
+      LOCK IN SHARE MODE
+    """.format(
+        shards=_HUNT_COUNTERS_SHARDS,
+        aggregates=", ".join(_HUNT_COUNTERS_AGGREGATES))
+    cursor.execute(query, [hunt_id_int])
+    counters_rows = [(hunt_id_int,) + row for row in cursor.fetchall()]
+
+    histograms_rows = []
+    for histogram, column, bins in _HUNT_RESOURCE_HISTOGRAMS:
+      query = """
+        SELECT MOD(client_id, {shards}), {bin_index}, COUNT(*)
+        FROM flows
+        FORCE INDEX(flows_by_hunt)
+        WHERE parent_hunt_id = %s AND parent_flow_id IS NULL
+        GROUP BY MOD(client_id, {shards}), {bin_index}
+        LOCK IN SHARE MODE
+      """.format(
+          shards=_HUNT_COUNTERS_SHARDS,
+          bin_index=_BinIndexExpression(column, bins))
+      cursor.execute(query, [hunt_id_int])
+      histograms_rows.extend((hunt_id_int, shard, histogram, bin_index, num)
+                             for shard, bin_index, num in cursor.fetchall())
+
+    cursor.execute("DELETE FROM hunt_counters WHERE hunt_id = %s",
+                   [hunt_id_int])
+    cursor.execute("DELETE FROM hunt_resource_histograms WHERE hunt_id = %s",
+                   [hunt_id_int])
+
+    if counters_rows:
+      query = """
+        INSERT INTO hunt_counters (hunt_id, shard, {columns})
+        VALUES ({placeholders})
+      """.format(
+          columns=", ".join(_HUNT_COUNTERS_COLUMNS),
+          placeholders=", ".join(["%s"] * (len(_HUNT_COUNTERS_COLUMNS) + 2)))
+      cursor.executemany(query, counters_rows)
+
+    if histograms_rows:
+      query = """
+        INSERT INTO hunt_resource_histograms
+          (hunt_id, shard, histogram, bin_index, num)
+        VALUES (%s, %s, %s, %s, %s)
+      """
+      cursor.executemany(query, histograms_rows)
+
   @mysql_utils.WithTransaction(readonly=True)
   def ReadHuntFlowsStatesAndTimestamps(self, hunt_id, cursor=None):
     """Reads hunt flows states and timestamps."""
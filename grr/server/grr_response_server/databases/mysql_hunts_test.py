@@ -3,16 +3,51 @@
 from absl import app
 from absl.testing import absltest
 
+from grr_response_core.lib.rdfvalues import client_stats as rdf_client_stats
 from grr_response_server.databases import db_hunts_test
 from grr_response_server.databases import db_test_utils
 from grr_response_server.databases import mysql_test
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr.test_lib import test_lib
 
 
 class MysqlHuntTest(db_hunts_test.DatabaseTestHuntMixin,
                     db_test_utils.QueryTestHelpersMixin,
                     mysql_test.MysqlTestBase, absltest.TestCase):
-  pass
+
+  def testRebuildHuntCountersRepairsCounters(self):
+    self.db.WriteGRRUser("user")
+    hunt_obj = rdf_hunt_objects.Hunt(description="foo", creator="user")
+    self.db.WriteHuntObject(hunt_obj)
+
+    for i in range(5):
+      self._SetupHuntClientAndFlow(
+          flow_state=rdf_flow_objects.Flow.FlowState.FINISHED,
+          cpu_time_used=rdf_client_stats.CpuSeconds(
+              user_cpu_time=i, system_cpu_time=2 * i),
+          network_bytes_sent=1000 * i,
+          hunt_id=hunt_obj.hunt_id)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_obj.hunt_id)
+    usage_stats = self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id)
+
+    def CorruptCounters(cursor):
+      cursor.execute("UPDATE hunt_counters SET num_flows = 0, "
+                     "num_finished_flows = 42")
+      cursor.execute("DELETE FROM hunt_resource_histograms")
+
+    # pylint: disable=protected-access
+    self.db.delegate._RunInTransaction(CorruptCounters)
+    # pylint: enable=protected-access
+    self.assertNotEqual(
+        self.db.ReadHuntCounters(hunt_obj.hunt_id), hunt_counters)
+
+    self.db.RebuildHuntCounters(hunt_obj.hunt_id)
+
+    self.assertEqual(self.db.ReadHuntCounters(hunt_obj.hunt_id), hunt_counters)
+    self.assertEqual(
+        self.db.ReadHuntClientResourcesStats(hunt_obj.hunt_id), usage_stats)
 
 
 if __name__ == "__main__":
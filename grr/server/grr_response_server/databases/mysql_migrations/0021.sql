@@ -0,0 +1,34 @@
+CREATE TABLE `output_plugin_requests` (
+  -- A unique identifier of the request.
+  `request_id` BIGINT UNSIGNED NOT NULL,
+  -- A timestamp at which the request was written.
+  `timestamp` TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+  -- A serialized `OutputPluginRequest` message.
+  `request` MEDIUMBLOB NOT NULL,
+  -- A number of failed attempts to process the request.
+  `attempts` INT UNSIGNED NOT NULL DEFAULT 0,
+  -- A timestamp until which the request is leased (or delayed).
+  `leased_until` TIMESTAMP(6) NULL DEFAULT NULL,
+  -- An identifier of the process that holds the lease.
+  `leased_by` VARCHAR(128),
+
+  PRIMARY KEY (`request_id`)
+);
+
+CREATE INDEX `output_plugin_requests_by_lease`
+    ON `output_plugin_requests` (`leased_until`, `leased_by`);
+
+CREATE TABLE `output_plugin_request_states` (
+  `client_id` BIGINT UNSIGNED NOT NULL,
+  `flow_id` BIGINT UNSIGNED NOT NULL,
+  `output_plugin_id` BIGINT UNSIGNED NOT NULL,
+  -- A serialized `OutputPluginState` of a flow output plugin, as left by the
+  -- last processed batch of queued requests.
+  `state` MEDIUMBLOB NOT NULL,
+
+  PRIMARY KEY (`client_id`, `flow_id`, `output_plugin_id`),
+  CONSTRAINT `output_plugin_request_states_ibfk_1`
+      FOREIGN KEY `output_plugin_request_states_ibfk_1`(`client_id`, `flow_id`)
+      REFERENCES `flows`(`client_id`, `flow_id`)
+      ON DELETE CASCADE
+);
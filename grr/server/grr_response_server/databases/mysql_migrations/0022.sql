@@ -0,0 +1,369 @@
+-- Materialized hunt counters and client resources histograms.
+--
+-- Aggregating over all flows of a hunt takes seconds for hunts with millions
+-- of flows, so counters of hunt flows (flows with a `parent_hunt_id` and no
+-- `parent_flow_id`) are kept up to date by triggers on `flows` instead.
+--
+-- Every hunt has up to 16 rows (shards) in each table, chosen by the
+-- client id of the flow, so that concurrent updates of flows of the same hunt
+-- don't all wait for the same row lock. Readers sum the shards up.
+--
+-- Like flows themselves, counters are kept when a hunt is deleted.
+--
+-- This migration doesn't fill in counters of existing hunts. Aggregating all
+-- hunt flows in one statement would lock them for as long as it runs. Run
+-- `grr_config_updater rebuild_hunt_counters` once after upgrading instead. It
+-- rebuilds counters one hunt at a time, each in a short transaction. Flows
+-- written while it runs are counted by the triggers below.
+
+CREATE TABLE hunt_counters(
+    hunt_id BIGINT UNSIGNED NOT NULL,
+    shard TINYINT UNSIGNED NOT NULL,
+    num_flows BIGINT NOT NULL DEFAULT 0,
+    num_running_flows BIGINT NOT NULL DEFAULT 0,
+    num_finished_flows BIGINT NOT NULL DEFAULT 0,
+    num_failed_flows BIGINT NOT NULL DEFAULT 0,
+    num_crashed_flows BIGINT NOT NULL DEFAULT 0,
+    num_flows_with_results BIGINT NOT NULL DEFAULT 0,
+    num_results BIGINT NOT NULL DEFAULT 0,
+    -- Squares are summed up exactly, so that standard deviations can be
+    -- computed without accumulating rounding errors.
+    user_cpu_time_used_micros BIGINT NOT NULL DEFAULT 0,
+    user_cpu_time_used_micros_squared DECIMAL(65, 0) NOT NULL DEFAULT 0,
+    system_cpu_time_used_micros BIGINT NOT NULL DEFAULT 0,
+    system_cpu_time_used_micros_squared DECIMAL(65, 0) NOT NULL DEFAULT 0,
+    network_bytes_sent BIGINT NOT NULL DEFAULT 0,
+    network_bytes_sent_squared DECIMAL(65, 0) NOT NULL DEFAULT 0,
+    PRIMARY KEY (hunt_id, shard)
+);
+
+-- Histograms: 0 - user CPU time, 1 - system CPU time, 2 - network bytes sent.
+-- Bins are the ones of `ClientResourcesStats.CPU_STATS_BINS` (in
+-- microseconds) and `ClientResourcesStats.NETWORK_STATS_BINS`, the last bin
+-- taking all values greater than the one-before-the-last bin boundary. Flows
+-- without a value are counted in bin -1.
+CREATE TABLE hunt_resource_histograms(
+    hunt_id BIGINT UNSIGNED NOT NULL,
+    shard TINYINT UNSIGNED NOT NULL,
+    histogram TINYINT UNSIGNED NOT NULL,
+    bin_index TINYINT NOT NULL,
+    num BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hunt_id, shard, histogram, bin_index)
+);
+
+-- Lets the worst performers of a hunt be read without sorting all its flows.
+ALTER TABLE flows
+  ADD COLUMN total_cpu_time_used_micros BIGINT UNSIGNED
+    AS (user_cpu_time_used_micros + system_cpu_time_used_micros) VIRTUAL;
+
+CREATE INDEX flows_by_hunt_and_cpu_time
+    ON flows(parent_hunt_id, total_cpu_time_used_micros);
+
+CREATE
+  TRIGGER
+    flows_hunt_counters_insert
+      AFTER INSERT
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_counters (
+  hunt_id, shard,
+  num_flows, num_running_flows, num_finished_flows, num_failed_flows,
+  num_crashed_flows, num_flows_with_results, num_results,
+  user_cpu_time_used_micros, user_cpu_time_used_micros_squared,
+  system_cpu_time_used_micros, system_cpu_time_used_micros_squared,
+  network_bytes_sent, network_bytes_sent_squared)
+SELECT
+  NEW.parent_hunt_id, NEW.client_id % 16,
+  1,
+  NEW.flow_state <=> 1,
+  NEW.flow_state <=> 2,
+  NEW.flow_state <=> 3,
+  NEW.flow_state <=> 4,
+  IFNULL(NEW.num_replies_sent, 0) > 0,
+  IFNULL(NEW.num_replies_sent, 0),
+  IFNULL(NEW.user_cpu_time_used_micros, 0),
+  CAST(IFNULL(NEW.user_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(NEW.user_cpu_time_used_micros, 0),
+  IFNULL(NEW.system_cpu_time_used_micros, 0),
+  CAST(IFNULL(NEW.system_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(NEW.system_cpu_time_used_micros, 0),
+  IFNULL(NEW.network_bytes_sent, 0),
+  CAST(IFNULL(NEW.network_bytes_sent, 0) AS DECIMAL(65, 0)) *
+    IFNULL(NEW.network_bytes_sent, 0)
+FROM DUAL
+WHERE NEW.parent_hunt_id IS NOT NULL AND NEW.parent_flow_id IS NULL
+ON DUPLICATE KEY UPDATE
+  num_flows = num_flows + VALUES(num_flows),
+  num_running_flows = num_running_flows + VALUES(num_running_flows),
+  num_finished_flows = num_finished_flows + VALUES(num_finished_flows),
+  num_failed_flows = num_failed_flows + VALUES(num_failed_flows),
+  num_crashed_flows = num_crashed_flows + VALUES(num_crashed_flows),
+  num_flows_with_results =
+    num_flows_with_results + VALUES(num_flows_with_results),
+  num_results = num_results + VALUES(num_results),
+  user_cpu_time_used_micros =
+    user_cpu_time_used_micros + VALUES(user_cpu_time_used_micros),
+  user_cpu_time_used_micros_squared =
+    user_cpu_time_used_micros_squared +
+    VALUES(user_cpu_time_used_micros_squared),
+  system_cpu_time_used_micros =
+    system_cpu_time_used_micros + VALUES(system_cpu_time_used_micros),
+  system_cpu_time_used_micros_squared =
+    system_cpu_time_used_micros_squared +
+    VALUES(system_cpu_time_used_micros_squared),
+  network_bytes_sent = network_bytes_sent + VALUES(network_bytes_sent),
+  network_bytes_sent_squared =
+    network_bytes_sent_squared + VALUES(network_bytes_sent_squared);
+
+-- Updates only touch the counters if a counted column has changed, so that
+-- flows that are merely leased or released don't contend for counter rows.
+CREATE
+  TRIGGER
+    flows_hunt_counters_update
+      AFTER UPDATE
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_counters (
+  hunt_id, shard,
+  num_flows, num_running_flows, num_finished_flows, num_failed_flows,
+  num_crashed_flows, num_flows_with_results, num_results,
+  user_cpu_time_used_micros, user_cpu_time_used_micros_squared,
+  system_cpu_time_used_micros, system_cpu_time_used_micros_squared,
+  network_bytes_sent, network_bytes_sent_squared)
+SELECT
+  NEW.parent_hunt_id, NEW.client_id % 16,
+  0,
+  (NEW.flow_state <=> 1) - (OLD.flow_state <=> 1),
+  (NEW.flow_state <=> 2) - (OLD.flow_state <=> 2),
+  (NEW.flow_state <=> 3) - (OLD.flow_state <=> 3),
+  (NEW.flow_state <=> 4) - (OLD.flow_state <=> 4),
+  (IFNULL(NEW.num_replies_sent, 0) > 0) -
+    (IFNULL(OLD.num_replies_sent, 0) > 0),
+  CAST(IFNULL(NEW.num_replies_sent, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.num_replies_sent, 0) AS SIGNED),
+  CAST(IFNULL(NEW.user_cpu_time_used_micros, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.user_cpu_time_used_micros, 0) AS SIGNED),
+  CAST(IFNULL(NEW.user_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(NEW.user_cpu_time_used_micros, 0) -
+  CAST(IFNULL(OLD.user_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(OLD.user_cpu_time_used_micros, 0),
+  CAST(IFNULL(NEW.system_cpu_time_used_micros, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.system_cpu_time_used_micros, 0) AS SIGNED),
+  CAST(IFNULL(NEW.system_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(NEW.system_cpu_time_used_micros, 0) -
+  CAST(IFNULL(OLD.system_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(OLD.system_cpu_time_used_micros, 0),
+  CAST(IFNULL(NEW.network_bytes_sent, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.network_bytes_sent, 0) AS SIGNED),
+  CAST(IFNULL(NEW.network_bytes_sent, 0) AS DECIMAL(65, 0)) *
+    IFNULL(NEW.network_bytes_sent, 0) -
+  CAST(IFNULL(OLD.network_bytes_sent, 0) AS DECIMAL(65, 0)) *
+    IFNULL(OLD.network_bytes_sent, 0)
+FROM DUAL
+WHERE
+  NEW.parent_hunt_id IS NOT NULL AND NEW.parent_flow_id IS NULL AND
+  NOT (NEW.flow_state <=> OLD.flow_state AND
+       NEW.num_replies_sent <=> OLD.num_replies_sent AND
+       NEW.user_cpu_time_used_micros <=> OLD.user_cpu_time_used_micros AND
+       NEW.system_cpu_time_used_micros <=> OLD.system_cpu_time_used_micros AND
+       NEW.network_bytes_sent <=> OLD.network_bytes_sent)
+ON DUPLICATE KEY UPDATE
+  num_running_flows = num_running_flows + VALUES(num_running_flows),
+  num_finished_flows = num_finished_flows + VALUES(num_finished_flows),
+  num_failed_flows = num_failed_flows + VALUES(num_failed_flows),
+  num_crashed_flows = num_crashed_flows + VALUES(num_crashed_flows),
+  num_flows_with_results =
+    num_flows_with_results + VALUES(num_flows_with_results),
+  num_results = num_results + VALUES(num_results),
+  user_cpu_time_used_micros =
+    user_cpu_time_used_micros + VALUES(user_cpu_time_used_micros),
+  user_cpu_time_used_micros_squared =
+    user_cpu_time_used_micros_squared +
+    VALUES(user_cpu_time_used_micros_squared),
+  system_cpu_time_used_micros =
+    system_cpu_time_used_micros + VALUES(system_cpu_time_used_micros),
+  system_cpu_time_used_micros_squared =
+    system_cpu_time_used_micros_squared +
+    VALUES(system_cpu_time_used_micros_squared),
+  network_bytes_sent = network_bytes_sent + VALUES(network_bytes_sent),
+  network_bytes_sent_squared =
+    network_bytes_sent_squared + VALUES(network_bytes_sent_squared);
+
+-- Note: triggers don't fire for rows deleted by a cascading foreign key, so
+-- hunt flows have to be deleted explicitly (see `DeleteClient`).
+CREATE
+  TRIGGER
+    flows_hunt_counters_delete
+      AFTER DELETE
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_counters (
+  hunt_id, shard,
+  num_flows, num_running_flows, num_finished_flows, num_failed_flows,
+  num_crashed_flows, num_flows_with_results, num_results,
+  user_cpu_time_used_micros, user_cpu_time_used_micros_squared,
+  system_cpu_time_used_micros, system_cpu_time_used_micros_squared,
+  network_bytes_sent, network_bytes_sent_squared)
+SELECT
+  OLD.parent_hunt_id, OLD.client_id % 16,
+  -1,
+  -(OLD.flow_state <=> 1),
+  -(OLD.flow_state <=> 2),
+  -(OLD.flow_state <=> 3),
+  -(OLD.flow_state <=> 4),
+  -(IFNULL(OLD.num_replies_sent, 0) > 0),
+  -CAST(IFNULL(OLD.num_replies_sent, 0) AS SIGNED),
+  -CAST(IFNULL(OLD.user_cpu_time_used_micros, 0) AS SIGNED),
+  -CAST(IFNULL(OLD.user_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(OLD.user_cpu_time_used_micros, 0),
+  -CAST(IFNULL(OLD.system_cpu_time_used_micros, 0) AS SIGNED),
+  -CAST(IFNULL(OLD.system_cpu_time_used_micros, 0) AS DECIMAL(65, 0)) *
+    IFNULL(OLD.system_cpu_time_used_micros, 0),
+  -CAST(IFNULL(OLD.network_bytes_sent, 0) AS SIGNED),
+  -CAST(IFNULL(OLD.network_bytes_sent, 0) AS DECIMAL(65, 0)) *
+    IFNULL(OLD.network_bytes_sent, 0)
+FROM DUAL
+WHERE OLD.parent_hunt_id IS NOT NULL AND OLD.parent_flow_id IS NULL
+ON DUPLICATE KEY UPDATE
+  num_flows = num_flows + VALUES(num_flows),
+  num_running_flows = num_running_flows + VALUES(num_running_flows),
+  num_finished_flows = num_finished_flows + VALUES(num_finished_flows),
+  num_failed_flows = num_failed_flows + VALUES(num_failed_flows),
+  num_crashed_flows = num_crashed_flows + VALUES(num_crashed_flows),
+  num_flows_with_results =
+    num_flows_with_results + VALUES(num_flows_with_results),
+  num_results = num_results + VALUES(num_results),
+  user_cpu_time_used_micros =
+    user_cpu_time_used_micros + VALUES(user_cpu_time_used_micros),
+  user_cpu_time_used_micros_squared =
+    user_cpu_time_used_micros_squared +
+    VALUES(user_cpu_time_used_micros_squared),
+  system_cpu_time_used_micros =
+    system_cpu_time_used_micros + VALUES(system_cpu_time_used_micros),
+  system_cpu_time_used_micros_squared =
+    system_cpu_time_used_micros_squared +
+    VALUES(system_cpu_time_used_micros_squared),
+  network_bytes_sent = network_bytes_sent + VALUES(network_bytes_sent),
+  network_bytes_sent_squared =
+    network_bytes_sent_squared + VALUES(network_bytes_sent_squared);
+
+CREATE
+  TRIGGER
+    flows_hunt_resource_histograms_insert
+      AFTER INSERT
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_resource_histograms (
+  hunt_id, shard, histogram, bin_index, num)
+SELECT NEW.parent_hunt_id, NEW.client_id % 16, bins.histogram, bins.new_bin, 1
+FROM (
+  SELECT 0 AS histogram,
+         INTERVAL(NEW.user_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+           AS new_bin
+  UNION ALL
+  SELECT 1,
+         INTERVAL(NEW.system_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+  UNION ALL
+  SELECT 2,
+         INTERVAL(NEW.network_bytes_sent,
+                  16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384,
+                  32768, 65536, 131072, 262144, 524288, 1048576)
+) AS bins
+WHERE NEW.parent_hunt_id IS NOT NULL AND NEW.parent_flow_id IS NULL
+ON DUPLICATE KEY UPDATE num = num + VALUES(num);
+
+-- A flow that moves from one bin to another is subtracted from the old bin
+-- and added to the new one.
+CREATE
+  TRIGGER
+    flows_hunt_resource_histograms_update
+      AFTER UPDATE
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_resource_histograms (
+  hunt_id, shard, histogram, bin_index, num)
+SELECT NEW.parent_hunt_id, NEW.client_id % 16, bins.histogram,
+       IF(deltas.delta > 0, bins.new_bin, bins.old_bin), deltas.delta
+FROM (
+  SELECT 0 AS histogram,
+         INTERVAL(NEW.user_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+           AS new_bin,
+         INTERVAL(OLD.user_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+           AS old_bin
+  UNION ALL
+  SELECT 1,
+         INTERVAL(NEW.system_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000),
+         INTERVAL(OLD.system_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+  UNION ALL
+  SELECT 2,
+         INTERVAL(NEW.network_bytes_sent,
+                  16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384,
+                  32768, 65536, 131072, 262144, 524288, 1048576),
+         INTERVAL(OLD.network_bytes_sent,
+                  16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384,
+                  32768, 65536, 131072, 262144, 524288, 1048576)
+) AS bins, (
+  SELECT 1 AS delta
+  UNION ALL
+  SELECT -1
+) AS deltas
+WHERE
+  NEW.parent_hunt_id IS NOT NULL AND NEW.parent_flow_id IS NULL AND
+  bins.new_bin <> bins.old_bin
+ON DUPLICATE KEY UPDATE num = num + VALUES(num);
+
+CREATE
+  TRIGGER
+    flows_hunt_resource_histograms_delete
+      AFTER DELETE
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_resource_histograms (
+  hunt_id, shard, histogram, bin_index, num)
+SELECT OLD.parent_hunt_id, OLD.client_id % 16, bins.histogram, bins.old_bin,
+       -1
+FROM (
+  SELECT 0 AS histogram,
+         INTERVAL(OLD.user_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+           AS old_bin
+  UNION ALL
+  SELECT 1,
+         INTERVAL(OLD.system_cpu_time_used_micros,
+                  100000, 200000, 300000, 400000, 500000, 750000, 1000000,
+                  1500000, 2000000, 2500000, 3000000, 4000000, 5000000,
+                  6000000, 7000000, 8000000, 9000000, 10000000, 15000000)
+  UNION ALL
+  SELECT 2,
+         INTERVAL(OLD.network_bytes_sent,
+                  16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384,
+                  32768, 65536, 131072, 262144, 524288, 1048576)
+) AS bins
+WHERE OLD.parent_hunt_id IS NOT NULL AND OLD.parent_flow_id IS NULL
+ON DUPLICATE KEY UPDATE num = num + VALUES(num);
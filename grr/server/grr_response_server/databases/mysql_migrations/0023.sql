@@ -0,0 +1,15 @@
+-- Lets descendants of a path be read in pages ordered by their binary path
+-- (see `MySQLDBPathMixin._ReadPathInfosWithDescendantsPage`). Ordering by
+-- `CAST(path AS BINARY)` needs a sort of all remaining descendants for every
+-- page, since neither the case-insensitive collation of `path` nor the prefix
+-- index on it can provide that order.
+--
+-- Index keys are limited to 3072 bytes, so only the first 2048 bytes of a path
+-- are indexed. Paths that share their first 2048 bytes are ordered by
+-- `path_id` in the index and are sorted when they are read.
+ALTER TABLE client_paths
+  ADD COLUMN path_key VARBINARY(2048)
+    AS (LEFT(CAST(path AS BINARY), 2048)) VIRTUAL;
+
+CREATE INDEX client_paths_by_path_key
+    ON client_paths(client_id, path_type, path_key, path_id);
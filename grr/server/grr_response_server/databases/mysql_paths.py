@@ -324,6 +324,12 @@ class MySQLDBPathMixin(object):
       """
       cursor.executemany(query, hash_entry_values)
 
+  # Number of paths read by a single query of `IterDescendantPathInfos`.
+  _DESCENDANT_PATH_INFOS_PAGE_SIZE = 10000
+
+  # Number of leading bytes of a path stored in `client_paths.path_key`.
+  _PATH_KEY_LENGTH = 2048
+
   @mysql_utils.WithTransaction(readonly=True)
   def ListDescendantPathInfos(self,
                               client_id,
@@ -333,107 +339,232 @@ class MySQLDBPathMixin(object):
                               max_depth=None,
                               cursor=None):
     """Lists path info records that correspond to descendants of given path."""
-    path_infos = []
+    # Unlike `IterDescendantPathInfos`, all pages are read in one transaction,
+    # so the list is a consistent snapshot of the paths.
+    path_infos = self._IterDescendantPathInfos(
+        client_id,
+        path_type,
+        components,
+        timestamp=timestamp,
+        max_depth=max_depth,
+        cursor=cursor)
+    return sorted(path_infos, key=lambda _: tuple(_.components))
+
+  def IterDescendantPathInfos(self,
+                              client_id,
+                              path_type,
+                              components,
+                              timestamp=None,
+                              max_depth=None):
+    """Yields path info records that correspond to descendants of given path."""
+    # Every page is read in its own transaction, so no transaction is held
+    # open while the caller consumes the paths.
+    return self._IterDescendantPathInfos(
+        client_id,
+        path_type,
+        components,
+        timestamp=timestamp,
+        max_depth=max_depth)
+
+  def _IterDescendantPathInfos(self,
+                               client_id,
+                               path_type,
+                               components,
+                               timestamp,
+                               max_depth,
+                               cursor=None):
+    """Yields descendant path infos, reading pages with the given cursor."""
+    path_infos = self._IterPathInfosWithDescendants(
+        client_id,
+        path_type,
+        components,
+        timestamp=timestamp,
+        max_depth=max_depth,
+        cursor=cursor)
+    # For specific timestamp, we return information only about explicit paths
+    # (paths that have associated stat or hash entry or have an ancestor that is
+    # explicit).
+    return db_utils.FilterDescendantPathInfos(
+        client_id,
+        path_type,
+        components,
+        path_infos,
+        only_explicit=timestamp is not None)
+
+  def _IterPathInfosWithDescendants(self,
+                                    client_id,
+                                    path_type,
+                                    components,
+                                    timestamp,
+                                    max_depth,
+                                    cursor=None):
+    """Yields path infos of a path and its descendants sorted by path.
+
+    Args:
+      client_id: An identifier string for a client.
+      path_type: A type of the path.
+      components: Path components of the path.
+      timestamp: If set, stat and hash entries are read as of that timestamp.
+      max_depth: If set, the maximum number of generations to descend.
+      cursor: If set, all pages are read with this cursor, i.e. in a single
+        transaction. Otherwise every page is read in a new transaction, and
+        paths written between pages may or may not be yielded (a path is never
+        yielded twice though).
+
+    Yields:
+      `rdf_objects.PathInfo` instances.
+    """
+    after = None
+    while True:
+      path_infos, after = self._ReadPathInfosWithDescendantsPage(
+          client_id,
+          path_type,
+          components,
+          timestamp=timestamp,
+          max_depth=max_depth,
+          after=after,
+          count=self._DESCENDANT_PATH_INFOS_PAGE_SIZE,
+          cursor=cursor)
+      yield from path_infos
+
+      if after is None:
+        return
 
-    query = ""
+  @mysql_utils.WithTransaction(readonly=True)
+  def _ReadPathInfosWithDescendantsPage(self,
+                                        client_id,
+                                        path_type,
+                                        components,
+                                        timestamp,
+                                        max_depth,
+                                        after,
+                                        count,
+                                        cursor=None):
+    """Reads a page of path infos of a path and its descendants.
+
+    Paths are read in the order of the `(client_id, path_type, path_key,
+    path_id)` index, so no page needs to sort the paths after it.
+
+    Args:
+      client_id: An identifier string for a client.
+      path_type: A type of the path.
+      components: Path components of the path.
+      timestamp: If set, stat and hash entries are read as of that timestamp.
+      max_depth: If set, the maximum number of generations to descend.
+      after: If set, a `(path_key, path_id)` tuple of the last path of the
+        previous page.
+      count: The maximum number of paths to read. More paths are read if the
+        last ones share an indexed path prefix.
+
+    Returns:
+      A tuple of path infos sorted by path and the `after` value to read the
+      next page with (`None` if this was the last page).
+    """
+    int_client_id = db_utils.ClientIDToInt(client_id)
 
     path = mysql_utils.ComponentsToPath(components)
-    escaped_path = db_utils.EscapeWildcards(db_utils.EscapeBackslashes(path))
+    path_bytes = path.encode("utf-8")
+
+    query = """
+    SELECT path, path_key, path_id, directory, UNIX_TIMESTAMP(timestamp)
+      FROM client_paths
+     WHERE client_id = %(client_id)s
+       AND path_type = %(path_type)s
+    """
     values = {
-        "client_id": db_utils.ClientIDToInt(client_id),
+        "client_id": int_client_id,
         "path_type": int(path_type),
-        "escaped_path": escaped_path,
-        "path": path,
+        "count": count,
     }
 
-    # Hint: the difference between the below two queries is the data source used
-    # to fetch the stat/hash entry details. `last_{stat,hash}_entry_timestamp`
-    # will always be fetched from the latest stat/hash entry in the DB. However,
-    # if a max timestamp is given, then the full stat/hash entry details will be
-    # fetched from the latest entry only up to that timestamp.
-    if timestamp is None:
+    if max_depth is not None:
+      query += """
+       AND depth <= %(depth)s
+      """
+      values["depth"] = len(components) + max_depth
+
+    # Paths are compared as binary strings. This makes the order match the
+    # order of Python strings and, unlike the case-insensitive collation of
+    # `path`, never considers two different paths equal. Descendants start
+    # with the path and a "/", so they sort between the path itself and the
+    # path followed by "0" (the character after "/"). Other paths in that
+    # range (like "/foo-bar" for "/foo") are skipped below.
+    if len(path_bytes) < self._PATH_KEY_LENGTH:
       query += """
-      SELECT path, directory, UNIX_TIMESTAMP(p.timestamp),
-             ls.stat_entry, UNIX_TIMESTAMP(ls.timestamp),
-             lh.hash_entry, UNIX_TIMESTAMP(lh.timestamp)
-        FROM client_paths AS p
-   LEFT JOIN client_path_stat_entries AS ls
-          ON ls.id = (SELECT id
-                       FROM client_path_stat_entries
-                      WHERE (client_id, path_type, path_id) =
-                            (p.client_id, p.path_type, p.path_id)
-                   ORDER BY timestamp DESC
-                      LIMIT 1)
-   LEFT JOIN client_path_hash_entries AS lh
-          ON lh.id = (SELECT id
-                       FROM client_path_hash_entries
-                      WHERE (client_id, path_type, path_id) =
-                            (p.client_id, p.path_type, p.path_id)
-                   ORDER BY timestamp DESC
-                      LIMIT 1)
+       AND path_key >= %(path_key)s AND path_key < %(path_key_end)s
       """
-      only_explicit = False
+      values["path_key"] = path_bytes
+      values["path_key_end"] = path_bytes + b"0"
     else:
       query += """
-      SELECT path, directory, UNIX_TIMESTAMP(p.timestamp),
-             s.stat_entry, UNIX_TIMESTAMP(ls.timestamp),
-             h.hash_entry, UNIX_TIMESTAMP(lh.timestamp)
-        FROM client_paths AS p
-   LEFT JOIN client_path_stat_entries AS ls
-          ON ls.id = (SELECT id
-                       FROM client_path_stat_entries
-                      WHERE (client_id, path_type, path_id) =
-                            (p.client_id, p.path_type, p.path_id)
-                   ORDER BY timestamp DESC
-                      LIMIT 1)
-   LEFT JOIN client_path_hash_entries AS lh
-          ON lh.id = (SELECT id
-                       FROM client_path_hash_entries
-                      WHERE (client_id, path_type, path_id) =
-                            (p.client_id, p.path_type, p.path_id)
-                   ORDER BY timestamp DESC
-                      LIMIT 1)
-   LEFT JOIN client_path_stat_entries AS s
-          ON s.id = (SELECT id
-                       FROM client_path_stat_entries
-                      WHERE (client_id, path_type, path_id) =
-                            (p.client_id, p.path_type, p.path_id)
-                        AND UNIX_TIMESTAMP(timestamp) <= %(timestamp)s
-                   ORDER BY timestamp DESC
-                      LIMIT 1)
-   LEFT JOIN client_path_hash_entries AS h
-          ON h.id = (SELECT id
-                       FROM client_path_hash_entries
-                      WHERE (client_id, path_type, path_id) =
-                            (p.client_id, p.path_type, p.path_id)
-                        AND UNIX_TIMESTAMP(timestamp) <= %(timestamp)s
-                   ORDER BY timestamp DESC
-                      LIMIT 1)
+       AND path_key = %(path_key)s
       """
-      values["timestamp"] = mysql_utils.RDFDatetimeToTimestamp(timestamp)
-      only_explicit = True
-
-    query += """
-    WHERE p.client_id = %(client_id)s
-      AND p.path_type = %(path_type)s
-      AND (path LIKE CONCAT(%(escaped_path)s, '/%%') OR path = %(path)s)
-    """
+      values["path_key"] = path_bytes[:self._PATH_KEY_LENGTH]
 
-    if max_depth is not None:
-      query += """
-      AND depth <= %(depth)s
+    page_query = query
+    if after is not None:
+      page_query += """
+       AND (path_key > %(after_key)s OR
+            (path_key = %(after_key)s AND path_id > %(after_path_id)s))
       """
-      values["depth"] = len(components) + max_depth
+      values["after_key"], values["after_path_id"] = after
 
-    cursor.execute(query, values)
-    for row in cursor.fetchall():
-      # pyformat: disable
-      (path, directory, timestamp,
-       stat_entry_bytes, last_stat_entry_timestamp,
-       hash_entry_bytes, last_hash_entry_timestamp) = row
-      # pyformat: enable
+    page_query += """
+  ORDER BY path_key, path_id
+     LIMIT %(count)s
+    """
 
-      path_components = mysql_utils.PathToComponents(path)
+    cursor.execute(page_query, values)
+    rows = list(cursor.fetchall())
+    if len(rows) < count:
+      next_after = None
+    else:
+      last_key, last_path_id = rows[-1][1:3]
+      if len(last_key) == self._PATH_KEY_LENGTH:
+        # Paths sharing a truncated key are ordered by `path_id` in the index,
+        # so all of them have to be on the same page to be sorted.
+        values["after_key"] = last_key
+        values["after_path_id"] = last_path_id
+        cursor.execute(
+            query + """
+       AND path_key = %(after_key)s AND path_id > %(after_path_id)s
+  ORDER BY path_id
+            """, values)
+        rows.extend(cursor.fetchall())
+      next_after = tuple(rows[-1][1:3])
+
+    # Python strings compare like their UTF-8 encodings, so this only reorders
+    # paths sharing a truncated key.
+    rows = sorted(
+        (row for row in rows
+         if row[0] == path or row[0].startswith(path + "/")),
+        key=lambda row: row[0])
+    path_ids = [path_id for _, _, path_id, _, _ in rows]
+
+    stat_entries = self._ReadLatestPathEntries(
+        "client_path_stat_entries",
+        "stat_entry",
+        int_client_id,
+        path_type,
+        path_ids,
+        timestamp,
+        cursor=cursor)
+    hash_entries = self._ReadLatestPathEntries(
+        "client_path_hash_entries",
+        "hash_entry",
+        int_client_id,
+        path_type,
+        path_ids,
+        timestamp,
+        cursor=cursor)
+
+    datetime = mysql_utils.TimestampToRDFDatetime
+    path_infos = []
+    for row_path, _, path_id, directory, row_timestamp in rows:
+      stat_entry_bytes, last_stat_entry_timestamp = stat_entries.get(
+          path_id, (None, None))
+      hash_entry_bytes, last_hash_entry_timestamp = hash_entries.get(
+          path_id, (None, None))
 
       if stat_entry_bytes is not None:
         stat_entry = rdf_client_fs.StatEntry.FromSerializedBytes(
@@ -446,54 +577,83 @@ class MySQLDBPathMixin(object):
       else:
         hash_entry = None
 
-      datetime = mysql_utils.TimestampToRDFDatetime
-      path_info = rdf_objects.PathInfo(
-          path_type=path_type,
-          components=path_components,
-          timestamp=datetime(timestamp),
-          last_stat_entry_timestamp=datetime(last_stat_entry_timestamp),
-          last_hash_entry_timestamp=datetime(last_hash_entry_timestamp),
-          directory=directory,
-          stat_entry=stat_entry,
-          hash_entry=hash_entry)
-
-      path_infos.append(path_info)
-
-    path_infos.sort(key=lambda _: tuple(_.components))
-
-    # The first entry should be always the base directory itself unless it is a
-    # root directory that was never collected.
-    if not path_infos and components:
-      raise db.UnknownPathError(client_id, path_type, components)
+      path_infos.append(
+          rdf_objects.PathInfo(
+              path_type=path_type,
+              components=mysql_utils.PathToComponents(row_path),
+              timestamp=datetime(row_timestamp),
+              last_stat_entry_timestamp=datetime(last_stat_entry_timestamp),
+              last_hash_entry_timestamp=datetime(last_hash_entry_timestamp),
+              directory=directory,
+              stat_entry=stat_entry,
+              hash_entry=hash_entry))
+
+    return path_infos, next_after
+
+  def _ReadLatestPathEntries(self, table, column, int_client_id, path_type,
+                             path_ids, timestamp, cursor):
+    """Reads the latest stat or hash entries of the given paths.
+
+    Instead of a correlated subquery per path, the latest timestamps of all
+    paths are computed with a single grouped query that is answered from the
+    `(client_id, path_type, path_id, timestamp)` index.
+
+    Args:
+      table: A table to read the entries from.
+      column: A column of the table with serialized entries.
+      int_client_id: An integer identifier of the client.
+      path_type: A type of the paths.
+      path_ids: Binary identifiers of the paths.
+      timestamp: If set, the latest entries up to this timestamp are read.
+      cursor: A MySQL cursor to use.
+
+    Returns:
+      A dictionary mapping path ids to tuples of serialized entries (`None` if
+      there's no entry up to the given timestamp) and timestamps of the latest
+      entries overall. Paths without any entries are omitted.
+    """
+    # MySQL does not handle well empty `IN` clauses so we guard against that.
+    if not path_ids:
+      return {}
 
-    if path_infos and not path_infos[0].directory:
-      raise db.NotDirectoryPathError(client_id, path_type, components)
+    values = []
+    if timestamp is None:
+      entry_timestamp = "MAX(timestamp)"
+    else:
+      entry_timestamp = """
+      MAX(IF(UNIX_TIMESTAMP(timestamp) <= %s, timestamp, NULL))
+      """
+      values.append(mysql_utils.RDFDatetimeToTimestamp(timestamp))
 
-    path_infos = path_infos[1:]
+    query = """
+    SELECT l.path_id, e.{column}, UNIX_TIMESTAMP(l.last_timestamp)
+      FROM (SELECT path_id,
+                   MAX(timestamp) AS last_timestamp,
+                   {entry_timestamp} AS entry_timestamp
+              FROM {table}
+             WHERE client_id = %s
+               AND path_type = %s
+               AND path_id IN ({path_ids})
+          GROUP BY path_id) AS l
+ LEFT JOIN {table} AS e
+        ON e.client_id = %s
+       AND e.path_type = %s
+       AND e.path_id = l.path_id
+       AND e.timestamp = l.entry_timestamp
+    """.format(
+        table=table,
+        column=column,
+        entry_timestamp=entry_timestamp,
+        path_ids=", ".join(["%s"] * len(path_ids)))
+    values.extend([int_client_id, int(path_type)])
+    values.extend(path_ids)
+    values.extend([int_client_id, int(path_type)])
 
-    # For specific timestamp, we return information only about explicit paths
-    # (paths that have associated stat or hash entry or have an ancestor that is
-    # explicit).
-    if not only_explicit:
-      return path_infos
-
-    explicit_path_infos = []
-    has_explicit_ancestor = set()
-
-    # This list is sorted according to the keys component, so by traversing it
-    # in the reverse order we make sure that we process deeper paths first.
-    for path_info in reversed(path_infos):
-      path_components = tuple(path_info.components)
-
-      if (path_info.HasField("stat_entry") or
-          path_info.HasField("hash_entry") or
-          path_components in has_explicit_ancestor):
-        explicit_path_infos.append(path_info)
-        has_explicit_ancestor.add(path_components[:-1])
-
-    # Since we collected explicit paths in reverse order, we need to reverse it
-    # again to conform to the interface.
-    return list(reversed(explicit_path_infos))
+    cursor.execute(query, values)
+    return {
+        path_id: (entry_bytes, last_timestamp)
+        for path_id, entry_bytes, last_timestamp in cursor.fetchall()
+    }
 
   @mysql_utils.WithTransaction(readonly=True)
   def ReadPathInfosHistories(
@@ -1,16 +1,60 @@
 #!/usr/bin/env python
+from unittest import mock
 
 from absl import app
 from absl.testing import absltest
 
 from grr_response_server.databases import db_paths_test
+from grr_response_server.databases import db_test_utils
+from grr_response_server.databases import mysql_paths
 from grr_response_server.databases import mysql_test
+from grr_response_server.rdfvalues import objects as rdf_objects
 from grr.test_lib import test_lib
 
 
 class MysqlPathsTest(db_paths_test.DatabaseTestPathsMixin,
                      mysql_test.MysqlTestBase, absltest.TestCase):
-  pass
+
+  @mock.patch.object(mysql_paths.MySQLDBPathMixin,
+                     "_DESCENDANT_PATH_INFOS_PAGE_SIZE", 2)
+  def testIterDescendantPathInfosReadsPages(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    path_infos = []
+    for i in range(5):
+      path_info = rdf_objects.PathInfo.OS(components=("foo", "bar%d" % i))
+      path_info.stat_entry.st_size = i
+      path_infos.append(path_info)
+    self.db.WritePathInfos(client_id, path_infos)
+
+    results = list(
+        self.db.IterDescendantPathInfos(
+            client_id=client_id,
+            path_type=rdf_objects.PathInfo.PathType.OS,
+            components=("foo",)))
+    self.assertEqual([tuple(_.components) for _ in results],
+                     [("foo", "bar%d" % i) for i in range(5)])
+    self.assertEqual([_.stat_entry.st_size for _ in results], list(range(5)))
+
+  @mock.patch.object(mysql_paths.MySQLDBPathMixin,
+                     "_DESCENDANT_PATH_INFOS_PAGE_SIZE", 2)
+  def testIterDescendantPathInfosSortsPathsSharingIndexedPrefix(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    # Only the first 2048 bytes of a path are indexed.
+    long_component = "x" * mysql_paths.MySQLDBPathMixin._PATH_KEY_LENGTH
+    components = [("foo", long_component + str(i)) for i in reversed(range(5))]
+    components.append(("foo", "bar"))
+    components.append(("foo", "y"))
+    self.db.WritePathInfos(
+        client_id, [rdf_objects.PathInfo.OS(components=_) for _ in components])
+
+    results = list(
+        self.db.IterDescendantPathInfos(
+            client_id=client_id,
+            path_type=rdf_objects.PathInfo.PathType.OS,
+            components=("foo",)))
+    self.assertEqual([tuple(_.components) for _ in results], sorted(components))
 
 
 if __name__ == "__main__":
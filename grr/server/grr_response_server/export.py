@@ -8,8 +8,16 @@ ExportConverters convert various complex RDFValues to simple RDFValues
 easily be written to a relational database or just to a set of files.
 """
 
+import threading
+from typing import Collection, Dict, Iterable, Text
+
+from grr_response_core import config
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.util import collection
+from grr_response_server import data_store
 from grr_response_server import export_converters_registry
+from grr_response_server.databases import db
 from grr_response_server.export_converters import base
 
 
@@ -77,6 +85,103 @@ def GetMetadata(client_id, client_full_info):
   return metadata
 
 
+class ClientMetadataCache(object):
+  """An in-process cache of exported client metadata of a database.
+
+  Entries are dropped whenever snapshots or labels of their clients are changed
+  through the database object the cache belongs to. Changes made by other
+  processes are picked up once entries get older than
+  `Export.metadata_cache_ttl`.
+  """
+
+  def __init__(self, rel_db: db.DatabaseValidationWrapper):
+    self._lock = threading.Lock()
+    self._db = rel_db
+    ttl = config.CONFIG["Export.metadata_cache_ttl"]
+    self._cache = utils.AgeBasedCache(
+        max_size=config.CONFIG["Export.metadata_cache_size"],
+        max_age=ttl.ToFractional(rdfvalue.SECONDS))
+    # Incremented whenever entries are invalidated. Metadata read from the
+    # database concurrently with an invalidation is not cached.
+    self._version = 0
+
+    rel_db.AddClientChangeListener(self.Invalidate)
+
+  def Get(
+      self,
+      client_ids: Iterable[Text]) -> Dict[Text, base.ExportedMetadata]:
+    """Returns exported metadata of the given clients.
+
+    Metadata missing from the cache is read with a single database call.
+
+    Args:
+      client_ids: Ids of the clients to get the metadata of.
+
+    Returns:
+      A dict mapping client ids to their metadata. Clients that don't exist
+      are omitted. The returned objects are shared between callers and must
+      not be modified. Their `timestamp` field is never set, since it's
+      specific to every exported value.
+    """
+    result = {}
+    missing = set()
+    with self._lock:
+      for client_id in client_ids:
+        try:
+          result[client_id] = self._cache.Get(client_id)
+        except KeyError:
+          missing.add(client_id)
+      version = self._version
+
+    if not missing:
+      return result
+
+    infos = self._db.MultiReadClientFullInfo(list(missing))
+    fetched = {}
+    for client_id, info in infos.items():
+      metadata = GetMetadata(client_id, info)
+      metadata.timestamp = None
+      fetched[client_id] = metadata
+
+    with self._lock:
+      if self._version == version:
+        for client_id, metadata in fetched.items():
+          self._cache.Put(client_id, metadata)
+
+    result.update(fetched)
+    return result
+
+  def Invalidate(self, client_ids: Collection[Text]) -> None:
+    """Drops cached metadata of the given clients."""
+    with self._lock:
+      self._version += 1
+      for client_id in client_ids:
+        self._cache.Pop(client_id)
+
+  def Flush(self) -> None:
+    """Drops all cached metadata."""
+    with self._lock:
+      self._version += 1
+      self._cache.Flush()
+
+
+def GetClientsMetadata(
+    client_ids: Iterable[Text]) -> Dict[Text, base.ExportedMetadata]:
+  """Returns exported metadata of the given clients.
+
+  Uses the metadata cache of the current database, see
+  `ClientMetadataCache.Get` for details.
+
+  Args:
+    client_ids: Ids of the clients to get the metadata of.
+
+  Returns:
+    A dict mapping ids of existing clients to their (shared) metadata.
+  """
+  cache = data_store.REL_DB.GetCache("client_metadata", ClientMetadataCache)
+  return cache.Get(client_ids)
+
+
 def ConvertValuesWithMetadata(metadata_value_pairs, options=None):
   """Converts a set of RDFValues into a set of export-friendly RDFValues.
 
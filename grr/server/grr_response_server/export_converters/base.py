@@ -49,6 +49,11 @@ class ExportConverter():
   # Type of values that this converter accepts.
   input_rdf_type = None
 
+  # True if the converter never accesses the data store or the file store and
+  # its results are instances of importable classes. Only such converters run
+  # in export processes (see Export.processes).
+  process_safe = False
+
   def __init__(self, options=None):
     """Constructor.
 
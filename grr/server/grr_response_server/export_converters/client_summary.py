@@ -22,6 +22,7 @@ class ClientSummaryToExportedNetworkInterfaceConverter(
   """Converts a ClientSummary to ExportedNetworkInterfaces."""
 
   input_rdf_type = rdf_client.ClientSummary
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata,
@@ -47,6 +48,7 @@ class ClientSummaryToExportedClientConverter(base.ExportConverter):
   """Converts a ClientSummary to ExportedClient."""
 
   input_rdf_type = rdf_client.ClientSummary
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata,
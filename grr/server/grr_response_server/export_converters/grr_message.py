@@ -2,7 +2,6 @@
 """Classes for exporting GrrMessage."""
 
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
-from grr_response_server import data_store
 from grr_response_server import export
 from grr_response_server import export_converters_registry
 from grr_response_server.export_converters import base
@@ -29,10 +28,6 @@ class GrrMessageConverter(base.ExportConverter):
 
   input_rdf_type = rdf_flows.GrrMessage
 
-  def __init__(self, *args, **kw):
-    super().__init__(*args, **kw)
-    self.cached_metadata = {}
-
   def Convert(self, metadata, grr_message):
     """Converts GrrMessage into a set of RDFValues.
 
@@ -63,55 +58,36 @@ class GrrMessageConverter(base.ExportConverter):
     for metadata, msg in metadata_value_pairs:
       msg_dict.setdefault(msg.source, []).append((metadata, msg))
 
-    metadata_objects = []
-    metadata_to_fetch = []
-
-    # Open the clients we don't have metadata for and fetch metadata.
-    for client_urn in msg_dict:
-      try:
-        metadata_objects.append(self.cached_metadata[client_urn])
-      except KeyError:
-        metadata_to_fetch.append(client_urn)
-
-    if metadata_to_fetch:
-      client_ids = set(urn.Basename() for urn in metadata_to_fetch)
-      infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids)
-
-      fetched_metadata = [
-          export.GetMetadata(client_id, info)
-          for client_id, info in infos.items()
-      ]
-
-      for metadata in fetched_metadata:
-        self.cached_metadata[metadata.client_urn] = metadata
-      metadata_objects.extend(fetched_metadata)
+    metadata_by_client_id = export.GetClientsMetadata(
+        {urn.Basename() for urn in msg_dict})
 
     data_by_type = {}
-    for metadata in metadata_objects:
-      try:
-        for original_metadata, message in msg_dict[metadata.client_urn]:
-          # Get source_urn and annotations from the original metadata
-          # provided.
-          new_metadata = base.ExportedMetadata(metadata)
-          new_metadata.source_urn = original_metadata.source_urn
-          new_metadata.annotations = original_metadata.annotations
-          cls_name = message.payload.__class__.__name__
-
-          # Create a dict of values for conversion keyed by type, so we can
-          # apply the right converters to the right object types
-          if cls_name not in data_by_type:
-            converters_classes = export_converters_registry.GetConvertersByValue(
-                message.payload)
-            data_by_type[cls_name] = {
-                "converters": [cls(self.options) for cls in converters_classes],
-                "batch_data": [(new_metadata, message.payload)]
-            }
-          else:
-            data_by_type[cls_name]["batch_data"].append(
-                (new_metadata, message.payload))
-
-      except KeyError:
-        pass
+    for client_urn, messages in msg_dict.items():
+      metadata = metadata_by_client_id.get(client_urn.Basename())
+      # Messages of clients that don't exist are skipped.
+      if metadata is None:
+        continue
+
+      for original_metadata, message in messages:
+        # Get source_urn and annotations from the original metadata
+        # provided.
+        new_metadata = base.ExportedMetadata(metadata)
+        new_metadata.source_urn = original_metadata.source_urn
+        new_metadata.annotations = original_metadata.annotations
+        cls_name = message.payload.__class__.__name__
+
+        # Create a dict of values for conversion keyed by type, so we can
+        # apply the right converters to the right object types
+        if cls_name not in data_by_type:
+          converters_classes = export_converters_registry.GetConvertersByValue(
+              message.payload)
+          data_by_type[cls_name] = {
+              "converters": [cls(self.options) for cls in converters_classes],
+              "batch_data": [(new_metadata, message.payload)]
+          }
+        else:
+          data_by_type[cls_name]["batch_data"].append(
+              (new_metadata, message.payload))
 
     # Run all converters against all objects of the relevant type
     converted_batch = []
@@ -23,6 +23,7 @@ class ExportedProcessMemoryError(rdf_structs.RDFProtoStruct):
 class YaraProcessScanMatchConverter(base.ExportConverter):
   """Converter for YaraProcessScanMatch."""
   input_rdf_type = rdf_memory.YaraProcessScanMatch
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata,
@@ -49,6 +50,7 @@ class YaraProcessScanMatchConverter(base.ExportConverter):
 class ProcessMemoryErrorConverter(base.ExportConverter):
   """Converter for ProcessMemoryError."""
   input_rdf_type = rdf_memory.ProcessMemoryError
+  process_safe = True
 
   def Convert(
       self,
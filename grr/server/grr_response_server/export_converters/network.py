@@ -36,6 +36,7 @@ class NetworkConnectionToExportedNetworkConnectionConverter(
   """Converts NetworkConnection to ExportedNetworkConnection."""
 
   input_rdf_type = rdf_client_network.NetworkConnection
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata,
@@ -68,6 +69,7 @@ class InterfaceToExportedNetworkInterfaceConverter(base.ExportConverter):
   """Converts Interface to ExportedNetworkInterface."""
 
   input_rdf_type = rdf_client_network.Interface
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata,
@@ -110,6 +112,7 @@ class DNSClientConfigurationToExportedDNSClientConfiguration(
   """Converts DNSClientConfiguration to ExportedDNSClientConfiguration."""
 
   input_rdf_type = rdf_client_network.DNSClientConfiguration
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata,
@@ -28,6 +28,7 @@ class ProcessToExportedProcessConverter(base.ExportConverter):
   """Converts Process to ExportedProcess."""
 
   input_rdf_type = rdf_client.Process
+  process_safe = True
 
   def Convert(self, metadata: base.ExportedMetadata,
               process: rdf_client.Process) -> List[ExportedProcess]:
@@ -74,6 +75,7 @@ class ProcessToExportedNetworkConnectionConverter(base.ExportConverter):
   """Converts Process to ExportedNetworkConnection."""
 
   input_rdf_type = rdf_client.Process
+  process_safe = True
 
   def Convert(
       self, metadata: base.ExportedMetadata, process: rdf_client.Process
@@ -100,6 +102,7 @@ class ProcessToExportedOpenFileConverter(base.ExportConverter):
   """Converts Process to ExportedOpenFile."""
 
   input_rdf_type = rdf_client.Process
+  process_safe = True
 
   def Convert(self, metadata: base.ExportedMetadata,
               process: rdf_client.Process) -> Iterator[ExportedOpenFile]:
@@ -18,6 +18,7 @@ class DictToExportedDictItemsConverter(base.ExportConverter):
   """Export converter that converts Dict to ExportedDictItems."""
 
   input_rdf_type = rdf_protodict.Dict
+  process_safe = True
 
   def _IterateDict(self,
                    d: Dict[str, Any],
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 """Tests for export converters."""
 
+from unittest import mock
+
 from absl import app
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import cloud as rdf_cloud
 from grr_response_server import data_store
 from grr_response_server import export
+from grr_response_server.databases import db
 from grr_response_server.export_converters import base
 from grr.test_lib import export_test_lib
 from grr.test_lib import fixture_test_lib
@@ -202,6 +205,115 @@ class GetMetadataTest(test_lib.GRRBaseTest):
     self.assertEqual(metadata.cloud_instance_id, "foo/bar")
 
 
+class GetClientsMetadataTest(test_lib.GRRBaseTest):
+
+  def _ReadWithSpy(self, client_ids):
+    with mock.patch.object(
+        data_store.REL_DB,
+        "MultiReadClientFullInfo",
+        wraps=data_store.REL_DB.MultiReadClientFullInfo) as multi_read:
+      metadata = export.GetClientsMetadata(client_ids)
+    return metadata, multi_read
+
+  def testReadsMetadataOfAllClientsInSingleCall(self):
+    client_ids = self.SetupClients(3)
+
+    metadata, multi_read = self._ReadWithSpy(client_ids)
+
+    self.assertEqual(multi_read.call_count, 1)
+    self.assertCountEqual(metadata.keys(), client_ids)
+    for client_id, client_metadata in metadata.items():
+      self.assertEqual(client_metadata.client_urn, "aff4:/" + client_id)
+      self.assertFalse(client_metadata.HasField("timestamp"))
+
+  def testOmitsUnknownClients(self):
+    client_id = self.SetupClient(0)
+
+    metadata = export.GetClientsMetadata([client_id, "C.0000000000000042"])
+
+    self.assertCountEqual(metadata.keys(), [client_id])
+
+  def testCachesMetadata(self):
+    client_ids = self.SetupClients(3)
+    export.GetClientsMetadata(client_ids[:2])
+
+    metadata, multi_read = self._ReadWithSpy(client_ids)
+
+    multi_read.assert_called_once_with([client_ids[2]])
+    self.assertCountEqual(metadata.keys(), client_ids)
+
+  def testCachedMetadataExpires(self):
+    client_id = self.SetupClient(0)
+
+    rel_db = db.DatabaseValidationWrapper(data_store.REL_DB.delegate)
+    with test_lib.ConfigOverrider(
+        {"Export.metadata_cache_ttl": rdfvalue.Duration(0)}):
+      # The cache is created with the configured TTL.
+      cache = export.ClientMetadataCache(rel_db)
+
+    cache.Get([client_id])
+    with mock.patch.object(
+        rel_db,
+        "MultiReadClientFullInfo",
+        wraps=rel_db.MultiReadClientFullInfo) as multi_read:
+      cache.Get([client_id])
+
+    self.assertEqual(multi_read.call_count, 1)
+
+  def testCacheBelongsToDatabase(self):
+    client_id = self.SetupClient(0)
+    export.GetClientsMetadata([client_id])
+
+    other_db = db.DatabaseValidationWrapper(data_store.REL_DB.delegate)
+    with mock.patch.object(data_store, "REL_DB", other_db):
+      _, multi_read = self._ReadWithSpy([client_id])
+
+    self.assertEqual(multi_read.call_count, 1)
+
+  def testSnapshotWriteInvalidatesCachedMetadata(self):
+    client_id = self.SetupClient(0, fqdn="foo.example.com")
+    export.GetClientsMetadata([client_id])
+
+    snapshot = data_store.REL_DB.ReadClientSnapshot(client_id)
+    snapshot.knowledge_base.fqdn = "bar.example.com"
+    data_store.REL_DB.WriteClientSnapshot(snapshot)
+
+    metadata = export.GetClientsMetadata([client_id])
+    self.assertEqual(metadata[client_id].hostname, "bar.example.com")
+
+  def testLabelChangesInvalidateCachedMetadata(self):
+    client_id = self.SetupClient(0)
+    data_store.REL_DB.WriteGRRUser(self.test_username)
+    export.GetClientsMetadata([client_id])
+
+    data_store.REL_DB.AddClientLabels(client_id, self.test_username, ["foo"])
+    metadata = export.GetClientsMetadata([client_id])
+    self.assertEqual(metadata[client_id].user_labels, "foo")
+
+    data_store.REL_DB.RemoveClientLabels(client_id, self.test_username,
+                                         ["foo"])
+    metadata = export.GetClientsMetadata([client_id])
+    self.assertEqual(metadata[client_id].user_labels, "")
+
+  def testInvalidationDuringReadIsNotLost(self):
+    client_id = self.SetupClient(0)
+    multi_read = data_store.REL_DB.MultiReadClientFullInfo
+
+    def MultiReadAndInvalidate(client_ids):
+      result = multi_read(client_ids)
+      # A write racing with the read.
+      data_store.REL_DB.WriteClientSnapshot(
+          data_store.REL_DB.ReadClientSnapshot(client_id))
+      return result
+
+    with mock.patch.object(data_store.REL_DB, "MultiReadClientFullInfo",
+                           MultiReadAndInvalidate):
+      export.GetClientsMetadata([client_id])
+
+    _, multi_read_spy = self._ReadWithSpy([client_id])
+    self.assertEqual(multi_read_spy.call_count, 1)
+
+
 def main(argv):
   test_lib.main(argv)
 
@@ -2,14 +2,20 @@
 """REL_DB-based file store implementation."""
 
 import abc
+import bisect
 import collections
+from concurrent import futures
+import contextlib
 import hashlib
 import io
 import os
+import threading
 from typing import Dict
 from typing import Iterable
+from typing import Iterator
 from typing import NamedTuple
 from typing import Optional
+from typing import Sequence
 
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
@@ -117,45 +123,184 @@ class CompositeExternalFileStore(ExternalFileStore):
 EXTERNAL_FILE_STORE = CompositeExternalFileStore()
 
 
-# TODO(user): this is a naive implementation as it reads one chunk
-# per REL_DB call. It has to be optimized.
+def _ReadBlobsAhead(
+    blob_refs: Sequence[rdf_objects.BlobReference],
+    batch_size: int,
+    max_batches: int,
+    max_bytes: int,
+) -> Iterator[bytes]:
+  """Yields contents of given blobs, reading subsequent batches concurrently.
+
+  Blobs are read with `ReadBlobs` calls of up to `batch_size` blobs each. Up to
+  `max_batches` of these calls run concurrently ahead of the consumer, as long
+  as the total size of the blobs that were requested but not yet yielded does
+  not exceed `max_bytes`.
+
+  Args:
+    blob_refs: References of blobs to read.
+    batch_size: Number of blobs to read with a single `ReadBlobs` call.
+    max_batches: Maximum number of batches to read concurrently. If 0, blobs
+      are read synchronously, one batch at a time.
+    max_bytes: Maximum number of bytes read ahead of the consumer.
+
+  Yields:
+    Contents of the blobs in the order of `blob_refs`.
+
+  Raises:
+    BlobNotFoundError: if one of the blobs wasn't found.
+  """
+
+  def _Yield(batch, blobs):
+    for ref in batch:
+      blob_data = blobs[ref.blob_id]
+      if blob_data is None:
+        raise BlobNotFoundError(ref.blob_id)
+      yield blob_data
+
+  batches = collection.Batch(blob_refs, batch_size)
+
+  if max_batches <= 0:
+    for batch in batches:
+      yield from _Yield(batch,
+                        data_store.BLOBS.ReadBlobs([r.blob_id for r in batch]))
+    return
+
+  pending = collections.deque()
+  pending_bytes = 0
+  for batch in batches:
+    batch_bytes = sum(ref.size for ref in batch)
+    while pending and (len(pending) >= max_batches or
+                       pending_bytes + batch_bytes > max_bytes):
+      done_batch, done_future, done_bytes = pending.popleft()
+      pending_bytes -= done_bytes
+      yield from _Yield(done_batch, done_future.result())
+
+    pending.append(
+        (batch, _ReadBlobsInThread([ref.blob_id for ref in batch]), batch_bytes))
+    pending_bytes += batch_bytes
+
+  while pending:
+    done_batch, done_future, _ = pending.popleft()
+    yield from _Yield(done_batch, done_future.result())
+
+
+def _ReadBlobsInThread(
+    blob_ids: Sequence[rdf_objects.BlobID]) -> futures.Future:
+  """Reads blobs in a new thread and returns a future with the result."""
+  # A short-lived thread per batch is used instead of a thread pool: readers
+  # are often abandoned without being closed and no threads should outlive
+  # the reads they were started for.
+  future = futures.Future()
+
+  def _Read():
+    try:
+      future.set_result(data_store.BLOBS.ReadBlobs(blob_ids))
+    except Exception as e:  # pylint: disable=broad-except
+      future.set_exception(e)
+
+  threading.Thread(target=_Read, name="BlobReadAhead", daemon=True).start()
+  return future
+
+
 class BlobStream(object):
-  """File-like object for reading from blobs."""
+  """File-like object for reading from blobs.
+
+  Random reads fetch blobs one by one. Once the stream is read sequentially
+  past a blob boundary, subsequent blobs are read ahead in batches
+  concurrently (see `Server.blob_read_ahead_*` config options). Blobs passed
+  to the constructor are never read from the blob store.
+  """
 
-  def __init__(self, client_path, blob_refs, hash_id):
+  def __init__(self, client_path, blob_refs, hash_id, blobs=None):
     self._client_path = client_path
     self._blob_refs = blob_refs
+    self._blobs: Dict[rdf_objects.BlobID, bytes] = blobs or {}
+    self._blob_offsets = [ref.offset for ref in blob_refs]
     self._hash_id = hash_id
 
     self._max_unbound_read = config.CONFIG["Server.max_unbound_read_size"]
+    self._read_ahead_batches = config.CONFIG["Server.blob_read_ahead_batches"]
+    self._read_ahead_batch_size = config.CONFIG[
+        "Server.blob_read_ahead_batch_size"]
+    self._read_ahead_max_bytes = config.CONFIG[
+        "Server.blob_read_ahead_max_bytes"]
 
     self._offset = 0
     self._length = self._blob_refs[-1].offset + self._blob_refs[-1].size
 
+    self._current_index = None
     self._current_ref = None
     self._current_chunk = None
 
+    # A generator yielding contents of blobs starting at _read_ahead_index.
+    self._read_ahead = None
+    self._read_ahead_index = None
+
+  def _FindRefIndex(self):
+    """Returns index of the blob covering the current offset or None."""
+    index = bisect.bisect_right(self._blob_offsets, self._offset) - 1
+    if index < 0:
+      return None
+
+    ref = self._blob_refs[index]
+    if self._offset >= ref.offset + ref.size:
+      return None
+
+    return index
+
+  def _StopReadAhead(self):
+    if self._read_ahead is not None:
+      self._read_ahead.close()
+    self._read_ahead = None
+    self._read_ahead_index = None
+
+  def _ReadChunk(self, index):
+    """Reads contents of the blob with a given index."""
+    blob_data = self._blobs.get(self._blob_refs[index].blob_id)
+    if blob_data is not None:
+      return blob_data
+
+    if self._read_ahead is None and self._read_ahead_batches > 0 and (
+        self._current_index is not None and index == self._current_index + 1):
+      self._read_ahead = _ReadBlobsAhead(
+          self._blob_refs[index:],
+          batch_size=self._read_ahead_batch_size,
+          max_batches=self._read_ahead_batches,
+          max_bytes=self._read_ahead_max_bytes)
+      self._read_ahead_index = index
+
+    if self._read_ahead is not None and index == self._read_ahead_index:
+      try:
+        chunk = next(self._read_ahead)
+      except Exception:
+        self._StopReadAhead()
+        raise
+      self._read_ahead_index += 1
+      return chunk
+
+    # Non-sequential access: read-ahead would only fetch blobs that are not
+    # going to be used.
+    self._StopReadAhead()
+
+    blob_id = self._blob_refs[index].blob_id
+    data = data_store.BLOBS.ReadBlobs([blob_id])
+    if data[blob_id] is None:
+      raise BlobNotFoundError(blob_id)
+    return data[blob_id]
+
   def _GetChunk(self):
     """Fetches a chunk corresponding to the current offset."""
 
-    found_ref = None
-    for ref in self._blob_refs:
-      if self._offset >= ref.offset and self._offset < (ref.offset + ref.size):
-        found_ref = ref
-        break
-
-    if not found_ref:
+    index = self._FindRefIndex()
+    if index is None:
       return None, None
 
-    # If self._current_ref == found_ref, then simply return previously found
+    # If self._current_index == index, then simply return previously found
     # chunk. Otherwise, update self._current_chunk value.
-    if self._current_ref != found_ref:
-      self._current_ref = found_ref
-
-      data = data_store.BLOBS.ReadBlobs([found_ref.blob_id])
-      if data[found_ref.blob_id] is None:
-        raise BlobNotFoundError(found_ref.blob_id)
-      self._current_chunk = data[found_ref.blob_id]
+    if self._current_index != index:
+      self._current_chunk = self._ReadChunk(index)
+      self._current_index = index
+      self._current_ref = self._blob_refs[index]
 
     return self._current_chunk, self._current_ref
 
@@ -203,9 +348,18 @@ class BlobStream(object):
     else:
       raise ValueError("Invalid whence argument: %s" % whence)
 
+  def Close(self):
+    """Stops reading ahead and releases blobs that were read ahead."""
+    self._StopReadAhead()
+
+  def IsPrefetched(self) -> bool:
+    """Returns True if the stream can be read without the blob store."""
+    return all(ref.blob_id in self._blobs for ref in self._blob_refs)
+
   read = utils.Proxy("Read")
   tell = utils.Proxy("Tell")
   seek = utils.Proxy("Seek")
+  close = utils.Proxy("Close")
 
   @property
   def size(self):
@@ -430,7 +584,79 @@ def OpenFile(
   return BlobStream(client_path, blob_references, hash_id)
 
 
-STREAM_CHUNKS_READ_AHEAD = 500
+def OpenFiles(
+    client_paths: Sequence[db.ClientPath],
+    max_timestamp: Optional[rdfvalue.RDFDatetime] = None,
+    prefetch_max_bytes: int = 0,
+) -> Dict[db.ClientPath, BlobStream]:
+  """Opens latest content of given files for reading.
+
+  Unlike calling `OpenFile` for every file, this reads path infos and blob
+  references of all files with single database calls. Blobs of the files are
+  also read in bulk, until their total size exceeds `prefetch_max_bytes`.
+  Blobs of the remaining files are read from the blob store when the files
+  are read.
+
+  Args:
+    client_paths: Paths of files to open.
+    max_timestamp: If specified, will open the last collected versions with a
+      timestamp equal or lower than max_timestamp. If not specified, will simply
+      open the latest versions.
+    prefetch_max_bytes: Maximum total size of blobs read in bulk.
+
+  Returns:
+    A dict mapping client paths to file like objects with random access
+    support. Files that were never collected (or not collected before
+    max_timestamp) are omitted.
+
+  Raises:
+    MissingBlobReferencesError: if one of the blobs was not found.
+  """
+  path_infos = data_store.REL_DB.ReadLatestPathInfosWithHashBlobReferences(
+      client_paths, max_timestamp=max_timestamp)
+
+  hash_ids = {}
+  for client_path, path_info in path_infos.items():
+    if path_info is not None:
+      hash_ids[client_path] = rdf_objects.SHA256HashID.FromSerializedBytes(
+          path_info.hash_entry.sha256.AsBytes())
+
+  if not hash_ids:
+    return {}
+
+  blob_refs = data_store.REL_DB.ReadHashBlobReferences(set(hash_ids.values()))
+
+  prefetched_ids = []
+  prefetched_bytes = 0
+  for client_path, hash_id in hash_ids.items():
+    refs = blob_refs[hash_id]
+    if refs is None:
+      raise MissingBlobReferencesError(
+          "File hash was expected to have corresponding "
+          "blob references, but they were not found: %r" % hash_id)
+
+    size = sum(ref.size for ref in refs)
+    if prefetched_bytes + size > prefetch_max_bytes:
+      continue
+
+    prefetched_ids.extend(ref.blob_id for ref in refs)
+    prefetched_bytes += size
+
+  blobs = {}
+  if prefetched_ids:
+    blobs = data_store.BLOBS.ReadBlobs(prefetched_ids)
+    blobs = {k: v for k, v in blobs.items() if v is not None}
+
+  result = {}
+  for client_path, hash_id in hash_ids.items():
+    refs = blob_refs[hash_id]
+    file_blobs = {
+        ref.blob_id: blobs[ref.blob_id] for ref in refs if ref.blob_id in blobs
+    }
+    result[client_path] = BlobStream(
+        client_path, refs, hash_id, blobs=file_blobs)
+
+  return result
 
 
 class StreamedFileChunk(object):
@@ -492,6 +718,7 @@ def StreamFilesChunks(client_paths, max_timestamp=None, max_size=None):
       hash_ids_by_cp.values())
 
   all_chunks = []
+  all_refs = []
   for cp in client_paths:
     try:
       hash_id = hash_ids_by_cp[cp]
@@ -510,18 +737,19 @@ def StreamFilesChunks(client_paths, max_timestamp=None, max_size=None):
 
     cur_size = 0
     for i, ref in enumerate(blob_refs):
-      all_chunks.append((cp, ref.blob_id, i, num_blobs, ref.offset, total_size))
+      all_chunks.append((cp, i, num_blobs, ref.offset, total_size))
+      all_refs.append(ref)
 
       cur_size += ref.size
       if max_size is not None and cur_size >= max_size:
         break
 
-  for batch in collection.Batch(all_chunks, STREAM_CHUNKS_READ_AHEAD):
-    blobs = data_store.BLOBS.ReadBlobs(
-        [blob_id for cp, blob_id, i, num_blobs, offset, total_size in batch])
-    for cp, blob_id, i, num_blobs, offset, total_size in batch:
-      blob_data = blobs[blob_id]
-      if blob_data is None:
-        raise BlobNotFoundError(blob_id)
-
+  blobs_data = _ReadBlobsAhead(
+      all_refs,
+      batch_size=config.CONFIG["Server.blob_read_ahead_batch_size"],
+      max_batches=config.CONFIG["Server.blob_read_ahead_batches"],
+      max_bytes=config.CONFIG["Server.blob_read_ahead_max_bytes"])
+  with contextlib.closing(blobs_data):
+    for (cp, i, num_blobs, offset, total_size), blob_data in zip(
+        all_chunks, blobs_data):
       yield StreamedFileChunk(cp, blob_data, i, num_blobs, offset, total_size)
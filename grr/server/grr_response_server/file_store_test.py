@@ -84,6 +84,86 @@ class BlobStreamTest(test_lib.GRRBaseTest):
       self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
       self.blob_stream.read(self.blob_size)
 
+  def _ReadBlobsCalls(self, blob_stream, fn):
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs",
+        wraps=data_store.BLOBS.ReadBlobs) as read_blobs:
+      result = fn()
+    blob_stream.close()
+    return result, [call[0][0] for call in read_blobs.call_args_list]
+
+  def testReadsAheadInBatchesWhenReadingSequentially(self):
+    with test_lib.ConfigOverrider({
+        "Server.blob_read_ahead_batches": 2,
+        "Server.blob_read_ahead_batch_size": 3,
+    }):
+      blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+      data, calls = self._ReadBlobsCalls(blob_stream, blob_stream.read)
+
+    self.assertEqual(data, b"".join(self.blob_data))
+    # The first blob is read on its own, the following ones in batches.
+    self.assertEqual([len(blob_ids) for blob_ids in calls], [1, 3, 3, 3])
+
+  def testReadAheadRespectsMaxBytes(self):
+    requested = []
+    read_blobs = data_store.BLOBS.ReadBlobs
+
+    def ReadBlobs(blob_ids):
+      requested.extend(blob_ids)
+      return read_blobs(blob_ids)
+
+    consumed = 0
+    with mock.patch.object(data_store, "BLOBS", mock.Mock(ReadBlobs=ReadBlobs)):
+      for data in file_store._ReadBlobsAhead(
+          self.blob_refs,
+          batch_size=1,
+          max_batches=10,
+          max_bytes=self.blob_size * 2):
+        consumed += 1
+        self.assertEqual(data, self.blob_data[consumed - 1])
+        self.assertLessEqual(len(requested) - consumed, 2)
+
+    self.assertEqual(consumed, len(self.blob_refs))
+
+  def testDoesNotReadAheadWhenDisabled(self):
+    with test_lib.ConfigOverrider({"Server.blob_read_ahead_batches": 0}):
+      blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+      data, calls = self._ReadBlobsCalls(blob_stream, blob_stream.read)
+
+    self.assertEqual(data, b"".join(self.blob_data))
+    self.assertEqual([len(blob_ids) for blob_ids in calls], [1] * 10)
+
+  def testReadsCorrectlyWhenSeekingDuringReadAhead(self):
+    with test_lib.ConfigOverrider({
+        "Server.blob_read_ahead_batches": 2,
+        "Server.blob_read_ahead_batch_size": 2,
+    }):
+      blob_stream = file_store.BlobStream(None, self.blob_refs, None)
+
+    self.assertEqual(blob_stream.read(self.blob_size + 1), b"a" * 10 + b"b")
+    blob_stream.seek(-1, 2)
+    self.assertEqual(blob_stream.read(1), b"5")
+    blob_stream.seek(self.blob_size * 2)
+    self.assertEqual(blob_stream.read(self.blob_size + 1), b"c" * 10 + b"d")
+    blob_stream.seek(0)
+    self.assertEqual(blob_stream.read(), b"".join(self.blob_data))
+    blob_stream.close()
+
+  def testRaisesIfBlobIsMissingDuringReadAhead(self):
+    _, missing_blob_refs = vfs_test_lib.GenerateBlobRefs(self.blob_size, "0")
+    blob_refs = self.blob_refs[:3] + [
+        rdf_objects.BlobReference(
+            offset=self.blob_size * 3,
+            size=self.blob_size,
+            blob_id=missing_blob_refs[0].blob_id)
+    ]
+
+    with test_lib.ConfigOverrider({"Server.blob_read_ahead_batches": 2}):
+      blob_stream = file_store.BlobStream(None, blob_refs, None)
+
+    with self.assertRaises(file_store.BlobNotFoundError):
+      blob_stream.read()
+
 
 class AddFileWithUnknownHashTest(test_lib.GRRBaseTest):
   """Tests for AddFileWithUnknownHash."""
@@ -419,6 +499,68 @@ class OpenFileTest(test_lib.GRRBaseTest):
     self.assertEqual(fd.read(), self.data)
 
 
+class OpenFilesTest(test_lib.GRRBaseTest):
+  """Tests for OpenFiles."""
+
+  def setUp(self):
+    super().setUp()
+    self.client_id = self.SetupClient(0)
+    self.blob_size = 10
+
+  def _WriteFile(self, components, chars):
+    client_path = db.ClientPath.OS(self.client_id, components)
+    blob_data, blob_refs = vfs_test_lib.GenerateBlobRefs(self.blob_size, chars)
+    vfs_test_lib.CreateFileWithBlobRefsAndData(client_path, blob_refs,
+                                               blob_data)
+    return client_path, b"".join(blob_data)
+
+  def _ReadAll(self, fds):
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs",
+        wraps=data_store.BLOBS.ReadBlobs) as read_blobs:
+      data = {client_path: fd.read() for client_path, fd in fds.items()}
+    return data, read_blobs.call_count
+
+  def testOpensAllFilesWithPrefetchedBlobs(self):
+    foo_path, foo_data = self._WriteFile(("foo",), "abc")
+    bar_path, bar_data = self._WriteFile(("bar",), "de")
+
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs",
+        wraps=data_store.BLOBS.ReadBlobs) as read_blobs:
+      fds = file_store.OpenFiles([foo_path, bar_path],
+                                 prefetch_max_bytes=1024)
+    self.assertEqual(read_blobs.call_count, 1)
+
+    data, num_reads = self._ReadAll(fds)
+    self.assertEqual(data, {foo_path: foo_data, bar_path: bar_data})
+    self.assertEqual(num_reads, 0)
+
+  def testReadsBlobsOfFilesExceedingPrefetchLimitLazily(self):
+    foo_path, foo_data = self._WriteFile(("foo",), "abc")
+    bar_path, bar_data = self._WriteFile(("bar",), "de")
+
+    fds = file_store.OpenFiles([foo_path, bar_path],
+                               prefetch_max_bytes=3 * self.blob_size)
+
+    data, num_reads = self._ReadAll({bar_path: fds[bar_path]})
+    self.assertEqual(data, {bar_path: bar_data})
+    self.assertGreater(num_reads, 0)
+
+    data, num_reads = self._ReadAll({foo_path: fds[foo_path]})
+    self.assertEqual(data, {foo_path: foo_data})
+    self.assertEqual(num_reads, 0)
+
+  def testOmitsFilesThatWereNotCollected(self):
+    foo_path, foo_data = self._WriteFile(("foo",), "abc")
+    bar_path = db.ClientPath.OS(self.client_id, ("bar",))
+
+    fds = file_store.OpenFiles([foo_path, bar_path])
+
+    self.assertCountEqual(fds.keys(), [foo_path])
+    self.assertEqual(fds[foo_path].read(), foo_data)
+
+
 class StreamFilesChunksTest(test_lib.GRRBaseTest):
   """Tests for StreamFilesChunks."""
 
@@ -8,12 +8,14 @@ from typing import Any, Callable, Iterator, Mapping, NamedTuple, Optional, Seque
 
 from google.protobuf import any_pb2
 from google.protobuf import message as pb_message
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.registry import FlowRegistry
+from grr_response_core.lib.util import random
 from grr_response_core.stats import metrics
 from grr_response_server import access_control
 from grr_response_server import action_registry
@@ -149,6 +151,7 @@ class FlowBase(metaclass=FlowRegistry):
     self.completed_requests = []
     self.replies_to_process = []
     self.replies_to_write = []
+    self.output_plugin_requests = []
 
     self._state = None
 
@@ -742,7 +745,9 @@ class FlowBase(metaclass=FlowRegistry):
         method(responses)
 
       if self.replies_to_process:
-        if self.rdf_flow.parent_hunt_id and not self.rdf_flow.parent_flow_id:
+        if config.CONFIG["Worker.output_plugin_queue"]:
+          self._QueueRepliesForOutputPlugins(self.replies_to_process)
+        elif self.rdf_flow.parent_hunt_id and not self.rdf_flow.parent_flow_id:
           self._ProcessRepliesWithHuntOutputPlugins(self.replies_to_process)
         else:
           self._ProcessRepliesWithFlowOutputPlugins(self.replies_to_process)
@@ -762,17 +767,26 @@ class FlowBase(metaclass=FlowRegistry):
 
       self.Error(error_message=msg, backtrace=traceback.format_exc())
 
-  def ProcessAllReadyRequests(self) -> Tuple[int, int]:
+  def ProcessAllReadyRequests(
+      self,
+      request_dict: Optional[db.ReadyFlowRequests] = None,
+  ) -> Tuple[int, int]:
     """Processes all requests that are due to run.
 
+    Args:
+      request_dict: Requests ready for processing, as returned by
+        `ReadFlowRequestsReadyForProcessing`. If not given, they are read from
+        the database.
+
     Returns:
       (processed, incrementally_processed) The number of completed processed
       requests and the number of incrementally processed ones.
     """
-    request_dict = data_store.REL_DB.ReadFlowRequestsReadyForProcessing(
-        self.rdf_flow.client_id,
-        self.rdf_flow.flow_id,
-        next_needed_request=self.rdf_flow.next_request_to_process)
+    if request_dict is None:
+      request_dict = data_store.REL_DB.ReadFlowRequestsReadyForProcessing(
+          self.rdf_flow.client_id,
+          self.rdf_flow.flow_id,
+          next_needed_request=self.rdf_flow.next_request_to_process)
     if not request_dict:
       return (0, 0)
 
@@ -918,6 +932,59 @@ class FlowBase(metaclass=FlowRegistry):
         data_store.REL_DB.WriteFlowResults(self.replies_to_write)
       self.replies_to_write = []
 
+    if self.output_plugin_requests:
+      data_store.REL_DB.WriteOutputPluginRequests(self.output_plugin_requests)
+      self.output_plugin_requests = []
+
+  def _QueueRepliesForOutputPlugins(
+      self, replies: Sequence[rdf_flow_objects.FlowResult]) -> None:
+    """Queues replies to be processed by output plugin workers.
+
+    Requests are queued for every output plugin of the flow (or of the hunt
+    for top-level hunt-induced flows). Replies are split into several requests
+    if they are larger than `Worker.output_plugin_request_max_size`. Requests
+    are written to the database together with the replies in
+    `FlushQueuedMessages`.
+
+    Args:
+      replies: Replies to process.
+    """
+    client_id = self.rdf_flow.client_id
+    flow_id = self.rdf_flow.flow_id
+    chunks = list(
+        _ChunkBySize(replies,
+                     config.CONFIG["Worker.output_plugin_request_max_size"]))
+
+    if self.rdf_flow.parent_hunt_id and not self.rdf_flow.parent_flow_id:
+      hunt_id = self.rdf_flow.parent_hunt_id
+      hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
+      for index in range(len(hunt_obj.output_plugins)):
+        for chunk in chunks:
+          self.output_plugin_requests.append(
+              rdf_flow_objects.OutputPluginRequest(
+                  request_id=random.UInt64(),
+                  client_id=client_id,
+                  flow_id=flow_id,
+                  hunt_id=hunt_id,
+                  output_plugin_id="%d" % index,
+                  source_urn=rdfvalue.RDFURN("hunts").Add(hunt_id),
+                  results=chunk))
+      return
+
+    for index, output_plugin_state in enumerate(
+        self.rdf_flow.output_plugins_states):
+      for chunk in chunks:
+        self.output_plugin_requests.append(
+            rdf_flow_objects.OutputPluginRequest(
+                request_id=random.UInt64(),
+                client_id=client_id,
+                flow_id=flow_id,
+                hunt_id=self.rdf_flow.parent_hunt_id,
+                output_plugin_id="%d" % index,
+                output_plugin_state=output_plugin_state,
+                source_urn=self.rdf_flow.long_flow_id,
+                results=chunk))
+
   def _ProcessRepliesWithHuntOutputPlugins(
       self, replies: Sequence[rdf_flow_objects.FlowResponse]) -> None:
     """Applies output plugins to hunt results."""
@@ -1023,6 +1090,8 @@ class FlowBase(metaclass=FlowRegistry):
     flow_obj.completed_requests = []
     self.replies_to_write.extend(flow_obj.replies_to_write)
     flow_obj.replies_to_write = []
+    self.output_plugin_requests.extend(flow_obj.output_plugin_requests)
+    flow_obj.output_plugin_requests = []
 
   def ShouldSendNotifications(self) -> bool:
     return bool(not self.rdf_flow.parent_flow_id and
@@ -1197,6 +1266,37 @@ def UseProto2AnyResponses(
   return Wrapper
 
 
+def _ChunkBySize(
+    replies: Sequence[rdf_flow_objects.FlowResult],
+    max_size: int,
+) -> Iterator[Sequence[rdf_flow_objects.FlowResult]]:
+  """Splits replies into chunks of at most `max_size` serialized bytes.
+
+  A reply larger than `max_size` is put into a chunk of its own.
+
+  Args:
+    replies: Replies to split.
+    max_size: Maximum serialized size of the replies in a chunk.
+
+  Yields:
+    Lists of replies.
+  """
+  chunk = []
+  chunk_size = 0
+  for reply in replies:
+    size = len(reply.SerializeToBytes())
+    if chunk and chunk_size + size > max_size:
+      yield chunk
+      chunk = []
+      chunk_size = 0
+
+    chunk.append(reply)
+    chunk_size += size
+
+  if chunk:
+    yield chunk
+
+
 def _TerminateFlow(
     rdf_flow: rdf_flow_objects.Flow,
     reason: Optional[str] = None,
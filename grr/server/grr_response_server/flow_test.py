@@ -2,6 +2,7 @@
 """Tests for flows."""
 
 import random
+import sys
 from unittest import mock
 
 from absl import app
@@ -18,6 +19,7 @@ from grr_response_server import data_store
 from grr_response_server import flow
 from grr_response_server import flow_base
 from grr_response_server import flow_responses
+from grr_response_server import output_plugin_queue
 from grr_response_server import server_stubs
 from grr_response_server import worker_lib
 from grr_response_server.databases import db
@@ -597,6 +599,61 @@ class FlowOutputPluginsTest(BasicFlowTest):
     self.assertEqual(test_output_plugins.DummyFlowOutputPlugin.num_responses, 1)
 
 
+class QueuedFlowOutputPluginsTest(FlowOutputPluginsTest):
+  """Runs the flow output plugin tests with the output plugin queue enabled."""
+
+  def setUp(self):
+    super().setUp()
+
+    overrider = test_lib.ConfigOverrider({
+        "Worker.output_plugin_queue": True,
+        "Worker.output_plugin_max_attempts": 1,
+    })
+    overrider.Start()
+    self.addCleanup(overrider.Stop)
+
+    self.processor = output_plugin_queue.OutputPluginRequestProcessor(
+        num_threads=2)
+    self.addCleanup(self.processor.Stop)
+
+  def RunFlow(self, *args, **kwargs):
+    flow_id = super().RunFlow(*args, **kwargs)
+    self.processor.ProcessRequests(
+        data_store.REL_DB.ReadOutputPluginRequests())
+    self.assertEmpty(data_store.REL_DB.ReadOutputPluginRequests())
+    return flow_id
+
+  def _ReadOutputPluginLogs(self, flow_id):
+    return data_store.REL_DB.ReadFlowOutputPluginLogEntries(
+        self.client_id, flow_id, "0", 0, sys.maxsize)
+
+  def testFlowLogsSuccessfulOutputPluginProcessing(self):
+    flow_id = self.RunFlow(output_plugins=[
+        rdf_output_plugin.OutputPluginDescriptor(
+            plugin_name="DummyFlowOutputPlugin")
+    ])
+
+    logs = self._ReadOutputPluginLogs(flow_id)
+    self.assertLen(logs, 1)
+    self.assertEqual(logs[0].log_entry_type,
+                     rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType.LOG)
+    self.assertEqual(logs[0].message, "Processed 1 replies.")
+
+  def testFlowLogsFailedOutputPluginProcessing(self):
+    flow_id = self.RunFlow(output_plugins=[
+        rdf_output_plugin.OutputPluginDescriptor(
+            plugin_name="FailingDummyFlowOutputPlugin")
+    ])
+
+    logs = self._ReadOutputPluginLogs(flow_id)
+    self.assertLen(logs, 1)
+    self.assertEqual(
+        logs[0].log_entry_type,
+        rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType.ERROR)
+    self.assertEqual(logs[0].message,
+                     "Error while processing 1 replies: Oh no!")
+
+
 class ScheduleFlowTest(flow_test_lib.FlowTestsBaseclass):
 
   def SetupUser(self, username="u0"):
@@ -992,6 +1049,27 @@ class WorkerTest(BasicFlowTest):
       with self.assertRaises(worker_lib.FlowHasNothingToProcessError):
         worker.ProcessFlow(fpr)
 
+  def testProcessFlowsProcessesBatchOfFlows(self):
+    flow_ids = [
+        flow.StartFlow(flow_cls=CallStateFlow, client_id=self.client_id)
+        for _ in range(3)
+    ]
+    requests = data_store.REL_DB.ReadFlowProcessingRequests()
+    self.assertLen(requests, 3)
+
+    worker = flow_test_lib.TestWorker()
+    # A request for an unknown flow must not prevent processing of others.
+    worker.ProcessFlows(requests + [
+        rdf_flows.FlowProcessingRequest(
+            client_id=self.client_id, flow_id="ABCDEF12")
+    ])
+
+    self.assertEmpty(data_store.REL_DB.ReadFlowProcessingRequests())
+    for flow_id in flow_ids:
+      rdf_flow = data_store.REL_DB.ReadFlowObject(self.client_id, flow_id)
+      self.assertEqual(rdf_flow.flow_state, rdf_flow.FlowState.FINISHED)
+      self.assertFalse(rdf_flow.processing_on)
+
 
 def main(argv):
   # Run the full test suite
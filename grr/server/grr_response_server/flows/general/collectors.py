@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 """Flows for handling the collection for artifacts."""
 
+import hashlib
 import logging
-from typing import Optional, Sequence, Text
+import threading
+from typing import List, Optional, Sequence, Text
 
 from grr_response_core import config
 from grr_response_core.lib import artifact_utils
 from grr_response_core.lib import parsers
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.parsers import windows_persistence
 from grr_response_core.lib.rdfvalues import anomaly as rdf_anomaly
 from grr_response_core.lib.rdfvalues import artifacts as rdf_artifacts
@@ -34,6 +37,56 @@ from grr_response_server.flows.general import transfer
 # pylint: enable=unused-import
 _MAX_DEBUG_RESPONSES_STRING_LENGTH = 100000
 
+_expansion_cache_lock = threading.Lock()
+_expansion_cache: Optional[utils.FastStore] = None
+_expansion_cache_generation: Optional[int] = None
+
+
+def _GetExpansionCache() -> utils.FastStore:
+  """Returns the cache of artifact expansions and interpolations.
+
+  Clients with equal knowledge bases (or just equal OS, for expansions) get the
+  same results, so these are shared between all flows of the process. The
+  cache is flushed whenever the artifact registry changes.
+
+  Returns:
+    A LRU cache.
+  """
+  global _expansion_cache, _expansion_cache_generation
+
+  generation = artifact_registry.REGISTRY.Generation()
+  with _expansion_cache_lock:
+    if _expansion_cache is None:
+      _expansion_cache = utils.FastStore(
+          max_size=config.CONFIG["Artifacts.expansion_cache_size"])
+    if generation != _expansion_cache_generation:
+      _expansion_cache.Flush()
+      _expansion_cache_generation = generation
+    return _expansion_cache
+
+
+def _KnowledgeBaseFingerprint(
+    knowledge_base: rdf_client.KnowledgeBase) -> bytes:
+  return hashlib.sha256(knowledge_base.SerializeToBytes()).digest()
+
+
+def _InterpolateKbAttributes(
+    pattern: Text,
+    knowledge_base: rdf_client.KnowledgeBase,
+) -> List[Text]:
+  """Memoizing version of `artifact_utils.InterpolateKbAttributes`."""
+  cache = _GetExpansionCache()
+  key = ("interpolation", pattern, _KnowledgeBaseFingerprint(knowledge_base))
+  try:
+    return list(cache.Get(key))
+  except KeyError:
+    pass
+
+  results = tuple(
+      artifact_utils.InterpolateKbAttributes(pattern, knowledge_base))
+  cache.Put(key, results)
+  return list(results)
+
 
 def _ReadClientKnowledgeBase(client_id, allow_uninitialized=False):
   client = data_store.REL_DB.ReadClientSnapshot(client_id)
@@ -584,7 +637,7 @@ class ArtifactCollectorFlow(flow_base.FlowBase):
       knowledgebase = self.state.knowledge_base
 
     try:
-      return artifact_utils.InterpolateKbAttributes(pattern, knowledgebase)
+      return _InterpolateKbAttributes(pattern, knowledgebase)
     except artifact_utils.KbInterpolationMissingAttributesError as error:
       if self.args.old_client_snapshot_fallback:
         return []
@@ -1091,6 +1144,28 @@ def GetArtifactCollectorArgs(flow_args, knowledge_base):
   args.ignore_interpolation_errors = flow_args.ignore_interpolation_errors
   args.max_file_size = flow_args.max_file_size
 
+  path_type = _GetPathType(flow_args, knowledge_base.os)
+
+  # Expansions only depend on the client's OS, not on the rest of its
+  # knowledge base.
+  cache = _GetExpansionCache()
+  key = ("expansion", tuple(flow_args.artifact_list),
+         bool(flow_args.recollect_knowledge_base), knowledge_base.os,
+         int(path_type), int(flow_args.max_file_size))
+  try:
+    expanded_artifacts = cache.Get(key)
+  except KeyError:
+    expanded_artifacts = tuple(
+        _ExpandArtifacts(flow_args, knowledge_base, path_type))
+    cache.Put(key, expanded_artifacts)
+
+  for expanded_artifact in expanded_artifacts:
+    args.artifacts.append(expanded_artifact.Copy())
+  return args
+
+
+def _ExpandArtifacts(flow_args, knowledge_base, path_type):
+  """Yields expanded artifacts requested by the flow arguments."""
   if not flow_args.recollect_knowledge_base:
     artifact_names = flow_args.artifact_list
   else:
@@ -1100,7 +1175,7 @@ def GetArtifactCollectorArgs(flow_args, knowledge_base):
 
   expander = ArtifactExpander(
       knowledge_base,
-      _GetPathType(flow_args, knowledge_base.os),
+      path_type,
       flow_args.max_file_size,
   )
   for artifact_name in artifact_names:
@@ -1110,9 +1185,7 @@ def GetArtifactCollectorArgs(flow_args, knowledge_base):
     if artifact_name in expander.processed_artifacts:
       continue
     requested_by_user = artifact_name in flow_args.artifact_list
-    for expanded_artifact in expander.Expand(rdf_artifact, requested_by_user):
-      args.artifacts.append(expanded_artifact)
-  return args
+    yield from expander.Expand(rdf_artifact, requested_by_user)
 
 
 def MeetsOSConditions(knowledge_base, source):
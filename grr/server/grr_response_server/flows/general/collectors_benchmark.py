@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""Benchmark measuring artifact expansion for knowledge base collection.
+
+The benchmark prepares `KnowledgeBase` artifact collection for many synthetic
+clients the way `ClientArtifactCollector` and `ArtifactCollectorFlow` do it:
+artifacts (and their dependencies) are expanded with `GetArtifactCollectorArgs`
+and all paths of the expanded sources are interpolated with the client's
+knowledge base. It is run twice: once with the expansion cache disabled and
+once with the default cache.
+"""
+
+import time
+from unittest import mock
+
+from absl import app
+from absl import flags
+
+from grr_response_core import config
+from grr_response_core.lib import config_lib
+from grr_response_core.lib.rdfvalues import artifacts as rdf_artifacts
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_server import artifact
+from grr_response_server import data_store
+from grr_response_server.databases import db
+from grr_response_server.databases import mem
+from grr_response_server.flows.general import collectors
+
+_CLIENTS = flags.DEFINE_integer(
+    "clients",
+    default=10000,
+    help="Number of synthetic clients to expand artifacts for.",
+)
+
+_KNOWLEDGE_BASES = flags.DEFINE_integer(
+    "knowledge_bases",
+    default=100,
+    help="Number of distinct knowledge bases of the synthetic clients.",
+)
+
+_ARTIFACTS = flags.DEFINE_list(
+    "artifacts",
+    default=[],
+    help="Artifacts to collect. Defaults to Artifacts.knowledge_base.",
+)
+
+_OSES = ["Linux", "Windows", "Darwin"]
+
+
+class _NoCache(object):
+  """A cache that never holds anything."""
+
+  def Get(self, key):
+    raise KeyError(key)
+
+  def Put(self, key, value):
+    del key, value  # Unused.
+
+
+def _KnowledgeBase(idx):
+  users = [
+      rdf_client.User(
+          username="user%d" % i,
+          homedir="/home/user%d" % i,
+          userprofile="C:\\Users\\user%d" % i,
+          sid="S-1-5-21-%d" % i) for i in range(idx % 5 + 1)
+  ]
+  return rdf_client.KnowledgeBase(
+      os=_OSES[idx % len(_OSES)],
+      fqdn="host%d.example.com" % idx,
+      environ_systemroot="C:\\Windows",
+      environ_systemdrive="C:",
+      environ_windir="C:\\Windows",
+      users=users)
+
+
+def _Expand(knowledge_bases):
+  """Expands and interpolates knowledge base artifacts for all clients."""
+  artifact_list = _ARTIFACTS.value or config.CONFIG["Artifacts.knowledge_base"]
+  flow_args = rdf_artifacts.ArtifactCollectorFlowArgs(
+      artifact_list=artifact_list,
+      recollect_knowledge_base=True,
+      ignore_interpolation_errors=True)
+
+  num_paths = 0
+  for kb in knowledge_bases:
+    args = collectors.GetArtifactCollectorArgs(flow_args, kb)
+    for expanded_artifact in args.artifacts:
+      for source in expanded_artifact.sources:
+        for path in source.base_source.attributes.get("paths", []):
+          try:
+            # pylint: disable=protected-access
+            num_paths += len(collectors._InterpolateKbAttributes(path, kb))
+            # pylint: enable=protected-access
+          except collectors.artifact_utils.Error:
+            pass
+  return num_paths
+
+
+def _Time(knowledge_bases):
+  start = time.time()
+  num_paths = _Expand(knowledge_bases)
+  return time.time() - start, num_paths
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  config_lib.ParseConfigCommandLine()
+  # Artifacts are only read from the database when the registry is reloaded,
+  # so an in-memory database is enough.
+  data_store.REL_DB = db.DatabaseValidationWrapper(mem.InMemoryDB())
+  artifact.LoadArtifactsOnce()
+
+  # Clients are (de)serialized separately by every flow, so knowledge bases
+  # are never shared between them.
+  knowledge_bases = [
+      _KnowledgeBase(i % _KNOWLEDGE_BASES.value).Copy()
+      for i in range(_CLIENTS.value)
+  ]
+
+  with mock.patch.object(
+      collectors, "_GetExpansionCache", return_value=_NoCache()):
+    uncached_s, uncached_paths = _Time(knowledge_bases)
+  cached_s, cached_paths = _Time(knowledge_bases)
+
+  if uncached_paths != cached_paths:
+    raise AssertionError("Cached expansion yielded %d paths instead of %d." %
+                         (cached_paths, uncached_paths))
+
+  print("clients\tpaths\tuncached\tcached\tspeedup")
+  print("{clients}\t{paths}\t{uncached:.2f}s\t{cached:.2f}s\t{speedup:.2f}x"
+        .format(
+            clients=_CLIENTS.value,
+            paths=cached_paths,
+            uncached=uncached_s,
+            cached=cached_s,
+            speedup=uncached_s / cached_s))
+
+
+if __name__ == "__main__":
+  app.run(main)
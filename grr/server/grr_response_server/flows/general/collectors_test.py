@@ -16,6 +16,7 @@ import psutil
 from grr_response_client.client_actions import artifact_collector
 from grr_response_client.client_actions import standard
 from grr_response_core import config
+from grr_response_core.lib import artifact_utils
 from grr_response_core.lib import factory
 from grr_response_core.lib import parser
 from grr_response_core.lib import parsers
@@ -1063,6 +1064,70 @@ class GetArtifactCollectorArgsTest(test_lib.GRRBaseTest):
     self.assertEqual(art_obj.name, "TestArtifactFilesArtifact")
     self.assertTrue(art_obj.requested_by_user)
 
+  def _CountExpansions(self, fn):
+    with mock.patch.object(
+        collectors.ArtifactExpander,
+        "Expand",
+        autospec=True,
+        side_effect=collectors.ArtifactExpander.Expand) as expand:
+      result = fn()
+    return result, expand.call_count
+
+  def testExpansionsAreCachedPerOS(self):
+    self.SetOS("Linux")
+    args, num_expansions = self._CountExpansions(
+        lambda: self.ArtifactCollectorArgs(["TestOSAgnostic"]))
+    self.assertGreater(num_expansions, 0)
+
+    # A different client with the same OS gets the cached expansion.
+    self.knowledge_base = rdf_client.KnowledgeBase(os="Linux", fqdn="foo")
+    cached_args, num_expansions = self._CountExpansions(
+        lambda: self.ArtifactCollectorArgs(["TestOSAgnostic"]))
+    self.assertEqual(num_expansions, 0)
+    self.assertEqual(cached_args.artifacts, args.artifacts)
+    self.assertEqual(cached_args.knowledge_base.fqdn, "foo")
+
+    self.SetOS("Windows")
+    _, num_expansions = self._CountExpansions(
+        lambda: self.ArtifactCollectorArgs(["TestOSAgnostic"]))
+    self.assertGreater(num_expansions, 0)
+
+  def testExpansionCacheIsFlushedWhenRegistryChanges(self):
+    self.SetOS("Linux")
+    self.ArtifactCollectorArgs(["TestCmdArtifact"])
+
+    artifact_obj = artifact_registry.REGISTRY.GetArtifact("TestCmdArtifact")
+    artifact_registry.REGISTRY.RegisterArtifact(
+        artifact_obj, overwrite_if_exists=True, overwrite_system_artifacts=True)
+
+    _, num_expansions = self._CountExpansions(
+        lambda: self.ArtifactCollectorArgs(["TestCmdArtifact"]))
+    self.assertGreater(num_expansions, 0)
+
+  def testInterpolationsAreCachedPerKnowledgeBase(self):
+    pattern = "/home/%%users.username%%"
+    kb = rdf_client.KnowledgeBase(
+        os="Linux", users=[rdf_client.User(username="foo")])
+
+    with mock.patch.object(
+        artifact_utils,
+        "InterpolateKbAttributes",
+        wraps=artifact_utils.InterpolateKbAttributes) as interpolate:
+      # pylint: disable=protected-access
+      self.assertEqual(
+          collectors._InterpolateKbAttributes(pattern, kb), ["/home/foo"])
+      self.assertEqual(
+          collectors._InterpolateKbAttributes(pattern, kb.Copy()),
+          ["/home/foo"])
+      self.assertEqual(interpolate.call_count, 1)
+
+      kb.users.Append(rdf_client.User(username="bar"))
+      self.assertCountEqual(
+          collectors._InterpolateKbAttributes(pattern, kb),
+          ["/home/foo", "/home/bar"])
+      self.assertEqual(interpolate.call_count, 2)
+      # pylint: enable=protected-access
+
 
 class TestCmdParser(parser.CommandParser):
   output_types = [rdf_client.SoftwarePackages]
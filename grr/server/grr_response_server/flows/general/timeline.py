@@ -6,10 +6,12 @@ from typing import Optional
 from typing import Text
 
 from google.protobuf import any_pb2
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
 from grr_response_core.lib.util import timeline
 from grr_response_proto import timeline_pb2
+from grr_response_server import columnar_timeline
 from grr_response_server import data_store
 from grr_response_server import flow_base
 from grr_response_server import flow_responses
@@ -55,6 +57,12 @@ class TimelineFlow(flow_base.FlowBase):
 
     self.state.progress = rdf_timeline.TimelineProgress()
 
+    if config.CONFIG["Server.timeline_columnar_index"]:
+      # Every batch of responses writes a part of the segment index linked to
+      # the previous one, the state only keeps the last part. An empty value
+      # means that no part was written yet.
+      self.state[_COLUMNAR_INDEX_STATE_KEY] = b""
+
     if self.rrg_support:
       args = rrg_get_filesystem_timeline_pb2.Args()
       args.root.raw_bytes = self.args.root
@@ -84,6 +92,7 @@ class TimelineFlow(flow_base.FlowBase):
         blob_ids.append(rdf_objects.BlobID(blob_id))
 
     data_store.BLOBS.WaitForBlobs(blob_ids, timeout=_BLOB_STORE_TIMEOUT)
+    self._WriteColumnarSegments(blob_ids)
 
     for response in responses:
       self.SendReply(response)
@@ -116,6 +125,7 @@ class TimelineFlow(flow_base.FlowBase):
       self.state.progress.total_entry_count += result.entry_count
 
     data_store.BLOBS.WaitForBlobs(blob_ids, timeout=_BLOB_STORE_TIMEOUT)
+    self._WriteColumnarSegments(blob_ids)
 
     for flow_result in flow_results:
       self.SendReply(flow_result)
@@ -123,6 +133,41 @@ class TimelineFlow(flow_base.FlowBase):
   def GetProgress(self) -> rdf_timeline.TimelineProgress:
     return self.state.progress
 
+  def _WriteColumnarSegments(self, blob_ids: list[rdf_objects.BlobID]) -> None:
+    """Stores entries of the given blobs in the columnar format."""
+    last_index_blob_id = self.state.get(_COLUMNAR_INDEX_STATE_KEY)
+    if last_index_blob_id is None:
+      # The flow was started with the columnar format disabled.
+      return
+
+    index = columnar_timeline.SegmentIndex()
+    blobs = data_store.BLOBS.ReadBlobs(blob_ids)
+    entries = timeline.DeserializeTimelineEntryProtoStream(
+        blobs[blob_id] for blob_id in blob_ids)
+    try:
+      columnar_timeline.WriteSegments(
+          entries,
+          index,
+          segment_size=config.CONFIG["Server.timeline_columnar_segment_size"])
+    except Exception as e:  # pylint: disable=broad-except
+      # The columnar format is only used to speed up queries, so the flow
+      # doesn't fail if it can't be built. Queries fall back to decoding all
+      # entries instead.
+      self.Log("Failed to store the timeline in the columnar format: %s", e)
+      self.state[_COLUMNAR_INDEX_STATE_KEY] = None
+      return
+
+    if not index:
+      return
+
+    if last_index_blob_id:
+      previous_blob_id = rdf_objects.BlobID(last_index_blob_id)
+    else:
+      previous_blob_id = None
+
+    index_blob_id = columnar_timeline.WriteIndexPart(index, previous_blob_id)
+    self.state[_COLUMNAR_INDEX_STATE_KEY] = index_blob_id.AsBytes()
+
 
 def ProtoEntries(
     client_id: Text,
@@ -185,6 +230,29 @@ def Blobs(
       yield blob
 
 
+def ColumnarIndex(
+    client_id: str,
+    flow_id: str,
+) -> Optional[columnar_timeline.SegmentIndex]:
+  """Retrieves an index of the columnar timeline of the specified flow.
+
+  Args:
+    client_id: An identifier of a client of the flow.
+    flow_id: An identifier of the flow.
+
+  Returns:
+    An index of the columnar timeline segments or `None` if the flow did not
+    store its results in the columnar format.
+  """
+  flow_obj = data_store.REL_DB.ReadFlowObject(client_id, flow_id)
+  last_index_blob_id = flow_obj.persistent_data.ToDict().get(
+      _COLUMNAR_INDEX_STATE_KEY)
+  if not last_index_blob_id:
+    return None
+
+  return columnar_timeline.ReadIndex(rdf_objects.BlobID(last_index_blob_id))
+
+
 def FilesystemType(client_id: str, flow_id: str) -> Optional[str]:
   """Retrieves a filesystem type information of the specified timeline flow.
 
@@ -219,3 +287,7 @@ _READ_FLOW_MAX_RESULTS_COUNT = 1024
 # before the flow receives results from the client. This delay should usually be
 # very quick, so the timeout used here should be more than enough.
 _BLOB_STORE_TIMEOUT = rdfvalue.Duration.From(30, rdfvalue.SECONDS)
+
+# A key of the flow state under which the blob id of the last written part of
+# the columnar timeline index is stored.
+_COLUMNAR_INDEX_STATE_KEY = "columnar_index_blob_id"
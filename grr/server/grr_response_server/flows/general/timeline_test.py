@@ -12,6 +12,7 @@ from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
 from grr_response_core.lib.util import temp
 from grr_response_proto import timeline_pb2
 from grr_response_server import blob_store as abstract_bs
+from grr_response_server import columnar_timeline
 from grr_response_server import flow_responses
 from grr_response_server.databases import db as abstract_db
 from grr_response_server.databases import db_test_utils
@@ -22,6 +23,7 @@ from grr.test_lib import action_mocks
 from grr.test_lib import db_test_lib
 from grr.test_lib import filesystem_test_lib
 from grr.test_lib import flow_test_lib
+from grr.test_lib import test_lib
 from grr.test_lib import testing_startup
 from grr_response_proto.rrg.action import get_filesystem_timeline_pb2 as rrg_get_filesystem_timeline_pb2
 
@@ -107,6 +109,34 @@ class TimelineTest(flow_test_lib.FlowTestsBaseclass):
       self.assertEqual(entries_by_path[thud_filepath].size, 4)
       self.assertEqual(entries_by_path[blargh_filepath].size, 6)
 
+  def testWritesColumnarTimeline(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      for idx in range(8):
+        filepath = os.path.join(dirpath, "foo", f"bar{idx}")
+        filesystem_test_lib.CreateFile(filepath, content=b"x" * idx)
+
+      flow_id = self._RunFlow(dirpath.encode("utf-8"))
+
+    entries = list(
+        timeline_flow.ProtoEntries(client_id=self.client_id, flow_id=flow_id))
+    self.assertLen(entries, 10)
+
+    index = timeline_flow.ColumnarIndex(
+        client_id=self.client_id, flow_id=flow_id)
+    self.assertIsNotNone(index)
+    self.assertEqual(index.entry_count, len(entries))
+
+    columnar_entries = columnar_timeline.Query(index, columnar_timeline.Filter())
+    self.assertEqual(list(columnar_entries), entries)
+
+  def testDoesNotWriteColumnarTimelineIfDisabled(self):
+    with test_lib.ConfigOverrider({"Server.timeline_columnar_index": False}):
+      with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+        flow_id = self._RunFlow(dirpath.encode("utf-8"))
+
+    self.assertIsNone(
+        timeline_flow.ColumnarIndex(client_id=self.client_id, flow_id=flow_id))
+
   def testProgress(self):
     client_id = self.client_id
 
@@ -191,6 +221,10 @@ class TimelineTest(flow_test_lib.FlowTestsBaseclass):
   # TODO(hanuszczak): Add tests for timestamps.
 
   def _Collect(self, root: bytes) -> Iterator[timeline_pb2.TimelineEntry]:
+    flow_id = self._RunFlow(root)
+    return timeline_flow.ProtoEntries(client_id=self.client_id, flow_id=flow_id)
+
+  def _RunFlow(self, root: bytes) -> str:
     args = rdf_timeline.TimelineArgs(root=root)
 
     flow_id = flow_test_lib.TestFlowHelper(
@@ -202,7 +236,7 @@ class TimelineTest(flow_test_lib.FlowTestsBaseclass):
 
     flow_test_lib.FinishAllFlowsOnClient(self.client_id)
 
-    return timeline_flow.ProtoEntries(client_id=self.client_id, flow_id=flow_id)
+    return flow_id
 
   @db_test_lib.WithDatabase
   @db_test_lib.WithDatabaseBlobstore
@@ -6,7 +6,6 @@ from typing import Any
 from typing import Mapping
 from typing import Optional
 from typing import Sequence
-import zlib
 
 from google.protobuf import any_pb2
 from grr_response_core.lib import constants
@@ -16,8 +15,8 @@ from grr_response_core.lib.rdfvalues import client_action as rdf_client_action
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import crypto as rdf_crypto
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
-from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_core.lib.util import compression
 from grr_response_core.lib.util import text
 from grr_response_proto import flows_pb2
 from grr_response_server import data_store
@@ -1182,15 +1181,8 @@ class BlobHandler(message_handlers.MessageHandler):
       if not data:
         continue
 
-      ct = rdf_protodict.DataBlob.CompressionType
-      if blob.compression == ct.ZCOMPRESSION:
-        data = zlib.decompress(data)
-      elif blob.compression == ct.UNCOMPRESSED:
-        pass
-      else:
-        raise ValueError("Unsupported compression")
-
-      blobs.append(data)
+      # Raises a ValueError if the blob can't be decompressed.
+      blobs.append(compression.Decompress(data, blob.compression))
 
     data_store.BLOBS.WriteBlobsWithUnknownHashes(blobs)
 
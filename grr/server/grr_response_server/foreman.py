@@ -1,11 +1,23 @@
 #!/usr/bin/env python
 """The GRR Foreman."""
 
+import bisect
+import collections
 import logging
-
+import threading
+from typing import AbstractSet
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_server import data_store
 from grr_response_server import flow
+from grr_response_server import foreman_rules
 from grr_response_server import hunt
 from grr_response_server import message_handlers
 from grr_response_server.databases import db
@@ -19,6 +31,237 @@ class UnknownHuntTypeError(Error):
   pass
 
 
+# Operating system names as matched by `ForemanOsClientRule`.
+_OS_NAMES = ("Windows", "Linux", "Darwin")
+
+
+def _OsName(os_string: str) -> Optional[str]:
+  for os_name in _OS_NAMES:
+    if os_string.startswith(os_name):
+      return os_name
+  return None
+
+
+class IndexedRule(object):
+  """A foreman rule with preconditions that are cheap to check.
+
+  The preconditions are derived from the OS and label rules of rule sets that
+  have to match as a whole. A client that doesn't meet them can't match the
+  rule, so the full (and possibly expensive) evaluation can be skipped.
+  """
+
+  def __init__(self, rule: foreman_rules.ForemanCondition):
+    self.rule = rule
+    # OS names the client has to run, None if the rule doesn't restrict it.
+    self.os_names: Optional[FrozenSet[str]] = None
+    # Sets of label names; the client has to have a label from each of them.
+    self.label_sets: List[FrozenSet[str]] = []
+
+    rule_set = rule.client_rule_set
+    rule_set_mode = foreman_rules.ForemanClientRuleSet.MatchMode
+    if rule_set.match_mode != rule_set_mode.MATCH_ALL:
+      return
+
+    label_mode = foreman_rules.ForemanLabelClientRule.MatchMode
+    for client_rule in rule_set.rules:
+      client_rule = client_rule.UnionCast()
+
+      if isinstance(client_rule, foreman_rules.ForemanOsClientRule):
+        enabled = (client_rule.os_windows, client_rule.os_linux,
+                   client_rule.os_darwin)
+        os_names = frozenset(n for n, e in zip(_OS_NAMES, enabled) if e)
+        if self.os_names is None:
+          self.os_names = os_names
+        else:
+          self.os_names &= os_names
+
+      elif isinstance(client_rule, foreman_rules.ForemanLabelClientRule):
+        if client_rule.match_mode == label_mode.MATCH_ALL:
+          self.label_sets.extend(
+              frozenset([name]) for name in client_rule.label_names)
+        elif client_rule.match_mode == label_mode.MATCH_ANY:
+          self.label_sets.append(frozenset(client_rule.label_names))
+
+  def MatchesLabels(self, label_names: AbstractSet[str]) -> bool:
+    """Checks whether a client with given labels meets label preconditions."""
+    return all(not label_set.isdisjoint(label_names)
+               for label_set in self.label_sets)
+
+  def MayMatch(self, os_string: str, label_names: AbstractSet[str]) -> bool:
+    """Checks whether a client meets all preconditions of the rule."""
+    if self.os_names is not None and _OsName(os_string) not in self.os_names:
+      return False
+    return self.MatchesLabels(label_names)
+
+
+class _RuleList(object):
+  """Indexed rules ordered by their creation time."""
+
+  def __init__(self):
+    self.rules: List[IndexedRule] = []
+    self._creation_times: List[rdfvalue.RDFDatetime] = []
+
+  def Add(self, rule: IndexedRule) -> None:
+    """Adds a rule, rules have to be added in order of creation."""
+    self.rules.append(rule)
+    self._creation_times.append(rule.rule.creation_time)
+
+  def CreatedAfter(self, time: rdfvalue.RDFDatetime) -> List[IndexedRule]:
+    """Returns rules created strictly after the given time."""
+    return self.rules[bisect.bisect_right(self._creation_times, time):]
+
+
+class ForemanRuleIndex(object):
+  """Foreman rules indexed by their creation time, labels and OS names.
+
+  Every rule requiring labels is indexed under the labels of one of its label
+  sets (the smallest one), since clients having none of them can't match it.
+  Every rule restricting the OS is indexed under the OS names it allows. This
+  way only rules that may match a client have to be looked at, no matter how
+  many rules there are.
+  """
+
+  def __init__(self, rules: Sequence[foreman_rules.ForemanCondition]):
+    self._all = _RuleList()
+    self._without_labels = _RuleList()
+    self._by_label: Dict[str, _RuleList] = collections.defaultdict(_RuleList)
+    self._without_os = _RuleList()
+    self._by_os: Dict[str, _RuleList] = collections.defaultdict(_RuleList)
+    self._positions: Dict[int, int] = {}
+
+    indexed_rules = sorted((IndexedRule(r) for r in rules),
+                           key=lambda r: r.rule.creation_time)
+    for position, rule in enumerate(indexed_rules):
+      self._all.Add(rule)
+      self._positions[id(rule)] = position
+
+      if rule.label_sets:
+        for label_name in min(rule.label_sets, key=len):
+          self._by_label[label_name].Add(rule)
+      else:
+        self._without_labels.Add(rule)
+
+      if rule.os_names is None:
+        self._without_os.Add(rule)
+      else:
+        for os_name in rule.os_names:
+          self._by_os[os_name].Add(rule)
+
+    if rules:
+      self.latest_creation_time = indexed_rules[-1].rule.creation_time
+      self.earliest_expiration_time = min(r.expiration_time for r in rules)
+    else:
+      self.latest_creation_time = None
+      self.earliest_expiration_time = None
+
+  def __len__(self) -> int:
+    return len(self._all.rules)
+
+  def RulesCreatedAfter(self, time: rdfvalue.RDFDatetime) -> List[IndexedRule]:
+    """Returns rules created strictly after the given time."""
+    return self._all.CreatedAfter(time)
+
+  def HasRulesWithoutLabels(self, time: rdfvalue.RDFDatetime) -> bool:
+    """Checks whether rules created after the given time may match any labels."""
+    return bool(self._without_labels.CreatedAfter(time))
+
+  def _Sorted(self, rules: Iterable[IndexedRule]) -> List[IndexedRule]:
+    return sorted(rules, key=lambda r: self._positions[id(r)])
+
+  def _RulesForLabels(self, time: rdfvalue.RDFDatetime,
+                      label_names: AbstractSet[str]) -> Dict[int, IndexedRule]:
+    rules = {id(r): r for r in self._without_labels.CreatedAfter(time)}
+    for label_name in label_names:
+      rule_list = self._by_label.get(label_name)
+      if rule_list is not None:
+        rules.update((id(r), r) for r in rule_list.CreatedAfter(time))
+    return rules
+
+  def RulesMatchingLabels(self, time: rdfvalue.RDFDatetime,
+                          label_names: AbstractSet[str]) -> List[IndexedRule]:
+    """Returns rules created after the given time a client's labels meet."""
+    rules = self._RulesForLabels(time, label_names).values()
+    return self._Sorted(r for r in rules if r.MatchesLabels(label_names))
+
+  def RulesMayMatch(self, time: rdfvalue.RDFDatetime, os_string: str,
+                    label_names: AbstractSet[str]) -> List[IndexedRule]:
+    """Returns rules created after the given time a client may match.
+
+    Args:
+      time: Only rules created strictly after this time are returned.
+      os_string: The OS of the client.
+      label_names: Names of the client's labels.
+
+    Returns:
+      Rules whose preconditions the client meets (see `IndexedRule.MayMatch`),
+      ordered by their creation time.
+    """
+    rules = self._RulesForLabels(time, label_names)
+
+    os_rules = self._without_os.CreatedAfter(time)
+    os_name = _OsName(os_string)
+    if os_name in self._by_os:
+      os_rules = os_rules + self._by_os[os_name].CreatedAfter(time)
+
+    return self._Sorted(
+        r for r in os_rules
+        if id(r) in rules and r.MayMatch(os_string, label_names))
+
+
+class ForemanRulesCache(object):
+  """An in-process cache of indexed foreman rules of a database.
+
+  The cache is invalidated whenever foreman rules are changed through the
+  database object it belongs to (see `ForemanRulesCache.Get`), so hunts started
+  and stopped by this process are picked up right away.
+
+  Changes made by other processes (e.g. a hunt started in the AdminUI while the
+  foreman runs in a frontend) go unnoticed for up to `Foreman.rules_cache_ttl`.
+  Clients talking to the frontend in that window are checked against the old
+  rules; since the last foreman run of a client only advances to the latest
+  rule seen, such clients are still assigned new hunts on their next poll after
+  the cache expires.
+  """
+
+  def __init__(self, rel_db: db.DatabaseValidationWrapper):
+    self._lock = threading.Lock()
+    self._db = rel_db
+    self._version = None
+    self._expiration_time = None
+    self._index = None
+
+  def Get(self) -> ForemanRuleIndex:
+    """Returns the index of current foreman rules."""
+    # The database counts changes made through it. The version has to be read
+    # before the rules, so that changes made while the rules are being read
+    # invalidate the cache.
+    version = self._db.foreman_rules_version
+    now = rdfvalue.RDFDatetime.Now()
+
+    with self._lock:
+      if (self._index is not None and self._version == version and
+          now < self._expiration_time):
+        return self._index
+
+    index = ForemanRuleIndex(self._db.ReadAllForemanRules())
+
+    with self._lock:
+      self._version = version
+      self._expiration_time = now + config.CONFIG["Foreman.rules_cache_ttl"]
+      self._index = index
+
+    return index
+
+  def Flush(self) -> None:
+    with self._lock:
+      self._index = None
+
+
+def GetRulesCache() -> ForemanRulesCache:
+  """Returns the foreman rules cache of the current database."""
+  return data_store.REL_DB.GetCache("foreman_rules", ForemanRulesCache)
+
+
 # TODO(amoser): Now that Foreman rules are directly stored in the db,
 # consider removing this class altogether once the AFF4 Foreman has
 # been removed.
@@ -104,14 +347,14 @@ class Foreman(object):
     Returns:
       Number of assigned tasks.
     """
-    rules = data_store.REL_DB.ReadAllForemanRules()
-    if not rules:
+    rule_index = GetRulesCache().Get()
+    if not rule_index:
       return 0
 
     last_foreman_run, fleetspeak_validation_info = self._GetLastForemanRunTime(
         client_id)
 
-    latest_rule_creation_time = max(rule.creation_time for rule in rules)
+    latest_rule_creation_time = rule_index.latest_creation_time
 
     if latest_rule_creation_time <= last_foreman_run:
       return 0
@@ -120,29 +363,34 @@ class Foreman(object):
     self._SetLastForemanRunTime(client_id, latest_rule_creation_time,
                                 fleetspeak_validation_info)
 
-    relevant_rules = []
-    expired_rules = False
-
     now = rdfvalue.RDFDatetime.Now()
-
-    for rule in rules:
-      if rule.expiration_time < now:
-        expired_rules = True
-        continue
-      if rule.creation_time <= last_foreman_run:
-        continue
-
-      relevant_rules.append(rule)
+    expired_rules = rule_index.earliest_expiration_time < now
+
+    # Client labels are much cheaper to read than the full client info. If
+    # all new rules require labels, use them to reject rules early.
+    may_match = True
+    if not rule_index.HasRulesWithoutLabels(last_foreman_run):
+      label_names = set(
+          label.name for label in data_store.REL_DB.ReadClientLabels(client_id))
+      may_match = any(
+          r.rule.expiration_time >= now
+          for r in rule_index.RulesMatchingLabels(last_foreman_run, label_names))
 
     actions_count = 0
-    if relevant_rules:
+    if may_match:
       client_data = data_store.REL_DB.ReadClientFullInfo(client_id)
       if client_data is None:
         return
 
-      for rule in relevant_rules:
-        if rule.Evaluate(client_data):
-          actions_count += self._RunAction(rule, client_id)
+      os_string = client_data.last_snapshot.knowledge_base.os or ""
+      label_names = client_data.GetLabelsNames()
+
+      for indexed_rule in rule_index.RulesMayMatch(last_foreman_run, os_string,
+                                                   label_names):
+        if indexed_rule.rule.expiration_time < now:
+          continue
+        if indexed_rule.rule.Evaluate(client_data):
+          actions_count += self._RunAction(indexed_rule.rule, client_id)
 
     if expired_rules:
       data_store.REL_DB.RemoveExpiredForemanRules()
@@ -156,10 +404,6 @@ class ForemanMessageHandler(message_handlers.MessageHandler):
   handler_name = "ForemanHandler"
 
   def ProcessMessages(self, msgs):
-    # TODO(amoser): The foreman reads the rules from the database for each
-    # client. In the old implementation we used to have a cache. If this is a
-    # performance hit, lets consider putting the cache back.
-
     foreman_obj = Foreman()
     for msg in msgs:
       foreman_obj.AssignTasksToClient(msg.client_id)
@@ -3,12 +3,16 @@
 from unittest import mock
 
 from absl import app
+from absl.testing import absltest
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_server import data_store
 from grr_response_server import foreman
 from grr_response_server import foreman_rules
 from grr_response_server import hunt
+from grr_response_server.databases import db
+from grr_response_server.databases import mem
 from grr.test_lib import test_lib
 
 
@@ -245,6 +249,206 @@ class ForemanTests(test_lib.GRRBaseTest):
         rules = data_store.REL_DB.ReadAllForemanRules()
         self.assertLen(rules, num_rules)
 
+  def _LabelRule(self, hunt_id, label_names):
+    now = rdfvalue.RDFDatetime.Now()
+    return foreman_rules.ForemanCondition(
+        creation_time=now,
+        expiration_time=now + rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        description="Test rule",
+        hunt_id=hunt_id,
+        client_rule_set=foreman_rules.ForemanClientRuleSet(rules=[
+            foreman_rules.ForemanClientRule(
+                rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+                label=foreman_rules.ForemanLabelClientRule(
+                    label_names=label_names))
+        ]))
+
+  def testLabelRulesAreCheckedWithoutReadingFullClientInfo(self):
+    client_id = self.SetupClient(0, labels=["foo"])
+    data_store.REL_DB.WriteForemanRule(self._LabelRule("11111111", ["bar"]))
+
+    with mock.patch.object(hunt, "StartHuntFlowOnClient",
+                           self.StartHuntFlowOnClient):
+      with mock.patch.object(
+          data_store.REL_DB,
+          "ReadClientFullInfo",
+          wraps=data_store.REL_DB.ReadClientFullInfo) as read_full_info:
+        self.clients_started = []
+        foreman.Foreman().AssignTasksToClient(client_id)
+
+        self.assertEmpty(self.clients_started)
+        read_full_info.assert_not_called()
+
+        data_store.REL_DB.WriteForemanRule(self._LabelRule("22222222", ["foo"]))
+        foreman.Foreman().AssignTasksToClient(client_id)
+
+        self.assertEqual(self.clients_started, [("22222222", client_id)])
+        read_full_info.assert_called_once()
+
+  def testRulesCacheIsInvalidatedOnWrite(self):
+    rules_cache = foreman.GetRulesCache()
+    self.assertEmpty(rules_cache.Get())
+    self.assertIs(rules_cache.Get(), rules_cache.Get())
+
+    data_store.REL_DB.WriteForemanRule(self._LabelRule("11111111", ["foo"]))
+    self.assertLen(rules_cache.Get(), 1)
+
+    data_store.REL_DB.RemoveForemanRule("11111111")
+    self.assertEmpty(rules_cache.Get())
+
+  def testRulesCacheExpires(self):
+    rules_cache = foreman.GetRulesCache()
+    with test_lib.FakeTime(1000):
+      rules_cache.Flush()
+      self.assertEmpty(rules_cache.Get())
+
+      # Simulate a write done by another process.
+      data_store.REL_DB.delegate.WriteForemanRule(
+          self._LabelRule("11111111", ["foo"]))
+      self.assertEmpty(rules_cache.Get())
+
+    ttl = config.CONFIG["Foreman.rules_cache_ttl"]
+    with test_lib.FakeTime(
+        rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1000) + ttl):
+      self.assertLen(rules_cache.Get(), 1)
+
+  def testRulesCacheBelongsToDatabase(self):
+    rules_cache = foreman.GetRulesCache()
+    self.assertIs(foreman.GetRulesCache(), rules_cache)
+
+    other_db = db.DatabaseValidationWrapper(mem.InMemoryDB())
+    with mock.patch.object(data_store, "REL_DB", other_db):
+      self.assertIsNot(foreman.GetRulesCache(), rules_cache)
+
+  def testFlushCachesFlushesRulesCache(self):
+    rules_cache = foreman.GetRulesCache()
+    with test_lib.FakeTime(1000):
+      self.assertEmpty(rules_cache.Get())
+
+      data_store.REL_DB.delegate.WriteForemanRule(
+          self._LabelRule("11111111", ["foo"]))
+      data_store.FlushCaches()
+      self.assertLen(rules_cache.Get(), 1)
+
+
+class IndexedRuleTest(absltest.TestCase):
+
+  def _IndexedRule(self, match_mode, *client_rules):
+    return foreman.IndexedRule(
+        foreman_rules.ForemanCondition(
+            client_rule_set=foreman_rules.ForemanClientRuleSet(
+                match_mode=match_mode, rules=client_rules)))
+
+  def _OsRule(self, **kwargs):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(**kwargs))
+
+  def _LabelRule(self, match_mode, *label_names):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+        label=foreman_rules.ForemanLabelClientRule(
+            match_mode=match_mode, label_names=label_names))
+
+  def testOsPreconditions(self):
+    rule = self._IndexedRule(
+        foreman_rules.ForemanClientRuleSet.MatchMode.MATCH_ALL,
+        self._OsRule(os_windows=True, os_linux=True),
+        self._OsRule(os_linux=True, os_darwin=True))
+
+    self.assertTrue(rule.MayMatch("Linux", set()))
+    self.assertFalse(rule.MayMatch("Windows 7", set()))
+    self.assertFalse(rule.MayMatch("Darwin", set()))
+    self.assertFalse(rule.MayMatch("", set()))
+
+  def testLabelPreconditions(self):
+    mode = foreman_rules.ForemanLabelClientRule.MatchMode
+    rule = self._IndexedRule(
+        foreman_rules.ForemanClientRuleSet.MatchMode.MATCH_ALL,
+        self._LabelRule(mode.MATCH_ALL, "foo", "bar"),
+        self._LabelRule(mode.MATCH_ANY, "baz", "quux"),
+        self._LabelRule(mode.DOES_NOT_MATCH_ANY, "norf"))
+
+    self.assertTrue(rule.MatchesLabels({"foo", "bar", "quux", "norf"}))
+    self.assertFalse(rule.MatchesLabels({"foo", "quux"}))
+    self.assertFalse(rule.MatchesLabels({"foo", "bar"}))
+
+  def testNoPreconditionsForMatchAnyRuleSets(self):
+    rule = self._IndexedRule(
+        foreman_rules.ForemanClientRuleSet.MatchMode.MATCH_ANY,
+        self._OsRule(os_windows=True),
+        self._LabelRule(
+            foreman_rules.ForemanLabelClientRule.MatchMode.MATCH_ALL, "foo"))
+
+    self.assertIsNone(rule.os_names)
+    self.assertEmpty(rule.label_sets)
+    self.assertTrue(rule.MayMatch("Linux", set()))
+
+
+class ForemanRuleIndexTest(absltest.TestCase):
+
+  def _Rule(self, hunt_id, creation_time, *client_rules):
+    return foreman_rules.ForemanCondition(
+        creation_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(creation_time),
+        expiration_time=rdfvalue.RDFDatetime.FromSecondsSinceEpoch(10000),
+        hunt_id=hunt_id,
+        client_rule_set=foreman_rules.ForemanClientRuleSet(rules=client_rules))
+
+  def _OsRule(self, **kwargs):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.OS,
+        os=foreman_rules.ForemanOsClientRule(**kwargs))
+
+  def _LabelRule(self, *label_names):
+    return foreman_rules.ForemanClientRule(
+        rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+        label=foreman_rules.ForemanLabelClientRule(
+            match_mode=foreman_rules.ForemanLabelClientRule.MatchMode.MATCH_ANY,
+            label_names=label_names))
+
+  def _HuntIds(self, rules):
+    return [r.rule.hunt_id for r in rules]
+
+  def testRulesMayMatch(self):
+    index = foreman.ForemanRuleIndex([
+        self._Rule("33333333", 30, self._OsRule(os_linux=True)),
+        self._Rule("11111111", 10),
+        self._Rule("22222222", 20, self._LabelRule("foo", "bar")),
+        self._Rule("44444444", 40, self._OsRule(os_windows=True),
+                   self._LabelRule("foo")),
+    ])
+    time = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(0)
+
+    self.assertLen(index, 4)
+    self.assertEqual(
+        self._HuntIds(index.RulesMayMatch(time, "Linux", set())),
+        ["11111111", "33333333"])
+    self.assertEqual(
+        self._HuntIds(index.RulesMayMatch(time, "Linux", {"bar"})),
+        ["11111111", "22222222", "33333333"])
+    self.assertEqual(
+        self._HuntIds(index.RulesMayMatch(time, "Windows 10", {"foo"})),
+        ["11111111", "22222222", "44444444"])
+    self.assertEqual(
+        self._HuntIds(index.RulesMayMatch(time, "", {"foo", "bar"})),
+        ["11111111", "22222222"])
+
+  def testRulesMayMatchOnlyReturnsNewRules(self):
+    index = foreman.ForemanRuleIndex([
+        self._Rule("11111111", 10),
+        self._Rule("22222222", 20, self._LabelRule("foo")),
+        self._Rule("33333333", 30, self._LabelRule("foo")),
+    ])
+    time = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(20)
+
+    self.assertEqual(
+        self._HuntIds(index.RulesMayMatch(time, "Linux", {"foo"})),
+        ["33333333"])
+    self.assertFalse(index.HasRulesWithoutLabels(time))
+    self.assertEqual(
+        self._HuntIds(index.RulesMatchingLabels(time, {"foo"})), ["33333333"])
+    self.assertEmpty(index.RulesMatchingLabels(time, {"bar"}))
+
 
 def main(argv):
   # Run the full test suite
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 """The GRR frontend server."""
 import logging
+import queue
+import threading
 import time
-from typing import Optional, Sequence
+from typing import List, Optional, Sequence
 
 from grr_response_core.lib import queues
 from grr_response_core.lib import rdfvalue
@@ -33,9 +35,183 @@ RRG_PARCEL_ACCEPT_ERRORS = metrics.Counter(
     fields=[("sink", str)],
 )
 
+INGESTION_STAGE_LATENCY = metrics.Event(
+    "frontend_ingestion_stage_latency",
+    bins=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50],
+    fields=[("stage", str)])
+INGESTION_BATCH_SIZE = metrics.Event(
+    "frontend_ingestion_batch_size",
+    bins=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000])
+
 FRONTEND_USERNAME = "GRRFrontEnd"
 
 
+class _IngestionItem(object):
+  """Messages received from a single client, ready to be written."""
+
+  def __init__(
+      self,
+      client_id: str,
+      flow_responses: List[rdf_flow_objects.FlowMessage],
+      crashes: List[rdf_client.ClientCrash],
+      worker_message_handler_requests: List[rdf_objects.MessageHandlerRequest],
+      frontend_message_handler_requests: List[
+          rdf_objects.MessageHandlerRequest],
+  ):
+    self.client_id = client_id
+    self.flow_responses = flow_responses
+    self.crashes = crashes
+    self.worker_message_handler_requests = worker_message_handler_requests
+    self.frontend_message_handler_requests = frontend_message_handler_requests
+
+    self.submit_time = time.time()
+    self.error = None
+    self.done = threading.Event()
+
+  def __len__(self) -> int:
+    return (len(self.flow_responses) + len(self.crashes) +
+            len(self.worker_message_handler_requests) +
+            len(self.frontend_message_handler_requests))
+
+
+def _Ingest(items: Sequence[_IngestionItem]) -> None:
+  """Writes received messages of one or more clients to the database."""
+  flow_responses = []
+  crashes = []
+  worker_message_handler_requests = []
+  frontend_message_handler_requests = []
+  for item in items:
+    flow_responses.extend(item.flow_responses)
+    crashes.extend(item.crashes)
+    worker_message_handler_requests.extend(item.worker_message_handler_requests)
+    frontend_message_handler_requests.extend(
+        item.frontend_message_handler_requests)
+
+  start_time = time.time()
+  if flow_responses:
+    data_store.REL_DB.WriteFlowResponses(flow_responses)
+
+  for crash_details in crashes:
+    # A client crashed while performing an action, fire an event.
+    events.Events.PublishEvent(
+        "ClientCrash", crash_details, username=FRONTEND_USERNAME)
+
+  if worker_message_handler_requests:
+    data_store.REL_DB.WriteMessageHandlerRequests(
+        worker_message_handler_requests)
+  INGESTION_STAGE_LATENCY.RecordEvent(
+      time.time() - start_time, fields=["write"])
+
+  if frontend_message_handler_requests:
+    start_time = time.time()
+    worker_lib.ProcessMessageHandlerRequests(frontend_message_handler_requests)
+    INGESTION_STAGE_LATENCY.RecordEvent(
+        time.time() - start_time, fields=["frontend_handlers"])
+
+
+class IngestionPipeline(object):
+  """Writes messages received from many clients in batches.
+
+  Request threads put messages they received into a bounded queue and wait
+  until they are written. The writing itself is done by the waiting request
+  threads: up to `max_writers` of them at a time take as many queued
+  submissions as fit into a batch and write them with a single call per
+  database method. Once the queue is full, submitting blocks until the writers
+  catch up.
+  """
+
+  def __init__(self, max_queue_size: int, max_batch_size: int,
+               max_writers: int):
+    """Initializes the pipeline.
+
+    Args:
+      max_queue_size: Maximum number of submissions waiting to be written.
+      max_batch_size: Maximum number of messages written with a single batch.
+        A single submission exceeding it is still written as one batch.
+      max_writers: Maximum number of batches written concurrently.
+    """
+    if max_queue_size < 1 or max_batch_size < 1 or max_writers < 1:
+      raise ValueError("Invalid ingestion pipeline parameters: %d, %d, %d." %
+                       (max_queue_size, max_batch_size, max_writers))
+
+    self.max_batch_size = max_batch_size
+    self.max_writers = max_writers
+
+    self._queue = queue.Queue(maxsize=max_queue_size)
+    self._cond = threading.Condition()
+    self._num_writers = 0
+
+  def Submit(self, item: _IngestionItem) -> None:
+    """Submits messages for writing and waits until they are written."""
+    self._queue.put(item)
+
+    while True:
+      with self._cond:
+        # Wait while the item is being written by another thread or while
+        # there are too many writers already.
+        while not item.done.is_set() and (self._num_writers >= self.max_writers
+                                          or self._queue.empty()):
+          self._cond.wait()
+
+        if item.done.is_set():
+          break
+        self._num_writers += 1
+
+      try:
+        batch = self._NextBatch()
+        if batch:
+          self._WriteBatch(batch)
+      finally:
+        with self._cond:
+          self._num_writers -= 1
+          self._cond.notify_all()
+
+    if item.error is not None:
+      raise item.error
+
+  def _NextBatch(self) -> List[_IngestionItem]:
+    """Takes queued submissions fitting into a single batch."""
+    batch = []
+    batch_size = 0
+    while batch_size < self.max_batch_size:
+      try:
+        item = self._queue.get_nowait()
+      except queue.Empty:
+        break
+
+      batch.append(item)
+      batch_size += len(item)
+
+    return batch
+
+  def _WriteBatch(self, batch: List[_IngestionItem]) -> None:
+    """Writes a batch of submissions and marks them as done."""
+    now = time.time()
+    for item in batch:
+      INGESTION_STAGE_LATENCY.RecordEvent(
+          now - item.submit_time, fields=["queue"])
+    INGESTION_BATCH_SIZE.RecordEvent(sum(len(item) for item in batch))
+
+    try:
+      _Ingest(batch)
+    except Exception as e:  # pylint: disable=broad-except
+      if len(batch) == 1:
+        batch[0].error = e
+      else:
+        # Retry submissions one by one, so that a single bad one doesn't fail
+        # the others.
+        logging.exception("Failed to write a batch of %d submissions.",
+                          len(batch))
+        for item in batch:
+          try:
+            _Ingest([item])
+          except Exception as e:  # pylint: disable=broad-except
+            item.error = e
+
+    for item in batch:
+      item.done.set()
+
+
 class FrontEndServer(object):
   """This is the front end server.
 
@@ -53,11 +229,24 @@ class FrontEndServer(object):
   def __init__(self,
                max_queue_size=50,
                message_expiry_time=120,
-               max_retransmission_time=10):
+               max_retransmission_time=10,
+               ingestion_queue_size=0,
+               ingestion_batch_size=1000,
+               ingestion_max_writers=1):
     self.message_expiry_time = message_expiry_time
     self.max_retransmission_time = max_retransmission_time
     self.max_queue_size = max_queue_size
 
+    # Without an ingestion pipeline, messages are written on the thread that
+    # received them.
+    if ingestion_queue_size:
+      self.ingestion_pipeline = IngestionPipeline(
+          max_queue_size=ingestion_queue_size,
+          max_batch_size=ingestion_batch_size,
+          max_writers=ingestion_max_writers)
+    else:
+      self.ingestion_pipeline = None
+
     # There is only a single session id that we accept unauthenticated
     # messages for, the one to enroll new clients.
     self.unauth_allowed_session_id = rdfvalue.SessionID(
@@ -164,44 +353,47 @@ class FrontEndServer(object):
       logging.info("Dropped %d unauthenticated messages for %s", dropped_count,
                    client_id)
 
-    if unprocessed_msgs:
-      flow_responses = []
-      for message in unprocessed_msgs:
-        try:
-          flow_responses.append(
-              rdf_flow_objects.FlowResponseForLegacyResponse(message))
-        except ValueError as e:
-          logging.warning("Failed to parse legacy FlowResponse:\n%s\n%s", e,
-                          message)
-
-      data_store.REL_DB.WriteFlowResponses(flow_responses)
-
-      for msg in unprocessed_msgs:
-        if msg.type == rdf_flows.GrrMessage.Type.STATUS:
-          stat = rdf_flows.GrrStatus(msg.payload)
-          if stat.status == rdf_flows.GrrStatus.ReturnedStatus.CLIENT_KILLED:
-            # A client crashed while performing an action, fire an event.
-            crash_details = rdf_client.ClientCrash(
-                client_id=client_id,
-                session_id=msg.session_id,
-                backtrace=stat.backtrace,
-                crash_message=stat.error_message,
-                nanny_status=stat.nanny_status,
-                timestamp=rdfvalue.RDFDatetime.Now())
-            events.Events.PublishEvent(
-                "ClientCrash", crash_details, username=FRONTEND_USERNAME)
-
-    if worker_message_handler_requests:
-      data_store.REL_DB.WriteMessageHandlerRequests(
-          worker_message_handler_requests)
-
-    if frontend_message_handler_requests:
-      worker_lib.ProcessMessageHandlerRequests(
-          frontend_message_handler_requests)
+    flow_responses = []
+    crashes = []
+    for message in unprocessed_msgs:
+      try:
+        flow_responses.append(
+            rdf_flow_objects.FlowResponseForLegacyResponse(message))
+      except ValueError as e:
+        logging.warning("Failed to parse legacy FlowResponse:\n%s\n%s", e,
+                        message)
+
+      if message.type == rdf_flows.GrrMessage.Type.STATUS:
+        stat = rdf_flows.GrrStatus(message.payload)
+        if stat.status == rdf_flows.GrrStatus.ReturnedStatus.CLIENT_KILLED:
+          crashes.append(
+              rdf_client.ClientCrash(
+                  client_id=client_id,
+                  session_id=message.session_id,
+                  backtrace=stat.backtrace,
+                  crash_message=stat.error_message,
+                  nanny_status=stat.nanny_status,
+                  timestamp=rdfvalue.RDFDatetime.Now()))
+
+    INGESTION_STAGE_LATENCY.RecordEvent(
+        time.time() - now, fields=["classify"])
+
+    item = _IngestionItem(
+        client_id,
+        flow_responses=flow_responses,
+        crashes=crashes,
+        worker_message_handler_requests=worker_message_handler_requests,
+        frontend_message_handler_requests=frontend_message_handler_requests)
+    if item:
+      if self.ingestion_pipeline is not None:
+        self.ingestion_pipeline.Submit(item)
+      else:
+        _Ingest([item])
 
+    elapsed = time.time() - now
+    INGESTION_STAGE_LATENCY.RecordEvent(elapsed, fields=["total"])
     logging.debug("Received %s messages from %s in %s sec", len(messages),
-                  client_id,
-                  time.time() - now)
+                  client_id, elapsed)
 
   def ReceiveRRGResponse(
       self,
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 """Tests for frontend server, client communicator, and the GRRHTTPClient."""
 
+import threading
+import time
 from unittest import mock
 import zlib
 
@@ -139,6 +141,132 @@ class GRRFEServerTestRelational(flow_test_lib.FlowTestsBaseclass):
     self.assertTrue(crash_details_rel)
     self.assertEqual(crash_details_rel.session_id, session_id)
 
+  def testReceiveMessagesWithIngestionPipeline(self):
+    client_id = "C.1234567890123456"
+    flow_id = "12345678"
+    data_store.REL_DB.WriteClientMetadata(client_id)
+    self._FlowSetup(client_id, flow_id)
+
+    session_id = "%s/%s" % (client_id, flow_id)
+    messages = [
+        rdf_flows.GrrMessage(
+            request_id=1,
+            response_id=i,
+            session_id=session_id,
+            auth_state="AUTHENTICATED",
+            payload=rdfvalue.RDFInteger(i)) for i in range(1, 10)
+    ]
+
+    server = frontend_lib.FrontEndServer(
+        message_expiry_time=MESSAGE_EXPIRY_TIME, ingestion_queue_size=10)
+    server.ReceiveMessages(client_id, messages)
+
+    received = data_store.REL_DB.ReadAllFlowRequestsAndResponses(
+        client_id, flow_id)
+    self.assertLen(received, 1)
+    self.assertLen(received[0][1], 9)
+
+
+class IngestionPipelineTest(absltest.TestCase):
+
+  def _Item(self, client_id, num_responses=1):
+    return frontend_lib._IngestionItem(  # pylint: disable=protected-access
+        client_id,
+        flow_responses=[
+            rdf_flow_objects.FlowResponse(client_id=client_id)
+            for _ in range(num_responses)
+        ],
+        crashes=[],
+        worker_message_handler_requests=[],
+        frontend_message_handler_requests=[])
+
+  def _SubmitInThread(self, pipeline, item):
+    thread = threading.Thread(target=pipeline.Submit, args=(item,))
+    thread.start()
+    self.addCleanup(thread.join)
+    return thread
+
+  def _WaitForQueueSize(self, pipeline, size):
+    # pylint: disable=protected-access
+    deadline = time.time() + 10
+    while pipeline._queue.qsize() < size:
+      if time.time() > deadline:
+        self.fail("Submissions were not queued in time.")
+      time.sleep(0.01)
+    # pylint: enable=protected-access
+
+  def testConcurrentSubmissionsAreWrittenTogether(self):
+    pipeline = frontend_lib.IngestionPipeline(
+        max_queue_size=10, max_batch_size=100, max_writers=1)
+
+    batches = []
+    first_write_started = threading.Event()
+    unblock_first_write = threading.Event()
+
+    def Ingest(items):
+      batches.append([item.client_id for item in items])
+      if len(batches) == 1:
+        first_write_started.set()
+        unblock_first_write.wait()
+
+    with mock.patch.object(frontend_lib, "_Ingest", Ingest):
+      first = self._SubmitInThread(pipeline, self._Item("C.0"))
+      self.assertTrue(first_write_started.wait(10))
+
+      others = [
+          self._SubmitInThread(pipeline, self._Item("C.%d" % i))
+          for i in range(1, 4)
+      ]
+      self._WaitForQueueSize(pipeline, 3)
+      unblock_first_write.set()
+
+      for thread in [first] + others:
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+    self.assertLen(batches, 2)
+    self.assertEqual(batches[0], ["C.0"])
+    self.assertCountEqual(batches[1], ["C.1", "C.2", "C.3"])
+
+  def testBatchSizeIsLimited(self):
+    pipeline = frontend_lib.IngestionPipeline(
+        max_queue_size=10, max_batch_size=3, max_writers=1)
+
+    # pylint: disable=protected-access
+    for i in range(3):
+      pipeline._queue.put(self._Item("C.%d" % i, num_responses=2))
+
+    batch = pipeline._NextBatch()
+    # pylint: enable=protected-access
+    self.assertEqual([item.client_id for item in batch], ["C.0", "C.1"])
+
+  def testFailingSubmissionDoesNotFailOthers(self):
+    pipeline = frontend_lib.IngestionPipeline(
+        max_queue_size=10, max_batch_size=100, max_writers=1)
+
+    written = []
+
+    def Ingest(items):
+      client_ids = [item.client_id for item in items]
+      if "C.bad" in client_ids:
+        raise ValueError("Bad submission.")
+      written.extend(client_ids)
+
+    good = self._Item("C.good")
+    bad = self._Item("C.bad")
+    # pylint: disable=protected-access
+    pipeline._queue.put(good)
+    pipeline._queue.put(bad)
+    with mock.patch.object(frontend_lib, "_Ingest", Ingest):
+      pipeline._WriteBatch(pipeline._NextBatch())
+    # pylint: enable=protected-access
+
+    self.assertEqual(written, ["C.good"])
+    self.assertTrue(good.done.is_set())
+    self.assertIsNone(good.error)
+    self.assertTrue(bad.done.is_set())
+    self.assertIsInstance(bad.error, ValueError)
+
 
 class FleetspeakFrontendTests(flow_test_lib.FlowTestsBaseclass):
 
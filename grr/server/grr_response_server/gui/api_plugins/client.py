@@ -806,6 +806,32 @@ class ApiGetClientLoadStatsHandler(api_call_handler_base.ApiCallHandler):
       ApiGetClientLoadStatsArgs.Metric.MEMORY_RSS_SIZE,
       ApiGetClientLoadStatsArgs.Metric.MEMORY_VMS_SIZE
   ]
+  # Metrics read from samples of client stats: names of the sample fields
+  # and of the sampled values.
+  SAMPLED_METRICS = {
+      ApiGetClientLoadStatsArgs.Metric.CPU_PERCENT:
+          ("cpu_samples", "cpu_percent"),
+      ApiGetClientLoadStatsArgs.Metric.CPU_SYSTEM:
+          ("cpu_samples", "system_cpu_time"),
+      ApiGetClientLoadStatsArgs.Metric.CPU_USER:
+          ("cpu_samples", "user_cpu_time"),
+      ApiGetClientLoadStatsArgs.Metric.IO_READ_BYTES:
+          ("io_samples", "read_bytes"),
+      ApiGetClientLoadStatsArgs.Metric.IO_WRITE_BYTES:
+          ("io_samples", "write_bytes"),
+      ApiGetClientLoadStatsArgs.Metric.IO_READ_OPS:
+          ("io_samples", "read_count"),
+      ApiGetClientLoadStatsArgs.Metric.IO_WRITE_OPS:
+          ("io_samples", "write_count"),
+  }
+  # Metrics read from client stats themselves.
+  STATS_METRICS = {
+      ApiGetClientLoadStatsArgs.Metric.NETWORK_BYTES_RECEIVED: "bytes_received",
+      ApiGetClientLoadStatsArgs.Metric.NETWORK_BYTES_SENT: "bytes_sent",
+      ApiGetClientLoadStatsArgs.Metric.MEMORY_PERCENT: "memory_percent",
+      ApiGetClientLoadStatsArgs.Metric.MEMORY_RSS_SIZE: "RSS_size",
+      ApiGetClientLoadStatsArgs.Metric.MEMORY_VMS_SIZE: "VMS_size",
+  }
   # pyformat: enable
   MAX_SAMPLES = 100
 
@@ -823,49 +849,26 @@ class ApiGetClientLoadStatsHandler(api_call_handler_base.ApiCallHandler):
         client_id=str(args.client_id),
         min_timestamp=start_time,
         max_timestamp=end_time)
-    points = []
-    for stat_value in reversed(stat_values):
-      if args.metric == args.Metric.CPU_PERCENT:
-        points.extend(
-            (s.cpu_percent, s.timestamp) for s in stat_value.cpu_samples)
-      elif args.metric == args.Metric.CPU_SYSTEM:
-        points.extend(
-            (s.system_cpu_time, s.timestamp) for s in stat_value.cpu_samples)
-      elif args.metric == args.Metric.CPU_USER:
-        points.extend(
-            (s.user_cpu_time, s.timestamp) for s in stat_value.cpu_samples)
-      elif args.metric == args.Metric.IO_READ_BYTES:
-        points.extend(
-            (s.read_bytes, s.timestamp) for s in stat_value.io_samples)
-      elif args.metric == args.Metric.IO_WRITE_BYTES:
-        points.extend(
-            (s.write_bytes, s.timestamp) for s in stat_value.io_samples)
-      elif args.metric == args.Metric.IO_READ_OPS:
-        points.extend(
-            (s.read_count, s.timestamp) for s in stat_value.io_samples)
-      elif args.metric == args.Metric.IO_WRITE_OPS:
-        points.extend(
-            (s.write_count, s.timestamp) for s in stat_value.io_samples)
-      elif args.metric == args.Metric.NETWORK_BYTES_RECEIVED:
-        points.append((stat_value.bytes_received, stat_value.timestamp))
-      elif args.metric == args.Metric.NETWORK_BYTES_SENT:
-        points.append((stat_value.bytes_sent, stat_value.timestamp))
-      elif args.metric == args.Metric.MEMORY_PERCENT:
-        points.append((stat_value.memory_percent, stat_value.timestamp))
-      elif args.metric == args.Metric.MEMORY_RSS_SIZE:
-        points.append((stat_value.RSS_size, stat_value.timestamp))
-      elif args.metric == args.Metric.MEMORY_VMS_SIZE:
-        points.append((stat_value.VMS_size, stat_value.timestamp))
-      else:
-        raise ValueError("Unknown metric.")
+    values = []
+    timestamps = []
+    if args.metric in self.SAMPLED_METRICS:
+      samples_field, value_field = self.SAMPLED_METRICS[args.metric]
+      for stat_value in reversed(stat_values):
+        for sample in stat_value.Get(samples_field):
+          values.append(sample.Get(value_field))
+          timestamps.append(sample.timestamp.AsMicrosecondsSinceEpoch())
+    elif args.metric in self.STATS_METRICS:
+      value_field = self.STATS_METRICS[args.metric]
+      for stat_value in reversed(stat_values):
+        values.append(stat_value.Get(value_field))
+        timestamps.append(stat_value.timestamp.AsMicrosecondsSinceEpoch())
+    else:
+      raise ValueError("Unknown metric.")
 
     # Points collected from "cpu_samples" and "io_samples" may not be correctly
     # sorted in some cases (as overlaps between different stat_values are
     # possible).
-    points.sort(key=lambda x: x[1])
-
-    ts = timeseries.Timeseries()
-    ts.MultiAppend(points)
+    ts = timeseries.Timeseries.FromArrays(values, timestamps, sort=True)
 
     if args.metric not in self.GAUGE_METRICS:
       ts.MakeIncreasing()
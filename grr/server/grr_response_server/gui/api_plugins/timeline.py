@@ -5,11 +5,15 @@ from typing import Iterator
 from typing import Optional
 from typing import Text
 
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.util import body
 from grr_response_core.lib.util import chunked
+from grr_response_core.lib.util import gzchunked
+from grr_response_proto import timeline_pb2 as rdf_timeline_pb2
 from grr_response_proto.api import timeline_pb2
+from grr_response_server import columnar_timeline
 from grr_response_server import data_store
 from grr_response_server.flows.general import timeline
 from grr_response_server.gui import api_call_context
@@ -26,6 +30,15 @@ class ApiTimelineBodyOpts(rdf_structs.RDFProtoStruct):
   rdf_deps = []
 
 
+class ApiTimelineFilter(rdf_structs.RDFProtoStruct):
+  """An RDF wrapper class for the timeline exporter filter."""
+
+  protobuf = timeline_pb2.ApiTimelineFilter
+  rdf_deps = [
+      rdfvalue.RDFDatetime,
+  ]
+
+
 class ApiGetCollectedTimelineArgs(rdf_structs.RDFProtoStruct):
   """An RDF wrapper class for the arguments of timeline exporter arguments."""
 
@@ -34,6 +47,7 @@ class ApiGetCollectedTimelineArgs(rdf_structs.RDFProtoStruct):
       api_client.ApiClientId,
       api_flow.ApiFlowId,
       ApiTimelineBodyOpts,
+      ApiTimelineFilter,
   ]
 
 
@@ -68,6 +82,8 @@ class ApiGetCollectedTimelineHandler(api_call_handler_base.ApiCallHandler):
     if args.format == timeline_pb2.ApiGetCollectedTimelineArgs.BODY:
       return self._StreamBody(args)
     if args.format == timeline_pb2.ApiGetCollectedTimelineArgs.RAW_GZCHUNKED:
+      if _IsFilteredOrSorted(args):
+        return self._StreamFilteredRawGzchunked(args)
       return self._StreamRawGzchunked(client_id=client_id, flow_id=flow_id)
 
     message = "Incorrect timeline export format: {}".format(args.format)
@@ -96,7 +112,7 @@ class ApiGetCollectedTimelineHandler(api_call_handler_base.ApiCallHandler):
       if fstype is not None and fstype.lower() == "ntfs":
         opts.inode_format = body.Opts.InodeFormat.NTFS_FILE_REFERENCE
 
-    entries = timeline.ProtoEntries(client_id=client_id, flow_id=flow_id)
+    entries = _Entries(args)
     content = body.Stream(entries, opts=opts)
 
     filename = "timeline_{}.body".format(flow_id)
@@ -113,6 +129,18 @@ class ApiGetCollectedTimelineHandler(api_call_handler_base.ApiCallHandler):
     filename = "timeline_{}.gzchunked".format(flow_id)
     return api_call_handler_base.ApiBinaryStream(filename, content)
 
+  def _StreamFilteredRawGzchunked(
+      self,
+      args: ApiGetCollectedTimelineArgs,
+  ) -> api_call_handler_base.ApiBinaryStream:
+    entries = _Entries(args)
+    content = gzchunked.Serialize(
+        entry.SerializeToString() for entry in entries)
+    content = map(chunked.Encode, content)
+
+    filename = "timeline_{}.gzchunked".format(args.flow_id)
+    return api_call_handler_base.ApiBinaryStream(filename, content)
+
 
 class ApiGetCollectedHuntTimelinesHandler(api_call_handler_base.ApiCallHandler):
   """An API handler for the hunt timelines exporter."""
@@ -192,6 +220,71 @@ class ApiGetCollectedHuntTimelinesHandler(api_call_handler_base.ApiCallHandler):
     return self._handler.Handle(args).GenerateContent()
 
 
+_TIMESTAMP_COLUMNS = {
+    timeline_pb2.ApiTimelineFilter.MTIME: "mtime_ns",
+    timeline_pb2.ApiTimelineFilter.ATIME: "atime_ns",
+    timeline_pb2.ApiTimelineFilter.CTIME: "ctime_ns",
+    timeline_pb2.ApiTimelineFilter.BTIME: "btime_ns",
+}
+
+_SORT_KEYS = {
+    timeline_pb2.ApiGetCollectedTimelineArgs.UNSORTED: None,
+    timeline_pb2.ApiGetCollectedTimelineArgs.ATIME: "atime_ns",
+    timeline_pb2.ApiGetCollectedTimelineArgs.MTIME: "mtime_ns",
+    timeline_pb2.ApiGetCollectedTimelineArgs.CTIME: "ctime_ns",
+    timeline_pb2.ApiGetCollectedTimelineArgs.BTIME: "btime_ns",
+    timeline_pb2.ApiGetCollectedTimelineArgs.SIZE: "size",
+    timeline_pb2.ApiGetCollectedTimelineArgs.PATH: "path",
+}
+
+
+def _IsFilteredOrSorted(args: ApiGetCollectedTimelineArgs) -> bool:
+  return args.HasField("filter") or bool(args.sort_by)
+
+
+def _ColumnarFilter(args: ApiTimelineFilter) -> columnar_timeline.Filter:
+  """Converts the API filter to a columnar timeline filter."""
+  min_time_ns = None
+  if args.HasField("min_time"):
+    min_time_ns = args.min_time.AsMicrosecondsSinceEpoch() * 1000
+
+  max_time_ns = None
+  if args.HasField("max_time"):
+    max_time_ns = args.max_time.AsMicrosecondsSinceEpoch() * 1000
+
+  return columnar_timeline.Filter(
+      timestamp_column=_TIMESTAMP_COLUMNS[args.timestamp_type],
+      min_timestamp_ns=min_time_ns,
+      max_timestamp_ns=max_time_ns,
+      path_prefix=args.path_prefix or None,
+      min_size=args.min_size if args.HasField("min_size") else None,
+      max_size=args.max_size if args.HasField("max_size") else None,
+  )
+
+
+def _Entries(
+    args: ApiGetCollectedTimelineArgs,
+) -> Iterator[rdf_timeline_pb2.TimelineEntry]:
+  """Returns timeline entries of a flow matching the filter of the arguments."""
+  client_id = str(args.client_id)
+  flow_id = str(args.flow_id)
+
+  if not _IsFilteredOrSorted(args):
+    return timeline.ProtoEntries(client_id=client_id, flow_id=flow_id)
+
+  entry_filter = _ColumnarFilter(args.filter)
+  sort_key = _SORT_KEYS[args.sort_by]
+
+  index = timeline.ColumnarIndex(client_id=client_id, flow_id=flow_id)
+  if index is not None:
+    return columnar_timeline.Query(index, entry_filter, sort_key=sort_key)
+
+  # Timelines collected without the columnar format are filtered by decoding
+  # all of their entries.
+  entries = timeline.ProtoEntries(client_id=client_id, flow_id=flow_id)
+  return columnar_timeline.Filtered(entries, entry_filter, sort_key=sort_key)
+
+
 def _GetHuntTimelineFilename(
     snapshot: rdf_objects.ClientSnapshot,
     fmt: timeline_pb2.ApiGetCollectedTimelineArgs.Format,
@@ -366,6 +366,66 @@ class ApiGetCollectedTimelineHandlerTest(api_test_lib.ApiCallHandlerTest):
     self.assertEqual(entries, deserialized)
 
 
+  def _WriteFilterTestTimeline(self, columnar):
+    entries = []
+    for idx in range(64):
+      entry = rdf_timeline.TimelineEntry()
+      entry.path = "/foo/{}/file{}".format(idx % 4, idx).encode("utf-8")
+      entry.size = idx
+      entry.mtime_ns = (1000 - idx) * 10**9
+      entries.append(entry)
+
+    client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+    flow_id = timeline_test_lib.WriteTimeline(
+        client_id, entries, columnar=columnar)
+    return client_id, flow_id
+
+  def _FilteredBodyPaths(self, columnar):
+    client_id, flow_id = self._WriteFilterTestTimeline(columnar)
+
+    args = api_timeline.ApiGetCollectedTimelineArgs()
+    args.client_id = client_id
+    args.flow_id = flow_id
+    args.format = api_timeline.ApiGetCollectedTimelineArgs.Format.BODY
+    args.filter.timestamp_type = api_timeline.ApiTimelineFilter.TimestampType.MTIME
+    args.filter.min_time = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(950)
+    args.filter.max_time = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(990)
+    args.filter.path_prefix = b"/foo/1/"
+    args.filter.min_size = 20
+    args.sort_by = api_timeline.ApiGetCollectedTimelineArgs.SortKey.MTIME
+
+    result = self.handler.Handle(args)
+    content = b"".join(result.GenerateContent()).decode("utf-8")
+
+    rows = list(csv.reader(io.StringIO(content), delimiter="|"))
+    return [row[1] for row in rows]
+
+  def testBodyFilteredAndSorted(self):
+    expected = ["/foo/1/file{}".format(idx) for idx in range(49, 20, -4)]
+    self.assertEqual(self._FilteredBodyPaths(columnar=True), expected)
+
+  def testBodyFilteredAndSortedWithoutColumnarTimeline(self):
+    expected = ["/foo/1/file{}".format(idx) for idx in range(49, 20, -4)]
+    self.assertEqual(self._FilteredBodyPaths(columnar=False), expected)
+
+  def testRawGzchunkedFiltered(self):
+    client_id, flow_id = self._WriteFilterTestTimeline(columnar=True)
+
+    args = api_timeline.ApiGetCollectedTimelineArgs()
+    args.client_id = client_id
+    args.flow_id = flow_id
+    args.format = api_timeline.ApiGetCollectedTimelineArgs.Format.RAW_GZCHUNKED
+    args.filter.max_size = 2
+
+    content = b"".join(self.handler.Handle(args).GenerateContent())
+
+    chunks = chunked.ReadAll(io.BytesIO(content))
+    deserialized = list(rdf_timeline.TimelineEntry.DeserializeStream(chunks))
+
+    self.assertEqual([entry.path for entry in deserialized],
+                     [b"/foo/0/file0", b"/foo/1/file1", b"/foo/2/file2"])
+
+
 class ApiGetCollectedHuntTimelinesHandlerTest(api_test_lib.ApiCallHandlerTest):
 
   @classmethod
@@ -689,8 +689,11 @@ class ApiGetFileBlobHandler(api_call_handler_base.ApiCallHandler):
 
   def _GenerateFile(self, file_obj, offset, length):
     file_obj.seek(offset)
-    for start in range(offset, offset + length, self.CHUNK_SIZE):
-      yield file_obj.read(min(self.CHUNK_SIZE, offset + length - start))
+    try:
+      for start in range(offset, offset + length, self.CHUNK_SIZE):
+        yield file_obj.read(min(self.CHUNK_SIZE, offset + length - start))
+    finally:
+      file_obj.close()
 
   def _WrapContentGenerator(self, generator, args, username):
     try:
@@ -976,7 +979,7 @@ def _GetTimelineStatEntries(api_client_id, file_path, with_history=True):
   path_infos = []
   for path_info in itertools.chain(
       [root_path_info],
-      data_store.REL_DB.ListDescendantPathInfos(client_id, path_type,
+      data_store.REL_DB.IterDescendantPathInfos(client_id, path_type,
                                                 components),
   ):
     # TODO(user): this is to keep the compatibility with current
@@ -1267,7 +1270,7 @@ class ApiGetVfsFilesArchiveHandler(api_call_handler_base.ApiCallHandler):
     client_paths = []
     for start_path in start_paths:
       path_type, components = rdf_objects.ParseCategorizedPath(start_path)
-      for pi in data_store.REL_DB.ListDescendantPathInfos(
+      for pi in data_store.REL_DB.IterDescendantPathInfos(
           client_id, path_type, components):
         if pi.directory:
           continue
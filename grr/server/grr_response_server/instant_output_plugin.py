@@ -1,17 +1,98 @@
 #!/usr/bin/env python
 """Instant output plugins used by the API for on-the-fly conversion."""
 
+import collections
+from concurrent import futures
 import functools
+import multiprocessing
 import re
-
+import threading
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.registry import MetaclassRegistry
 from grr_response_core.lib.util import collection
-from grr_response_server import data_store
 from grr_response_server import export
 from grr_response_server import export_converters_registry
 from grr_response_server.export_converters import base
 
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+_export_executor_lock = threading.Lock()
+_export_executor: Optional[futures.Executor] = None
+
+
+def _InitExportProcess(protobuf_codec: bool) -> None:
+  """Initializes a process of the export pool."""
+  # Spawned processes don't inherit the server's initialization. They never
+  # access the data store, only values are converted and serialized there.
+  rdf_structs.EnableProtobufCodec(protobuf_codec)
+
+
+def _GetExportExecutor() -> Optional[futures.Executor]:
+  """Returns the pool exports of this process run on, if configured."""
+  global _export_executor
+
+  with _export_executor_lock:
+    if _export_executor is None:
+      num_processes = config.CONFIG["Export.processes"]
+      if num_processes > 0:
+        # Server processes are multithreaded and hold database connections,
+        # so their pool processes are spawned instead of forked.
+        _export_executor = futures.ProcessPoolExecutor(
+            max_workers=num_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_InitExportProcess,
+            initargs=(config.CONFIG["Server.protobuf_codec"],))
+    return _export_executor
+
+
+def _OrderedMap(executor: futures.Executor, fn: Callable[[_T], _R],
+                items: Iterable[_T], max_pending: int) -> Iterator[_R]:
+  """Applies a function to items on an executor, yielding results in order.
+
+  Unlike `executor.map`, items are consumed lazily and at most `max_pending`
+  of them are processed at a time, so that arbitrarily long exports don't
+  have to fit in memory.
+
+  Args:
+    executor: An executor to run the function on.
+    fn: A function to apply.
+    items: Items to apply the function to.
+    max_pending: Maximum number of items submitted but not yet yielded.
+
+  Yields:
+    Results of the function, in the order of the items.
+  """
+  pending = collections.deque()
+  try:
+    for item in items:
+      pending.append(executor.submit(fn, item))
+      if len(pending) >= max_pending:
+        yield pending.popleft().result()
+
+    while pending:
+      yield pending.popleft().result()
+  finally:
+    for future in pending:
+      future.cancel()
+
+
+def _BatchConvert(converter: base.ExportConverter,
+                  batch: List[Tuple[base.ExportedMetadata, rdfvalue.RDFValue]]
+                 ) -> List[rdfvalue.RDFValue]:
+  return list(converter.BatchConvert(batch))
+
 
 class InstantOutputPlugin(metaclass=MetaclassRegistry):
   """The base class for instant output plugins.
@@ -94,45 +175,78 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
   __abstract = True  # pylint: disable=g-bad-name
 
   BATCH_SIZE = 5000
+  # Maximum number of batches converted or serialized on the executor at a
+  # time.
+  MAX_PENDING_BATCHES = 16
+
+  def __init__(self,
+               *args,
+               executor: Optional[futures.Executor] = None,
+               **kwargs):
+    """Constructor.
 
-  def __init__(self, *args, **kwargs):
+    Args:
+      *args: Positional arguments of InstantOutputPlugin.
+      executor: An executor to convert and serialize values on. Defaults to a
+        process-wide pool if Export.processes is set, otherwise
+        values are processed sequentially.
+      **kwargs: Keyword arguments of InstantOutputPlugin.
+    """
     super().__init__(*args, **kwargs)
-    self._cached_metadata = {}
+
+    if executor is None:
+      executor = _GetExportExecutor()
+    self._executor = executor
+    # Maps client ids to their cached metadata and its copy with the plugin's
+    # source_urn set.
+    self._metadata: Dict[str, Tuple[base.ExportedMetadata,
+                                    base.ExportedMetadata]] = {}
 
   def _GetMetadataForClients(self, client_urns):
     """Fetches metadata for a given list of clients."""
+    cached_metadata = export.GetClientsMetadata(
+        {urn.Basename() for urn in client_urns})
 
+    # Values of the same client share their metadata. It's only copied again
+    # if the cached metadata of the client changed.
     result = {}
-    metadata_to_fetch = set()
-
     for urn in client_urns:
-      try:
-        result[urn] = self._cached_metadata[urn]
-      except KeyError:
-        metadata_to_fetch.add(urn)
+      if urn in result:
+        continue
 
-    if metadata_to_fetch:
-      client_ids = set(urn.Basename() for urn in metadata_to_fetch)
-      infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids)
+      client_id = urn.Basename()
+      cached = cached_metadata.get(client_id)
+      entry = self._metadata.get(client_id)
+      if entry is None or entry[0] is not cached:
+        metadata = base.ExportedMetadata(cached)
+        metadata.source_urn = self.source_urn
+        entry = (cached, metadata)
+        # Don't keep more copies than there are cached clients.
+        if len(self._metadata) >= config.CONFIG["Export.metadata_cache_size"]:
+          self._metadata.clear()
+        self._metadata[client_id] = entry
+      result[urn] = entry[1]
 
-      fetched_metadata = [
-          export.GetMetadata(client_id, info)
-          for client_id, info in infos.items()
-      ]
+    return [result[urn] for urn in client_urns]
 
-      for metadata in fetched_metadata:
-        metadata.source_urn = self.source_urn
+  def _MapBatches(self, fn: Callable[[List[_T]], _R],
+                  batches: Iterable[List[_T]]) -> Iterator[_R]:
+    """Applies a function to batches of values, preserving their order.
 
-        self._cached_metadata[metadata.client_urn] = metadata
-        result[metadata.client_urn] = metadata
-        metadata_to_fetch.remove(metadata.client_urn)
+    Batches are processed on the plugin's executor if there is one. The
+    function and batches have to be picklable then.
 
-      for urn in metadata_to_fetch:
-        default_mdata = base.ExportedMetadata(source_urn=self.source_urn)
-        result[urn] = default_mdata
-        self._cached_metadata[urn] = default_mdata
+    Args:
+      fn: A function to apply to every batch.
+      batches: Batches of values.
 
-    return [result[urn] for urn in client_urns]
+    Returns:
+      An iterator over results of the function.
+    """
+    if self._executor is None:
+      return map(fn, batches)
+
+    return _OrderedMap(self._executor, fn, batches, self.MAX_PENDING_BATCHES)
 
   def GetExportOptions(self):
     """Rerturns export options to be used by export converter."""
@@ -210,7 +324,9 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
     """Generates converted values using given converter from given messages.
 
     Groups values in batches of BATCH_SIZE size and applies the converter
-    to each batch.
+    to each batch. Batches are converted in parallel if the plugin has an
+    executor and the converter is `process_safe`, but results are always
+    yielded in the order of the messages.
 
     Args:
       converter: ExportConverter instance.
@@ -222,12 +338,22 @@ class InstantOutputPluginWithExportConversion(InstantOutputPlugin):
     Raises:
       ValueError: if any of the GrrMessage objects doesn't have "source" set.
     """
-    for batch in collection.Batch(grr_messages, self.BATCH_SIZE):
-      metadata_items = self._GetMetadataForClients([gm.source for gm in batch])
-      batch_with_metadata = zip(metadata_items, [gm.payload for gm in batch])
 
-      for result in converter.BatchConvert(batch_with_metadata):
-        yield result
+    def BatchesWithMetadata():
+      for batch in collection.Batch(grr_messages, self.BATCH_SIZE):
+        metadata_items = self._GetMetadataForClients(
+            [gm.source for gm in batch])
+        yield list(zip(metadata_items, [gm.payload for gm in batch]))
+
+    convert = functools.partial(_BatchConvert, converter)
+    if converter.process_safe:
+      converted_batches = self._MapBatches(convert, BatchesWithMetadata())
+    else:
+      # Converters that may access the data store run in this process.
+      converted_batches = map(convert, BatchesWithMetadata())
+
+    for results in converted_batches:
+      yield from results
 
   def ProcessValues(self, value_type, values_generator_fn):
     converter_classes = export_converters_registry.GetConvertersByClass(
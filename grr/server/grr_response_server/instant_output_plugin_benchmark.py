@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""Benchmark measuring throughput of exporting results with instant plugins.
+
+Synthetic `StatEntry` hunt results are exported the way
+`ApiGetExportedHuntResultsHandler` does it: sequentially and with a process
+pool of different sizes. The exported archives are compared to make sure that
+parallel exports produce exactly the same files.
+"""
+
+from concurrent import futures
+import hashlib
+import io
+import time
+from unittest import mock
+import zipfile
+
+from absl import app
+from absl import flags
+
+from grr_response_core import config
+from grr_response_core.lib import config_lib
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
+from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_server import data_store
+from grr_response_server import instant_output_plugin
+from grr_response_server.databases import db
+from grr_response_server.databases import db_test_utils
+from grr_response_server.databases import mem
+from grr_response_server.export_converters import registry_init as ec_registry_init
+# pylint: disable=unused-import
+from grr_response_server.output_plugins import csv_plugin
+from grr_response_server.output_plugins import yaml_plugin
+# pylint: enable=unused-import
+
+_RESULTS = flags.DEFINE_integer(
+    "results",
+    default=100000,
+    help="Number of hunt results to export.",
+)
+
+_CLIENTS = flags.DEFINE_integer(
+    "clients",
+    default=100,
+    help="Number of clients the results are spread across.",
+)
+
+_PROCESSES = flags.DEFINE_list(
+    "processes",
+    default=["0", "2", "4", "8"],
+    help="Numbers of processes to export with. 0 exports sequentially.",
+)
+
+_PLUGINS = flags.DEFINE_list(
+    "plugins",
+    default=["csv-zip", "flattened-yaml-zip"],
+    help="Names of instant output plugins to benchmark.",
+)
+
+
+def _MakeResults(client_ids):
+  results = []
+  for i in range(_RESULTS.value):
+    stat_entry = rdf_client_fs.StatEntry(
+        pathspec=rdf_paths.PathSpec.OS(path="/home/user/file%d" % i),
+        st_mode=33184,
+        st_ino=1063090 + i,
+        st_size=i,
+        st_atime=1336469177,
+        st_mtime=1336129892,
+        st_ctime=1336129892)
+    results.append(
+        rdf_flows.GrrMessage(
+            source=client_ids[i % len(client_ids)],
+            payload=stat_entry))
+  return results
+
+
+def _Export(plugin_cls, source_urn, results, executor):
+  """Exports results and returns the archive with the export time."""
+  plugin = plugin_cls(source_urn=source_urn, executor=executor)
+
+  def FetchFn(type_name):
+    del type_name  # Unused.
+    return iter(results)
+
+  # Exported metadata contains the time of the export, which would make
+  # archives of different runs differ.
+  now = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1600000000)
+  with mock.patch.object(rdfvalue.RDFDatetime, "Now", return_value=now):
+    start = time.time()
+    content = b"".join(
+        instant_output_plugin.ApplyPluginToTypedCollection(
+            plugin, [rdf_client_fs.StatEntry.__name__], FetchFn))
+    return content, time.time() - start
+
+
+def _Digest(content):
+  """Returns a digest of names and contents of all files of an archive."""
+  digest = hashlib.sha256()
+  with zipfile.ZipFile(io.BytesIO(content)) as archive:
+    for name in archive.namelist():
+      digest.update(name.encode("utf-8"))
+      digest.update(archive.read(name))
+  return digest.hexdigest()
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  config_lib.ParseConfigCommandLine()
+  # Plugins without an explicit executor export sequentially.
+  config.CONFIG.Set("Export.processes", 0)
+  ec_registry_init.RegisterExportConverters()
+  data_store.REL_DB = db.DatabaseValidationWrapper(mem.InMemoryDB())
+
+  client_ids = [
+      db_test_utils.InitializeClient(data_store.REL_DB)
+      for _ in range(_CLIENTS.value)
+  ]
+  source_urn = rdfvalue.RDFURN("hunts").Add("ABCDEF12")
+  results = _MakeResults(client_ids)
+
+  iop_cls = instant_output_plugin.InstantOutputPlugin
+  print("plugin\tprocesses\tresults\ttime\tresults/s")
+  for plugin_name in _PLUGINS.value:
+    plugin_cls = iop_cls.GetPluginClassByPluginName(plugin_name)
+
+    expected_digest = None
+    for num_processes in map(int, _PROCESSES.value):
+      if num_processes > 0:
+        executor = futures.ProcessPoolExecutor(max_workers=num_processes)
+      else:
+        executor = None
+
+      try:
+        content, duration = _Export(plugin_cls, source_urn, results, executor)
+      finally:
+        if executor is not None:
+          executor.shutdown()
+
+      digest = _Digest(content)
+      if expected_digest is None:
+        expected_digest = digest
+      elif digest != expected_digest:
+        raise AssertionError("Export with %d processes differs." %
+                             num_processes)
+
+      print("{plugin}\t{processes}\t{results}\t{time:.2f}s\t{rate:.0f}".format(
+          plugin=plugin_name,
+          processes=num_processes,
+          results=len(results),
+          time=duration,
+          rate=len(results) / duration))
+
+
+if __name__ == "__main__":
+  app.run(main)
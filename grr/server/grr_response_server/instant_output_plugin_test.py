@@ -1,12 +1,19 @@
 #!/usr/bin/env python
 """Tests for grr.lib.output_plugin."""
 
+from concurrent import futures
 import io
+import os
+from unittest import mock
 
 from absl import app
 
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_server import data_store
+from grr_response_server import instant_output_plugin
 from grr_response_server.export_converters import base
+from grr_response_server.export_converters import process
 from grr_response_server.output_plugins import test_plugins
 from grr.test_lib import export_test_lib
 from grr.test_lib import test_lib
@@ -30,6 +37,7 @@ class DummyOutValue2(rdfvalue.RDFString):
 
 class TestConverter1(base.ExportConverter):
   input_rdf_type = DummySrcValue1
+  process_safe = True
 
   def Convert(self, metadata, value):
     return [DummyOutValue1("exp-" + str(value))]
@@ -37,6 +45,7 @@ class TestConverter1(base.ExportConverter):
 
 class TestConverter2(base.ExportConverter):
   input_rdf_type = DummySrcValue2
+  process_safe = True
 
   def Convert(self, metadata, value):
     _ = metadata
@@ -46,6 +55,20 @@ class TestConverter2(base.ExportConverter):
     ]
 
 
+class DataStoreConverter(base.ExportConverter):
+  """Converter that reads from the data store, like file converters do."""
+
+  input_rdf_type = DummySrcValue1
+
+  def Convert(self, metadata, value):
+    snapshot = data_store.REL_DB.ReadClientSnapshot(
+        metadata.client_urn.Basename())
+    return [
+        DummyOutValue1("%s-%s-%d" %
+                       (value, snapshot.knowledge_base.fqdn, os.getpid()))
+    ]
+
+
 class InstantOutputPluginWithExportConversionTest(
     test_plugins.InstantOutputPluginTestBase):
   """Tests for InstantOutputPluginWithExportConversion."""
@@ -120,6 +143,91 @@ class InstantOutputPluginWithExportConversionTest(
         "Finish"
     ])  # pyformat: disable
 
+  @export_test_lib.WithAllExportConverters
+  @export_test_lib.WithExportConverter(TestConverter1)
+  @export_test_lib.WithExportConverter(TestConverter2)
+  def testExecutorPreservesOrder(self):
+    values_by_cls = {
+        DummySrcValue1: [DummySrcValue1("foo%d" % i) for i in range(20)],
+        DummySrcValue2: [DummySrcValue2("bar%d" % i) for i in range(20)],
+    }
+    self.plugin.BATCH_SIZE = 3
+    expected_lines = self.ProcessValuesToLines(values_by_cls)
+
+    with futures.ThreadPoolExecutor(max_workers=4) as executor:
+      self.plugin = self.plugin_cls(
+          source_urn=self.results_urn, executor=executor)
+      self.plugin.BATCH_SIZE = 3
+      self.plugin.MAX_PENDING_BATCHES = 2
+      lines = self.ProcessValuesToLines(values_by_cls)
+
+    self.assertListEqual(lines, expected_lines)
+    self.assertLen(lines, 65)
+
+  @export_test_lib.WithAllExportConverters
+  @export_test_lib.WithExportConverter(DataStoreConverter)
+  def testDataStoreConvertersRunInServerProcess(self):
+    with test_lib.ConfigOverrider({"Export.processes": 1}):
+      with mock.patch.object(instant_output_plugin, "_export_executor", None):
+        executor = instant_output_plugin._GetExportExecutor()  # pylint: disable=protected-access
+        self.addCleanup(executor.shutdown)
+
+        self.plugin = self.plugin_cls(source_urn=self.results_urn)
+        lines = self.ProcessValuesToLines(
+            {DummySrcValue1: [DummySrcValue1("foo")]})
+
+    self.assertListEqual(lines, [
+        "Start",
+        "Original: DummySrcValue1",
+        "Exported value: foo-Host-0.example.com-%d" % os.getpid(),
+        "Finish"
+    ])  # pyformat: disable
+
+  @export_test_lib.WithAllExportConverters
+  def testProcessSafeConvertersRunInSpawnedProcesses(self):
+    values_by_cls = {
+        rdf_client.Process: [
+            rdf_client.Process(pid=i, name="proc%d" % i) for i in range(10)
+        ]
+    }
+    self.plugin.BATCH_SIZE = 3
+    expected_lines = self.ProcessValuesToLines(values_by_cls)
+
+    with test_lib.ConfigOverrider({"Export.processes": 2}):
+      with mock.patch.object(instant_output_plugin, "_export_executor", None):
+        executor = instant_output_plugin._GetExportExecutor()  # pylint: disable=protected-access
+        self.addCleanup(executor.shutdown)
+
+        self.plugin = self.plugin_cls(source_urn=self.results_urn)
+        self.plugin.BATCH_SIZE = 3
+        with mock.patch.object(
+            process.ProcessToExportedProcessConverter,
+            "BatchConvert",
+            side_effect=AssertionError("Must not run in this process.")):
+          lines = self.ProcessValuesToLines(values_by_cls)
+
+    self.assertListEqual(lines, expected_lines)
+    self.assertEqual(executor._mp_context.get_start_method(), "spawn")  # pylint: disable=protected-access
+
+  def testMetadataIsOnlyCopiedWhenClientChanges(self):
+    client_urn = rdf_client.ClientURN(self.client_id)
+
+    first = self.plugin._GetMetadataForClients([client_urn, client_urn])
+    second = self.plugin._GetMetadataForClients([client_urn])
+
+    self.assertIs(first[0], first[1])
+    self.assertIs(first[0], second[0])
+    self.assertEqual(first[0].source_urn, self.results_urn)
+    self.assertEqual(first[0].client_urn, client_urn)
+
+    snapshot = data_store.REL_DB.ReadClientSnapshot(self.client_id)
+    snapshot.knowledge_base.fqdn = "changed.example.com"
+    data_store.REL_DB.WriteClientSnapshot(snapshot)
+
+    third = self.plugin._GetMetadataForClients([client_urn])
+    self.assertIsNot(third[0], first[0])
+    self.assertEqual(third[0].hostname, "changed.example.com")
+
 
 def main(argv):
   test_lib.main(argv)
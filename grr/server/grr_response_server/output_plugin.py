@@ -44,6 +44,9 @@ class OutputPlugin(metaclass=OutputPluginRegistry):
   name = ""
   description = ""
   args_type = None
+  # Maximum number of queued batches a single worker processes concurrently
+  # with this plugin. Worker.output_plugin_concurrency is used if not set.
+  max_concurrency = None
 
   @classmethod
   def CreatePluginAndDefaultState(cls, source_urn=None, args=None):
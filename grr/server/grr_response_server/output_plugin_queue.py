@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""Processing of queued output plugin requests.
+
+Flows don't run output plugins themselves when `Worker.output_plugin_queue` is
+enabled. Instead, they write an `OutputPluginRequest` for every output plugin
+and batch of replies to the database (see
+`FlowBase._QueueRepliesForOutputPlugins`). Workers lease these requests and
+process them with `OutputPluginRequestProcessor`, so that slow output plugins
+never delay flow processing.
+
+Hunt output plugin states are updated in the database with
+`UpdateHuntOutputPluginState`. Flow output plugin states are owned by the queue:
+the state a flow has when its first request is queued is stored next to the
+requests and updated with `UpdateQueuedFlowOutputPluginState`, so flows never
+have to be leased by output plugin workers. The states in the flow object are
+not updated by queued processing.
+"""
+
+from concurrent import futures
+import logging
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+from grr_response_core import config
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.util import collection
+from grr_response_core.stats import metrics
+from grr_response_server import data_store
+from grr_response_server import flow_base
+from grr_response_server import output_plugin as output_plugin_lib
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
+
+OUTPUT_PLUGIN_REQUEST_LATENCY = metrics.Event(
+    "output_plugin_request_latency", fields=[("plugin", str)])
+OUTPUT_PLUGIN_REQUESTS_PROCESSED = metrics.Counter(
+    "output_plugin_requests_processed", fields=[("plugin", str)])
+OUTPUT_PLUGIN_REQUEST_RETRIES = metrics.Counter(
+    "output_plugin_request_retries", fields=[("plugin", str)])
+OUTPUT_PLUGIN_REQUEST_FAILURES = metrics.Counter(
+    "output_plugin_request_failures", fields=[("plugin", str)])
+
+_LogEntryType = rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType
+
+
+def _GroupKey(request: rdf_flow_objects.OutputPluginRequest) -> Tuple[str, ...]:
+  """Returns the key of the batch a request is processed in."""
+  # Flow output plugins have their own state in every flow, so requests can
+  # only be batched per flow. Hunt output plugins share a single state, so
+  # results of all the hunt's flows are processed together.
+  if request.HasField("output_plugin_state"):
+    return (request.client_id, request.flow_id, request.output_plugin_id)
+  return (request.hunt_id, request.output_plugin_id)
+
+
+class OutputPluginRequestProcessor(object):
+  """Processes leased output plugin requests in cross-flow batches."""
+
+  def __init__(self, num_threads: Optional[int] = None):
+    """Constructor.
+
+    Args:
+      num_threads: Number of threads batches are processed on. Defaults to
+        Worker.output_plugin_threads.
+    """
+    if num_threads is None:
+      num_threads = config.CONFIG["Worker.output_plugin_threads"]
+
+    self._executor = futures.ThreadPoolExecutor(
+        max_workers=num_threads, thread_name_prefix="output_plugin")
+    self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+    self._semaphores_lock = threading.Lock()
+
+  def Stop(self) -> None:
+    """Waits for batches being processed and stops the processing threads."""
+    self._executor.shutdown(wait=True)
+
+  def _GetSemaphore(
+      self, plugin_cls: type[output_plugin_lib.OutputPlugin]
+  ) -> threading.BoundedSemaphore:
+    """Returns a semaphore limiting concurrent batches of a plugin class."""
+    with self._semaphores_lock:
+      semaphore = self._semaphores.get(plugin_cls.__name__)
+      if semaphore is None:
+        limit = plugin_cls.max_concurrency
+        if limit is None:
+          limit = config.CONFIG["Worker.output_plugin_concurrency"]
+
+        semaphore = threading.BoundedSemaphore(max(limit, 1))
+        self._semaphores[plugin_cls.__name__] = semaphore
+
+      return semaphore
+
+  def ProcessRequests(
+      self, requests: Sequence[rdf_flow_objects.OutputPluginRequest]) -> None:
+    """Processes leased output plugin requests.
+
+    Requests are grouped into batches (see `_GroupKey`), which are processed
+    concurrently. Returns when all batches are processed.
+
+    Args:
+      requests: Leased output plugin requests.
+    """
+    batches = collection.Group(requests, _GroupKey)
+    logging.info("Processing %d output plugin requests in %d batches.",
+                 len(requests), len(batches))
+
+    # Consuming the results makes sure all batches are done before the next
+    # requests are leased.
+    list(self._executor.map(self._ProcessBatch, batches.values()))
+
+  def _ProcessBatch(
+      self, batch: Sequence[rdf_flow_objects.OutputPluginRequest]) -> None:
+    """Processes a batch of requests for the same plugin and state."""
+    plugin_name = "unknown"
+    try:
+      state = self._ReadPluginState(batch[0])
+      plugin_descriptor = state.plugin_descriptor
+      plugin_name = plugin_descriptor.plugin_name
+      plugin_cls = plugin_descriptor.GetPluginClass()
+
+      with self._GetSemaphore(plugin_cls):
+        self._RunPlugin(batch, plugin_cls, state)
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Output plugin %s failed to process %d requests.",
+                        plugin_name, len(batch))
+      self._HandleFailure(batch, plugin_name, e)
+      return
+
+    now = rdfvalue.RDFDatetime.Now()
+    for request in batch:
+      OUTPUT_PLUGIN_REQUEST_LATENCY.RecordEvent(
+          (now - request.timestamp).ToFractional(rdfvalue.SECONDS),
+          fields=[plugin_name])
+    OUTPUT_PLUGIN_REQUESTS_PROCESSED.Increment(
+        delta=len(batch), fields=[plugin_name])
+
+  def _ReadPluginState(
+      self, request: rdf_flow_objects.OutputPluginRequest
+  ) -> rdf_flow_runner.OutputPluginState:
+    if request.HasField("output_plugin_state"):
+      # The state in the request is a snapshot taken when the request was
+      # queued, the queued state is the one left by previous batches.
+      return data_store.REL_DB.ReadQueuedFlowOutputPluginState(
+          request.client_id, request.flow_id, request.output_plugin_id)
+
+    states = data_store.REL_DB.ReadHuntOutputPluginsStates(request.hunt_id)
+    return states[int(request.output_plugin_id)]
+
+  def _RunPlugin(
+      self,
+      batch: Sequence[rdf_flow_objects.OutputPluginRequest],
+      plugin_cls: type[output_plugin_lib.OutputPlugin],
+      state: rdf_flow_runner.OutputPluginState,
+  ) -> None:
+    """Runs the plugin on all results of a batch and deletes its requests."""
+    first = batch[0]
+    plugin = plugin_cls(
+        source_urn=first.source_urn, args=state.plugin_descriptor.args)
+
+    results = [result for request in batch for result in request.results]
+    # TODO(user): refactor output plugins to use FlowResponse
+    # instead of GrrMessage.
+    plugin.ProcessResponses(state.plugin_state,
+                            [r.AsLegacyGrrMessage() for r in results])
+    plugin.Flush(state.plugin_state)
+
+    is_hunt_plugin = not first.HasField("output_plugin_state")
+
+    # Only do the REL_DB calls if the plugin state has actually changed.
+    s = state.plugin_state.Copy()
+    plugin.UpdateState(s)
+    if s != state.plugin_state:
+
+      def UpdateFn(plugin_state):
+        plugin.UpdateState(plugin_state)
+        return plugin_state
+
+      if is_hunt_plugin:
+        data_store.REL_DB.UpdateHuntOutputPluginState(
+            first.hunt_id, int(first.output_plugin_id), UpdateFn)
+      else:
+        data_store.REL_DB.UpdateQueuedFlowOutputPluginState(
+            first.client_id, first.flow_id, first.output_plugin_id, UpdateFn)
+
+    if is_hunt_plugin:
+      flow_base.HUNT_RESULTS_RAN_THROUGH_PLUGIN.Increment(
+          len(results), fields=[state.plugin_descriptor.plugin_name])
+
+    data_store.REL_DB.DeleteOutputPluginRequests(batch)
+
+    for request in batch:
+      self._WriteLogEntry(request, _LogEntryType.LOG,
+                          "Processed %d replies." % len(request.results))
+
+  def _HandleFailure(
+      self,
+      batch: Sequence[rdf_flow_objects.OutputPluginRequest],
+      plugin_name: str,
+      error: Exception,
+  ) -> None:
+    """Schedules a failed batch for a retry or drops it."""
+    try:
+      attempts = max(request.attempts for request in batch) + 1
+      if attempts < config.CONFIG["Worker.output_plugin_max_attempts"]:
+        OUTPUT_PLUGIN_REQUEST_RETRIES.Increment(
+            delta=len(batch), fields=[plugin_name])
+        delay = config.CONFIG["Worker.output_plugin_retry_delay"] * (
+            2**(attempts - 1))
+        data_store.REL_DB.DelayOutputPluginRequests(batch, delay)
+        return
+
+      OUTPUT_PLUGIN_REQUEST_FAILURES.Increment(
+          delta=len(batch), fields=[plugin_name])
+      if not batch[0].HasField("output_plugin_state"):
+        flow_base.HUNT_OUTPUT_PLUGIN_ERRORS.Increment(fields=[plugin_name])
+
+      data_store.REL_DB.DeleteOutputPluginRequests(batch)
+      for request in batch:
+        self._WriteLogEntry(
+            request, _LogEntryType.ERROR,
+            "Error while processing %d replies: %s" %
+            (len(request.results), error))
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Failed to handle output plugin failure: %s", e)
+
+  def _WriteLogEntry(self, request: rdf_flow_objects.OutputPluginRequest,
+                     log_entry_type: _LogEntryType, message: str) -> None:
+    try:
+      data_store.REL_DB.WriteFlowOutputPluginLogEntry(
+          rdf_flow_objects.FlowOutputPluginLogEntry(
+              client_id=request.client_id,
+              flow_id=request.flow_id,
+              hunt_id=request.hunt_id,
+              output_plugin_id=request.output_plugin_id,
+              log_entry_type=log_entry_type,
+              message=message))
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception("Failed to write output plugin log entry: %s", e)
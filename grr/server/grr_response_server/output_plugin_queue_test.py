@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+"""Tests for the output plugin queue."""
+
+import sys
+import threading
+import time
+from unittest import mock
+
+from absl import app
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
+from grr_response_server import data_store
+from grr_response_server import flow_base
+from grr_response_server import output_plugin
+from grr_response_server import output_plugin_queue
+from grr_response_server.databases import db_test_utils
+from grr_response_server.flows.general import transfer
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import flow_runner as rdf_flow_runner
+from grr_response_server.rdfvalues import output_plugin as rdf_output_plugin
+from grr.test_lib import flow_test_lib
+from grr.test_lib import hunt_test_lib
+from grr.test_lib import stats_test_lib
+from grr.test_lib import test_lib
+from grr.test_lib import test_output_plugins
+
+
+class SerialDummyOutputPlugin(output_plugin.OutputPlugin):
+  """Dummy plugin that tracks how many batches it processes concurrently."""
+
+  max_concurrency = 1
+
+  lock = threading.Lock()
+  active = 0
+  max_active = 0
+  num_calls = 0
+
+  def ProcessResponses(self, state, responses):
+    cls = SerialDummyOutputPlugin
+    with cls.lock:
+      cls.active += 1
+      cls.num_calls += 1
+      cls.max_active = max(cls.max_active, cls.active)
+
+    time.sleep(0.05)
+
+    with cls.lock:
+      cls.active -= 1
+
+
+class StatefulDummyFlowOutputPlugin(output_plugin.OutputPlugin):
+  """Dummy plugin that counts processed responses in its state."""
+
+  data = []
+
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.delta = 0
+
+  def InitializeState(self, state):
+    super().InitializeState(state)
+    state.index = 0
+
+  def ProcessResponses(self, state, responses):
+    StatefulDummyFlowOutputPlugin.data.append(state.index)
+    self.delta += len(list(responses))
+
+  def UpdateState(self, state):
+    state.index += self.delta
+
+
+class OutputPluginQueueTest(stats_test_lib.StatsTestMixin,
+                            hunt_test_lib.StandardHuntTestMixin,
+                            test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super().setUp()
+
+    overrider = test_lib.ConfigOverrider({
+        "Worker.output_plugin_queue": True,
+        "Worker.output_plugin_max_attempts": 2,
+    })
+    overrider.Start()
+    self.addCleanup(overrider.Stop)
+
+    self.processor = output_plugin_queue.OutputPluginRequestProcessor(
+        num_threads=4)
+    self.addCleanup(self.processor.Stop)
+
+    hunt_test_lib.DummyHuntOutputPlugin.num_calls = 0
+    hunt_test_lib.DummyHuntOutputPlugin.num_responses = 0
+    hunt_test_lib.StatefulDummyHuntOutputPlugin.data = []
+    test_output_plugins.DummyFlowOutputPlugin.num_calls = 0
+    test_output_plugins.DummyFlowOutputPlugin.num_responses = 0
+    StatefulDummyFlowOutputPlugin.data = []
+
+  def _RunHunt(self, plugin_names, num_clients=5):
+    self.client_ids = self.SetupClients(num_clients)
+    hunt_id = self.StartHunt(
+        client_rule_set=self._CreateForemanClientRuleSet(),
+        output_plugins=[
+            rdf_output_plugin.OutputPluginDescriptor(plugin_name=name)
+            for name in plugin_names
+        ],
+        creator=self.test_username)
+    self.RunHunt(failrate=-1)
+    return hunt_id
+
+  def _ProcessQueue(self):
+    self.processor.ProcessRequests(
+        data_store.REL_DB.ReadOutputPluginRequests())
+
+  def _ReadHuntLogs(self, hunt_id, log_entry_type):
+    return data_store.REL_DB.ReadHuntOutputPluginLogEntries(
+        hunt_id,
+        output_plugin_id="0",
+        offset=0,
+        count=sys.maxsize,
+        with_type=log_entry_type)
+
+  def _RunGetFile(self, client_id, plugin_name):
+    return flow_test_lib.StartAndRunFlow(
+        transfer.GetFile,
+        client_mock=hunt_test_lib.SampleHuntMock(failrate=-1),
+        client_id=client_id,
+        flow_args=transfer.GetFileArgs(
+            pathspec=rdf_paths.PathSpec.OS(path="/tmp/evil.txt")),
+        output_plugins=[
+            rdf_output_plugin.OutputPluginDescriptor(plugin_name=plugin_name)
+        ])
+
+  def testHuntResultsAreQueuedInsteadOfProcessedInline(self):
+    hunt_id = self._RunHunt(["DummyHuntOutputPlugin"])
+
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 0)
+    requests = data_store.REL_DB.ReadOutputPluginRequests()
+    self.assertLen(requests, 5)
+    for request in requests:
+      self.assertEqual(request.hunt_id, hunt_id)
+      self.assertEqual(request.output_plugin_id, "0")
+      self.assertFalse(request.HasField("output_plugin_state"))
+      self.assertLen(request.results, 1)
+
+  def testHuntResultsAreProcessedInSingleBatch(self):
+    hunt_id = self._RunHunt(
+        ["DummyHuntOutputPlugin", "StatefulDummyHuntOutputPlugin"])
+
+    with self.assertStatsCounterDelta(
+        5, output_plugin_queue.OUTPUT_PLUGIN_REQUESTS_PROCESSED,
+        ["DummyHuntOutputPlugin"]):
+      self._ProcessQueue()
+
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 1)
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_responses, 5)
+    self.assertEqual(hunt_test_lib.StatefulDummyHuntOutputPlugin.data, [0])
+    self.assertEmpty(data_store.REL_DB.ReadOutputPluginRequests())
+
+    states = data_store.REL_DB.ReadHuntOutputPluginsStates(hunt_id)
+    self.assertEqual(states[1].plugin_state.index, 1)
+
+    logs = self._ReadHuntLogs(
+        hunt_id, rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType.LOG)
+    self.assertCountEqual([l.client_id for l in logs], self.client_ids)
+    for l in logs:
+      self.assertEqual(l.message, "Processed 1 replies.")
+
+  def testFailingRequestsAreRetriedWithBackoff(self):
+    hunt_id = self._RunHunt(["FailingDummyHuntOutputPlugin"], num_clients=2)
+
+    retry_delay = rdfvalue.Duration.From(30, rdfvalue.SECONDS)
+    before = rdfvalue.RDFDatetime.Now()
+    with self.assertStatsCounterDelta(
+        2, output_plugin_queue.OUTPUT_PLUGIN_REQUEST_RETRIES,
+        ["FailingDummyHuntOutputPlugin"]):
+      self._ProcessQueue()
+
+    requests = data_store.REL_DB.ReadOutputPluginRequests()
+    self.assertLen(requests, 2)
+    for request in requests:
+      self.assertEqual(request.attempts, 1)
+      self.assertGreaterEqual(request.leased_until, before + retry_delay)
+
+    self.assertEmpty(
+        self._ReadHuntLogs(
+            hunt_id,
+            rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType.ERROR))
+
+    with self.assertStatsCounterDelta(
+        2, output_plugin_queue.OUTPUT_PLUGIN_REQUEST_FAILURES,
+        ["FailingDummyHuntOutputPlugin"]):
+      self._ProcessQueue()
+
+    self.assertEmpty(data_store.REL_DB.ReadOutputPluginRequests())
+    errors = self._ReadHuntLogs(
+        hunt_id, rdf_flow_objects.FlowOutputPluginLogEntry.LogEntryType.ERROR)
+    self.assertLen(errors, 2)
+    for e in errors:
+      self.assertEqual(e.message, "Error while processing 1 replies: Oh no!")
+
+  def testFlowCompletesWithoutWaitingForOutputPlugins(self):
+    client_id = self.SetupClient(0)
+    flow_id = self._RunGetFile(client_id, "DummyFlowOutputPlugin")
+
+    flow_obj = data_store.REL_DB.ReadFlowObject(client_id, flow_id)
+    self.assertEqual(flow_obj.flow_state, flow_obj.FlowState.FINISHED)
+    self.assertEqual(test_output_plugins.DummyFlowOutputPlugin.num_calls, 0)
+
+    requests = data_store.REL_DB.ReadOutputPluginRequests()
+    self.assertLen(requests, 1)
+    self.assertEqual(requests[0].flow_id, flow_id)
+    self.assertEqual(
+        requests[0].output_plugin_state.plugin_descriptor.plugin_name,
+        "DummyFlowOutputPlugin")
+
+    self._ProcessQueue()
+
+    self.assertEqual(test_output_plugins.DummyFlowOutputPlugin.num_calls, 1)
+    self.assertEqual(test_output_plugins.DummyFlowOutputPlugin.num_responses, 1)
+    self.assertEmpty(data_store.REL_DB.ReadOutputPluginRequests())
+
+    logs = data_store.REL_DB.ReadFlowOutputPluginLogEntries(
+        client_id, flow_id, "0", 0, sys.maxsize)
+    self.assertLen(logs, 1)
+    self.assertEqual(logs[0].message, "Processed 1 replies.")
+
+  def testFlowPluginStateIsStoredInQueue(self):
+    client_id = self.SetupClient(0)
+    flow_id = self._RunGetFile(client_id, "StatefulDummyFlowOutputPlugin")
+
+    requests = data_store.REL_DB.ReadOutputPluginRequests()
+    self.assertLen(requests, 1)
+    with mock.patch.object(
+        data_store.REL_DB.delegate,
+        "LeaseFlowForProcessing",
+        side_effect=AssertionError("Flow must not be leased.")):
+      self._ProcessQueue()
+
+    state = data_store.REL_DB.ReadQueuedFlowOutputPluginState(
+        client_id, flow_id, "0")
+    self.assertEqual(state.plugin_state.index, 1)
+
+    # The state snapshot in a request queued before the first batch was
+    # processed must not be used, the queued state is the current one.
+    data_store.REL_DB.WriteOutputPluginRequests(requests)
+    self._ProcessQueue()
+
+    self.assertEqual(StatefulDummyFlowOutputPlugin.data, [0, 1])
+    state = data_store.REL_DB.ReadQueuedFlowOutputPluginState(
+        client_id, flow_id, "0")
+    self.assertEqual(state.plugin_state.index, 2)
+
+  def testLargeResultBatchesAreSplit(self):
+    client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+    flow_id = db_test_utils.InitializeFlow(data_store.REL_DB, client_id)
+    results = [
+        rdf_flow_objects.FlowResult(
+            client_id=client_id,
+            flow_id=flow_id,
+            payload=rdf_protodict.DataBlob(data=b"x" * 100)) for _ in range(5)
+    ]
+    rdf_flow = data_store.REL_DB.ReadFlowObject(client_id, flow_id)
+    rdf_flow.output_plugins_states = [
+        rdf_flow_runner.OutputPluginState(
+            plugin_descriptor=rdf_output_plugin.OutputPluginDescriptor(
+                plugin_name="DummyFlowOutputPlugin"),
+            plugin_state=rdf_protodict.AttributedDict())
+    ]
+    flow_obj = flow_base.FlowBase(rdf_flow)
+
+    max_size = 2 * len(results[0].SerializeToBytes())
+    with test_lib.ConfigOverrider(
+        {"Worker.output_plugin_request_max_size": max_size}):
+      flow_obj._QueueRepliesForOutputPlugins(results)  # pylint: disable=protected-access
+
+    self.assertEqual([len(r.results) for r in flow_obj.output_plugin_requests],
+                     [2, 2, 1])
+
+  def testPluginConcurrencyIsLimited(self):
+    SerialDummyOutputPlugin.max_active = 0
+    SerialDummyOutputPlugin.num_calls = 0
+
+    client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+    state = rdf_flow_runner.OutputPluginState(
+        plugin_descriptor=rdf_output_plugin.OutputPluginDescriptor(
+            plugin_name="SerialDummyOutputPlugin"),
+        plugin_state=rdf_protodict.AttributedDict())
+
+    requests = []
+    for _ in range(4):
+      flow_id = db_test_utils.InitializeFlow(
+          data_store.REL_DB, client_id, output_plugins_states=[state])
+      requests.append(
+          rdf_flow_objects.OutputPluginRequest(
+              request_id=len(requests) + 1,
+              client_id=client_id,
+              flow_id=flow_id,
+              output_plugin_id="0",
+              output_plugin_state=state,
+              source_urn=rdfvalue.RDFURN(client_id).Add(flow_id),
+              results=[
+                  rdf_flow_objects.FlowResult(
+                      client_id=client_id,
+                      flow_id=flow_id,
+                      payload=rdf_client.ClientSummary(client_id=client_id))
+              ]))
+    data_store.REL_DB.WriteOutputPluginRequests(requests)
+
+    self._ProcessQueue()
+
+    self.assertEqual(SerialDummyOutputPlugin.num_calls, 4)
+    self.assertEqual(SerialDummyOutputPlugin.max_active, 1)
+    self.assertEmpty(data_store.REL_DB.ReadOutputPluginRequests())
+
+
+if __name__ == "__main__":
+  app.run(test_lib.main)
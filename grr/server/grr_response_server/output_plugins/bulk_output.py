@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""Helpers for output plugins sending results to HTTP bulk APIs.
+
+Output plugins like Elasticsearch or Splunk receive results of many clients and
+flows in a single ProcessResponses() call when results are processed from the
+output plugin queue. The helpers in this module let them:
+
+  * pack events of many flows into size- and time-bounded bulk requests;
+  * reuse HTTP connections between requests.
+
+Client metadata of all clients in a batch is looked up with
+`export.GetClientsMetadata`.
+"""
+
+import logging
+import threading
+import time
+from typing import List, Mapping, Optional, Text
+
+import requests
+from requests import adapters
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.stats import metrics
+
+BULK_REQUESTS_SENT = metrics.Counter(
+    "output_plugin_bulk_requests_sent", fields=[("plugin", str)])
+BULK_REQUEST_EVENTS = metrics.Event(
+    "output_plugin_bulk_request_events",
+    bins=[1, 10, 100, 1000, 10000, 100000],
+    fields=[("plugin", str)])
+
+# Maximum number of connections per host kept open by the shared HTTP session.
+_HTTP_POOL_SIZE = 10
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+
+
+def _GetSession() -> requests.Session:
+  """Returns the HTTP session shared by all bulk senders of this process."""
+  global _session
+
+  with _session_lock:
+    if _session is None:
+      adapter = adapters.HTTPAdapter(
+          pool_connections=_HTTP_POOL_SIZE, pool_maxsize=_HTTP_POOL_SIZE)
+      _session = requests.Session()
+      _session.mount("http://", adapter)
+      _session.mount("https://", adapter)
+    return _session
+
+
+def CloseSession() -> None:
+  """Closes all pooled HTTP connections."""
+  global _session
+
+  with _session_lock:
+    if _session is not None:
+      _session.close()
+      _session = None
+
+
+class BulkSender(object):
+  """Buffers serialized events and sends them in bounded bulk requests.
+
+  A request is sent as soon as the buffered events would exceed `max_events`
+  or `max_bytes`, or once the oldest buffered event is older than `max_age`,
+  even if no more events are added. Remaining events are sent by Flush().
+
+  Events stay buffered if sending them fails, so that they are sent again by
+  the next request.
+  """
+
+  def __init__(self,
+               plugin_name: Text,
+               url: Text,
+               headers: Mapping[Text, Text],
+               verify: bool,
+               max_events: int,
+               max_bytes: int,
+               max_age: rdfvalue.Duration,
+               separator: Text = "\n",
+               terminator: Text = ""):
+    """Constructor.
+
+    Args:
+      plugin_name: Name of the output plugin, used for monitoring.
+      url: URL the requests are posted to.
+      headers: HTTP headers of every request.
+      verify: Whether to verify HTTPS certificates.
+      max_events: Maximum number of events in a single request.
+      max_bytes: Maximum size of a single request's body. A single event
+        larger than this is still sent, in a request of its own.
+      max_age: Maximum time an event is buffered before it is sent.
+      separator: String separating events in a request's body.
+      terminator: String terminating a request's body.
+    """
+    self._plugin_name = plugin_name
+    self._url = url
+    self._headers = dict(headers)
+    self._verify = verify
+    self._max_events = max(max_events, 1)
+    self._max_bytes = max_bytes
+    self._max_age = max_age.ToFractional(rdfvalue.SECONDS)
+    self._separator = separator
+    self._terminator = terminator
+
+    self._lock = threading.RLock()
+    self._events: List[Text] = []
+    self._size = 0
+    self._oldest: Optional[float] = None
+    self._timer: Optional[threading.Timer] = None
+
+  def Add(self, event: Text) -> None:
+    """Buffers a serialized event, sending buffered events if needed."""
+    size = len(event.encode("utf-8")) + len(self._separator)
+
+    with self._lock:
+      if self._events and self._size + size > self._max_bytes:
+        self.Flush()
+
+      self._events.append(event)
+      self._size += size
+      if self._oldest is None:
+        self._oldest = time.time()
+
+      if (len(self._events) >= self._max_events or
+          time.time() - self._oldest >= self._max_age):
+        self.Flush()
+      elif self._timer is None:
+        self._timer = threading.Timer(self._max_age, self._FlushOldEvents)
+        self._timer.daemon = True
+        self._timer.start()
+
+  def _FlushOldEvents(self) -> None:
+    """Sends buffered events once the oldest of them reached `max_age`."""
+    with self._lock:
+      self._timer = None
+      try:
+        self.Flush()
+      except Exception as e:  # pylint: disable=broad-except
+        # Events stay buffered and are sent by the next Flush().
+        logging.exception("%s failed to send old events: %s",
+                          self._plugin_name, e)
+
+  def Flush(self) -> None:
+    """Sends all buffered events."""
+    with self._lock:
+      if not self._events:
+        return
+
+      # If sending fails, the caller has to retry. The timer is started again
+      # by the next Add().
+      if self._timer is not None:
+        self._timer.cancel()
+        self._timer = None
+
+      data = self._separator.join(self._events) + self._terminator
+      num_events = len(self._events)
+
+      response = _GetSession().post(
+          url=self._url, verify=self._verify, data=data, headers=self._headers)
+      response.raise_for_status()
+
+      self._events = []
+      self._size = 0
+      self._oldest = None
+
+    BULK_REQUESTS_SENT.Increment(fields=[self._plugin_name])
+    BULK_REQUEST_EVENTS.RecordEvent(num_events, fields=[self._plugin_name])
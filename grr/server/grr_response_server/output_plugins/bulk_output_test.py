@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Tests for the helpers of output plugins using HTTP bulk APIs."""
+
+from http import server as http_server
+import threading
+import time
+
+from absl import app
+import requests
+
+from grr_response_core.lib import rdfvalue
+from grr_response_server.output_plugins import bulk_output
+from grr.test_lib import test_lib
+
+
+class _StubHandler(http_server.BaseHTTPRequestHandler):
+  """Records all posted requests and answers with a configured status."""
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    length = int(self.headers["Content-Length"])
+    body = self.rfile.read(length).decode("utf-8")
+    self.server.requests.append((self.path, dict(self.headers), body))
+
+    self.send_response(self.server.status)
+    self.send_header("Content-Length", "0")
+    self.end_headers()
+
+  def log_message(self, *args):
+    pass
+
+
+class BulkSenderTest(test_lib.GRRBaseTest):
+
+  def setUp(self):
+    super().setUp()
+
+    self.server = http_server.HTTPServer(("localhost", 0), _StubHandler)
+    self.server.requests = []
+    self.server.status = 200
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.start()
+
+    def StopServer():
+      self.server.shutdown()
+      thread.join()
+      self.server.server_close()
+
+    self.addCleanup(StopServer)
+    self.addCleanup(bulk_output.CloseSession)
+
+  def _MakeSender(self,
+                  max_events=100,
+                  max_bytes=1000,
+                  max_age=rdfvalue.Duration.From(1, rdfvalue.HOURS)):
+    return bulk_output.BulkSender(
+        plugin_name="Test",
+        url="http://localhost:{}/bulk".format(self.server.server_port),
+        headers={"Authorization": "Basic foo"},
+        verify=True,
+        max_events=max_events,
+        max_bytes=max_bytes,
+        max_age=max_age,
+        separator="\n",
+        terminator="\n")
+
+  def _Bodies(self):
+    return [body for _, _, body in self.server.requests]
+
+  def testBuffersEventsUntilFlush(self):
+    sender = self._MakeSender()
+    sender.Add("a")
+    sender.Add("b")
+    self.assertEmpty(self.server.requests)
+
+    sender.Flush()
+    self.assertLen(self.server.requests, 1)
+    path, headers, body = self.server.requests[0]
+    self.assertEqual(path, "/bulk")
+    self.assertEqual(headers["Authorization"], "Basic foo")
+    self.assertEqual(body, "a\nb\n")
+
+  def testFlushWithoutEventsSendsNothing(self):
+    sender = self._MakeSender()
+    sender.Flush()
+    self.assertEmpty(self.server.requests)
+
+  def testSplitsRequestsByNumberOfEvents(self):
+    sender = self._MakeSender(max_events=2)
+    for event in "abcde":
+      sender.Add(event)
+    sender.Flush()
+
+    self.assertEqual(self._Bodies(), ["a\nb\n", "c\nd\n", "e\n"])
+
+  def testSplitsRequestsBySize(self):
+    sender = self._MakeSender(max_bytes=10)
+    sender.Add("aaaa")
+    sender.Add("bbbb")
+    sender.Add("cccccccccccc")
+    sender.Add("d")
+    sender.Flush()
+
+    self.assertEqual(self._Bodies(),
+                     ["aaaa\nbbbb\n", "cccccccccccc\n", "d\n"])
+
+  def testSendsOldEvents(self):
+    sender = self._MakeSender(max_age=rdfvalue.Duration(0))
+    sender.Add("a")
+    sender.Add("b")
+
+    self.assertEqual(self._Bodies(), ["a\n", "b\n"])
+
+  def testRaisesForHttpError(self):
+    self.server.status = 500
+    sender = self._MakeSender()
+    sender.Add("a")
+
+    with self.assertRaises(requests.exceptions.HTTPError):
+      sender.Flush()
+
+  def testKeepsEventsWhenSendingFails(self):
+    self.server.status = 500
+    sender = self._MakeSender()
+    sender.Add("a")
+    with self.assertRaises(requests.exceptions.HTTPError):
+      sender.Flush()
+
+    self.server.status = 200
+    sender.Add("b")
+    sender.Flush()
+
+    self.assertEqual(self._Bodies(), ["a\n", "a\nb\n"])
+
+  def testSendsOldEventsOfIdleSender(self):
+    sender = self._MakeSender(max_age=rdfvalue.Duration.From(
+        100, rdfvalue.MILLISECONDS))
+    sender.Add("a")
+    self.assertEmpty(self.server.requests)
+
+    for _ in range(100):
+      if self.server.requests:
+        break
+      time.sleep(0.05)
+
+    self.assertEqual(self._Bodies(), ["a\n"])
+
+
+if __name__ == "__main__":
+  app.run(test_lib.main)
@@ -14,6 +14,29 @@ from grr_response_core.lib.util import text
 from grr_response_server import instant_output_plugin
 
 
+def _GetCSVRow(value):
+  row = []
+  for type_info in value.__class__.type_infos:
+    if isinstance(type_info, rdf_structs.ProtoEmbedded):
+      row.extend(_GetCSVRow(value.Get(type_info.name)))
+    elif isinstance(type_info, rdf_structs.ProtoBinary):
+      row.append(text.Asciify(value.Get(type_info.name)))
+    else:
+      row.append(str(value.Get(type_info.name)))
+
+  return row
+
+
+def _SerializeToCSVRows(values):
+  """Serializes a batch of values to UTF-8 encoded CSV rows."""
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  for value in values:
+    writer.writerow(_GetCSVRow(value))
+
+  return buffer.getvalue().encode("utf-8")
+
+
 class CSVInstantOutputPlugin(
     instant_output_plugin.InstantOutputPluginWithExportConversion):
   """Instant Output plugin that writes results to an archive of CSV files."""
@@ -37,18 +60,6 @@ class CSVInstantOutputPlugin(
 
     return header
 
-  def _GetCSVRow(self, value):
-    row = []
-    for type_info in value.__class__.type_infos:
-      if isinstance(type_info, rdf_structs.ProtoEmbedded):
-        row.extend(self._GetCSVRow(value.Get(type_info.name)))
-      elif isinstance(type_info, rdf_structs.ProtoBinary):
-        row.append(text.Asciify(value.Get(type_info.name)))
-      else:
-        row.append(str(value.Get(type_info.name)))
-
-    return row
-
   @property
   def path_prefix(self):
     prefix, _ = os.path.splitext(self.output_file_name)
@@ -76,22 +87,21 @@ class CSVInstantOutputPlugin(
     # the first value itself. All other values are guaranteed
     # to have the same class (see ProcessSingleTypeExportedValues definition).
     writer.writerow(self._GetCSVHeader(first_value.__class__))
-    writer.writerow(self._GetCSVRow(first_value))
+    writer.writerow(_GetCSVRow(first_value))
 
     chunk = buffer.getvalue().encode("utf-8")
     yield self.archive_generator.WriteFileChunk(chunk)
 
     # Counter starts from 1, as 1 value has already been written.
     counter = 1
-    for batch in collection.Batch(exported_values, self.ROW_BATCH):
-      counter += len(batch)
 
-      buffer = io.StringIO()
-      writer = csv.writer(buffer)
-      for value in batch:
-        writer.writerow(self._GetCSVRow(value))
+    def Batches():
+      nonlocal counter
+      for batch in collection.Batch(exported_values, self.ROW_BATCH):
+        counter += len(batch)
+        yield batch
 
-      chunk = buffer.getvalue().encode("utf-8")
+    for chunk in self._MapBatches(_SerializeToCSVRows, Batches()):
       yield self.archive_generator.WriteFileChunk(chunk)
 
     yield self.archive_generator.WriteFileFooter()
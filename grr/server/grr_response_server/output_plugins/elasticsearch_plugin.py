@@ -14,8 +14,6 @@ from typing import List
 from typing import Text
 from urllib import parse as urlparse
 
-import requests
-
 from google.protobuf import json_format
 from grr_response_core import config
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
@@ -27,6 +25,7 @@ from grr_response_server import export
 from grr_response_server import output_plugin
 from grr_response_server.export_converters import base
 from grr_response_server.gui.api_plugins import flow as api_flow
+from grr_response_server.output_plugins import bulk_output
 
 BULK_OPERATIONS_PATH = "_bulk"
 
@@ -72,41 +71,60 @@ class ElasticsearchOutputPlugin(output_plugin.OutputPlugin):
     # Allow the Flow creator to override the index, fall back to configuration.
     self._index = self.args.index or config.CONFIG["Elasticsearch.index"]
 
-    self._url = urlparse.urljoin(url, BULK_OPERATIONS_PATH)
+    # https://www.elastic.co/guide/en/elasticsearch/reference/7.1/docs-bulk.html
+    if self._token:
+      headers = {
+          "Authorization": "Basic {}".format(self._token),
+          "Content-Type": "application/json"
+      }
+    else:
+      headers = {"Content-Type": "application/json"}
+
+    # Each index operation is two lines, the first defining the index settings,
+    # the second is the actual document to be indexed.
+    self._index_command = json.dumps({"index": {"_index": self._index}},
+                                     indent=None)
+
+    self._sender = bulk_output.BulkSender(
+        plugin_name=self.__class__.__name__,
+        url=urlparse.urljoin(url, BULK_OPERATIONS_PATH),
+        headers=headers,
+        verify=self._verify_https,
+        max_events=config.CONFIG["Elasticsearch.batch_max_events"],
+        max_bytes=config.CONFIG["Elasticsearch.batch_max_bytes"],
+        max_age=config.CONFIG["Elasticsearch.batch_max_age"],
+        separator="\n",
+        terminator="\n")
 
   def ProcessResponses(self, state: rdf_protodict.AttributedDict,
                        responses: List[rdf_flows.GrrMessage]) -> None:
     """See base class."""
-    client_id = self._GetClientId(responses)
-    flow_id = self._GetFlowId(responses)
-
-    client = self._GetClientMetadata(client_id)
-    flow = self._GetFlowMetadata(client_id, flow_id)
-
-    events = [self._MakeEvent(response, client, flow) for response in responses]
-    self._SendEvents(events)
-
-  def _GetClientId(self, responses: List[rdf_flows.GrrMessage]) -> Text:
-    client_ids = {msg.source.Basename() for msg in responses}
-    if len(client_ids) > 1:
-      raise AssertionError((
-          "ProcessResponses received messages from different Clients {}, which "
-          "violates OutputPlugin constraints.").format(client_ids))
-    return client_ids.pop()
-
-  def _GetFlowId(self, responses: List[rdf_flows.GrrMessage]) -> Text:
-    flow_ids = {msg.session_id.Basename() for msg in responses}
-    if len(flow_ids) > 1:
-      raise AssertionError(
-          ("ProcessResponses received messages from different Flows {}, which "
-           "violates OutputPlugin constraints.").format(flow_ids))
-    return flow_ids.pop()
-
-  def _GetClientMetadata(self, client_id: Text) -> base.ExportedMetadata:
-    info = data_store.REL_DB.ReadClientFullInfo(client_id)
-    metadata = export.GetMetadata(client_id, info)
-    metadata.timestamp = None  # timestamp is sent outside of metadata.
-    return metadata
+    # Responses may come from many clients and flows when they are processed
+    # from the output plugin queue.
+    clients = export.GetClientsMetadata(
+        {msg.source.Basename() for msg in responses})
+
+    flows = {}
+    for response in responses:
+      client_id = response.source.Basename()
+      flow_id = response.session_id.Basename()
+      flow = flows.get((client_id, flow_id))
+      if flow is None:
+        flow = self._GetFlowMetadata(client_id, flow_id)
+        flows[(client_id, flow_id)] = flow
+
+      client = clients.get(client_id)
+      if client is None:
+        # The client was deleted after its results were written.
+        client = base.ExportedMetadata()
+
+      event = self._MakeEvent(response, client, flow)
+      self._sender.Add("{}\n{}".format(self._index_command,
+                                        json.dumps(event, indent=None)))
+
+  def Flush(self, state: rdf_protodict.AttributedDict) -> None:
+    """See base class."""
+    self._sender.Flush()
 
   def _GetFlowMetadata(self, client_id: Text,
                        flow_id: Text) -> api_flow.ApiFlow:
@@ -128,34 +146,3 @@ class ElasticsearchOutputPlugin(output_plugin.OutputPlugin):
       event["tags"] = list(self.args.tags)
 
     return event
-
-  def _SendEvents(self, events: List[JsonDict]) -> None:
-    """Uses the Elasticsearch bulk API to index all events in a single request.
-    """
-    # https://www.elastic.co/guide/en/elasticsearch/reference/7.1/docs-bulk.html
-
-    if self._token:
-      headers = {
-          "Authorization": "Basic {}".format(self._token),
-          "Content-Type": "application/json"
-      }
-    else:
-      headers = {"Content-Type": "application/json"}
-
-    index_command = json.dumps({"index": {"_index": self._index}}, indent=None)
-
-    # Each index operation is two lines, the first defining the index settings,
-    # the second is the actual document to be indexed
-    data = (
-        "\n".join(
-            [
-                "{}\n{}".format(index_command, json.dumps(event, indent=None))
-                for event in events
-            ]
-        )
-        + "\n"
-    )
-
-    response = requests.post(
-        url=self._url, verify=self._verify_https, data=data, headers=headers)
-    response.raise_for_status()
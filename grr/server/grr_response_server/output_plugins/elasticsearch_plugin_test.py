@@ -12,6 +12,7 @@ from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
 from grr_response_server import data_store
+from grr_response_server import export
 from grr_response_server.output_plugins import elasticsearch_plugin
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr.test_lib import flow_test_lib
@@ -37,24 +38,29 @@ class ElasticsearchOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
             create_time=rdfvalue.RDFDatetime.Now(),
         ))
 
-  def _CallPlugin(self, plugin_args=None, responses=None, patcher=None):
+  def _CallPlugin(self,
+                  plugin_args=None,
+                  responses=None,
+                  patcher=None,
+                  messages=None):
     source_id = rdf_client.ClientURN(
         self.client_id).Add('Results').RelativeName('aff4:/')
 
-    messages = []
-    for response in responses:
-      messages.append(
-          rdf_flows.GrrMessage(
-              source=self.client_id,
-              session_id='{}/{}'.format(self.client_id, self.flow_id),
-              payload=response))
+    if messages is None:
+      messages = []
+      for response in responses:
+        messages.append(
+            rdf_flows.GrrMessage(
+                source=self.client_id,
+                session_id='{}/{}'.format(self.client_id, self.flow_id),
+                payload=response))
 
     plugin_cls = elasticsearch_plugin.ElasticsearchOutputPlugin
     plugin, plugin_state = plugin_cls.CreatePluginAndDefaultState(
         source_urn=source_id, args=plugin_args)
 
     if patcher is None:
-      patcher = mock.patch.object(requests, 'post')
+      patcher = mock.patch.object(requests.Session, 'post')
 
     with patcher as patched:
       plugin.ProcessResponses(plugin_state, messages)
@@ -64,7 +70,9 @@ class ElasticsearchOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
     return patched
 
   def _ParseEvents(self, patched):
-    request = patched.call_args[KWARGS]['data']
+    return self._ParseData(patched.call_args[KWARGS]['data'])
+
+  def _ParseData(self, request):
     # Elasticsearch bulk requests are line-deliminated pairs, where the first
     # line is the index command and the second is the actual document to index
     split_requests = []
@@ -143,6 +151,63 @@ class ElasticsearchOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
         'pid': 42,
     })
 
+  def _MakeMessages(self):
+    other_client_id = self.SetupClient(1)
+    other_flow_id = '87654321'
+    data_store.REL_DB.WriteFlowObject(
+        rdf_flow_objects.Flow(
+            flow_id=other_flow_id,
+            client_id=other_client_id,
+            flow_class_name='ClientFileFinder',
+            create_time=rdfvalue.RDFDatetime.Now(),
+        ))
+
+    messages = []
+    for pid, (client_id, flow_id) in enumerate([
+        (self.client_id, self.flow_id),
+        (other_client_id, other_flow_id),
+        (self.client_id, self.flow_id),
+    ]):
+      messages.append(
+          rdf_flows.GrrMessage(
+              source=client_id,
+              session_id='{}/{}'.format(client_id, flow_id),
+              payload=rdf_client.Process(pid=pid)))
+    return messages
+
+  def testPacksResultsOfManyFlowsInSingleRequest(self):
+    with test_lib.ConfigOverrider({
+        'Elasticsearch.url': 'http://a',
+        'Elasticsearch.token': 'b',
+    }):
+      mock_post = self._CallPlugin(
+          plugin_args=elasticsearch_plugin.ElasticsearchOutputPluginArgs(),
+          messages=self._MakeMessages())
+
+    self.assertEqual(mock_post.call_count, 1)
+    bulk_pairs = self._ParseEvents(mock_post)
+    self.assertEqual([pair[1]['result']['pid'] for pair in bulk_pairs[1:]], [1, 2])
+    self.assertEqual([(pair[1]['client']['clientUrn'], pair[1]['flow']['flowId']) for pair in bulk_pairs], [
+        ('aff4:/C.1000000000000000', '12345678'),
+        ('aff4:/C.1000000000000001', '87654321'),
+        ('aff4:/C.1000000000000000', '12345678'),
+    ])
+
+  def testSplitsRequestsExceedingBatchSize(self):
+    with test_lib.ConfigOverrider({
+        'Elasticsearch.url': 'http://a',
+        'Elasticsearch.token': 'b',
+        'Elasticsearch.batch_max_events': 2,
+    }):
+      mock_post = self._CallPlugin(
+          plugin_args=elasticsearch_plugin.ElasticsearchOutputPluginArgs(),
+          messages=self._MakeMessages())
+
+    self.assertEqual([
+        len(self._ParseData(call[KWARGS]['data']))
+        for call in mock_post.call_args_list
+    ], [2, 1])
+
   def testReadsConfigurationValuesCorrectly(self):
     with test_lib.ConfigOverrider({
         'Elasticsearch.url': 'http://a',
@@ -201,7 +266,7 @@ class ElasticsearchOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
         self._CallPlugin(
             plugin_args=elasticsearch_plugin.ElasticsearchOutputPluginArgs(),
             responses=[rdf_client.Process(pid=42)],
-            patcher=mock.patch.object(requests, 'post', post))
+            patcher=mock.patch.object(requests.Session, 'post', post))
 
   def testPostDataTerminatingNewline(self):
     with test_lib.ConfigOverrider({
@@ -213,6 +278,20 @@ class ElasticsearchOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
           responses=[rdf_client.Process(pid=42)])
     self.assertEndsWith(mock_post.call_args[KWARGS]['data'], '\n')
 
+  def testSendsResultsOfUnknownClients(self):
+    with test_lib.ConfigOverrider({
+        'Elasticsearch.url': 'http://a',
+        'Elasticsearch.token': 'b',
+    }):
+      with mock.patch.object(export, 'GetClientsMetadata', return_value={}):
+        mock_post = self._CallPlugin(
+            plugin_args=elasticsearch_plugin.ElasticsearchOutputPluginArgs(),
+            responses=[rdf_client.Process(pid=42)])
+
+    events = self._ParseEvents(mock_post)
+    self.assertLen(events, 1)
+    self.assertNotIn('clientUrn', events[0][1]['client'])
+
 
 if __name__ == '__main__':
   app.run(test_lib.main)
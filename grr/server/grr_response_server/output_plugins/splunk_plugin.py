@@ -14,8 +14,6 @@ from typing import List
 from typing import Text
 from urllib import parse as urlparse
 
-import requests
-
 from google.protobuf import json_format
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
@@ -28,6 +26,7 @@ from grr_response_server import export
 from grr_response_server import output_plugin
 from grr_response_server.export_converters import base
 from grr_response_server.gui.api_plugins import flow as api_flow
+from grr_response_server.output_plugins import bulk_output
 
 HTTP_EVENT_COLLECTOR_PATH = "services/collector/event"
 
@@ -81,41 +80,45 @@ class SplunkOutputPlugin(output_plugin.OutputPlugin):
           "token when configuring a new HEC input in your Splunk "
           "installation.")
 
-    self._url = urlparse.urljoin(url, HTTP_EVENT_COLLECTOR_PATH)
+    # Multiple events are batched in one request, separated by two newlines.
+    self._sender = bulk_output.BulkSender(
+        plugin_name=self.__class__.__name__,
+        url=urlparse.urljoin(url, HTTP_EVENT_COLLECTOR_PATH),
+        headers={"Authorization": "Splunk {}".format(self._token)},
+        verify=self._verify_https,
+        max_events=config.CONFIG["Splunk.batch_max_events"],
+        max_bytes=config.CONFIG["Splunk.batch_max_bytes"],
+        max_age=config.CONFIG["Splunk.batch_max_age"],
+        separator="\n\n")
 
   def ProcessResponses(self, state: rdf_protodict.AttributedDict,
                        responses: List[rdf_flows.GrrMessage]) -> None:
     """See base class."""
-    client_id = self._GetClientId(responses)
-    flow_id = self._GetFlowId(responses)
-
-    client = self._GetClientMetadata(client_id)
-    flow = self._GetFlowMetadata(client_id, flow_id)
-
-    events = [self._MakeEvent(response, client, flow) for response in responses]
-    self._SendEvents(events)
-
-  def _GetClientId(self, responses: List[rdf_flows.GrrMessage]) -> Text:
-    client_ids = {msg.source.Basename() for msg in responses}
-    if len(client_ids) > 1:
-      raise AssertionError((
-          "ProcessResponses received messages from different Clients {}, which "
-          "violates OutputPlugin constraints.").format(client_ids))
-    return client_ids.pop()
-
-  def _GetFlowId(self, responses: List[rdf_flows.GrrMessage]) -> Text:
-    flow_ids = {msg.session_id.Basename() for msg in responses}
-    if len(flow_ids) > 1:
-      raise AssertionError(
-          ("ProcessResponses received messages from different Flows {}, which "
-           "violates OutputPlugin constraints.").format(flow_ids))
-    return flow_ids.pop()
-
-  def _GetClientMetadata(self, client_id: Text) -> base.ExportedMetadata:
-    info = data_store.REL_DB.ReadClientFullInfo(client_id)
-    metadata = export.GetMetadata(client_id, info)
-    metadata.timestamp = None  # timestamp is sent outside of metadata.
-    return metadata
+    # Responses may come from many clients and flows when they are processed
+    # from the output plugin queue.
+    clients = export.GetClientsMetadata(
+        {msg.source.Basename() for msg in responses})
+
+    flows = {}
+    for response in responses:
+      client_id = response.source.Basename()
+      flow_id = response.session_id.Basename()
+      flow = flows.get((client_id, flow_id))
+      if flow is None:
+        flow = self._GetFlowMetadata(client_id, flow_id)
+        flows[(client_id, flow_id)] = flow
+
+      client = clients.get(client_id)
+      if client is None:
+        # The client was deleted after its results were written.
+        client = base.ExportedMetadata()
+
+      event = self._MakeEvent(response, client, flow)
+      self._sender.Add(json.dumps(event))
+
+  def Flush(self, state: rdf_protodict.AttributedDict) -> None:
+    """See base class."""
+    self._sender.Flush()
 
   def _GetFlowMetadata(self, client_id: Text,
                        flow_id: Text) -> api_flow.ApiFlow:
@@ -151,13 +154,3 @@ class SplunkOutputPlugin(output_plugin.OutputPlugin):
       event["index"] = self._index
 
     return event
-
-  def _SendEvents(self, events: List[JsonDict]) -> None:
-    headers = {"Authorization": "Splunk {}".format(self._token)}
-
-    # Batch multiple events in one request, separated by two newlines.
-    data = "\n\n".join(json.dumps(event) for event in events)
-
-    response = requests.post(
-        url=self._url, verify=self._verify_https, data=data, headers=headers)
-    response.raise_for_status()
@@ -12,6 +12,7 @@ from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import paths as rdf_paths
 from grr_response_server import data_store
+from grr_response_server import export
 from grr_response_server.output_plugins import splunk_plugin
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr.test_lib import flow_test_lib
@@ -36,24 +37,29 @@ class SplunkOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
             create_time=rdfvalue.RDFDatetime.Now(),
         ))
 
-  def _CallPlugin(self, plugin_args=None, responses=None, patcher=None):
+  def _CallPlugin(self,
+                  plugin_args=None,
+                  responses=None,
+                  patcher=None,
+                  messages=None):
     source_id = rdf_client.ClientURN(
         self.client_id).Add('Results').RelativeName('aff4:/')
 
-    messages = []
-    for response in responses:
-      messages.append(
-          rdf_flows.GrrMessage(
-              source=self.client_id,
-              session_id='{}/{}'.format(self.client_id, self.flow_id),
-              payload=response))
+    if messages is None:
+      messages = []
+      for response in responses:
+        messages.append(
+            rdf_flows.GrrMessage(
+                source=self.client_id,
+                session_id='{}/{}'.format(self.client_id, self.flow_id),
+                payload=response))
 
     plugin_cls = splunk_plugin.SplunkOutputPlugin
     plugin, plugin_state = plugin_cls.CreatePluginAndDefaultState(
         source_urn=source_id, args=plugin_args)
 
     if patcher is None:
-      patcher = mock.patch.object(requests, 'post')
+      patcher = mock.patch.object(requests.Session, 'post')
 
     with patcher as patched:
       plugin.ProcessResponses(plugin_state, messages)
@@ -63,7 +69,9 @@ class SplunkOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
     return patched
 
   def _ParseEvents(self, patched):
-    request = patched.call_args[KWARGS]['data']
+    return self._ParseData(patched.call_args[KWARGS]['data'])
+
+  def _ParseData(self, request):
     return [json.loads(part) for part in request.split('\n\n')]
 
   def testPopulatesEventCorrectly(self):
@@ -133,6 +141,63 @@ class SplunkOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
         'pid': 42,
     })
 
+  def _MakeMessages(self):
+    other_client_id = self.SetupClient(1)
+    other_flow_id = '87654321'
+    data_store.REL_DB.WriteFlowObject(
+        rdf_flow_objects.Flow(
+            flow_id=other_flow_id,
+            client_id=other_client_id,
+            flow_class_name='ClientFileFinder',
+            create_time=rdfvalue.RDFDatetime.Now(),
+        ))
+
+    messages = []
+    for pid, (client_id, flow_id) in enumerate([
+        (self.client_id, self.flow_id),
+        (other_client_id, other_flow_id),
+        (self.client_id, self.flow_id),
+    ]):
+      messages.append(
+          rdf_flows.GrrMessage(
+              source=client_id,
+              session_id='{}/{}'.format(client_id, flow_id),
+              payload=rdf_client.Process(pid=pid)))
+    return messages
+
+  def testPacksResultsOfManyFlowsInSingleRequest(self):
+    with test_lib.ConfigOverrider({
+        'Splunk.url': 'http://a',
+        'Splunk.token': 'b',
+    }):
+      mock_post = self._CallPlugin(
+          plugin_args=splunk_plugin.SplunkOutputPluginArgs(),
+          messages=self._MakeMessages())
+
+    self.assertEqual(mock_post.call_count, 1)
+    events = self._ParseEvents(mock_post)
+    self.assertEqual([event['event']['result']['pid'] for event in events[1:]], [1, 2])
+    self.assertEqual([(event['event']['client']['clientUrn'], event['event']['flow']['flowId']) for event in events], [
+        ('aff4:/C.1000000000000000', '12345678'),
+        ('aff4:/C.1000000000000001', '87654321'),
+        ('aff4:/C.1000000000000000', '12345678'),
+    ])
+
+  def testSplitsRequestsExceedingBatchSize(self):
+    with test_lib.ConfigOverrider({
+        'Splunk.url': 'http://a',
+        'Splunk.token': 'b',
+        'Splunk.batch_max_events': 2,
+    }):
+      mock_post = self._CallPlugin(
+          plugin_args=splunk_plugin.SplunkOutputPluginArgs(),
+          messages=self._MakeMessages())
+
+    self.assertEqual([
+        len(self._ParseData(call[KWARGS]['data']))
+        for call in mock_post.call_args_list
+    ], [2, 1])
+
   def testReadsConfigurationValuesCorrectly(self):
     with test_lib.ConfigOverrider({
         'Splunk.url': 'http://a',
@@ -199,7 +264,22 @@ class SplunkOutputPluginTest(flow_test_lib.FlowTestsBaseclass):
         self._CallPlugin(
             plugin_args=splunk_plugin.SplunkOutputPluginArgs(),
             responses=[rdf_client.Process(pid=42)],
-            patcher=mock.patch.object(requests, 'post', post))
+            patcher=mock.patch.object(requests.Session, 'post', post))
+
+  def testSendsResultsOfUnknownClients(self):
+    with test_lib.ConfigOverrider({
+        'Splunk.url': 'http://a',
+        'Splunk.token': 'b',
+    }):
+      with mock.patch.object(export, 'GetClientsMetadata', return_value={}):
+        mock_post = self._CallPlugin(
+            plugin_args=splunk_plugin.SplunkOutputPluginArgs(),
+            responses=[rdf_client.Process(pid=42)])
+
+    events = self._ParseEvents(mock_post)
+    self.assertLen(events, 1)
+    self.assertEqual(events[0]['host'], self.client_id)
+    self.assertNotIn('clientUrn', events[0]['event']['client'])
 
 
 def main(argv):
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 """Plugin that exports results as SQLite db scripts."""
+import functools
 import io
 import os
 import zipfile
@@ -74,6 +75,62 @@ class Rdf2SqliteAdapter(object):
           type_info.__class__, Rdf2SqliteAdapter.DEFAULT_CONVERTER)
 
 
+def _ToPrimitive(value):
+  """Converts a leaf field value the way `ToPrimitiveDict` does it."""
+  if isinstance(value, rdf_structs.RepeatedFieldHelper):
+    return [_ToPrimitive(v) for v in value]
+  elif isinstance(value, rdf_structs.EnumNamedValue):
+    return str(value)
+  return value
+
+
+def _ConvertToSqlColumns(proto_struct_class, values):
+  """Converts RDF structs into SQL-ready columns.
+
+  Args:
+    proto_struct_class: Class of the structs.
+    values: A list of structs of the given class, or Nones for structs that
+      are not set (e.g. when they are embedded in another struct).
+
+  Returns:
+    A list of columns, ordered like the columns of the SQLite schema of the
+    class. Every column is a list with a value (or None) per struct.
+  """
+  columns = []
+  for type_info in proto_struct_class.type_infos:
+    name = type_info.name
+    field_values = [
+        v.Get(name) if v is not None and v.HasField(name) else None
+        for v in values
+    ]
+
+    if type_info.__class__ is rdf_structs.ProtoEmbedded:
+      columns.extend(_ConvertToSqlColumns(type_info.type, field_values))
+      continue
+
+    convert_fn = Rdf2SqliteAdapter.GetConverter(type_info).convert_fn
+    if type_info.__class__ is rdf_structs.ProtoList:
+      columns.append([
+          None if v is None else convert_fn(_ToPrimitive(v))
+          for v in field_values
+      ])
+    else:
+      # Converters of other fields handle enums the same way as their
+      # primitive (string) form.
+      columns.append(
+          [None if v is None else convert_fn(v) for v in field_values])
+  return columns
+
+
+def _ConvertToSqlRows(proto_struct_class, values):
+  """Converts a batch of RDF structs into rows of SQL-ready values."""
+  return list(zip(*_ConvertToSqlColumns(proto_struct_class, values)))
+
+
+def _QuoteIdentifier(name):
+  return "\"%s\"" % name.replace("\"", "\"\"")
+
+
 class SqliteInstantOutputPlugin(
     instant_output_plugin.InstantOutputPluginWithExportConversion):
   """Instant output plugin that converts results into SQLite db commands."""
@@ -83,7 +140,12 @@ class SqliteInstantOutputPlugin(
   description = "Output ZIP archive containing SQLite scripts."
   output_file_extension = ".zip"
 
-  ROW_BATCH = 100
+  # Number of rows buffered in the in-memory database before they are dumped
+  # into the archive.
+  ROW_BATCH = 5000
+
+  # Columns that get an index once all rows of a table are inserted.
+  INDEXED_COLUMNS = ["metadata.client_urn"]
 
   def __init__(self, *args, **kwargs):
     super().__init__(*args, **kwargs)
@@ -109,53 +171,76 @@ class SqliteInstantOutputPlugin(
 
     if not isinstance(first_value, rdf_structs.RDFProtoStruct):
       raise ValueError("The SQLite plugin only supports export-protos")
+    value_cls = first_value.__class__
     yield self.archive_generator.WriteFileHeader(
-        "%s/%s_from_%s.sql" % (self.path_prefix, first_value.__class__.__name__,
-                               original_value_type.__name__))
-    table_name = "%s.from_%s" % (first_value.__class__.__name__,
+        "%s/%s_from_%s.sql" %
+        (self.path_prefix, value_cls.__name__, original_value_type.__name__))
+    table_name = "%s.from_%s" % (value_cls.__name__,
                                  original_value_type.__name__)
-    schema = self._GetSqliteSchema(first_value.__class__)
+    schema = self._GetSqliteSchema(value_cls)
 
-    # We will buffer the sql statements into an in-memory sql database before
-    # dumping them to the zip archive. We rely on the PySQLite library for
-    # string escaping.
+    # We will buffer the rows in an in-memory sql database before dumping them
+    # to the zip archive. We rely on the SQLite library for string escaping.
+    # The database is a scratch buffer, so it doesn't need a rollback journal.
     db_connection = sqlite3.connect(":memory:")
-    db_cursor = db_connection.cursor()
+    db_connection.execute("PRAGMA journal_mode = OFF;")
+    db_connection.execute("PRAGMA synchronous = OFF;")
 
     yield self.archive_generator.WriteFileChunk(
         "BEGIN TRANSACTION;\n".encode("utf-8"))
 
+    buf = io.StringIO()
+    buf.write(u"CREATE TABLE %s (\n  " % _QuoteIdentifier(table_name))
+    column_types = [(k, v.sqlite_type) for k, v in schema.items()]
+    buf.write(u",\n  ".join(
+        [u"%s %s" % (_QuoteIdentifier(k), v) for k, v in column_types]))
+    buf.write(u"\n);")
     with db_connection:
-      buf = io.StringIO()
-      buf.write(u"CREATE TABLE \"%s\" (\n  " % table_name)
-      column_types = [(k, v.sqlite_type) for k, v in schema.items()]
-      buf.write(u",\n  ".join([u"\"%s\" %s" % (k, v) for k, v in column_types]))
-      buf.write(u"\n);")
-      db_cursor.execute(buf.getvalue())
-
-      chunk = (buf.getvalue() + "\n").encode("utf-8")
-      yield self.archive_generator.WriteFileChunk(chunk)
-
-      self._InsertValueIntoDb(table_name, schema, first_value, db_cursor)
-
-    for sql in self._FlushAllRows(db_connection, table_name):
-      yield sql
-    counter = 1
-    for batch in collection.Batch(exported_values, self.ROW_BATCH):
-      counter += len(batch)
+      db_connection.execute(buf.getvalue())
+
+    chunk = (buf.getvalue() + "\n").encode("utf-8")
+    yield self.archive_generator.WriteFileChunk(chunk)
+
+    insert_sql = u"INSERT INTO %s VALUES (%s);" % (_QuoteIdentifier(table_name),
+                                                  u",".join(u"?" * len(schema)))
+
+    def Batches():
+      yield [first_value]
+      for batch in collection.Batch(exported_values, self.ROW_BATCH):
+        yield batch
+
+    counter = 0
+    num_buffered = 0
+    convert = functools.partial(_ConvertToSqlRows, value_cls)
+    for rows in self._MapBatches(convert, Batches()):
       with db_connection:
-        for value in batch:
-          self._InsertValueIntoDb(table_name, schema, value, db_cursor)
-      for sql in self._FlushAllRows(db_connection, table_name):
-        yield sql
+        db_connection.executemany(insert_sql, rows)
+      counter += len(rows)
+      num_buffered += len(rows)
+
+      if num_buffered >= self.ROW_BATCH:
+        yield self._FlushAllRows(db_connection, table_name, schema)
+        num_buffered = 0
+
+    if num_buffered:
+      yield self._FlushAllRows(db_connection, table_name, schema)
 
     db_connection.close()
+
+    # Indexes are cheaper to build once all the rows are loaded.
+    for column in self.INDEXED_COLUMNS:
+      if column in schema:
+        index_sql = u"CREATE INDEX %s ON %s (%s);\n" % (_QuoteIdentifier(
+            "%s.%s" % (table_name, column)), _QuoteIdentifier(table_name),
+                                                      _QuoteIdentifier(column))
+        yield self.archive_generator.WriteFileChunk(index_sql.encode("utf-8"))
+
     yield self.archive_generator.WriteFileChunk("COMMIT;\n".encode("utf-8"))
     yield self.archive_generator.WriteFileFooter()
 
     counts_for_original_type = self.export_counts.setdefault(
         original_value_type.__name__, dict())
-    counts_for_original_type[first_value.__class__.__name__] = counter
+    counts_for_original_type[value_cls.__name__] = counter
 
   def _GetSqliteSchema(self, proto_struct_class, prefix=""):
     """Returns a mapping of SQLite column names to Converter objects."""
@@ -170,40 +255,33 @@ class SqliteInstantOutputPlugin(
         schema[field_name] = Rdf2SqliteAdapter.GetConverter(type_info)
     return schema
 
-  def _InsertValueIntoDb(self, table_name, schema, value, db_cursor):
-    sql_dict = self._ConvertToCanonicalSqlDict(schema, value.ToPrimitiveDict())
+  def _FlushAllRows(self, db_connection, table_name, schema):
+    """Dumps rows from the given db as a single archive chunk and deletes them.
+
+    Args:
+      db_connection: The in-memory database buffering rows.
+      table_name: Name of the table the rows are in.
+      schema: SQLite schema of the table.
+
+    Returns:
+      A chunk of the archive with INSERT statements of all rows.
+    """
+    # This is the query `iterdump` uses, minus the schema statements that only
+    # need to be written once.
+    quoted_table_name = _QuoteIdentifier(table_name).replace("'", "''")
+    query = u"SELECT 'INSERT INTO %s VALUES(%s);' FROM %s;" % (
+        quoted_table_name, u",".join(
+            u"'||quote(%s)||'" % _QuoteIdentifier(column) for column in schema),
+        _QuoteIdentifier(table_name))
     buf = io.StringIO()
-    buf.write(u"INSERT INTO \"%s\" (\n  " % table_name)
-    buf.write(u",\n  ".join(["\"%s\"" % k for k in sql_dict.keys()]))
-    buf.write(u"\n)")
-    buf.write(u"VALUES (%s);" % u",".join([u"?"] * len(sql_dict)))
-    db_cursor.execute(buf.getvalue(), list(sql_dict.values()))
-
-  def _ConvertToCanonicalSqlDict(self, schema, raw_dict, prefix=""):
-    """Converts a dict of RDF values into a SQL-ready form."""
-    flattened_dict = {}
-    for k, v in raw_dict.items():
-      if isinstance(v, dict):
-        flattened_dict.update(
-            self._ConvertToCanonicalSqlDict(
-                schema, v, prefix="%s%s." % (prefix, k)))
-      else:
-        field_name = prefix + k
-        flattened_dict[field_name] = schema[field_name].convert_fn(v)
-    return flattened_dict
-
-  def _FlushAllRows(self, db_connection, table_name):
-    """Copies rows from the given db into the output file then deletes them."""
-    for sql in db_connection.iterdump():
-      if (sql.startswith("CREATE TABLE") or
-          sql.startswith("BEGIN TRANSACTION") or sql.startswith("COMMIT")):
-        # These statements only need to be written once.
-        continue
-      # The archive generator expects strings (not Unicode objects returned by
-      # the pysqlite library).
-      yield self.archive_generator.WriteFileChunk((sql + "\n").encode("utf-8"))
+    for (sql,) in db_connection.execute(query):
+      buf.write(sql)
+      buf.write(u"\n")
+
     with db_connection:
-      db_connection.cursor().execute("DELETE FROM \"%s\";" % table_name)
+      db_connection.execute("DELETE FROM %s;" % _QuoteIdentifier(table_name))
+
+    return self.archive_generator.WriteFileChunk(buf.getvalue().encode("utf-8"))
 
   def Finish(self):
     manifest = {"export_stats": self.export_counts}
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 """Tests for the SQLite instant output plugin."""
 
+from concurrent import futures
 import datetime
+import multiprocessing
 import os
 import zipfile
 
@@ -115,7 +117,7 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
             "embedded_field.e_double_field": "REAL"
         })
 
-  def testConversionToCanonicalSqlDict(self):
+  def testConversionToSqlRows(self):
     schema = self.plugin._GetSqliteSchema(SqliteTestStruct)
     test_struct = SqliteTestStruct(
         string_field="string_value",
@@ -134,10 +136,11 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
         duration_field=rdfvalue.Duration.From(123, rdfvalue.SECONDS),
         embedded_field=TestEmbeddedStruct(
             e_string_field="e_string_value", e_double_field=0.789))
-    sql_dict = self.plugin._ConvertToCanonicalSqlDict(
-        schema, test_struct.ToPrimitiveDict())
+    rows = sqlite_plugin._ConvertToSqlRows(SqliteTestStruct,
+                                           [test_struct, SqliteTestStruct()])
+    self.assertLen(rows, 2)
     self.assertEqual(
-        sql_dict,
+        dict(zip(schema.keys(), rows[0])),
         {
             "string_field": "string_value",
             "bytes_field": b"bytes_value",
@@ -154,6 +157,8 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
             "embedded_field.e_string_field": "e_string_value",
             "embedded_field.e_double_field": 0.789
         })
+    # Fields that are not set are exported as NULLs.
+    self.assertEqual(rows[1], (None,) * len(schema))
 
   @export_test_lib.WithAllExportConverters
   def testExportedFilenamesAndManifestForValuesOfSameType(self):
@@ -244,6 +249,22 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
       }
       self.assertEqual(results, expected_results)
 
+  @export_test_lib.WithAllExportConverters
+  def testExportedTableIsIndexedByClient(self):
+    zip_fd, prefix = self.ProcessValuesToZip(
+        {rdf_client_fs.StatEntry: self.STAT_ENTRY_RESPONSES})
+
+    sqlite_dump_path = "%s/ExportedFile_from_StatEntry.sql" % prefix
+    sqlite_dump = zip_fd.read(sqlite_dump_path).decode("utf-8")
+    with self.db_connection:
+      self.db_cursor.executescript(sqlite_dump)
+
+    self.db_cursor.execute(
+        "PRAGMA index_list('ExportedFile.from_StatEntry');")
+    indexes = [row[1] for row in self.db_cursor.fetchall()]
+    self.assertEqual(indexes,
+                     ["ExportedFile.from_StatEntry.metadata.client_urn"])
+
   @export_test_lib.WithAllExportConverters
   def testExportedFilenamesAndManifestForValuesOfMultipleTypes(self):
     zip_fd, prefix = self.ProcessValuesToZip({
@@ -364,6 +385,35 @@ class SqliteInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
       self.assertEqual(results[i][0],
                        "aff4:/%s/fs/os/foo/bar/%d" % (self.client_id, i))
 
+  @export_test_lib.WithAllExportConverters
+  def testSqlitePluginOutputIsTheSameWithProcessPool(self):
+    responses = []
+    for i in range(61):
+      responses.append(
+          rdf_client_fs.StatEntry(
+              pathspec=rdf_paths.PathSpec(
+                  path="/foo/bar/%d" % i, pathtype="OS"),
+              st_size=i))
+    values_by_cls = {rdf_client_fs.StatEntry: responses}
+
+    # Exported metadata contains the (microsecond) time of the export.
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42)):
+      self.plugin.ROW_BATCH = 20
+      expected_zip_fd, _ = self.ProcessValuesToZip(values_by_cls)
+
+      context = multiprocessing.get_context("fork")
+      with futures.ProcessPoolExecutor(
+          max_workers=2, mp_context=context) as executor:
+        self.plugin = self.plugin_cls(
+            source_urn=self.results_urn, executor=executor)
+        self.plugin.BATCH_SIZE = 10
+        self.plugin.ROW_BATCH = 20
+        zip_fd, _ = self.ProcessValuesToZip(values_by_cls)
+
+    self.assertEqual(zip_fd.namelist(), expected_zip_fd.namelist())
+    for name in zip_fd.namelist():
+      self.assertEqual(zip_fd.read(name), expected_zip_fd.read(name))
+
 
 def main(argv):
   test_lib.main(argv)
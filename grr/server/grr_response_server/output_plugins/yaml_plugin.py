@@ -25,6 +25,16 @@ def _SerializeToYaml(value):
   return yaml.safe_dump(preserialized)
 
 
+def _SerializeToYamlEntries(values):
+  """Serializes a batch of values to UTF-8 encoded YAML list entries."""
+  buf = io.StringIO()
+  for value in values:
+    buf.write("\n")
+    buf.write(_SerializeToYaml(value))
+
+  return buf.getvalue().encode("utf-8")
+
+
 class YamlInstantOutputPluginWithExportConversion(
     instant_output_plugin.InstantOutputPluginWithExportConversion):
   """Instant output plugin that flattens results into YAML."""
@@ -66,16 +76,15 @@ class YamlInstantOutputPluginWithExportConversion(
     serialized_value_bytes = _SerializeToYaml(first_value).encode("utf-8")
     yield self.archive_generator.WriteFileChunk(serialized_value_bytes)
     counter = 1
-    for batch in collection.Batch(exported_values, self.ROW_BATCH):
-      counter += len(batch)
 
-      buf = io.StringIO()
-      for value in batch:
-        buf.write("\n")
-        buf.write(_SerializeToYaml(value))
+    def Batches():
+      nonlocal counter
+      for batch in collection.Batch(exported_values, self.ROW_BATCH):
+        counter += len(batch)
+        yield batch
 
-      contents = buf.getvalue()
-      yield self.archive_generator.WriteFileChunk(contents.encode("utf-8"))
+    for chunk in self._MapBatches(_SerializeToYamlEntries, Batches()):
+      yield self.archive_generator.WriteFileChunk(chunk)
     yield self.archive_generator.WriteFileFooter()
 
     counts_for_original_type = self.export_counts.setdefault(
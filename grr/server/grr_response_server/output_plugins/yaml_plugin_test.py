@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 """Tests for YAML instant output plugin."""
 
+from concurrent import futures
+import multiprocessing
 import os
 import zipfile
 
@@ -179,6 +181,35 @@ class YamlInstantOutputPluginTest(test_plugins.InstantOutputPluginTestBase):
       self.assertEqual(parsed_output[i]["urn"],
                        "aff4:/%s/fs/os/foo/bar/%d" % (self.client_id, i))
 
+  @export_test_lib.WithAllExportConverters
+  def testYamlPluginOutputIsTheSameWithProcessPool(self):
+    responses = []
+    for i in range(self.plugin_cls.ROW_BATCH * 3 + 1):
+      responses.append(
+          rdf_client_fs.StatEntry(
+              pathspec=rdf_paths.PathSpec(
+                  path="/foo/bar/%d" % i, pathtype="OS"),
+              st_size=i))
+    values_by_cls = {rdf_client_fs.StatEntry: responses}
+
+    # Both exports are written to the same path, so the contents of each are
+    # read right after it is produced. Exports are timestamped, so both are
+    # produced at the same (fake) time.
+    with test_lib.FakeTime(1445995873):
+      zip_fd, _ = self.ProcessValuesToZip(values_by_cls)
+      expected = [(name, zip_fd.read(name)) for name in zip_fd.namelist()]
+
+      context = multiprocessing.get_context("fork")
+      with futures.ProcessPoolExecutor(
+          max_workers=2, mp_context=context) as executor:
+        self.plugin = self.plugin_cls(
+            source_urn=self.results_urn, executor=executor)
+        self.plugin.BATCH_SIZE = 50
+        zip_fd, _ = self.ProcessValuesToZip(values_by_cls)
+        output = [(name, zip_fd.read(name)) for name in zip_fd.namelist()]
+
+    self.assertEqual(output, expected)
+
 
 def main(argv):
   test_lib.main(argv)
@@ -69,6 +69,7 @@ class FlowMessage(object):
 
 class FlowResponse(FlowMessage, rdf_structs.RDFProtoStruct):
   protobuf = flows_pb2.FlowResponse
+  use_protobuf_codec = True
   rdf_deps = []
 
   def AsLegacyGrrMessage(self):
@@ -172,6 +173,18 @@ class FlowOutputPluginLogEntry(rdf_structs.RDFProtoStruct):
         summary=self.message, batch_index=0, batch_size=0, status=status)
 
 
+class OutputPluginRequest(rdf_structs.RDFProtoStruct):
+  """A batch of flow results waiting to be processed by an output plugin."""
+
+  protobuf = flows_pb2.OutputPluginRequest
+  rdf_deps = [
+      FlowResult,
+      rdf_flow_runner.OutputPluginState,
+      rdfvalue.RDFDatetime,
+      rdfvalue.RDFURN,
+  ]
+
+
 class Flow(rdf_structs.RDFProtoStruct):
   """Flow DB object."""
 
@@ -14,6 +14,7 @@ from grr_response_core.lib import config_lib
 from grr_response_core.lib import utils
 from grr_response_core.lib.local import plugins  # pylint: disable=unused-import
 from grr_response_core.lib.parsers import all as all_parsers
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.stats import stats_collector_instance
 from grr_response_server import artifact
 from grr_response_server import cronjobs
@@ -82,6 +83,8 @@ def Init():
 
   server_logging.ServerLoggingStartupInit()
 
+  rdf_structs.EnableProtobufCodec(config.CONFIG["Server.protobuf_codec"])
+
   bs_registry_init.RegisterBlobStores()
   all_decoders.Register()
   all_parsers.Register()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 """Operations on a series of points, indexed by time.
-"""
 
-import copy
+Points are kept in two NumPy arrays: float values (with NaN standing for
+missing values) and integer timestamps in microseconds. All operations work on
+whole arrays, so series of millions of points can be processed quickly.
+"""
 
+import numpy as np
 
 from grr_response_core.lib import rdfvalue
 
@@ -23,14 +26,90 @@ class Timeseries(object):
     Raises:
       RuntimeError: If initializer is not understood.
     """
+    # Points appended one by one are buffered in lists and only turned into
+    # arrays when the series is used.
+    self._pending_values = []
+    self._pending_timestamps = []
+
     if initializer is None:
-      self.data = []
+      self._values = np.empty(0, dtype=np.float64)
+      self._timestamps = np.empty(0, dtype=np.int64)
       return
     if isinstance(initializer, Timeseries):
-      self.data = copy.deepcopy(initializer.data)
+      self._values = initializer.values.copy()
+      self._timestamps = initializer.timestamps.copy()
       return
     raise RuntimeError("Unrecognized initializer.")
 
+  @classmethod
+  def FromArrays(cls, values, timestamps, sort=False):
+    """Creates a timeseries from sequences of values and timestamps.
+
+    Args:
+      values: A sequence of observed values. None stands for a missing value.
+      timestamps: A sequence of timestamps (in microseconds since epoch) the
+        values were observed at.
+      sort: If set, points are sorted by timestamp. Points with equal
+        timestamps keep their order.
+
+    Returns:
+      A new Timeseries.
+
+    Raises:
+      RuntimeError: If timestamps are not increasing and sort is not set.
+    """
+    values = np.array(values, dtype=np.float64)
+    timestamps = np.array(timestamps, dtype=np.int64)
+    if len(values) != len(timestamps):
+      raise RuntimeError("Values and timestamps differ in length.")
+
+    if sort:
+      order = np.argsort(timestamps, kind="stable")
+      values = values[order]
+      timestamps = timestamps[order]
+    elif np.any(np.diff(timestamps) < 0):
+      raise RuntimeError("Next timestamp must be larger.")
+
+    result = cls()
+    result._values = values  # pylint: disable=protected-access
+    result._timestamps = timestamps  # pylint: disable=protected-access
+    return result
+
+  def _Flush(self):
+    if self._pending_values:
+      self._values = np.concatenate(
+          [self._values,
+           np.array(self._pending_values, dtype=np.float64)])
+      self._timestamps = np.concatenate(
+          [self._timestamps,
+           np.array(self._pending_timestamps, dtype=np.int64)])
+      self._pending_values = []
+      self._pending_timestamps = []
+
+  @property
+  def values(self):
+    """Values of the series, as a float array with NaNs for missing values."""
+    self._Flush()
+    return self._values
+
+  @property
+  def timestamps(self):
+    """Timestamps of the series, as an array of microseconds since epoch."""
+    self._Flush()
+    return self._timestamps
+
+  @property
+  def data(self):
+    """Points of the series as a list of [value, timestamp] pairs."""
+    values = self.values
+    present = ~np.isnan(values)
+    return [[value if is_present else None, timestamp]
+            for value, is_present, timestamp in zip(
+                values.tolist(), present.tolist(), self.timestamps.tolist())]
+
+  def __len__(self):
+    return len(self._values) + len(self._pending_values)
+
   def _NormalizeTime(self, time):
     """Normalize a time to be an int measured in microseconds."""
     if isinstance(time, rdfvalue.RDFDatetime):
@@ -53,9 +132,17 @@ class Timeseries(object):
     """
 
     timestamp = self._NormalizeTime(timestamp)
-    if self.data and timestamp < self.data[-1][1]:
+    if self._pending_timestamps:
+      last_timestamp = self._pending_timestamps[-1]
+    elif len(self._timestamps):
+      last_timestamp = self._timestamps[-1]
+    else:
+      last_timestamp = None
+
+    if last_timestamp is not None and timestamp < last_timestamp:
       raise RuntimeError("Next timestamp must be larger.")
-    self.data.append([value, timestamp])
+    self._pending_values.append(np.nan if value is None else value)
+    self._pending_timestamps.append(timestamp)
 
   def MultiAppend(self, value_timestamp_pairs):
     """Adds multiple value<->timestamp pairs.
@@ -75,14 +162,15 @@ class Timeseries(object):
       start_time: If set, timestamps before start_time will be dropped.
       stop_time: If set, timestamps at or past stop_time will be dropped.
     """
+    timestamps = self.timestamps
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start_time is not None:
+      mask &= timestamps >= self._NormalizeTime(start_time)
+    if stop_time is not None:
+      mask &= timestamps < self._NormalizeTime(stop_time)
 
-    start_time = self._NormalizeTime(start_time)
-    stop_time = self._NormalizeTime(stop_time)
-    self.data = [
-        p for p in self.data
-        if (start_time is None or p[1] >= start_time) and
-        (stop_time is None or p[1] < stop_time)
-    ]
+    self._values = self._values[mask]
+    self._timestamps = timestamps[mask]
 
   def Normalize(self, period, start_time, stop_time, mode=NORMALIZE_MODE_GAUGE):
     """Normalize the series to have a fixed period over a fixed time range.
@@ -120,33 +208,33 @@ class Timeseries(object):
     period = self._NormalizeTime(period)
     start_time = self._NormalizeTime(start_time)
     stop_time = self._NormalizeTime(stop_time)
-    if not self.data:
+    if not len(self):  # pylint: disable=g-explicit-length-test
       return
 
     self.FilterRange(start_time, stop_time)
 
-    grouped = {}
-    for value, timestamp in self.data:
-      offset = timestamp - start_time
-      shifted_offset = offset - (offset % period)
-      grouped.setdefault(shifted_offset, []).append(value)
-
-    self.data = []
-    last_value = None
-    for offset in range(0, stop_time - start_time, period):
-      g = grouped.get(offset)
-      if mode == NORMALIZE_MODE_GAUGE:
-        v = None
-        if g:
-          v = sum(g) / len(g)
-        self.data.append([v, offset + start_time])
-      else:
-        if g:
-          for v in g:
-            if last_value is not None and v < last_value:
-              raise RuntimeError("Next value must not be smaller.")
-            last_value = v
-        self.data.append([last_value, offset + start_time])
+    num_buckets = len(range(0, stop_time - start_time, period))
+    buckets = (self._timestamps - start_time) // period
+    self._timestamps = start_time + np.arange(
+        num_buckets, dtype=np.int64) * period
+
+    if mode == NORMALIZE_MODE_GAUGE:
+      sums = np.bincount(buckets, weights=self._values, minlength=num_buckets)
+      counts = np.bincount(buckets, minlength=num_buckets)
+      with np.errstate(invalid="ignore", divide="ignore"):
+        self._values = np.where(counts > 0, sums / counts, np.nan)
+    else:
+      if np.any(np.diff(self._values) < 0):
+        raise RuntimeError("Next value must not be smaller.")
+
+      # Buckets are sorted, so the last point during or before every output
+      # interval is found with a binary search.
+      last = np.searchsorted(
+          buckets, np.arange(num_buckets), side="right") - 1
+      values = np.full(num_buckets, np.nan)
+      seen = last >= 0
+      values[seen] = self._values[last[seen]]
+      self._values = values
 
   def MakeIncreasing(self):
     """Makes the time series increasing.
@@ -160,15 +248,15 @@ class Timeseries(object):
     larger than the previous level.
 
     """
-    offset = 0
-    last_value = None
-    for p in self.data:
-      if last_value and last_value > p[0]:
-        # Assume that it was only reset once.
-        offset += last_value
-      last_value = p[0]
-      if offset:
-        p[0] += offset
+    values = self.values
+    if len(values) < 2:
+      return
+
+    previous = values[:-1]
+    # Assume that it was only reset once.
+    resets = (previous != 0) & (previous > values[1:])
+    offsets = np.cumsum(np.where(resets, previous, 0))
+    values[1:] += offsets
 
   def ToDeltas(self):
     """Convert the sequence to the sequence of differences between points.
@@ -176,15 +264,9 @@ class Timeseries(object):
     The value of each point v[i] is replaced by v[i+1] - v[i], except for the
     last point which is dropped.
     """
-    if len(self.data) < 2:
-      self.data = []
-      return
-    for i in range(0, len(self.data) - 1):
-      if self.data[i][0] is None or self.data[i + 1][0] is None:
-        self.data[i][0] = None
-      else:
-        self.data[i][0] = self.data[i + 1][0] - self.data[i][0]
-    del self.data[-1]
+    values = self.values
+    self._values = values[1:] - values[:-1]
+    self._timestamps = self._timestamps[:-1]
 
   def Add(self, other):
     """Add other to self pointwise.
@@ -199,27 +281,29 @@ class Timeseries(object):
     Raises:
       RuntimeError: other does not contain the same timestamps as self.
     """
-    if len(self.data) != len(other.data):
+    if len(self) != len(other):
       raise RuntimeError("Can only add series of identical lengths.")
-    for i in range(len(self.data)):
-      if self.data[i][1] != other.data[i][1]:
-        raise RuntimeError("Timestamp mismatch.")
-      if self.data[i][0] is None and other.data[i][0] is None:
-        continue
-      self.data[i][0] = (self.data[i][0] or 0) + (other.data[i][0] or 0)
+    if not np.array_equal(self.timestamps, other.timestamps):
+      raise RuntimeError("Timestamp mismatch.")
+
+    values = self.values
+    other_values = other.values
+    missing = np.isnan(values) & np.isnan(other_values)
+    self._values = np.where(
+        missing, np.nan,
+        np.nan_to_num(values) + np.nan_to_num(other_values))
 
   def Rescale(self, multiplier):
     """Multiply pointwise by multiplier."""
-    for p in self.data:
-      if p[0] is not None:
-        p[0] *= multiplier
+    self._values = self.values * multiplier
 
   def Mean(self):
     """Return the arithmetic mean of all values."""
-    values = [v for v, _ in self.data if v is not None]
-    if not values:
+    values = self.values
+    values = values[~np.isnan(values)]
+    if not len(values):  # pylint: disable=g-explicit-length-test
       return None
 
     # TODO(hanuszczak): Why do we return a floored division result instead of
     # the exact value?
-    return sum(values) // len(values)
+    return float(np.sum(values)) // len(values)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Benchmark measuring operations on large timeseries.
+
+A counter sampled at irregular intervals (and occasionally reset) is turned
+into a normalized series the way client load stats are: it's made increasing,
+normalized and converted to deltas. A gauge is normalized and averaged.
+"""
+
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+
+from grr_response_server import timeseries
+
+_POINTS = flags.DEFINE_integer(
+    "points",
+    default=1000000,
+    help="Number of points of the series.",
+)
+
+_BUCKETS = flags.DEFINE_integer(
+    "buckets",
+    default=1000,
+    help="Number of points of the normalized series.",
+)
+
+# Average time between two points, in microseconds.
+_INTERVAL = 10 * 1000 * 1000
+
+
+def _MakePoints(num_points):
+  rng = np.random.default_rng(0)
+  timestamps = np.cumsum(rng.integers(1, 2 * _INTERVAL, num_points))
+  counter = np.cumsum(rng.integers(0, 1000, num_points)) % (1 << 40)
+  gauge = rng.random(num_points) * 100
+  return timestamps.tolist(), counter.tolist(), gauge.tolist()
+
+
+def _Time(name, fn, results):
+  start = time.time()
+  value = fn()
+  results.append((name, time.time() - start))
+  return value
+
+
+def main(argv):
+  """Main."""
+  del argv  # Unused.
+
+  timestamps, counter, gauge = _MakePoints(_POINTS.value)
+  start_time = timestamps[0]
+  stop_time = timestamps[-1] + 1
+  period = (stop_time - start_time) // _BUCKETS.value + 1
+
+  results = []
+
+  def Build(values):
+    ts = timeseries.Timeseries()
+    ts.MultiAppend(zip(values, timestamps))
+    return ts
+
+  counter_ts = _Time("build_appending", lambda: Build(counter), results)
+  gauge_ts = _Time(
+      "build_from_arrays",
+      lambda: timeseries.Timeseries.FromArrays(gauge, timestamps), results)
+
+  _Time("make_increasing", counter_ts.MakeIncreasing, results)
+  _Time(
+      "normalize_counter", lambda: counter_ts.Normalize(
+          period,
+          start_time,
+          stop_time,
+          mode=timeseries.NORMALIZE_MODE_COUNTER), results)
+  _Time("to_deltas", counter_ts.ToDeltas, results)
+  _Time("normalize_gauge",
+        lambda: gauge_ts.Normalize(period, start_time, stop_time), results)
+  _Time("mean", gauge_ts.Mean, results)
+
+  print("points\toperation\ttime")
+  for name, duration in results:
+    print("{points}\t{name}\t{time:.3f}s".format(
+        points=_POINTS.value, name=name, time=duration))
+
+
+if __name__ == "__main__":
+  app.run(main)
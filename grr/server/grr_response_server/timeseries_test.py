@@ -110,6 +110,41 @@ class TimeseriesTest(test_lib.GRRBaseTest):
     for i in range(0, 5):
       self.assertEqual(i, s1.data[i][0])
 
+  def testFromArrays(self):
+    s = timeseries.Timeseries.FromArrays([1, None, 3], [10, 20, 30])
+    self.assertEqual(s.data, [[1, 10], [None, 20], [3, 30]])
+
+    with self.assertRaises(RuntimeError):
+      timeseries.Timeseries.FromArrays([1, 2], [20, 10])
+
+  def testFromArraysSortsStably(self):
+    s = timeseries.Timeseries.FromArrays([1, 2, 3, 4], [30, 10, 30, 20],
+                                         sort=True)
+    self.assertEqual(s.data, [[2, 10], [4, 20], [1, 30], [3, 30]])
+
+  def testNormalizeCounterCarriesLastValueOverGaps(self):
+    s = timeseries.Timeseries.FromArrays([1, 2, 5], [5, 15, 45])
+    s.Normalize(10, 0, 60, mode=timeseries.NORMALIZE_MODE_COUNTER)
+    self.assertEqual(s.data, [[1, 0], [2, 10], [2, 20], [2, 30], [5, 40],
+                              [5, 50]])
+
+  def testNormalizeCounterRaisesForDecreasingValues(self):
+    s = timeseries.Timeseries.FromArrays([2, 1], [5, 15])
+    with self.assertRaises(RuntimeError):
+      s.Normalize(10, 0, 20, mode=timeseries.NORMALIZE_MODE_COUNTER)
+
+  def testToDeltasAndAddPropagateMissingValues(self):
+    s1 = timeseries.Timeseries.FromArrays([1, None, 4, 8], [0, 10, 20, 30])
+    s1.ToDeltas()
+    self.assertEqual(s1.data, [[None, 0], [None, 10], [4, 20]])
+
+    s2 = timeseries.Timeseries.FromArrays([None, 1, 1], [0, 10, 20])
+    s1.Add(s2)
+    self.assertEqual(s1.data, [[None, 0], [1, 10], [5, 20]])
+
+    with self.assertRaises(RuntimeError):
+      s1.Add(timeseries.Timeseries.FromArrays([1, 1, 1], [0, 10, 21]))
+
   def testMean(self):
     s = timeseries.Timeseries()
     self.assertEqual(None, s.Mean())
@@ -3,8 +3,10 @@
 
 import logging
 import time
+from typing import Optional
 from typing import Sequence
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
@@ -13,6 +15,7 @@ from grr_response_core.stats import metrics
 from grr_response_server import data_store
 from grr_response_server import flow_base
 from grr_response_server import handler_registry
+from grr_response_server import output_plugin_queue
 # pylint: disable=unused-import
 from grr_response_server import server_stubs
 # pylint: enable=unused-import
@@ -65,14 +68,21 @@ class GRRWorker(object):
   """A GRR worker."""
 
   message_handler_lease_time = rdfvalue.Duration.From(600, rdfvalue.SECONDS)
+  flow_processing_time = rdfvalue.Duration.From(6, rdfvalue.HOURS)
 
   def __init__(self):
     """Constructor."""
     logging.info("Started GRR worker.")
+    self._output_plugin_processor: Optional[
+        output_plugin_queue.OutputPluginRequestProcessor] = None
 
   def Shutdown(self) -> None:
     data_store.REL_DB.UnregisterMessageHandler()
     data_store.REL_DB.UnregisterFlowProcessingHandler()
+    if self._output_plugin_processor is not None:
+      data_store.REL_DB.UnregisterOutputPluginHandler()
+      self._output_plugin_processor.Stop()
+      self._output_plugin_processor = None
 
   def Run(self) -> None:
     """Event loop."""
@@ -80,7 +90,19 @@ class GRRWorker(object):
         ProcessMessageHandlerRequests,
         self.message_handler_lease_time,
         limit=100)
-    data_store.REL_DB.RegisterFlowProcessingHandler(self.ProcessFlow)
+    if config.CONFIG["Worker.output_plugin_queue"]:
+      self._output_plugin_processor = (
+          output_plugin_queue.OutputPluginRequestProcessor())
+      data_store.REL_DB.RegisterOutputPluginHandler(
+          self._output_plugin_processor.ProcessRequests,
+          config.CONFIG["Worker.output_plugin_lease_time"],
+          limit=config.CONFIG["Worker.output_plugin_batch_size"])
+    batch_size = config.CONFIG["Worker.flow_processing_batch_size"]
+    if batch_size > 1:
+      data_store.REL_DB.RegisterFlowProcessingHandler(
+          self.ProcessFlows, batch_size=batch_size)
+    else:
+      data_store.REL_DB.RegisterFlowProcessingHandler(self.ProcessFlow)
 
     try:
       # The main thread just keeps sleeping and listens to keyboard interrupt
@@ -91,7 +113,11 @@ class GRRWorker(object):
       logging.info("Caught interrupt, exiting.")
       self.Shutdown()
 
-  def _ReleaseProcessedFlow(self, flow_obj: rdf_flow_objects.Flow) -> bool:
+  def _ReleaseProcessedFlow(self, flow_obj: flow_base.FlowBase) -> bool:
+    self._PrepareForRelease(flow_obj)
+    return data_store.REL_DB.ReleaseProcessedFlow(flow_obj.rdf_flow)
+
+  def _PrepareForRelease(self, flow_obj: flow_base.FlowBase) -> None:
     rdf_flow = flow_obj.rdf_flow
     if rdf_flow.processing_deadline < rdfvalue.RDFDatetime.Now():
       raise flow_base.FlowError(
@@ -100,29 +126,121 @@ class GRRWorker(object):
 
     flow_obj.FlushQueuedMessages()
 
-    return data_store.REL_DB.ReleaseProcessedFlow(rdf_flow)
-
   def ProcessFlow(
       self, flow_processing_request: rdf_flows.FlowProcessingRequest) -> None:
     """The callback for the flow processing queue."""
-
-    client_id = flow_processing_request.client_id
-    flow_id = flow_processing_request.flow_id
-
     data_store.REL_DB.AckFlowProcessingRequests([flow_processing_request])
+    self._ProcessFlow(flow_processing_request.client_id,
+                      flow_processing_request.flow_id)
+
+  def ProcessFlows(
+      self,
+      flow_processing_requests: Sequence[rdf_flows.FlowProcessingRequest]
+  ) -> None:
+    """The callback for the flow processing queue handling batches of requests.
+
+    Flows referenced by the requests are leased, have their ready requests
+    read and are released with a single database call per step. Flows that
+    can't be leased in bulk are processed one by one, so that all errors are
+    handled the same way as in `ProcessFlow`.
+
+    Args:
+      flow_processing_requests: Flow processing requests to handle.
+    """
+    data_store.REL_DB.AckFlowProcessingRequests(flow_processing_requests)
+
+    flow_keys = []
+    for request in flow_processing_requests:
+      key = (request.client_id, request.flow_id)
+      if key not in flow_keys:
+        flow_keys.append(key)
+
+    leased_flows = data_store.REL_DB.LeaseFlowsForProcessing(
+        flow_keys, processing_time=self.flow_processing_time)
+
+    for client_id, flow_id in flow_keys:
+      if (client_id, flow_id) in leased_flows:
+        continue
+      try:
+        self._ProcessFlow(client_id, flow_id)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("Exception while processing flow %s/%s: %s",
+                          client_id, flow_id, e)
+
+    if not leased_flows:
+      return
+
+    ready_requests = data_store.REL_DB.MultiReadFlowRequestsReadyForProcessing(
+        {key: f.next_request_to_process for key, f in leased_flows.items()})
+
+    flows_to_release = []
+    for key, rdf_flow in leased_flows.items():
+      try:
+        flow_obj = self._ProcessLeasedFlow(rdf_flow, ready_requests.get(key))
+        if flow_obj is not None:
+          self._PrepareForRelease(flow_obj)
+          flows_to_release.append((rdf_flow.next_request_to_process, flow_obj))
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("Exception while processing flow %s/%s: %s", key[0],
+                          key[1], e)
+
+    if not flows_to_release:
+      return
 
+    released = data_store.REL_DB.ReleaseProcessedFlows(
+        [flow_obj.rdf_flow for _, flow_obj in flows_to_release])
+
+    for first_request_to_process, flow_obj in flows_to_release:
+      rdf_flow = flow_obj.rdf_flow
+      try:
+        if not released[(rdf_flow.client_id, rdf_flow.flow_id)]:
+          self._ProcessUntilReleased(flow_obj)
+        self._LogProcessingDone(flow_obj, first_request_to_process)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("Exception while processing flow %s/%s: %s",
+                          rdf_flow.client_id, rdf_flow.flow_id, e)
+
+  def _ProcessFlow(self, client_id: str, flow_id: str) -> None:
+    """Leases, processes and releases a single flow."""
     try:
       rdf_flow = data_store.REL_DB.LeaseFlowForProcessing(
-          client_id,
-          flow_id,
-          processing_time=rdfvalue.Duration.From(6, rdfvalue.HOURS))
+          client_id, flow_id, processing_time=self.flow_processing_time)
     except db.ParentHuntIsNotRunningError:
       flow_base.TerminateFlow(client_id, flow_id, "Parent hunt stopped.")
       return
 
     first_request_to_process = rdf_flow.next_request_to_process
+    flow_obj = self._ProcessLeasedFlow(rdf_flow)
+    if flow_obj is None:
+      return
+
+    if not self._ReleaseProcessedFlow(flow_obj):
+      self._ProcessUntilReleased(flow_obj)
+    self._LogProcessingDone(flow_obj, first_request_to_process)
+
+  def _ProcessLeasedFlow(
+      self,
+      rdf_flow: rdf_flow_objects.Flow,
+      request_dict: Optional[db.ReadyFlowRequests] = None
+  ) -> Optional[flow_base.FlowBase]:
+    """Processes all ready requests of a leased flow.
+
+    Args:
+      rdf_flow: The leased flow.
+      request_dict: Requests ready for processing, as returned by
+        ReadFlowRequestsReadyForProcessing. If not set, they are read from the
+        database.
+
+    Returns:
+      The flow object or None if the flow is not running anymore.
+
+    Raises:
+      FlowHasNothingToProcessError: if the flow had no requests to process.
+    """
+    client_id = rdf_flow.client_id
+    flow_id = rdf_flow.flow_id
     logging.info("Processing Flow %s/%s/%d (%s).", client_id, flow_id,
-                 first_request_to_process, rdf_flow.flow_class_name)
+                 rdf_flow.next_request_to_process, rdf_flow.flow_class_name)
 
     flow_cls = registry.FlowRegistry.FlowClassByName(rdf_flow.flow_class_name)
     flow_obj = flow_cls(rdf_flow)
@@ -131,28 +249,40 @@ class GRRWorker(object):
       logging.info(
           "Received a request to process flow %s on client %s that is not "
           "running.", flow_id, client_id)
-      return
+      return None
 
-    processed, incrementally_processed = flow_obj.ProcessAllReadyRequests()
+    processed, incrementally_processed = flow_obj.ProcessAllReadyRequests(
+        request_dict)
     if processed == 0 and incrementally_processed == 0:
       raise FlowHasNothingToProcessError(
           "Unable to process any requests for flow %s on client %s." %
           (flow_id, client_id))
 
-    while not self._ReleaseProcessedFlow(flow_obj):
+    return flow_obj
+
+  def _ProcessUntilReleased(self, flow_obj: flow_base.FlowBase) -> None:
+    """Processes requests that arrived while the flow was being processed."""
+    while True:
       processed, incrementally_processed = flow_obj.ProcessAllReadyRequests()
       if processed == 0 and incrementally_processed == 0:
         raise FlowHasNothingToProcessError(
             "%s/%s: ReleaseProcessedFlow returned false but no "
             "request could be processed (next req: %d)." %
-            (client_id, flow_id, flow_obj.rdf_flow.next_request_to_process))
+            (flow_obj.rdf_flow.client_id, flow_obj.rdf_flow.flow_id,
+             flow_obj.rdf_flow.next_request_to_process))
+
+      if self._ReleaseProcessedFlow(flow_obj):
+        return
 
+  def _LogProcessingDone(self, flow_obj: flow_base.FlowBase,
+                         first_request_to_process: int) -> None:
+    rdf_flow = flow_obj.rdf_flow
     if flow_obj.IsRunning():
       logging.info(
           "Processing Flow %s/%s/%d (%s) done, next request to process: %d.",
-          client_id, flow_id, first_request_to_process,
+          rdf_flow.client_id, rdf_flow.flow_id, first_request_to_process,
           rdf_flow.flow_class_name, rdf_flow.next_request_to_process)
     else:
       logging.info("Processing Flow %s/%s/%d (%s) done, flow is done.",
-                   client_id, flow_id, first_request_to_process,
-                   rdf_flow.flow_class_name)
+                   rdf_flow.client_id, rdf_flow.flow_id,
+                   first_request_to_process, rdf_flow.flow_class_name)
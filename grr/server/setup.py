@@ -177,6 +177,7 @@ setup_args = dict(
         "grr-response-core==%s" % VERSION.get("Version", "packagedepends"),
         "ipython==7.15.0",
         "Jinja2==3.1.2",
+        "numpy==1.26.4",
         "pexpect==4.8.0",
         "portpicker==1.6.0b1",
         "prometheus_client==0.16.0",
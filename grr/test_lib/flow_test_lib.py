@@ -428,6 +428,11 @@ class TestWorker(worker_lib.GRRWorker):
     self.processed_flows.append(key)
     super().ProcessFlow(flow_processing_request)
 
+  def ProcessFlows(self, flow_processing_requests):
+    for r in flow_processing_requests:
+      self.processed_flows.append((r.client_id, r.flow_id))
+    super().ProcessFlows(flow_processing_requests)
+
   def ResetProcessedFlows(self):
     processed_flows = self.processed_flows
     self.processed_flows = []
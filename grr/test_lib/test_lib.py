@@ -90,6 +90,8 @@ class GRRBaseTest(absltest.TestCase):
     # to access the delegate directly (assuming it's an InMemoryDB
     # implementation).
     data_store.REL_DB.delegate.ClearTestDB()
+    # Clearing the database bypasses the in-process caches of its data.
+    data_store.FlushCaches()
 
     email_alerts.InitializeEmailAlerterOnce()
 
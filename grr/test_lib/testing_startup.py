@@ -10,6 +10,7 @@ from grr_response_core.config import contexts
 from grr_response_core.lib import config_lib
 from grr_response_core.lib import package
 from grr_response_core.lib import utils
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.util import temp
 from grr_response_core.stats import stats_collector_instance
 from grr_response_server import artifact
@@ -76,6 +77,8 @@ def TestInit():
     server_logging.ServerLoggingStartupInit()
     server_logging.SetTestVerbosity()
 
+  rdf_structs.EnableProtobufCodec(config.CONFIG["Server.protobuf_codec"])
+
   blob_store_test_lib.UseTestBlobStore()
 
   data_store.InitializeDataStore()
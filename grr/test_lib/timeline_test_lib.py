@@ -5,8 +5,11 @@ from typing import Optional
 from typing import Sequence
 from typing import Text
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
+from grr_response_server import columnar_timeline
 from grr_response_server import data_store
 from grr_response_server.flows.general import timeline
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
@@ -16,6 +19,7 @@ def WriteTimeline(
     client_id: Text,
     entries: Sequence[rdf_timeline.TimelineEntry],
     hunt_id: Optional[Text] = None,
+    columnar: bool = False,
 ) -> Text:
   """Writes a timeline to the database (as fake flow result).
 
@@ -23,6 +27,7 @@ def WriteTimeline(
     client_id: An identifier of the client for which the flow ran.
     entries: A sequence of timeline entries produced by the flow run.
     hunt_id: An (optional) identifier of a hunt the flows belong to.
+    columnar: Whether to also write the timeline in the columnar format.
 
   Returns:
     An identifier of the flow.
@@ -35,6 +40,19 @@ def WriteTimeline(
   flow_obj.flow_class_name = timeline.TimelineFlow.__name__
   flow_obj.create_time = rdfvalue.RDFDatetime.Now()
   flow_obj.parent_hunt_id = hunt_id
+
+  if columnar:
+    index = columnar_timeline.SegmentIndex()
+    columnar_timeline.WriteSegments(
+        (entry.AsPrimitiveProto() for entry in entries),
+        index,
+        segment_size=config.CONFIG["Server.timeline_columnar_segment_size"])
+    index_blob_id = columnar_timeline.WriteIndexPart(index, None)
+    # pylint: disable=protected-access
+    flow_obj.persistent_data = rdf_protodict.AttributedDict(
+        {timeline._COLUMNAR_INDEX_STATE_KEY: index_blob_id.AsBytes()})
+    # pylint: enable=protected-access
+
   data_store.REL_DB.WriteFlowObject(flow_obj)
 
   blobs = list(rdf_timeline.TimelineEntry.SerializeStream(iter(entries)))